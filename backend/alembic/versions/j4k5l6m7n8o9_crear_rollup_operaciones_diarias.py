@@ -0,0 +1,75 @@
+"""crear rollup operaciones_diarias
+
+Revision ID: j4k5l6m7n8o9
+Revises: a1f2b3c4d5e6
+Create Date: 2026-10-16
+
+- Crea operaciones_diarias: totales por fecha, tipo_operacion, area_id,
+  localidad y moneda_original de las operaciones activas.
+- La carga inicial se hace desde operaciones (mismo SQL que el rebuild).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'j4k5l6m7n8o9'
+down_revision: Union[str, None] = 'a1f2b3c4d5e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Reutiliza los enums ya creados por la tabla operaciones
+    tipo_operacion = postgresql.ENUM(
+        'INGRESO', 'GASTO', 'RETIRO', 'DISTRIBUCION', name='tipooperacion', create_type=False
+    )
+    localidad = postgresql.ENUM('MONTEVIDEO', 'MERCEDES', name='localidad', create_type=False)
+    moneda = postgresql.ENUM('UYU', 'USD', name='moneda', create_type=False)
+
+    op.create_table('operaciones_diarias',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('fecha', sa.Date(), nullable=False),
+    sa.Column('tipo_operacion', tipo_operacion, nullable=False),
+    sa.Column('area_id', sa.UUID(), nullable=True),
+    sa.Column('localidad', localidad, nullable=False),
+    sa.Column('moneda_original', moneda, nullable=False),
+    sa.Column('cantidad_operaciones', sa.Integer(), nullable=False),
+    sa.Column('monto_original', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('monto_uyu', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('monto_usd', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('total_pesificado', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('total_dolarizado', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['area_id'], ['areas.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint(
+        'fecha', 'tipo_operacion', 'area_id', 'localidad', 'moneda_original',
+        name='uq_operaciones_diarias_clave',
+        postgresql_nulls_not_distinct=True,
+    )
+    )
+    op.create_index('idx_operaciones_diarias_fecha', 'operaciones_diarias', ['fecha'])
+
+    op.execute("""
+        INSERT INTO operaciones_diarias (
+            id, fecha, tipo_operacion, area_id, localidad, moneda_original,
+            cantidad_operaciones, monto_original, monto_uyu, monto_usd,
+            total_pesificado, total_dolarizado, updated_at
+        )
+        SELECT
+            gen_random_uuid(), fecha, tipo_operacion, area_id, localidad, moneda_original,
+            COUNT(*), SUM(monto_original), SUM(monto_uyu), SUM(monto_usd),
+            SUM(total_pesificado), SUM(total_dolarizado), timezone('utc', now())
+        FROM operaciones
+        WHERE deleted_at IS NULL
+        GROUP BY fecha, tipo_operacion, area_id, localidad, moneda_original
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_operaciones_diarias_fecha', table_name='operaciones_diarias')
+    op.drop_table('operaciones_diarias')
@@ -0,0 +1,44 @@
+"""crear planes_sql_cfo
+
+Revision ID: k5l6m7n8o9p0
+Revises: j4k5l6m7n8o9
+Create Date: 2026-10-16
+
+- Crea planes_sql_cfo: plan EXPLAIN (FORMAT JSON) de cada SQL generado por el
+  CFO AI, con la pregunta, costo estimado y si la guardia de costo lo rechazó.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'k5l6m7n8o9p0'
+down_revision: Union[str, None] = 'j4k5l6m7n8o9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('planes_sql_cfo',
+    sa.Column('id', sa.UUID(), server_default=sa.text('gen_random_uuid()'), nullable=False),
+    sa.Column('pregunta', sa.Text(), nullable=False),
+    sa.Column('sql', sa.Text(), nullable=False),
+    sa.Column('costo_total', sa.Float(), nullable=False),
+    sa.Column('filas_estimadas', sa.Float(), nullable=False),
+    sa.Column('plan', JSONB, nullable=False),
+    sa.Column('rechazado', sa.Boolean(), nullable=False),
+    sa.Column('motivo', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_planes_sql_cfo_costo_total', 'planes_sql_cfo', ['costo_total'])
+    op.create_index('ix_planes_sql_cfo_created_at', 'planes_sql_cfo', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_planes_sql_cfo_created_at', table_name='planes_sql_cfo')
+    op.drop_index('ix_planes_sql_cfo_costo_total', table_name='planes_sql_cfo')
+    op.drop_table('planes_sql_cfo')
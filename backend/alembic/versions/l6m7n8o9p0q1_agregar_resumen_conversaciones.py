@@ -0,0 +1,34 @@
+"""agregar resumen a conversaciones
+
+Revision ID: l6m7n8o9p0q1
+Revises: k5l6m7n8o9p0
+Create Date: 2026-10-16
+
+- Agrega a conversaciones el resumen acumulado de los turnos viejos
+  (resumen, resumen_hasta) y el estado estructurado de la última consulta
+  (estado_consulta): el prompt del chat CFO lleva un contexto de tamaño fijo.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'l6m7n8o9p0q1'
+down_revision: Union[str, None] = 'k5l6m7n8o9p0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('conversaciones', sa.Column('resumen', sa.Text(), nullable=True))
+    op.add_column('conversaciones', sa.Column('resumen_hasta', sa.DateTime(), nullable=True))
+    op.add_column('conversaciones', sa.Column('estado_consulta', JSONB, nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('conversaciones', 'estado_consulta')
+    op.drop_column('conversaciones', 'resumen_hasta')
+    op.drop_column('conversaciones', 'resumen')
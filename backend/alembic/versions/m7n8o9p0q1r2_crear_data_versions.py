@@ -0,0 +1,81 @@
+"""crear data_versions
+
+Revision ID: m7n8o9p0q1r2
+Revises: l6m7n8o9p0q1
+Create Date: 2026-10-16
+
+- Crea data_versions: un contador por tabla versionada (clave primaria = nombre
+  de la tabla), con una fila inicial en 0 por cada una.
+- Triggers a nivel sentencia (INSERT, UPDATE, DELETE, TRUNCATE) sobre
+  operaciones, clientes, proveedores, distribuciones_detalle y expedientes
+  incrementan el contador de su tabla. Una sentencia que toca mil filas suma 1.
+- El incremento corre en la transacción que modifica la tabla: un rollback
+  también deshace el cambio de versión.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'm7n8o9p0q1r2'
+down_revision: Union[str, None] = 'l6m7n8o9p0q1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLAS_VERSIONADAS = (
+    'operaciones',
+    'clientes',
+    'proveedores',
+    'distribuciones_detalle',
+    'expedientes',
+)
+
+# Upsert: una tabla agregada después sin fila inicial empieza en 1
+SQL_FUNCION = """
+    CREATE OR REPLACE FUNCTION incrementar_data_version() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO data_versions (tabla, version, updated_at)
+        VALUES (TG_TABLE_NAME, 1, timezone('utc', now()))
+        ON CONFLICT (tabla) DO UPDATE
+            SET version = data_versions.version + 1,
+                updated_at = EXCLUDED.updated_at;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+
+def sql_trigger(tabla: str) -> str:
+    return f"""
+        CREATE TRIGGER trg_data_version_{tabla}
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {tabla}
+        FOR EACH STATEMENT EXECUTE FUNCTION incrementar_data_version()
+    """
+
+
+def upgrade() -> None:
+    op.create_table('data_versions',
+    sa.Column('tabla', sa.String(length=63), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('tabla')
+    )
+    op.execute(
+        "INSERT INTO data_versions (tabla, version, updated_at) "
+        "SELECT tabla, 0, timezone('utc', now()) FROM unnest(ARRAY["
+        + ", ".join(f"'{tabla}'" for tabla in TABLAS_VERSIONADAS)
+        + "]) AS tabla"
+    )
+
+    op.execute(SQL_FUNCION)
+    for tabla in TABLAS_VERSIONADAS:
+        op.execute(sql_trigger(tabla))
+
+
+def downgrade() -> None:
+    for tabla in TABLAS_VERSIONADAS:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_data_version_{tabla} ON {tabla}")
+    op.execute("DROP FUNCTION IF EXISTS incrementar_data_version()")
+    op.drop_table('data_versions')
@@ -0,0 +1,57 @@
+"""versionar areas, socios y operaciones_diarias
+
+Revision ID: n8o9p0q1r2s3
+Revises: m7n8o9p0q1r2
+Create Date: 2026-10-16
+
+- El cache de resultados SQL versiona cada entrada con data_versions de las
+  tablas que lee el SQL: suma los triggers a nivel sentencia (misma función
+  incrementar_data_version) a las otras tablas que lee el SQL generado.
+- operaciones_diarias se escribe junto con operaciones, salvo el rebuild
+  (scripts/reconstruir_rollup_operaciones.py), que solo toca el rollup.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'n8o9p0q1r2s3'
+down_revision: Union[str, None] = 'm7n8o9p0q1r2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLAS_VERSIONADAS = (
+    'areas',
+    'socios',
+    'operaciones_diarias',
+)
+
+
+def sql_trigger(tabla: str) -> str:
+    return f"""
+        CREATE TRIGGER trg_data_version_{tabla}
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {tabla}
+        FOR EACH STATEMENT EXECUTE FUNCTION incrementar_data_version()
+    """
+
+
+def upgrade() -> None:
+    op.execute(
+        "INSERT INTO data_versions (tabla, version, updated_at) "
+        "SELECT tabla, 0, timezone('utc', now()) FROM unnest(ARRAY["
+        + ", ".join(f"'{tabla}'" for tabla in TABLAS_VERSIONADAS)
+        + "]) AS tabla ON CONFLICT (tabla) DO NOTHING"
+    )
+    for tabla in TABLAS_VERSIONADAS:
+        op.execute(sql_trigger(tabla))
+
+
+def downgrade() -> None:
+    for tabla in TABLAS_VERSIONADAS:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_data_version_{tabla} ON {tabla}")
+    op.execute(
+        "DELETE FROM data_versions WHERE tabla IN ("
+        + ", ".join(f"'{tabla}'" for tabla in TABLAS_VERSIONADAS)
+        + ")"
+    )
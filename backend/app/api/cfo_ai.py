@@ -2,11 +2,11 @@
 Router API para gestión de conversaciones CFO AI.
 
 Los endpoints de chat (/ask-stream) están en cfo_streaming.py.
-Este módulo solo gestiona CRUD de conversaciones.
+Este módulo gestiona CRUD de conversaciones y el análisis de planes del SQL generado.
 """
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
 from uuid import UUID
@@ -14,6 +14,7 @@ from uuid import UUID
 from app.core.database import get_db
 from app.core.security import get_current_user
 from app.services.conversacion_service import ConversacionService
+from app.services.guardia_costo_sql import listar_planes_mas_costosos
 from app.schemas.conversacion import ConversacionListResponse, ConversacionResponse
 from app.models import Usuario
 
@@ -89,3 +90,37 @@ def eliminar_conversacion(
     db.commit()
 
     return {"success": True, "message": "Conversación eliminada"}
+
+
+# ══════════════════════════════════════════════════════════════
+# ANÁLISIS DE PLANES DEL SQL GENERADO
+# ══════════════════════════════════════════════════════════════
+
+@router.get("/planes-sql/costosos")
+def listar_planes_costosos(
+    db: Session = Depends(get_db),
+    limit: int = Query(20, ge=1, le=200),
+    solo_rechazados: bool = False,
+    incluir_plan: bool = False,
+    current_user: Usuario = Depends(get_current_user)
+):
+    """Lista las queries generadas con mayor costo estimado por el planner (solo socios)"""
+    if not current_user.es_socio:
+        raise HTTPException(403, "Solo socios pueden ver los planes de SQL")
+
+    planes = listar_planes_mas_costosos(db, limite=limit, solo_rechazados=solo_rechazados)
+
+    return [
+        {
+            "id": plan.id,
+            "pregunta": plan.pregunta,
+            "sql": plan.sql,
+            "costo_total": plan.costo_total,
+            "filas_estimadas": plan.filas_estimadas,
+            "rechazado": plan.rechazado,
+            "motivo": plan.motivo,
+            "created_at": plan.created_at,
+            **({"plan": plan.plan} if incluir_plan else {}),
+        }
+        for plan in planes
+    ]
@@ -9,7 +9,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from app.core.access_control import USUARIOS_ACCESO_JURISPRUDENCIA, tiene_acceso
-from app.core.database import get_db
+from app.core.database import get_analytics_db, get_db
 from app.core.security import get_current_user
 from app.models import Usuario
 from app.models.sentencia import Sentencia
@@ -50,7 +50,7 @@ def buscar_sentencias(
     q: str = Query(..., description="Texto a buscar"),
     limit: int = Query(20, ge=1, le=100, description="Máximo de resultados"),
     offset: int = Query(0, ge=0, description="Desplazamiento para paginación"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_analytics_db),
     current_user: Usuario = Depends(get_current_user),
 ):
     """Busca sentencias por texto libre."""
@@ -74,7 +74,7 @@ def listar_sentencias(
     sede: Optional[str] = Query(None, description="Filtrar por sede"),
     fecha_desde: Optional[date] = Query(None, description="Filtrar desde fecha"),
     fecha_hasta: Optional[date] = Query(None, description="Filtrar hasta fecha"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_analytics_db),
     current_user: Usuario = Depends(get_current_user),
 ):
     """Lista sentencias con filtros opcionales."""
@@ -5,7 +5,7 @@ Reemplaza los endpoints eliminados de reportes_dashboard.py
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session, joinedload
 from datetime import date
-from app.core.database import get_db
+from app.core.database import get_analytics_db
 from app.core.security import get_current_user
 from app.models.operacion import Operacion, TipoOperacion
 from app.models import Usuario
@@ -19,7 +19,7 @@ def get_dashboard_metrics(
     fecha_hasta: date = Query(...),
     localidad: str = Query(None),
     moneda_vista: str = Query("UYU"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_analytics_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """Métricas principales del dashboard"""
@@ -84,7 +84,7 @@ def get_operaciones_grafico(
     fecha_desde: date = Query(...),
     fecha_hasta: date = Query(...),
     localidad: str = Query(None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_analytics_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """Operaciones agrupadas para gráficos"""
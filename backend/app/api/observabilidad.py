@@ -0,0 +1,46 @@
+"""
+Endpoint /metrics en formato de texto de Prometheus.
+
+Expone los histogramas por etapa del chat CFO (trazas_cfo), el uso acumulado
+de tokens de Claude y los contadores de los caches de SQL, de resultados y
+de narrativas.
+Exige Authorization: Bearer <METRICS_TOKEN>; sin METRICS_TOKEN configurado
+el endpoint no existe (404): gasto de tokens, tasas de cache y tiempos por
+etapa no quedan expuestos por omisión.
+"""
+import secrets
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+
+from app.core.config import settings
+from app.services.ai.prompt_cache import estadisticas_uso_cache
+from app.services.narrativa_cache import estadisticas_cache_narrativas
+from app.services.result_cache import estadisticas_cache_resultados
+from app.services.sql_router import estadisticas_cache_sql
+from app.services.trazas_cfo import exportar_prometheus
+
+router = APIRouter()
+
+CONTENT_TYPE_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metricas_prometheus(authorization: Optional[str] = Header(None)):
+    """Métricas del pipeline de chat para scraping de Prometheus"""
+    if not settings.metrics_token:
+        raise HTTPException(404, "Not Found")
+    esperado = f"Bearer {settings.metrics_token}"
+    if not authorization or not secrets.compare_digest(authorization, esperado):
+        raise HTTPException(401, "Token de métricas inválido")
+
+    texto = exportar_prometheus(
+        uso_claude=estadisticas_uso_cache(),
+        caches={
+            "sql": estadisticas_cache_sql(),
+            "resultados": estadisticas_cache_resultados(),
+            "narrativas": estadisticas_cache_narrativas(),
+        },
+    )
+    return PlainTextResponse(texto, media_type=CONTENT_TYPE_PROMETHEUS)
@@ -16,6 +16,7 @@ from app.schemas.operacion import (
 )
 from app.services import operacion_service
 from app.services.excel_export_service import generar_excel_operaciones
+from app.services.rollup_operaciones import restar_operacion, sumar_operacion
 import uuid
 from app.core.access_control import EMAILS_OPERACIONES_CONTABLE, AREA_CONTABLE_ID
 
@@ -115,10 +116,12 @@ def anular_operacion(
     except ValueError:
         raise HTTPException(status_code=400, detail="ID inválido")
     
+    # FOR UPDATE: una anulación concurrente espera y ya no la ve activa, así el
+    # rollup no la resta dos veces
     operacion = db.query(Operacion).filter(
         Operacion.id == op_uuid,
         Operacion.deleted_at.is_(None)
-    ).first()
+    ).with_for_update().first()
     
     if not operacion:
         raise HTTPException(status_code=404, detail="Operación no encontrada")
@@ -127,6 +130,7 @@ def anular_operacion(
     if _es_usuario_solo_contable(current_user.email) and str(operacion.area_id) != AREA_CONTABLE_ID:
         raise HTTPException(status_code=403, detail="Solo puede modificar operaciones del área Contable")
 
+    restar_operacion(db, operacion)
     operacion.deleted_at = datetime.now(timezone.utc)
     db.commit()
 
@@ -160,7 +164,9 @@ def crear_distribucion(data: DistribucionCreate, db: Session = Depends(get_db),
 
 def _obtener_operacion_o_404(db: Session, operacion_id: str) -> Operacion:
     """
-    Valida UUID y busca operación activa.
+    Valida UUID y busca operación activa, con la fila bloqueada (FOR UPDATE)
+    hasta el commit: dos ediciones o anulaciones concurrentes se serializan
+    y el rollup de operaciones_diarias no resta dos veces los mismos valores.
     
     Args:
         db: Sesión de base de datos
@@ -181,7 +187,7 @@ def _obtener_operacion_o_404(db: Session, operacion_id: str) -> Operacion:
     operacion = db.query(Operacion).filter(
         Operacion.id == op_uuid,
         Operacion.deleted_at.is_(None)
-    ).first()
+    ).with_for_update().first()
     
     if not operacion:
         raise HTTPException(status_code=404, detail="Operación no encontrada")
@@ -299,6 +305,9 @@ def actualizar_operacion(
         if 'area_id' in payload and payload['area_id'] and str(payload['area_id']) != AREA_CONTABLE_ID:
             raise HTTPException(status_code=403, detail="Solo puede operar en el área Contable")
 
+    # El rollup se ajusta con los valores previos antes de tocar la operación
+    restar_operacion(db, operacion)
+
     # 2. Actualizar campos básicos
     _actualizar_campos_basicos(operacion, payload)
     
@@ -307,6 +316,7 @@ def actualizar_operacion(
     
     # 4. Guardar cambios
     operacion.updated_at = datetime.now(timezone.utc)
+    sumar_operacion(db, operacion)
     db.commit()
     db.refresh(operacion)
     
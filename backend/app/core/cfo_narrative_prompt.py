@@ -267,6 +267,7 @@ Si hay mensajes previos en <conversation_history>:
 - No repitas información que ya diste.
 - Si la pregunta es una continuación ("¿y por localidad?", "¿en dólares?"), conectá con lo anterior sin repetir el contexto completo.
 - Ajustá la extensión: en un ida y vuelta rápido, respuestas más cortas y directas.
+<conversation_summary> resume los turnos anteriores y la última consulta: usalo igual que el historial.
 </contexto_conversacional>
 
 <ejemplos>
@@ -347,16 +348,20 @@ La rentabilidad de 2025 fue del 33,0%. Sin embargo, no puedo decirte la rentabil
 # Esto cambia en cada request. Se arma con la pregunta, datos y contexto.
 # ═══════════════════════════════════════════════════════════════════════
 
-def build_cfo_user_message(
+def _partes_cfo_user_message(
     pregunta: str,
     financial_data=None,              # dict (legacy) o str (pre-formateado)
     resumen_precalculado: dict = None,
     conversation_history: list = None,
     fecha_actual: str = None,
     **kwargs,
-) -> str:
+) -> tuple[str, str]:
     """
-    Construye el user message dinámico para la llamada narrativa.
+    Arma el user message narrativo dividido en (prefijo estable, sufijo variable).
+
+    El prefijo (fecha + historial) es candidato a prompt caching; el sufijo
+    (pregunta, resumen y datos) cambia en cada llamada. prefijo + sufijo es
+    exactamente el texto de build_cfo_user_message.
 
     Args:
         pregunta: La pregunta original del usuario.
@@ -367,7 +372,7 @@ def build_cfo_user_message(
         fecha_actual: Fecha opcional ya formateada.
 
     Returns:
-        String con el user message listo para enviar a Claude
+        Tupla (prefijo, sufijo) de strings
     """
     # Compatibilidad retroactiva con el contrato anterior
     if financial_data is None and "datos_json" in kwargs:
@@ -387,6 +392,10 @@ def build_cfo_user_message(
     # Últimos 3 pares de intercambio (6 mensajes) para no inflar tokens.
     # Las respuestas del assistant se truncan a 300 chars porque lo importante
     # es que Claude sepa QUÉ se preguntó y QUÉ respondió, no el texto completo.
+    # El resumen de turnos anteriores (role "resumen", ya acotado) va aparte.
+    if conversation_history and conversation_history[0]["role"] == "resumen":
+        parts.append(f"\n<conversation_summary>\n{conversation_history[0]['content']}\n</conversation_summary>")
+        conversation_history = conversation_history[1:]
     if conversation_history and len(conversation_history) > 0:
         ultimos = conversation_history[-6:]  # Máximo 3 intercambios
         parts.append("\n<conversation_history>")
@@ -398,6 +407,9 @@ def build_cfo_user_message(
             parts.append(f"{role_label}: {content}")
         parts.append("</conversation_history>")
 
+    prefijo = "\n".join(parts)
+    parts = []
+
     # ── Pregunta actual ──
     parts.append(f"\n<user_question>\n{pregunta}\n</user_question>")
 
@@ -427,4 +439,66 @@ def build_cfo_user_message(
 
     parts.append(f"\n<financial_data>\n{datos_para_prompt}\n</financial_data>")
 
-    return "\n".join(parts)
+    return prefijo, "\n" + "\n".join(parts)
+
+
+def build_cfo_user_message(
+    pregunta: str,
+    financial_data=None,              # dict (legacy) o str (pre-formateado)
+    resumen_precalculado: dict = None,
+    conversation_history: list = None,
+    fecha_actual: str = None,
+    **kwargs,
+) -> str:
+    """
+    Construye el user message dinámico para la llamada narrativa.
+
+    Args:
+        pregunta: La pregunta original del usuario.
+        financial_data: Dict/list legacy (se serializa) o texto pre-formateado.
+        resumen_precalculado: Dict con sumas, subtotales y extremos pre-computados
+                              por el servidor para evitar aritmética mental del LLM.
+        conversation_history: Historial conversacional opcional.
+        fecha_actual: Fecha opcional ya formateada.
+
+    Returns:
+        String con el user message listo para enviar a Claude
+    """
+    prefijo, sufijo = _partes_cfo_user_message(
+        pregunta,
+        financial_data=financial_data,
+        resumen_precalculado=resumen_precalculado,
+        conversation_history=conversation_history,
+        fecha_actual=fecha_actual,
+        **kwargs,
+    )
+    return prefijo + sufijo
+
+
+def build_cfo_user_content(
+    pregunta: str,
+    financial_data=None,
+    resumen_precalculado: dict = None,
+    conversation_history: list = None,
+    fecha_actual: str = None,
+    **kwargs,
+):
+    """
+    Variante cache-aware de build_cfo_user_message para la API de Anthropic.
+
+    Con historial conversacional retorna bloques de contenido con cache_control
+    al final del historial; sin historial retorna el texto plano.
+    """
+    from app.services.ai.prompt_cache import construir_contenido_usuario
+
+    prefijo, sufijo = _partes_cfo_user_message(
+        pregunta,
+        financial_data=financial_data,
+        resumen_precalculado=resumen_precalculado,
+        conversation_history=conversation_history,
+        fecha_actual=fecha_actual,
+        **kwargs,
+    )
+    if not (conversation_history or kwargs.get("contexto")):
+        return prefijo + sufijo
+    return construir_contenido_usuario(prefijo, sufijo)
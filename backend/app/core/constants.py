@@ -35,6 +35,140 @@ KEYWORDS_TEMPORALES = [
     'estimar', 'estimación', 'estimacion'
 ]
 
+# ══════════════════════════════════════════════════════════════
+# CACHE DE SQL GENERADO (SQLRouter)
+# ══════════════════════════════════════════════════════════════
+
+SQL_CACHE_MAX_ENTRADAS = 256
+SQL_CACHE_TTL_SEGUNDOS = 6 * 60 * 60  # 6 horas
+
+# ══════════════════════════════════════════════════════════════
+# EJEMPLOS DINÁMICOS PARA GENERACIÓN SQL (ejemplos_sql)
+# ══════════════════════════════════════════════════════════════
+
+# SQL generado que se ejecutó bien y queda como ejemplo (en memoria, LRU)
+EJEMPLOS_SQL_HISTORIAL_MAX = 200
+# Largos de n-gramas de caracteres del índice TF-IDF (además de la palabra entera)
+EJEMPLOS_SQL_NGRAMAS = (3, 4)
+
+# ══════════════════════════════════════════════════════════════
+# MOTOR DE INTENCIONES (motor_intenciones)
+# ══════════════════════════════════════════════════════════════
+
+# Análisis de preguntas recientes (router, detector de informes y validadores
+# analizan la misma pregunta en un request)
+MOTOR_INTENCIONES_CACHE_MAX = 256
+
+# ══════════════════════════════════════════════════════════════
+# CACHE DE RESULTADOS SQL (versionado por datos de operaciones)
+# ══════════════════════════════════════════════════════════════
+
+RESULT_CACHE_MAX_ENTRADAS = 512
+RESULT_CACHE_MAX_FILAS = 5000  # Resultados más grandes no se cachean
+RESULT_CACHE_TTL_SEGUNDOS = 10 * 60  # Acota desactualización entre workers
+
+# ══════════════════════════════════════════════════════════════
+# CACHE DE NARRATIVAS (mismo resultado, misma respuesta)
+# ══════════════════════════════════════════════════════════════
+
+NARRATIVA_CACHE_MAX_ENTRADAS = 256
+# La clave ya incluye la fecha del prompt: el TTL solo acota la memoria
+NARRATIVA_CACHE_TTL_SEGUNDOS = 6 * 60 * 60  # 6 horas
+
+# ══════════════════════════════════════════════════════════════
+# EJECUCIÓN ACOTADA DE SQL GENERADO
+# ══════════════════════════════════════════════════════════════
+
+# Tamaño de lote del cursor del lado del servidor (fetchmany). El máximo de
+# filas y el statement_timeout son configurables: CFO_SQL_MAX_FILAS / CFO_SQL_TIMEOUT_MS.
+CFO_SQL_LOTE_FETCH = 500
+
+# ══════════════════════════════════════════════════════════════
+# STREAMING SSE (coalescing de tokens y filas por chunks)
+# ══════════════════════════════════════════════════════════════
+
+# Los chunks de Claude se agrupan hasta que pasa la ventana o se acumulan
+# suficientes caracteres; siempre se corta en fin de palabra.
+STREAM_VENTANA_TOKENS_SEGUNDOS = 0.05
+STREAM_MAX_CARACTERES_TOKEN = 160
+# Filas por evento data_chunk: las filas del resultado se emiten a medida que
+# llegan del cursor (lotes de CFO_SQL_LOTE_FETCH), partidas en chunks de este tamaño
+STREAM_FILAS_POR_CHUNK = 200
+
+# ══════════════════════════════════════════════════════════════
+# RESUMEN PRE-CALCULADO DE RESULTADOS SQL
+# ══════════════════════════════════════════════════════════════
+
+# A partir de esta cantidad de filas los agregados por columna usan NumPy
+RESUMEN_UMBRAL_NUMPY_FILAS = 1000
+
+# ══════════════════════════════════════════════════════════════
+# CAMINO RÁPIDO DE PREGUNTAS CANÓNICAS
+# ══════════════════════════════════════════════════════════════
+
+# Fracción mínima de palabras significativas de la pregunta cubiertas por el
+# patrón canónico para ejecutar su SQL de control sin pasar por Claude.
+# 1.0 = ninguna palabra fuera del patrón ("rentabilidad del mes de marzo" no
+# es "rentabilidad del mes": una sola palabra extra cambia la pregunta)
+CANONICA_CONFIANZA_MINIMA = 1.0
+
+# ══════════════════════════════════════════════════════════════
+# NARRATIVA POR PLANTILLAS (resultados chicos)
+# ══════════════════════════════════════════════════════════════
+
+# Máximo de columnas numéricas que se narran sin Claude (el máximo de filas
+# es configurable: CFO_NARRATIVA_PLANTILLA_MAX_FILAS)
+NARRATIVA_PLANTILLA_MAX_METRICAS = 3
+
+# ══════════════════════════════════════════════════════════════
+# PRESUPUESTO DE TOKENS DEL PROMPT NARRATIVO
+# ══════════════════════════════════════════════════════════════
+
+# Caracteres por token para estimar (español con números: conservador)
+CARACTERES_POR_TOKEN = 3.0
+# Muestra inicial al comprimir un resultado que excede el presupuesto; se
+# reduce a la mitad hasta entrar (el presupuesto es CFO_NARRATIVA_PRESUPUESTO_TOKENS)
+COMPRESION_FILAS_INICIO = 20
+COMPRESION_FILAS_FINAL = 5
+COMPRESION_TOP_GRUPOS = 10
+
+# ══════════════════════════════════════════════════════════════
+# PREGUNTAS EN LOTE (/api/cfo/ask-batch)
+# ══════════════════════════════════════════════════════════════
+
+CFO_LOTE_MAX_PREGUNTAS = 8
+# Consultas del lote ejecutadas a la vez: cada una toma una conexión del pool
+# (pool_size=5), se deja margen para el resto de los requests
+CFO_LOTE_CONCURRENCIA = 3
+
+# ══════════════════════════════════════════════════════════════
+# AST DE SQL (parseo único compartido por validadores)
+# ══════════════════════════════════════════════════════════════
+
+# SQLs parseados que se conservan: cubre el SQL generado y su versión
+# post-procesada de los turnos concurrentes
+SQL_AST_CACHE_MAX_ENTRADAS = 128
+
+# ══════════════════════════════════════════════════════════════
+# RESUMEN DE CONVERSACIÓN (contexto acotado del chat CFO)
+# ══════════════════════════════════════════════════════════════
+
+# Mensajes que van textuales al prompt; los anteriores se pliegan al resumen
+CONTEXTO_MENSAJES_RECIENTES = 4
+# Mensajes fuera de la ventana que disparan un plegado (uno cada 2 turnos)
+RESUMEN_MIN_MENSAJES_NUEVOS = 4
+RESUMEN_MAX_CARACTERES = 1200
+# SQL de la última consulta que se muestra en el estado estructurado
+ESTADO_CONSULTA_MAX_CARACTERES_SQL = 800
+
+# ══════════════════════════════════════════════════════════════
+# TRAZAS DEL CHAT CFO (histogramas de /metrics)
+# ══════════════════════════════════════════════════════════════
+
+TRAZA_BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TRAZA_BUCKETS_TOKENS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+TRAZA_BUCKETS_FILAS = (0, 1, 10, 100, 1000, 5000, 10000)
+
 # ══════════════════════════════════════════════════════════════
 # CONFIGURACIÓN DE NEGOCIO
 # ══════════════════════════════════════════════════════════════
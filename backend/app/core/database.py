@@ -1,4 +1,16 @@
-"""Conexión SQLAlchemy (sync) a PostgreSQL y generador de sesiones para FastAPI."""
+"""
+Conexión SQLAlchemy (sync) a PostgreSQL y generadores de sesiones para FastAPI.
+
+Hay dos engines con pools separados:
+- engine: escrituras, login, carga de operaciones (get_db)
+- analytics_engine: lecturas pesadas (SQL generado por el CFO AI, informes,
+  dashboard, búsqueda de jurisprudencia) vía get_analytics_db. Sus sesiones son
+  read-only y tienen statement_timeout propio. Apunta a ANALYTICS_DATABASE_URL
+  (réplica) o, si no hay réplica, a la misma base con otro pool.
+
+Así un informe pesado nunca deja sin conexiones al login ni al alta de operaciones.
+Con réplica, las lecturas analíticas pueden ver los datos con el lag de replicación.
+"""
 
 from datetime import datetime, timezone
 
@@ -21,6 +33,23 @@ engine = create_engine(
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+analytics_engine = create_engine(
+    settings.analytics_database_url or settings.database_url,
+    pool_recycle=1800,
+    pool_pre_ping=True,
+    pool_size=settings.analytics_pool_size,
+    max_overflow=settings.analytics_max_overflow,
+    pool_timeout=settings.analytics_pool_timeout_s,
+    connect_args={
+        "options": (
+            "-c default_transaction_read_only=on "
+            f"-c statement_timeout={int(settings.analytics_statement_timeout_ms)}"
+        ),
+        "application_name": "cfo_inteligente_analytics",
+    },
+)
+AnalyticsSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=analytics_engine)
+
 Base = declarative_base()
 
 def get_db():
@@ -29,3 +58,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_analytics_db():
+    """Sesión read-only del pool analítico (ver docstring del módulo)."""
+    db = AnalyticsSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -18,6 +18,10 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Inicializa y apaga servicios de larga vida de la aplicación."""
+    from app.services.motor_intenciones import get_motor_intenciones
+
+    get_motor_intenciones()  # compila el autómata de intenciones antes del primer request
+
     if settings.environment == "production":
         from app.services.scheduler_service import iniciar_scheduler
 
@@ -89,6 +93,9 @@ app.include_router(cfo_router, prefix="/api/cfo", tags=["cfo"])
 from app.api.cfo_streaming import router as cfo_streaming_router
 app.include_router(cfo_streaming_router, prefix="/api/cfo", tags=["cfo-streaming"])
 
+from app.api.observabilidad import router as observabilidad_router
+app.include_router(observabilidad_router, tags=["observabilidad"])
+
 from app.api.chat_export import router as chat_export_router
 app.include_router(chat_export_router, prefix="/api/cfo", tags=["cfo-export"])
 
@@ -1,6 +1,7 @@
 from app.models.area import Area
 from app.models.socio import Socio
 from app.models.operacion import Operacion, TipoOperacion, Moneda, Localidad
+from app.models.operacion_diaria import OperacionDiaria
 from app.models.distribucion import DistribucionDetalle
 from app.models.usuario import Usuario
 from app.models.cliente import Cliente
@@ -17,6 +18,8 @@ from app.models.tramite_dgr_historial import TramiteDgrHistorial
 from app.models.telegram_usuario import TelegramUsuario
 from app.models.verificacion_ala import VerificacionALA, ListaALAMetadata
 from app.models.consulta_contable import ConsultaContable
+from app.models.plan_sql import PlanSQL
+from app.models.version_datos import VersionDatos
 
 __all__ = [
     "Area",
@@ -25,6 +28,7 @@ __all__ = [
     "TipoOperacion",
     "Moneda",
     "Localidad",
+    "OperacionDiaria",
     "DistribucionDetalle",
     "Usuario",
     "Cliente",
@@ -48,6 +52,8 @@ __all__ = [
     "VerificacionALA",
     "ListaALAMetadata",
     "ConsultaContable",
+    "PlanSQL",
+    "VersionDatos",
     "Norma",
     "NormaArticulo",
     "NormaRelacion",
@@ -1,7 +1,7 @@
 """Modelos de conversaciones y mensajes del chat CFO."""
 
 from sqlalchemy import Column, String, DateTime, Text, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
 from app.core.database import Base, utc_now
 import uuid
@@ -14,6 +14,11 @@ class Conversacion(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     usuario_id = Column(UUID(as_uuid=True), ForeignKey("usuarios.id"), nullable=False)
     titulo = Column(String(200), nullable=True)
+    # Contexto acotado (ver resumen_conversacion): turnos viejos plegados en un
+    # resumen y el estado estructurado de la última consulta (tablas, filtros, período)
+    resumen = Column(Text, nullable=True)
+    resumen_hasta = Column(DateTime, nullable=True)  # created_at del último mensaje plegado
+    estado_consulta = Column(JSONB, nullable=True)
     deleted_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=utc_now, nullable=False)
     updated_at = Column(DateTime, default=utc_now, onupdate=utc_now, nullable=False)
@@ -0,0 +1,39 @@
+"""Rollup diario de operaciones activas para consultas agregadas."""
+
+from sqlalchemy import Column, Integer, DateTime, Numeric, Date, Enum, ForeignKey, UniqueConstraint, Index
+from sqlalchemy.dialects.postgresql import UUID
+from app.core.database import Base, utc_now
+from app.models.operacion import TipoOperacion, Moneda, Localidad
+import uuid
+
+class OperacionDiaria(Base):
+    """Totales por día, tipo, área, localidad y moneda de las operaciones no anuladas.
+
+    Lo mantiene rollup_operaciones en la misma transacción que cada alta, edición
+    o anulación; rebuild con scripts/reconstruir_rollup_operaciones.py.
+    Las sumas equivalen a SUM(...) sobre operaciones con deleted_at IS NULL.
+    """
+
+    __tablename__ = "operaciones_diarias"
+    __table_args__ = (
+        UniqueConstraint(
+            "fecha", "tipo_operacion", "area_id", "localidad", "moneda_original",
+            name="uq_operaciones_diarias_clave",
+            postgresql_nulls_not_distinct=True,  # area_id NULL (retiros/distribuciones) es una clave más
+        ),
+        Index("idx_operaciones_diarias_fecha", "fecha"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    fecha = Column(Date, nullable=False)
+    tipo_operacion = Column(Enum(TipoOperacion), nullable=False)
+    area_id = Column(UUID(as_uuid=True), ForeignKey("areas.id"), nullable=True)
+    localidad = Column(Enum(Localidad), nullable=False)
+    moneda_original = Column(Enum(Moneda), nullable=False)
+    cantidad_operaciones = Column(Integer, nullable=False, default=0)
+    monto_original = Column(Numeric(18, 2), nullable=False, default=0)
+    monto_uyu = Column(Numeric(18, 2), nullable=False, default=0)
+    monto_usd = Column(Numeric(18, 2), nullable=False, default=0)
+    total_pesificado = Column(Numeric(18, 2), nullable=False, default=0)
+    total_dolarizado = Column(Numeric(18, 2), nullable=False, default=0)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
@@ -0,0 +1,43 @@
+"""
+Modelo PlanSQL — plan EXPLAIN de cada SQL generado por el CFO AI antes de
+ejecutarse. Permite analizar después qué preguntas producen queries caras y
+cuáles fueron rechazadas por la guardia de costo.
+"""
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Index, Text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy import text
+
+from app.core.database import Base, utc_now
+
+
+class PlanSQL(Base):
+    __tablename__ = "planes_sql_cfo"
+
+    id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        server_default=text("gen_random_uuid()"),
+    )
+
+    pregunta = Column(Text, nullable=False)
+    sql = Column(Text, nullable=False)
+
+    # Estimaciones del planner (nodo raíz del plan)
+    costo_total = Column(Float, nullable=False)
+    filas_estimadas = Column(Float, nullable=False)
+    plan = Column(JSONB, nullable=False)
+
+    # Resultado de la guardia de costo
+    rechazado = Column(Boolean, default=False, nullable=False)
+    motivo = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=utc_now, nullable=False)
+
+    __table_args__ = (
+        Index("ix_planes_sql_cfo_costo_total", "costo_total"),
+        Index("ix_planes_sql_cfo_created_at", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<PlanSQL costo={self.costo_total:.0f} rechazado={self.rechazado}>"
@@ -0,0 +1,22 @@
+"""Contador de versión de datos por tabla, para invalidar caches."""
+
+from sqlalchemy import BigInteger, Column, DateTime, String
+
+from app.core.database import Base, utc_now
+
+
+class VersionDatos(Base):
+    """Versión de una tabla versionada: sube en cada sentencia que la modifica.
+
+    La mantienen triggers a nivel sentencia (migraciones m7n8o9p0q1r2 y n8o9p0q1r2s3), no la
+    aplicación. La lee versiones_datos en una sola query por clave primaria.
+    """
+
+    __tablename__ = "data_versions"
+
+    tabla = Column(String(63), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=utc_now, nullable=False)
+
+    def __repr__(self):
+        return f"<VersionDatos {self.tabla}={self.version}>"
@@ -1,9 +1,11 @@
 """Schemas Pydantic para soporte, chat y streaming CFO."""
 
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
+
+from app.core.constants import CFO_LOTE_MAX_PREGUNTAS
 
 
 class MensajeHistorial(BaseModel):
@@ -28,6 +30,45 @@ class PreguntaCFOStream(BaseModel):
     conversation_id: Optional[UUID] = None
 
 
+class PreguntasCFOLote(BaseModel):
+    """Payload del chat CFO con varias preguntas que comparten conversación."""
+
+    preguntas: List[str] = Field(..., min_length=1, max_length=CFO_LOTE_MAX_PREGUNTAS)
+    conversation_id: Optional[UUID] = None
+
+    @field_validator('preguntas')
+    @classmethod
+    def preguntas_no_vacias(cls, v):
+        preguntas = [pregunta.strip() for pregunta in v]
+        if not all(preguntas):
+            raise ValueError('Las preguntas no pueden estar vacías')
+        return preguntas
+
+
+class ResultadoPreguntaLote(BaseModel):
+    """Resultado de una pregunta del lote."""
+
+    pregunta: str
+    exito: bool
+    sql: Optional[str] = None
+    metodo: Optional[str] = None
+    filas: int = 0
+    datos: List[Dict[str, Any]] = []
+    truncado: bool = False
+    narrativa: Optional[str] = None
+    error: Optional[str] = None
+    tipo_error: Optional[str] = None
+
+
+class RespuestaCFOLote(BaseModel):
+    """Respuesta combinada de /ask-batch."""
+
+    conversation_id: Optional[UUID] = None
+    mensaje_id: Optional[UUID] = None
+    resultados: List[ResultadoPreguntaLote]
+    tiempo_total: float
+
+
 class ExportPDFRequest(BaseModel):
     """Request body para exportar mensaje a PDF."""
 
@@ -15,6 +15,11 @@ from typing import Optional
 from app.core.config import settings
 from app.core.constants import CLAUDE_MODEL as _CLAUDE_MODEL
 from app.core.logger import get_logger
+from app.services.ai.prompt_cache import (
+    ContenidoMensaje,
+    construir_system_cacheable,
+    registrar_uso_cache,
+)
 
 logger = get_logger(__name__)
 
@@ -73,21 +78,25 @@ class AIOrchestrator:
     
     def complete(
         self,
-        prompt: str,
+        prompt: ContenidoMensaje,
         system_prompt: Optional[str] = None,
         max_tokens: int = 1000,
         temperature: float = 0.3,
-        timeout: int = DEFAULT_TIMEOUT
+        timeout: int = DEFAULT_TIMEOUT,
+        cache_system: bool = False,
+        origen: str = "orchestrator"
     ) -> Optional[str]:
         """
         Genera respuesta usando Claude con reintentos automáticos.
         
         Args:
-            prompt: Prompt del usuario
+            prompt: Prompt del usuario (texto o bloques con cache_control)
             system_prompt: Prompt de sistema (opcional)
             max_tokens: Máximo tokens a generar
             temperature: Creatividad (0.0-1.0)
             timeout: Timeout en segundos por intento
+            cache_system: True para enviar el system prompt como bloque cacheable
+            origen: Etiqueta para el log de uso de tokens/cache
             
         Returns:
             String con respuesta o None si Claude falla
@@ -112,11 +121,14 @@ class AIOrchestrator:
                 }
                 
                 if system_prompt:
-                    kwargs["system"] = system_prompt
+                    kwargs["system"] = (
+                        construir_system_cacheable(system_prompt) if cache_system else system_prompt
+                    )
                 
                 # Llamar a Claude
                 response = self._client.messages.create(**kwargs)
                 result = response.content[0].text
+                registrar_uso_cache(getattr(response, "usage", None), origen)
                 
                 logger.info(f"AIOrchestrator: Claude respondió ({len(result)} chars) en intento {attempt}")
                 return result
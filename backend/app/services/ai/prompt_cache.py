@@ -0,0 +1,144 @@
+"""
+Prompt caching de Anthropic - Sistema CFO Inteligente
+
+Helpers para construir requests cache-friendly:
+- system prompts estáticos como bloques con cache_control (el prefijo grande
+  se procesa una vez y las siguientes llamadas lo leen del cache)
+- contenido de usuario partido en prefijo estable (fecha + historial) y sufijo
+  variable (pregunta + datos), con breakpoint de cache al final del prefijo
+- registro de cache_read_input_tokens / cache_creation_input_tokens por llamada
+
+Anthropic admite hasta 4 breakpoints por request y solo cachea prefijos de
+al menos ~1024 tokens; los bloques más chicos se envían igual, sin costo extra.
+
+Autor: Sistema CFO Inteligente
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+from app.core.logger import get_logger
+from app.services.trazas_cfo import registrar_tokens
+
+logger = get_logger(__name__)
+
+CACHE_CONTROL_EPHEMERAL = {"type": "ephemeral"}
+
+ContenidoMensaje = Union[str, List[Dict[str, Any]]]
+
+
+# ══════════════════════════════════════════════════════════════
+# CONSTRUCCIÓN DE BLOQUES
+# ══════════════════════════════════════════════════════════════
+
+def construir_system_cacheable(estatico: str, dinamico: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Arma el parámetro system con el prefijo estático marcado como cacheable.
+
+    Args:
+        estatico: Parte que no cambia entre llamadas (reglas, esquema, ejemplos).
+        dinamico: Parte variable opcional; va después del breakpoint.
+
+    Returns:
+        Lista de bloques de texto para el parámetro 'system' de messages.create/stream.
+    """
+    bloques: List[Dict[str, Any]] = [
+        {"type": "text", "text": estatico, "cache_control": CACHE_CONTROL_EPHEMERAL}
+    ]
+    if dinamico:
+        bloques.append({"type": "text", "text": dinamico})
+    return bloques
+
+
+def construir_contenido_usuario(prefijo_estable: Optional[str], sufijo: str) -> ContenidoMensaje:
+    """
+    Arma el contenido del mensaje de usuario con breakpoint al final del prefijo.
+
+    El prefijo (fecha + historial conversacional) crece de forma append-only
+    entre turnos de una conversación, así que el siguiente turno reutiliza el
+    cache de system + historial. Sin prefijo se retorna el texto plano.
+
+    Args:
+        prefijo_estable: Fecha e historial; None o "" si no hay.
+        sufijo: Pregunta actual, datos e instrucciones finales.
+    """
+    if not prefijo_estable:
+        return sufijo
+    return [
+        {"type": "text", "text": prefijo_estable, "cache_control": CACHE_CONTROL_EPHEMERAL},
+        {"type": "text", "text": sufijo},
+    ]
+
+
+def texto_de_contenido(contenido: ContenidoMensaje) -> str:
+    """Concatena el texto de un contenido (str o bloques), útil para logs y tests."""
+    if isinstance(contenido, str):
+        return contenido
+    return "".join(bloque.get("text", "") for bloque in contenido)
+
+
+# ══════════════════════════════════════════════════════════════
+# REGISTRO DE USO
+# ══════════════════════════════════════════════════════════════
+
+_CAMPOS_USO = (
+    "input_tokens",
+    "output_tokens",
+    "cache_read_input_tokens",
+    "cache_creation_input_tokens",
+)
+
+_totales: Dict[str, int] = {campo: 0 for campo in _CAMPOS_USO}
+_totales["llamadas"] = 0
+_totales_lock = threading.Lock()
+
+
+def _entero(valor: Any) -> int:
+    """Convierte a int los contadores de usage (None o tipos inesperados -> 0)."""
+    return valor if isinstance(valor, int) and not isinstance(valor, bool) else 0
+
+
+def registrar_uso_cache(usage: Any, origen: str) -> Dict[str, int]:
+    """
+    Loguea y acumula el uso de tokens de una llamada a Claude.
+
+    Args:
+        usage: Objeto usage de la respuesta de Anthropic (o None).
+        origen: Etiqueta de la llamada (p.ej. "sql", "narrativa").
+
+    Returns:
+        Dict con los contadores de esta llamada.
+    """
+    uso = {campo: _entero(getattr(usage, campo, 0)) for campo in _CAMPOS_USO}
+
+    with _totales_lock:
+        for campo, valor in uso.items():
+            _totales[campo] += valor
+        _totales["llamadas"] += 1
+    registrar_tokens(uso)
+
+    logger.info(
+        f"Claude uso [{origen}]: input={uso['input_tokens']} output={uso['output_tokens']} "
+        f"cache_read={uso['cache_read_input_tokens']} cache_creation={uso['cache_creation_input_tokens']}"
+    )
+    return uso
+
+
+def estadisticas_uso_cache() -> Dict[str, Any]:
+    """Totales acumulados de tokens y proporción de input servida desde cache."""
+    with _totales_lock:
+        totales = dict(_totales)
+    input_total = (
+        totales["input_tokens"] + totales["cache_read_input_tokens"] + totales["cache_creation_input_tokens"]
+    )
+    totales["cache_hit_ratio"] = (
+        round(totales["cache_read_input_tokens"] / input_total, 4) if input_total else 0.0
+    )
+    return totales
+
+
+def reiniciar_estadisticas_uso() -> None:
+    """Reinicia los acumulados (tests / mantenimiento)."""
+    with _totales_lock:
+        for campo in _totales:
+            _totales[campo] = 0
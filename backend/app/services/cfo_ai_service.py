@@ -1,10 +1,11 @@
 """
 Servicio que conecta la generación de SQL con la ejecución real
 """
-import re
-from sqlalchemy import text
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.result_cache import ejecutar_acotado_con_cache
+from app.services.sql_ast import parsear_sql
 
 # Comandos SQL que NUNCA deben ejecutarse
 COMANDOS_PROHIBIDOS = [
@@ -12,41 +13,47 @@ COMANDOS_PROHIBIDOS = [
     'ALTER', 'GRANT', 'REVOKE', 'CREATE', 'COPY'
 ]
 
-def ejecutar_consulta_cfo(db: Session, sql_query: str) -> Dict[str, Any]:
+def ejecutar_consulta_cfo(
+    db: Session,
+    sql_query: str,
+    params: Optional[Dict[str, Any]] = None,
+    max_filas: Optional[int] = None,
+    al_lote: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+) -> Dict[str, Any]:
     """
     Ejecuta el SQL generado y retorna resultados.
     Incluye validación de seguridad para bloquear comandos peligrosos.
+    La ejecución es read-only, con statement_timeout y tope de filas
+    ("truncado" indica si se cortó). El resultado se sirve desde cache
+    mientras no cambien las versiones (data_versions) de las tablas
+    versionadas que lee el SQL (ver result_cache).
+    al_lote recibe las filas a medida que se leen del cursor (ver ejecucion_acotada).
     """
     # VALIDACIÓN DE SEGURIDAD
-    sql_upper = sql_query.upper()
+    consulta = parsear_sql(sql_query)
     
-    for cmd in COMANDOS_PROHIBIDOS:
-        # Busca el comando al inicio del SQL o después de un ; (nuevo statement)
-        pattern = rf'(^|;\s*){cmd}\b'
-        if re.search(pattern, sql_upper):
-            return {
-                "success": False,
-                "error": "Consulta no permitida por seguridad"
-            }
+    # Comando al inicio de cada statement o de un paréntesis (CTE que modifica datos)
+    if any(cmd in COMANDOS_PROHIBIDOS for cmd in consulta.comandos):
+        return {
+            "success": False,
+            "error": "Consulta no permitida por seguridad"
+        }
     
-    # Bloquear múltiples statements (previene SQL injection)
-    if sql_query.count(';') > 1:
+    # Bloquear múltiples statements (previene SQL injection); ';' en strings no cuenta
+    if len(consulta.sentencias) > 1:
         return {
             "success": False,
             "error": "Solo se permite una consulta a la vez"
         }
     
     try:
-        result = db.execute(text(sql_query))
-        
-        rows = []
-        for row in result:
-            rows.append(dict(row._mapping))
+        rows, truncado = ejecutar_acotado_con_cache(db, sql_query, params, max_filas=max_filas, al_lote=al_lote)
         
         return {
             "success": True,
             "data": rows,
-            "count": len(rows)
+            "count": len(rows),
+            "truncado": truncado
         }
     except Exception as e:
         return {
@@ -0,0 +1,208 @@
+"""
+Preguntas en lote del chat CFO - Sistema CFO Inteligente
+
+Los socios suelen pegar cinco o seis preguntas relacionadas de una vez (cierre
+de mes). En lugar de recorrer /ask-stream una por una, el lote:
+- comparte el contexto de la conversación y los metadatos temporales
+- genera el SQL de todas en una sola llamada a Claude (canónicas y cacheadas
+  no llegan al modelo, ver SQLRouter.generar_sql_lote)
+- ejecuta las consultas en paralelo, cada una con su propia sesión del pool
+  analítico read-only (acotado a CFO_LOTE_CONCURRENCIA)
+- devuelve un resultado estructurado por pregunta; los resultados chicos
+  llevan narrativa por plantilla, sin una segunda llamada al modelo
+
+Cada pregunta pasa por las mismas validaciones que el chat SSE (validador SQL,
+post-procesador, guardia de costo). Sin regeneración: una pregunta rechazada
+informa el error y el resto del lote sigue.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.core.constants import CFO_LOTE_CONCURRENCIA
+from app.core.logger import get_logger
+from app.services.cfo_ai_service import ejecutar_consulta_cfo
+from app.services.cfo_streaming_service import _METODOS_SIN_GUARDIA_COSTO
+from app.services.conversacion_service import ConversacionService
+from app.services.guardia_costo_sql import evaluar_costo_sql, registrar_plan
+from app.services.narrativa_plantillas import renderizar_narrativa_simple
+from app.services.planificador_etapas import ejecutar_con_sesion_analitica, ejecutar_con_sesion_propia
+from app.services.sql_post_processor import SQLPostProcessor
+from app.services.sql_router import generar_sql_lote, invalidar_sql_cacheado, obtener_metadatos_temporales
+from app.services.validador_sql import ValidadorSQL
+
+logger = get_logger(__name__)
+
+
+def _error(pregunta: str, mensaje: str, tipo: str, **extra: Any) -> Dict[str, Any]:
+    return {"pregunta": pregunta, "exito": False, "error": mensaje, "tipo_error": tipo, **extra}
+
+
+def _resolver_pregunta(
+    db: Session,
+    pregunta: str,
+    resultado_sql: Dict[str, Any],
+    contexto: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Valida, ejecuta y narra (si es simple) el SQL de una pregunta del lote.
+
+    db es una sesión read-only del pool analítico; el plan se registra aparte.
+    """
+    if not resultado_sql.get("exito"):
+        return _error(pregunta, resultado_sql.get("error") or "No pude procesar la consulta", "sql_generation")
+
+    metodo = resultado_sql.get("metodo", "claude")
+    sql_generado = resultado_sql["sql"]
+
+    validacion_pre = ValidadorSQL.validar_sql_antes_ejecutar(pregunta, sql_generado)
+    if not validacion_pre["valido"] and validacion_pre.get("bloqueante"):
+        invalidar_sql_cacheado(pregunta, contexto=contexto)
+        return _error(
+            pregunta, "; ".join(validacion_pre["problemas"]), "validation_blocking",
+            sql=sql_generado, metodo=metodo,
+        )
+
+    sql_final = SQLPostProcessor.procesar_sql(pregunta, sql_generado)["sql"]
+
+    if metodo not in _METODOS_SIN_GUARDIA_COSTO:
+        evaluacion = evaluar_costo_sql(db, sql_final)
+        ejecutar_con_sesion_propia(registrar_plan, pregunta, sql_final, evaluacion)
+        if not evaluacion["aprobado"]:
+            invalidar_sql_cacheado(pregunta, contexto=contexto)
+            return _error(pregunta, evaluacion["motivo"], "sql_cost", sql=sql_final, metodo=metodo)
+
+    resultado = ejecutar_consulta_cfo(db, sql_final)
+    if not resultado.get("success"):
+        invalidar_sql_cacheado(pregunta, contexto=contexto)
+        return _error(
+            pregunta, resultado.get("error", "Error al ejecutar consulta"), "sql_execution",
+            sql=sql_final, metodo=metodo,
+        )
+
+    datos = resultado.get("data", [])
+    truncado = bool(resultado.get("truncado"))
+    return {
+        "pregunta": pregunta,
+        "exito": True,
+        "sql": sql_final,
+        "metodo": metodo,
+        "filas": len(datos),
+        "datos": datos,
+        "truncado": truncado,
+        "narrativa": None if truncado else renderizar_narrativa_simple(pregunta, datos, sql=sql_final),
+        "error": None,
+        "tipo_error": None,
+    }
+
+
+def _preparar_conversacion(
+    db: Session,
+    *,
+    preguntas: List[str],
+    conversation_id: Optional[UUID],
+    usuario_id: UUID,
+) -> tuple[Optional[UUID], List[Dict[str, Any]]]:
+    """Carga el contexto de la conversación o crea una nueva para el lote."""
+    if conversation_id:
+        contexto = ConversacionService.obtener_contexto_compacto(db, conversation_id)
+        logger.info(f"Lote: continuando conversación {conversation_id} ({len(contexto)} mensajes)")
+        return conversation_id, contexto
+
+    titulo = ConversacionService.generar_titulo(preguntas[0])
+    conversacion = ConversacionService.crear_conversacion(db, usuario_id, titulo)
+    logger.info(f"Lote: nueva conversación {conversacion.id}")
+    return conversacion.id, []
+
+
+def _texto_resultado(indice: int, resultado: Dict[str, Any]) -> str:
+    encabezado = f"### {indice}. {resultado['pregunta']}"
+    if not resultado["exito"]:
+        return f"{encabezado}\n⚠️ {resultado['error']}"
+    cuerpo = resultado.get("narrativa") or f"{resultado['filas']} filas."
+    return f"{encabezado}\n{cuerpo}"
+
+
+def _persistir_lote(
+    db: Session,
+    conversacion_id: UUID,
+    resultados: List[Dict[str, Any]],
+) -> UUID:
+    """Guarda las preguntas y la respuesta combinada como un turno de la conversación."""
+    preguntas = "\n".join(f"{i}. {r['pregunta']}" for i, r in enumerate(resultados, start=1))
+    respuesta = "\n\n".join(_texto_resultado(i, r) for i, r in enumerate(resultados, start=1))
+    sqls = ";\n\n".join(r["sql"] for r in resultados if r.get("sql"))
+
+    ConversacionService.agregar_mensaje(db, conversacion_id, "user", preguntas)
+    mensaje = ConversacionService.agregar_mensaje(
+        db, conversacion_id, "assistant", respuesta, sql_generado=sqls or None
+    )
+    return mensaje.id
+
+
+async def responder_lote(
+    db: Session,
+    *,
+    preguntas: List[str],
+    conversation_id: Optional[UUID],
+    usuario_id: UUID,
+) -> Dict[str, Any]:
+    """
+    Responde varias preguntas con un contexto compartido.
+
+    Args:
+        db: Sesión del request (conversación, metadatos y generación).
+        preguntas: Preguntas en orden.
+        conversation_id: Conversación a continuar (None = crear una).
+        usuario_id: Usuario autenticado.
+
+    Returns:
+        Dict con conversation_id, mensaje_id, resultados (uno por pregunta) y tiempo_total.
+    """
+    inicio = time.time()
+    conversacion_id, contexto = await run_in_threadpool(
+        _preparar_conversacion,
+        db,
+        preguntas=preguntas,
+        conversation_id=conversation_id,
+        usuario_id=usuario_id,
+    )
+
+    metadatos = await run_in_threadpool(obtener_metadatos_temporales, db, " ".join(preguntas))
+    resultados_sql = await run_in_threadpool(
+        generar_sql_lote, preguntas, contexto=contexto, db=db, metadatos=metadatos
+    )
+
+    semaforo = asyncio.Semaphore(CFO_LOTE_CONCURRENCIA)
+
+    async def resolver(pregunta: str, resultado_sql: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaforo:
+            try:
+                return await run_in_threadpool(
+                    ejecutar_con_sesion_analitica, _resolver_pregunta, pregunta, resultado_sql, contexto
+                )
+            except Exception as exc:
+                logger.error(f"Lote: error resolviendo '{pregunta[:60]}' - {exc}", exc_info=True)
+                return _error(pregunta, "Error interno al procesar la consulta", "internal")
+
+    resultados = await asyncio.gather(
+        *(resolver(pregunta, resultado_sql) for pregunta, resultado_sql in zip(preguntas, resultados_sql))
+    )
+
+    mensaje_id = await run_in_threadpool(_persistir_lote, db, conversacion_id, resultados)
+    tiempo_total = time.time() - inicio
+    logger.info(
+        f"Lote: {sum(r['exito'] for r in resultados)}/{len(resultados)} preguntas resueltas "
+        f"en {tiempo_total:.2f}s"
+    )
+    return {
+        "conversation_id": conversacion_id,
+        "mensaje_id": mensaje_id,
+        "resultados": resultados,
+        "tiempo_total": tiempo_total,
+    }
@@ -1,25 +1,87 @@
-"""Lógica de negocio para el endpoint SSE de CFO AI."""
+"""
+Lógica de negocio para el endpoint SSE de CFO AI.
+
+El pipeline es un async generator: el streaming de Claude usa AsyncAnthropic y
+el trabajo bloqueante (SQL, persistencia, generación de SQL) corre en el
+threadpool, así un worker atiende muchos chats concurrentes.
+
+Las etapas independientes se solapan con PlanificadorEtapas: metadatos
+temporales en paralelo con la carga de la conversación, query de control
+canónica en paralelo con la narrativa y persistencia de mensajes (y del
+resumen de la conversación) en segundo plano: el evento done no la espera.
+
+Los datos que van al prompt narrativo se acotan a un presupuesto de tokens
+(presupuesto_narrativa): un resultado grande se reemplaza por el resumen
+pre-calculado más una muestra de filas, y el done informa la compresión.
+
+Las filas del resultado SQL se emiten como eventos data_chunk a medida que
+llegan del cursor del lado del servidor, antes de que termine la query: la
+tabla empieza a renderizarse con las primeras filas sin importar el tamaño
+total. El post-proceso y el resumen para la narrativa corren en el threadpool
+en paralelo con la emisión de las filas que falten (resultado desde cache).
+
+Si el resultado (y la pregunta) ya se narraron antes, la narrativa sale del
+cache (narrativa_cache) sin llamar a Claude.
+
+Antes de ejecutar SQL generado por Claude, la guardia de costo (EXPLAIN) lo
+rechaza si el planner lo estima demasiado caro y se regenera una vez.
+
+Si el cliente se desconecta, la cancelación se propaga: las queries en curso
+se cancelan en PostgreSQL (consultas_cancelables), los generadores anidados se
+cierran con aclosing (el stream de Anthropic se aborta al salir de su contexto)
+y las etapas pendientes se cancelan, salvo la persistencia posterior al done.
+"""
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import time
-from decimal import Decimal
-from typing import Any, Generator, Optional
-from uuid import UUID
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Optional
+from uuid import UUID, uuid4
 
-from anthropic import Anthropic
+import anyio
+from anthropic import AsyncAnthropic
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.core.cfo_narrative_prompt import (
     CFO_NARRATIVE_SYSTEM_PROMPT,
-    build_cfo_user_message,
+    build_cfo_user_content,
 )
 from app.core.config import settings
-from app.core.constants import CLAUDE_MAX_TOKENS, CLAUDE_MAX_TOKENS_INFORME, CLAUDE_MODEL
+from app.core.constants import (
+    CLAUDE_MAX_TOKENS,
+    CLAUDE_MAX_TOKENS_INFORME,
+    CLAUDE_MODEL,
+    STREAM_FILAS_POR_CHUNK,
+    STREAM_MAX_CARACTERES_TOKEN,
+    STREAM_VENTANA_TOKENS_SEGUNDOS,
+)
 from app.core.logger import get_logger
+from app.services.ai.prompt_cache import (
+    ContenidoMensaje,
+    construir_system_cacheable,
+    registrar_uso_cache,
+)
 from app.services.cfo_ai_service import ejecutar_consulta_cfo
+from app.services.consultas_cancelables import ejecutar_cancelable
 from app.services.conversacion_service import ConversacionService
+from app.services.ejemplos_sql import registrar_ejemplo
+from app.services.guardia_costo_sql import evaluar_costo_sql, registrar_plan
+from app.services.narrativa_cache import (
+    construir_clave_narrativa,
+    fragmentar_narrativa,
+    guardar_narrativa,
+    obtener_narrativa,
+)
+from app.services.narrativa_plantillas import renderizar_narrativa_simple
+from app.services.planificador_etapas import PlanificadorEtapas
+from app.services.presupuesto_narrativa import ajustar_datos_a_presupuesto
+from app.services.resumen_conversacion import actualizar_resumen
+from app.services.resumen_resultados import computar_resumen as _computar_resumen
 from app.services.informe_orquestador import (
     _formatear_comparativo_para_narrativa,
     _formatear_informe_para_narrativa,
@@ -29,54 +91,33 @@ from app.services.informe_orquestador import (
 )
 from app.services.sql_post_processor import SQLPostProcessor
 from app.services.sql_post_processor_narrativa import post_procesar_resultado_sql
-from app.services.sql_router import generar_sql_inteligente
-from app.services.validador_canonico import validar_respuesta_cfo
+from app.services.trazas_cfo import anotar_traza, etapa, finalizar_traza, iniciar_traza
+from app.services.sql_router import (
+    generar_sql_inteligente,
+    invalidar_sql_cacheado,
+    obtener_metadatos_temporales,
+)
+from app.services.validador_canonico import ValidadorCanonico, validar_respuesta_cfo
 from app.services.validador_sql import ValidadorSQL
 
 logger = get_logger(__name__)
 
-# Cliente de Anthropic para streaming
+# Cliente async de Anthropic para streaming
 api_key_limpia = settings.anthropic_api_key.strip()
 if "\n" in api_key_limpia or len(api_key_limpia) > 108:
     api_key_limpia = api_key_limpia.split("\n")[0].strip()[:108]
 
-client = Anthropic(api_key=api_key_limpia)
-
-# Columnas que indican agrupación (valores tipo string para subtotales)
-_COLUMNAS_AGRUPACION = {
-    "localidad",
-    "area",
-    "nombre_area",
-    "tipo_operacion",
-    "tipo",
-    "nombre_mes",
-    "socio",
-    "nombre",
-    "cliente",
-    "proveedor",
-    "moneda_original",
-    "trimestre",
-    "semestre",
-    "anio",
-}
-
-# Columnas de porcentaje que NO deben re-sumarse
-_COLUMNAS_PORCENTAJE = {"porcentaje", "rentabilidad", "rentabilidad_porcentaje", "participacion"}
-
-# Columnas numéricas que NO tiene sentido sumar (temporales/identificadores)
-_COLS_NO_SUMAR = {
-    "mes",
-    "mes_num",
-    "numero_mes",
-    "anio",
-    "año",
-    "anio_num",
-    "year",
-    "trimestre",
-    "semestre",
-    "numero",
-    "id",
-}
+async_client = AsyncAnthropic(api_key=api_key_limpia)
+
+# Un chunk que termina así cierra una palabra y habilita el envío del buffer
+_FIN_DE_PALABRA = (" ", "\n", ".", ",", "!", "?", ":", ";", ")", "]", "}")
+
+# Un SQL rechazado por costo se regenera una vez antes de responder con error
+_INTENTOS_GUARDIA_COSTO = 2
+_METODOS_SIN_GUARDIA_COSTO = ("canonica", "cache")
+
+# Un cambio en el system prompt narrativo invalida las narrativas cacheadas
+_HUELLA_PROMPT_NARRATIVO = hashlib.sha1(CFO_NARRATIVE_SYSTEM_PROMPT.encode("utf-8")).hexdigest()
 
 
 def sse_format(event: str, data: dict | str) -> str:
@@ -92,153 +133,80 @@ def sse_format(event: str, data: dict | str) -> str:
     return "\n".join(lines) + "\n"
 
 
-def _computar_resumen(datos: list[dict[str, Any]]) -> dict[str, Any]:
-    """Pre-computa totales, subtotales y extremos de resultados SQL."""
-    if not datos:
-        return {}
-
-    resumen: dict[str, Any] = {"total_filas": len(datos)}
-
-    primera_fila = datos[0]
-    cols_numericas = []
-    cols_agrupacion = []
-
-    for col, val in primera_fila.items():
-        col_lower = col.lower()
-        if (
-            col_lower in _COLUMNAS_PORCENTAJE
-            or col_lower in _COLS_NO_SUMAR
-            or col_lower.endswith("_id")
-        ):
-            continue
-        if isinstance(val, (int, float, Decimal)) and val is not None and not isinstance(val, bool):
-            cols_numericas.append(col)
-        elif isinstance(val, str) and col_lower in _COLUMNAS_AGRUPACION:
-            cols_agrupacion.append(col)
-
-    if not cols_numericas:
-        return resumen
-
-    sumas = {}
-    promedios = {}
-    for col in cols_numericas:
-        valores = [row.get(col) for row in datos if row.get(col) is not None]
-        if valores:
-            total = sum(float(v) for v in valores)
-            sumas[col] = round(total, 2)
-            promedios[col] = round(total / len(valores), 2)
-    resumen["sumas"] = sumas
-    resumen["promedios"] = promedios
-
-    if len(datos) > 1:
-        for col in cols_numericas:
-            valores_con_ref = []
-            for row in datos:
-                valor = row.get(col)
-                if valor is None:
-                    continue
-
-                referencia = None
-                for col_agrupacion in cols_agrupacion:
-                    if row.get(col_agrupacion):
-                        referencia = str(row[col_agrupacion])
-                        break
-                if not referencia:
-                    for key, raw_val in row.items():
-                        if key != col and isinstance(raw_val, str) and raw_val:
-                            referencia = raw_val
-                            break
-                valores_con_ref.append((float(valor), referencia))
-
-            if len(valores_con_ref) > 1:
-                max_val = max(valores_con_ref, key=lambda item: item[0])
-                min_val = min(valores_con_ref, key=lambda item: item[0])
-                if "maximo" not in resumen:
-                    resumen["maximo"] = {}
-                    resumen["minimo"] = {}
-                resumen["maximo"][col] = {"valor": round(max_val[0], 2), "fila": max_val[1]}
-                resumen["minimo"][col] = {"valor": round(min_val[0], 2), "fila": min_val[1]}
-
-    for col_agrupacion in cols_agrupacion:
-        valores_grupo = set(
-            str(row.get(col_agrupacion, "")) for row in datos if row.get(col_agrupacion) is not None
-        )
-        if 1 < len(valores_grupo) <= 20:
-            subtotales = {}
-            for grupo_val in sorted(valores_grupo):
-                filas_grupo = [row for row in datos if str(row.get(col_agrupacion, "")) == grupo_val]
-                subtotal = {}
-                for col in cols_numericas:
-                    vals = [float(row.get(col, 0) or 0) for row in filas_grupo]
-                    subtotal[col] = round(sum(vals), 2)
-                subtotales[grupo_val] = subtotal
-            resumen[f"subtotales_por_{col_agrupacion.lower()}"] = subtotales
-
-    monto_cols = ["total_pesificado", "ingresos_uyu", "total_uyu", "monto_uyu"]
-    cantidad_cols = ["operaciones", "cantidad", "cantidad_operaciones"]
-    monto_col = next((col for col in monto_cols if col in sumas), None)
-    cantidad_col = next((col for col in cantidad_cols if col in sumas), None)
-    if monto_col and cantidad_col:
-        cantidad_total = float(sumas.get(cantidad_col, 0) or 0)
-        if cantidad_total > 0:
-            resumen["ticket_promedio"] = {
-                "valor": round(float(sumas[monto_col]) / cantidad_total, 2),
-                "monto_col": monto_col,
-                "cantidad_col": cantidad_col,
-            }
-
-    if len(datos) >= 5 and sumas:
-        col_principal = max(sumas.items(), key=lambda item: item[1])[0]
-        total_principal = float(sumas.get(col_principal, 0) or 0)
-        if total_principal > 0:
-            valores_ordenados = sorted(
-                [float(row.get(col_principal, 0) or 0) for row in datos],
-                reverse=True,
-            )
-            concentracion = {
-                "top_3_pct": round(sum(valores_ordenados[:3]) * 100.0 / total_principal, 2),
-                "top_5_pct": round(sum(valores_ordenados[:5]) * 100.0 / total_principal, 2),
-            }
-            if len(valores_ordenados) >= 10:
-                concentracion["top_10_pct"] = round(
-                    sum(valores_ordenados[:10]) * 100.0 / total_principal,
-                    2,
-                )
-            resumen["concentracion"] = concentracion
-
-    return resumen
-
-
-def _stream_claude_response(
+async def _stream_claude_response(
     *,
     system_prompt: str,
-    user_message: str,
+    user_message: ContenidoMensaje,
     max_tokens: int,
     respuesta_completa: list[str],
-) -> Generator[str, None, None]:
-    """Emite tokens SSE con la misma granularidad actual de streaming."""
+) -> AsyncGenerator[str, None]:
+    """
+    Emite tokens SSE agrupando chunks de Claude por ventana de tiempo.
+
+    El primer fin de palabra sale inmediatamente; después se acumula hasta que
+    pasa STREAM_VENTANA_TOKENS_SEGUNDOS o el buffer supera
+    STREAM_MAX_CARACTERES_TOKEN. Nunca se corta una palabra a la mitad.
+
+    El system prompt se envía como bloque cacheable y al terminar se registra
+    el uso de tokens (incluido cache read/creation).
+    """
     word_buffer = ""
+    ultimo_envio = float("-inf")
 
-    with client.messages.stream(
+    async with async_client.messages.stream(
         model=CLAUDE_MODEL,
         max_tokens=max_tokens,
         temperature=0.1,
-        system=system_prompt,
+        system=construir_system_cacheable(system_prompt),
         messages=[{"role": "user", "content": user_message}],
     ) as stream:
-        for text_chunk in stream.text_stream:
+        async for text_chunk in stream.text_stream:
             respuesta_completa.append(text_chunk)
             word_buffer += text_chunk
 
-            if text_chunk.endswith((" ", "\n", ".", ",", "!", "?", ":", ";", ")", "]", "}")):
-                if word_buffer.strip():
-                    yield sse_format("token", word_buffer)
-                    word_buffer = ""
-                    time.sleep(0.15)
+            if not text_chunk.endswith(_FIN_DE_PALABRA) or not word_buffer.strip():
+                continue
+
+            ahora = time.monotonic()
+            if (
+                ahora - ultimo_envio >= STREAM_VENTANA_TOKENS_SEGUNDOS
+                or len(word_buffer) >= STREAM_MAX_CARACTERES_TOKEN
+            ):
+                yield sse_format("token", word_buffer)
+                word_buffer = ""
+                ultimo_envio = ahora
 
         if word_buffer.strip():
             yield sse_format("token", word_buffer)
 
+        try:
+            mensaje_final = await stream.get_final_message()
+            registrar_uso_cache(getattr(mensaje_final, "usage", None), "narrativa")
+        except Exception as exc:
+            # La narrativa ya salió completa: un fallo acá no debe disparar el fallback
+            logger.warning(f"Stream: no se pudo registrar uso de tokens — {exc}")
+
+
+def _clave_narrativa(
+    pregunta: str,
+    datos: Any,
+    contexto: list[dict[str, Any]],
+    **opciones: Any,
+) -> str:
+    """Clave de narrativa_cache con el modelo y el system prompt de este stream."""
+    return construir_clave_narrativa(
+        pregunta,
+        datos,
+        contexto=contexto,
+        opciones={"modelo": CLAUDE_MODEL, "prompt": _HUELLA_PROMPT_NARRATIVO, **opciones},
+    )
+
+
+def _reproducir_narrativa(texto: str, respuesta_completa: list[str]) -> list[str]:
+    """Eventos token de una narrativa cacheada (se emiten sin esperas)."""
+    respuesta_completa[:] = [texto]
+    return [sse_format("token", fragmento) for fragmento in fragmentar_narrativa(texto)]
+
 
 def _guardar_respuesta_final(
     db: Session,
@@ -246,19 +214,86 @@ def _guardar_respuesta_final(
     conversacion_id: Optional[UUID],
     respuesta_final: str,
     sql_generado: Optional[str],
+    mensaje_id: Optional[UUID] = None,
 ) -> Any:
     """Persiste el mensaje del asistente si la conversación existe."""
     if not conversacion_id:
         return None
-    return ConversacionService.agregar_mensaje(
+    mensaje = ConversacionService.agregar_mensaje(
         db,
         conversacion_id,
         "assistant",
         respuesta_final,
         sql_generado=sql_generado,
+        mensaje_id=mensaje_id,
+    )
+    logger.info(f"Stream: Respuesta guardada en conversación {conversacion_id}, mensaje_id={mensaje.id}")
+    return mensaje
+
+
+def _guardar_pregunta(db: Session, conversacion_id: UUID, pregunta: str) -> Any:
+    """Persiste la pregunta del usuario."""
+    return ConversacionService.agregar_mensaje(db, conversacion_id, "user", pregunta)
+
+
+def _aviso_sql_costoso(sql: str, evaluacion: dict[str, Any]) -> str:
+    """Contexto para que Claude regenere un SQL rechazado por la guardia de costo."""
+    return (
+        "<sql_rechazado_por_costo>\n"
+        f"{evaluacion['motivo']}.\n"
+        "Este SQL es demasiado costoso para el planner de PostgreSQL:\n"
+        f"{sql}\n"
+        "Generá una alternativa equivalente que recorra operaciones una sola vez "
+        "(sin JOINs cartesianos ni subconsultas correlacionadas) o use operaciones_diarias.\n"
+        "</sql_rechazado_por_costo>"
     )
 
 
+def _lanzar_control_canonico(planificador: PlanificadorEtapas, pregunta: str) -> None:
+    """Si la pregunta es canónica, corre su query de control en paralelo a la narrativa."""
+    if ValidadorCanonico.identificar_query_canonica(pregunta):
+        planificador.lanzar(
+            "control_canonico", ValidadorCanonico.precalcular_control, pregunta, sesion_propia=True
+        )
+
+
+def _lanzar_persistencia_respuesta(
+    planificador: PlanificadorEtapas,
+    *,
+    conversacion_id: Optional[UUID],
+    respuesta_final: str,
+    sql_generado: Optional[str],
+) -> Optional[UUID]:
+    """
+    Programa el guardado del mensaje del asistente en segundo plano.
+
+    El UUID se genera acá para informarlo en el evento done sin esperar el INSERT.
+    Se encadena después del guardado de la pregunta para preservar el orden, y
+    detrás va la actualización del resumen de la conversación.
+    """
+    if not conversacion_id:
+        return None
+    mensaje_id = uuid4()
+    planificador.lanzar(
+        "mensaje_asistente",
+        _guardar_respuesta_final,
+        sesion_propia=True,
+        depende_de=["mensaje_usuario"],
+        conversacion_id=conversacion_id,
+        respuesta_final=respuesta_final,
+        sql_generado=sql_generado,
+        mensaje_id=mensaje_id,
+    )
+    planificador.lanzar(
+        "resumen_conversacion",
+        actualizar_resumen,
+        conversacion_id,
+        sesion_propia=True,
+        depende_de=["mensaje_asistente"],
+    )
+    return mensaje_id
+
+
 def _inicializar_conversacion(
     db: Session,
     *,
@@ -266,26 +301,17 @@ def _inicializar_conversacion(
     conversation_id: Optional[UUID],
     usuario_id: UUID,
 ) -> tuple[Optional[UUID], list[dict[str, Any]], list[str]]:
-    """Carga o crea una conversación y devuelve SSE iniciales."""
+    """Carga o crea una conversación y devuelve SSE iniciales (la pregunta se guarda aparte)."""
     eventos: list[str] = []
     contexto: list[dict[str, Any]] = []
     conversacion_id = conversation_id
 
     if conversation_id:
         logger.info(f"Stream: Continuando conversación {conversation_id}")
-        contexto = ConversacionService.obtener_contexto(db, conversation_id, limite=12)
+        # Tamaño acotado: resumen de turnos viejos + mensajes recientes
+        contexto = ConversacionService.obtener_contexto_compacto(db, conversation_id)
         logger.info(f"Stream: Contexto cargado - {len(contexto)} mensajes")
 
-        if len(contexto) >= 10:
-            eventos.append(
-                sse_format(
-                    "warning",
-                    {
-                        "message": "⚠️ Conversación larga detectada. Para mejor rendimiento, considera iniciar una nueva conversación.",
-                    },
-                )
-            )
-
         eventos.append(
             sse_format("status", {"message": f"Continuando conversación ({len(contexto)} mensajes previos)"})
         )
@@ -297,9 +323,6 @@ def _inicializar_conversacion(
         logger.info(f"Stream: Nueva conversación creada - {conversacion_id}")
         eventos.append(sse_format("conversation_id", {"id": str(conversacion_id)}))
 
-    if conversacion_id:
-        ConversacionService.agregar_mensaje(db, conversacion_id, "user", pregunta)
-
     return conversacion_id, contexto, eventos
 
 
@@ -310,16 +333,21 @@ def _generar_eventos_informe(
     contexto: list[dict[str, Any]],
     conversacion_id: Optional[UUID],
     respuesta_completa: list[str],
-) -> Optional[Generator[str, None, None]]:
+    planificador: PlanificadorEtapas,
+    db_analitica: Session,
+) -> Optional[AsyncGenerator[str, None]]:
     """Ejecuta el flujo multi-query de informes y emite SSE si aplica."""
-    if not es_pregunta_informe(pregunta):
+    with etapa("intencion"):
+        es_informe = es_pregunta_informe(pregunta)
+    if not es_informe:
         return None
 
-    def generator() -> Generator[str, None, None]:
+    async def generator() -> AsyncGenerator[str, None]:
         yield sse_format("status", {"message": "Preparando informe financiero completo..."})
         logger.info("Stream: Pregunta detectada como informe — activando orquestador multi-query")
 
-        resultado_informe = ejecutar_informe(db, pregunta)
+        with etapa("informe"):
+            resultado_informe = await ejecutar_cancelable(db_analitica, ejecutar_informe, pregunta)
         if resultado_informe is None:
             logger.info("Stream: Orquestador no pudo resolver — continuando flujo normal")
             return
@@ -330,6 +358,7 @@ def _generar_eventos_informe(
             texto_narrativa = _formatear_informe_para_narrativa(resultado_informe)
 
         sql_generado = "(informe multi-query: 4 consultas predefinidas)"
+        anotar_traza(metodo="informe_orquestador")
 
         yield sse_format("sql", {"query": sql_generado, "metodo": "informe_orquestador"})
         yield sse_format(
@@ -352,37 +381,57 @@ def _generar_eventos_informe(
         )
 
         resumen_informe = computar_resumen_informe(resultado_informe)
+        _lanzar_control_canonico(planificador, pregunta)
         yield sse_format("status", {"message": "Generando respuesta narrativa..."})
 
-        user_msg = build_cfo_user_message(
-            pregunta=pregunta,
-            financial_data=texto_narrativa,
-            conversation_history=contexto,
-            resumen_precalculado=resumen_informe,
+        clave_narrativa = _clave_narrativa(
+            pregunta, texto_narrativa, contexto, origen="informe", max_tokens=CLAUDE_MAX_TOKENS_INFORME
         )
-
-        try:
-            yield from _stream_claude_response(
-                system_prompt=CFO_NARRATIVE_SYSTEM_PROMPT,
-                user_message=user_msg,
-                max_tokens=CLAUDE_MAX_TOKENS_INFORME,
-                respuesta_completa=respuesta_completa,
+        narrativa_cacheada = obtener_narrativa(clave_narrativa)
+        if narrativa_cacheada is not None:
+            logger.info("Stream: narrativa de informe servida desde cache")
+            with etapa("narrativa_cache"):
+                eventos_cache = _reproducir_narrativa(narrativa_cacheada, respuesta_completa)
+            for evento in eventos_cache:
+                yield evento
+        else:
+            user_msg = build_cfo_user_content(
+                pregunta=pregunta,
+                financial_data=texto_narrativa,
+                conversation_history=contexto,
+                resumen_precalculado=resumen_informe,
             )
-        except Exception as exc:
-            logger.error(f"Stream: Error en streaming narrativo de informe — {exc}")
-            respuesta_fallback = f"Informe: {texto_narrativa[:500]}"
-            yield sse_format("token", respuesta_fallback)
-            respuesta_completa[:] = [respuesta_fallback]
+
+            with etapa("narrativa"):
+                try:
+                    async with aclosing(_stream_claude_response(
+                        system_prompt=CFO_NARRATIVE_SYSTEM_PROMPT,
+                        user_message=user_msg,
+                        max_tokens=CLAUDE_MAX_TOKENS_INFORME,
+                        respuesta_completa=respuesta_completa,
+                    )) as eventos:
+                        async for evento in eventos:
+                            yield evento
+                    guardar_narrativa(clave_narrativa, "".join(respuesta_completa))
+                except Exception as exc:
+                    logger.error(f"Stream: Error en streaming narrativo de informe — {exc}")
+                    respuesta_fallback = f"Informe: {texto_narrativa[:500]}"
+                    yield sse_format("token", respuesta_fallback)
+                    respuesta_completa[:] = [respuesta_fallback]
 
         respuesta_final = "".join(respuesta_completa)
-        validacion_canonica = validar_respuesta_cfo(db, pregunta, respuesta_final, [resultado_informe])
+        with etapa("validacion_canonica"):
+            valor_control = await planificador.resultado("control_canonico")
+            validacion_canonica = await run_in_threadpool(
+                validar_respuesta_cfo, db, pregunta, respuesta_final, [resultado_informe], valor_control
+            )
         if validacion_canonica.get("advertencia"):
             advertencia = validacion_canonica["advertencia"]
             yield sse_format("token", advertencia)
             respuesta_final += advertencia
 
-        mensaje_guardado = _guardar_respuesta_final(
-            db,
+        mensaje_id = _lanzar_persistencia_respuesta(
+            planificador,
             conversacion_id=conversacion_id,
             respuesta_final=respuesta_final,
             sql_generado=sql_generado,
@@ -392,112 +441,335 @@ def _generar_eventos_informe(
             "done",
             {
                 "conversation_id": str(conversacion_id) if conversacion_id else None,
-                "mensaje_id": str(mensaje_guardado.id) if mensaje_guardado else None,
+                "mensaje_id": str(mensaje_id) if mensaje_id else None,
                 "sql": sql_generado,
                 "metodo": "informe_orquestador",
                 "filas": 0,
+                "narrativa": "cache" if narrativa_cacheada is not None else "claude",
             },
         )
 
     return generator()
 
 
-def _generar_eventos_sql(
+async def _narrar_con_claude(
+    *,
+    pregunta: str,
+    contexto: list[dict[str, Any]],
+    datos: list[dict[str, Any]],
+    datos_texto_sql: str,
+    resumen: dict[str, Any],
+    respuesta_completa: list[str],
+    clave_cache: Optional[str] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Narrativa del resultado SQL con Claude (fallback: datos crudos).
+
+    datos_texto_sql ya viene acotado al presupuesto de tokens. Si la narrativa
+    termina completa se guarda en narrativa_cache bajo clave_cache.
+    """
+    user_msg = build_cfo_user_content(
+        pregunta=pregunta,
+        financial_data=datos_texto_sql,
+        conversation_history=contexto,
+        resumen_precalculado=resumen,
+    )
+
+    with etapa("narrativa"):
+        try:
+            async with aclosing(_stream_claude_response(
+                system_prompt=CFO_NARRATIVE_SYSTEM_PROMPT,
+                user_message=user_msg,
+                max_tokens=CLAUDE_MAX_TOKENS,
+                respuesta_completa=respuesta_completa,
+            )) as eventos:
+                async for evento in eventos:
+                    yield evento
+            if clave_cache:
+                guardar_narrativa(clave_cache, "".join(respuesta_completa))
+        except Exception as exc:
+            logger.error(f"Stream: Error en streaming Claude - {exc}")
+            datos_texto = json.dumps(datos, indent=2, ensure_ascii=False, default=str)
+            respuesta_fallback = f"Resultado: {datos_texto[:500]}"
+            yield sse_format("token", respuesta_fallback)
+            respuesta_completa[:] = [respuesta_fallback]
+
+
+def _eventos_filas(filas: list[dict[str, Any]], offset: int) -> list[str]:
+    """Eventos data_chunk de las filas; offset es la posición de la primera en el resultado."""
+    return [
+        sse_format("data_chunk", {"offset": offset + inicio, "rows": filas[inicio:inicio + STREAM_FILAS_POR_CHUNK]})
+        for inicio in range(0, len(filas), STREAM_FILAS_POR_CHUNK)
+    ]
+
+
+async def _ejecutar_emitiendo_filas(
+    db_analitica: Session,
+    sql_final: str,
+    salida: dict[str, Any],
+) -> AsyncGenerator[str, None]:
+    """
+    Ejecuta el SQL (cancelable) y emite data_chunk con cada lote que llega del
+    cursor, sin esperar el resultado completo.
+
+    Al terminar deja en salida["resultado"] lo que retornó ejecutar_consulta_cfo
+    y en salida["emitidas"] cuántas filas ya salieron (0 si vino de cache).
+    """
+    loop = asyncio.get_running_loop()
+    lotes: asyncio.Queue = asyncio.Queue()
+
+    def al_lote(filas: list[dict[str, Any]]) -> None:
+        # Corre en el hilo de la query; call_soon_threadsafe conserva el orden de los lotes
+        loop.call_soon_threadsafe(lotes.put_nowait, filas)
+
+    emitidas = 0
+    siguiente: Optional[asyncio.Future] = None
+    ejecucion = asyncio.ensure_future(
+        ejecutar_cancelable(db_analitica, ejecutar_consulta_cfo, sql_final, al_lote=al_lote)
+    )
+    try:
+        while True:
+            siguiente = asyncio.ensure_future(lotes.get())
+            await asyncio.wait({ejecucion, siguiente}, return_when=asyncio.FIRST_COMPLETED)
+            if not siguiente.done():
+                break
+            lote = siguiente.result()
+            for evento in _eventos_filas(lote, emitidas):
+                yield evento
+            emitidas += len(lote)
+        # Lotes que el hilo encoló justo antes de terminar
+        while not lotes.empty():
+            lote = lotes.get_nowait()
+            for evento in _eventos_filas(lote, emitidas):
+                yield evento
+            emitidas += len(lote)
+        salida["resultado"] = ejecucion.result()
+        salida["emitidas"] = emitidas
+    finally:
+        if siguiente is not None and not siguiente.done():
+            siguiente.cancel()
+        if not ejecucion.done():
+            # Cliente desconectado: ejecutar_cancelable cancela la query en PostgreSQL
+            ejecucion.cancel()
+            with anyio.CancelScope(shield=True):
+                await asyncio.gather(ejecucion, return_exceptions=True)
+
+
+def _post_procesar_resultado(pregunta: str, sql_final: str, datos: list[dict[str, Any]]) -> str:
+    """Texto pre-formateado para la narrativa y validación del resultado (corre en el threadpool)."""
+    datos_texto_sql = post_procesar_resultado_sql(datos, pregunta=pregunta)
+    if datos:
+        validacion_post = ValidadorSQL.validar_resultado(pregunta, sql_final, datos)
+        if not validacion_post["valido"]:
+            logger.warning(f"Stream: Resultado sospechoso - {validacion_post['razon']}")
+    return datos_texto_sql
+
+
+async def _generar_eventos_sql(
     db: Session,
     *,
     pregunta: str,
     contexto: list[dict[str, Any]],
     conversacion_id: Optional[UUID],
     respuesta_completa: list[str],
-) -> Generator[str, None, None]:
+    planificador: PlanificadorEtapas,
+    db_analitica: Session,
+) -> AsyncGenerator[str, None]:
     """Ejecuta el flujo SQL estándar y emite eventos SSE."""
     yield sse_format("status", {"message": "Analizando pregunta y generando SQL..."})
 
-    resultado_sql = generar_sql_inteligente(pregunta, contexto=contexto, db=db)
-    if not resultado_sql.get("exito"):
-        error_msg = resultado_sql.get("error", "No pude procesar tu consulta")
-        logger.error(f"Stream: Error SQL - {error_msg}")
-
-        mensaje_usuario = error_msg
-        if "temporalmente" in error_msg.lower() or "disponible" in error_msg.lower():
-            mensaje_usuario = "⏳ El servicio está ocupado. Por favor, espera unos segundos e intenta de nuevo."
-        elif "reformular" in error_msg.lower() or "entender" in error_msg.lower():
-            mensaje_usuario = (
-                "🤔 No entendí bien tu consulta. ¿Podrías escribirla de otra forma? "
-                "Por ejemplo: '¿Cuál fue la facturación de octubre?'"
+    metadatos = await planificador.resultado("metadatos")
+    contexto_generacion = contexto
+    for intento in range(1, _INTENTOS_GUARDIA_COSTO + 1):
+        with etapa("generacion_sql"):
+            resultado_sql = await run_in_threadpool(
+                generar_sql_inteligente, pregunta, contexto=contexto_generacion, db=db, metadatos=metadatos
             )
+        if not resultado_sql.get("exito"):
+            error_msg = resultado_sql.get("error", "No pude procesar tu consulta")
+            logger.error(f"Stream: Error SQL - {error_msg}")
+
+            mensaje_usuario = error_msg
+            if "temporalmente" in error_msg.lower() or "disponible" in error_msg.lower():
+                mensaje_usuario = "⏳ El servicio está ocupado. Por favor, espera unos segundos e intenta de nuevo."
+            elif "reformular" in error_msg.lower() or "entender" in error_msg.lower():
+                mensaje_usuario = (
+                    "🤔 No entendí bien tu consulta. ¿Podrías escribirla de otra forma? "
+                    "Por ejemplo: '¿Cuál fue la facturación de octubre?'"
+                )
 
-        yield sse_format("error", {"message": mensaje_usuario, "type": "sql_generation"})
-        return
+            yield sse_format("error", {"message": mensaje_usuario, "type": "sql_generation"})
+            return
+
+        sql_generado = resultado_sql["sql"]
+        metodo = resultado_sql.get("metodo", "claude")
+        # En el camino canónico el SQL es la propia query de control: exacto por construcción
+        es_canonica = metodo == "canonica"
+        anotar_traza(metodo=metodo)
+        logger.info(f"=== SQL GENERADO [{metodo}] ===\n{sql_generado}\n=== FIN SQL ===")
+        yield sse_format("sql", {"query": sql_generado, "metodo": metodo})
+
+        with etapa("validacion_sql"):
+            validacion_pre = ValidadorSQL.validar_sql_antes_ejecutar(pregunta, sql_generado)
+        if not validacion_pre["valido"]:
+            if validacion_pre.get("bloqueante"):
+                logger.warning(f"Stream: SQL bloqueado por validación - {validacion_pre['problemas']}")
+                invalidar_sql_cacheado(pregunta, contexto=contexto_generacion)
+                yield sse_format(
+                    "error",
+                    {
+                        "message": "No se puede ejecutar la consulta: problema de validación (enum en UNION ALL). Corregí la consulta o reformulá la pregunta.",
+                        "detalles": validacion_pre["problemas"],
+                        "type": "validation_blocking",
+                    },
+                )
+                return
+            logger.warning(f"Stream: SQL con advertencias - {validacion_pre['problemas']}")
+            yield sse_format(
+                "warning",
+                {"message": "SQL con posibles problemas", "detalles": validacion_pre["problemas"]},
+            )
 
-    sql_generado = resultado_sql["sql"]
-    logger.info(f"=== SQL GENERADO [{resultado_sql.get('metodo', 'claude')}] ===\n{sql_generado}\n=== FIN SQL ===")
-    yield sse_format("sql", {"query": sql_generado, "metodo": resultado_sql.get("metodo", "claude")})
+        with etapa("validacion_sql"):
+            sql_procesado_info = SQLPostProcessor.procesar_sql(pregunta, sql_generado)
+        sql_final = sql_procesado_info["sql"]
+
+        # SQL canónico y SQL cacheado ya pasaron la guardia (o son de control)
+        if metodo in _METODOS_SIN_GUARDIA_COSTO:
+            break
+        with etapa("guardia_costo"):
+            evaluacion = await ejecutar_cancelable(db_analitica, evaluar_costo_sql, sql_final)
+        planificador.lanzar(
+            f"plan_sql_{intento}", registrar_plan, pregunta, sql_final, evaluacion, sesion_propia=True
+        )
+        if evaluacion["aprobado"]:
+            break
 
-    validacion_pre = ValidadorSQL.validar_sql_antes_ejecutar(pregunta, sql_generado)
-    if not validacion_pre["valido"]:
-        if validacion_pre.get("bloqueante"):
-            logger.warning(f"Stream: SQL bloqueado por validación - {validacion_pre['problemas']}")
+        invalidar_sql_cacheado(pregunta, contexto=contexto_generacion)
+        if intento == _INTENTOS_GUARDIA_COSTO:
             yield sse_format(
                 "error",
                 {
-                    "message": "No se puede ejecutar la consulta: problema de validación (enum en UNION ALL). Corregí la consulta o reformulá la pregunta.",
-                    "detalles": validacion_pre["problemas"],
-                    "type": "validation_blocking",
+                    "message": "La consulta resultó demasiado costosa para ejecutarse. Probá acotar el período o el nivel de detalle.",
+                    "detalles": [evaluacion["motivo"]],
+                    "type": "sql_cost",
                 },
             )
             return
-        logger.warning(f"Stream: SQL con advertencias - {validacion_pre['problemas']}")
-        yield sse_format(
-            "warning",
-            {"message": "SQL con posibles problemas", "detalles": validacion_pre["problemas"]},
-        )
-
-    sql_procesado_info = SQLPostProcessor.procesar_sql(pregunta, sql_generado)
-    sql_final = sql_procesado_info["sql"]
+        yield sse_format("status", {"message": "La consulta generada es muy costosa, regenerando..."})
+        contexto_generacion = list(contexto) + [
+            {"role": "assistant", "content": _aviso_sql_costoso(sql_final, evaluacion)}
+        ]
 
     yield sse_format("status", {"message": "Ejecutando consulta en PostgreSQL..."})
-    resultado = ejecutar_consulta_cfo(db, sql_final)
+    ejecucion: dict[str, Any] = {}
+    with etapa("ejecucion_sql"):
+        async with aclosing(_ejecutar_emitiendo_filas(db_analitica, sql_final, ejecucion)) as eventos:
+            async for evento in eventos:
+                yield evento
+    resultado = ejecucion["resultado"]
     if not resultado.get("success"):
         error_msg = resultado.get("error", "Error al ejecutar consulta")
         logger.error(f"Stream: Error ejecución - {error_msg}")
+        invalidar_sql_cacheado(pregunta, contexto=contexto_generacion)
         yield sse_format("error", {"message": error_msg, "type": "sql_execution"})
         return
+    if metodo == "claude_direct" and not contexto:
+        # Pregunta autocontenida cuyo SQL corrió bien: ejemplo para próximas generaciones
+        registrar_ejemplo(pregunta, sql_final)
 
     datos = resultado.get("data", [])
-    yield sse_format("data", {"rows": len(datos), "preview": datos[:3] if datos else []})
+    anotar_traza(filas=len(datos))
+    truncado = bool(resultado.get("truncado"))
+    if truncado:
+        logger.warning(f"Stream: resultado truncado a {len(datos)} filas")
+
+    # El post-proceso muta las filas (etiquetas de mes, derivados): trabaja sobre
+    # copias para correr en paralelo con la serialización de los chunks pendientes
+    filas_narrativa = [dict(fila) for fila in datos]
+    planificador.lanzar("post_proceso_sql", _post_procesar_resultado, pregunta, sql_final, filas_narrativa)
+    if truncado or len(datos) > settings.cfo_narrativa_plantilla_max_filas:
+        # Sin narrativa por plantilla posible: el resumen se adelanta (se descarta si la narrativa sale de cache)
+        planificador.lanzar("resumen_sql", _computar_resumen, filas_narrativa, depende_de=["post_proceso_sql"])
+
+    emitidas = ejecucion["emitidas"]
+    for evento in _eventos_filas(datos[emitidas:], emitidas):
+        yield evento
+    yield sse_format(
+        "data",
+        {"rows": len(datos), "preview": datos[:3] if datos else [], "truncado": truncado},
+    )
 
-    datos_texto_sql = post_procesar_resultado_sql(datos, pregunta=pregunta)
-    if datos:
-        validacion_post = ValidadorSQL.validar_resultado(pregunta, sql_final, datos)
-        if not validacion_post["valido"]:
-            logger.warning(f"Stream: Resultado sospechoso - {validacion_post['razon']}")
+    with etapa("post_proceso"):
+        datos_texto_sql = await planificador.resultado("post_proceso_sql")
+    datos = filas_narrativa
 
+    if not es_canonica:
+        _lanzar_control_canonico(planificador, pregunta)
     yield sse_format("status", {"message": "Generando respuesta narrativa..."})
-    resumen = _computar_resumen(datos)
-    user_msg = build_cfo_user_message(
-        pregunta=pregunta,
-        financial_data=datos_texto_sql,
-        conversation_history=contexto,
-        resumen_precalculado=resumen,
-    )
-
-    try:
-        yield from _stream_claude_response(
-            system_prompt=CFO_NARRATIVE_SYSTEM_PROMPT,
-            user_message=user_msg,
+    # Resultados chicos (un número, pocas filas) se narran con plantillas, sin Claude
+    narrativa_plantilla = None
+    if not truncado:
+        with etapa("narrativa_plantilla"):
+            narrativa_plantilla = renderizar_narrativa_simple(pregunta, datos, sql=sql_final)
+
+    # Mismo resultado ya narrado por Claude: se reproduce sin volver a llamarlo
+    clave_narrativa = None
+    narrativa_cacheada = None
+    if narrativa_plantilla is None:
+        clave_narrativa = _clave_narrativa(
+            pregunta,
+            datos,
+            contexto,
+            origen="sql",
             max_tokens=CLAUDE_MAX_TOKENS,
-            respuesta_completa=respuesta_completa,
+            truncado=truncado,
+            presupuesto=settings.cfo_narrativa_presupuesto_tokens,
         )
-    except Exception as exc:
-        logger.error(f"Stream: Error en streaming Claude - {exc}")
-        datos_texto = json.dumps(datos, indent=2, ensure_ascii=False, default=str)
-        respuesta_fallback = f"Resultado: {datos_texto[:500]}"
-        yield sse_format("token", respuesta_fallback)
-        respuesta_completa[:] = [respuesta_fallback]
+        narrativa_cacheada = obtener_narrativa(clave_narrativa)
+
+    origen_narrativa = "claude"
+    compresion_datos = None
+    if narrativa_plantilla is not None:
+        origen_narrativa = "plantilla"
+        logger.info(f"Stream: narrativa por plantilla ({len(datos)} filas)")
+        for linea in narrativa_plantilla.splitlines(keepends=True):
+            respuesta_completa.append(linea)
+            yield sse_format("token", linea)
+    elif narrativa_cacheada is not None:
+        origen_narrativa = "cache"
+        logger.info(f"Stream: narrativa servida desde cache ({len(datos)} filas)")
+        with etapa("narrativa_cache"):
+            eventos_cache = _reproducir_narrativa(narrativa_cacheada, respuesta_completa)
+        for evento in eventos_cache:
+            yield evento
+    else:
+        with etapa("resumen"):
+            if planificador.lanzada("resumen_sql"):
+                resumen = await planificador.resultado("resumen_sql")
+            else:
+                resumen = _computar_resumen(datos)
+            datos_prompt, compresion_datos = ajustar_datos_a_presupuesto(datos, datos_texto_sql, resumen)
+        async with aclosing(_narrar_con_claude(
+            pregunta=pregunta,
+            contexto=contexto,
+            datos=datos,
+            datos_texto_sql=datos_prompt,
+            resumen=resumen,
+            respuesta_completa=respuesta_completa,
+            clave_cache=clave_narrativa,
+        )) as eventos:
+            async for evento in eventos:
+                yield evento
 
     respuesta_final = "".join(respuesta_completa)
-    validacion_canonica = validar_respuesta_cfo(db, pregunta, respuesta_final, datos)
+    validacion_canonica: dict[str, Any] = {}
+    if not es_canonica:
+        with etapa("validacion_canonica"):
+            valor_control = await planificador.resultado("control_canonico")
+            validacion_canonica = await run_in_threadpool(
+                validar_respuesta_cfo, db, pregunta, respuesta_final, datos, valor_control
+            )
 
     if validacion_canonica.get("advertencia"):
         advertencia = validacion_canonica["advertencia"]
@@ -509,48 +781,57 @@ def _generar_eventos_sql(
     elif validacion_canonica.get("validado"):
         logger.info(f"Stream: Validación canónica OK - {validacion_canonica['query_canonica']}")
 
-    mensaje_guardado = _guardar_respuesta_final(
-        db,
+    mensaje_id = _lanzar_persistencia_respuesta(
+        planificador,
         conversacion_id=conversacion_id,
         respuesta_final=respuesta_final,
         sql_generado=sql_final,
     )
-    if conversacion_id and mensaje_guardado:
-        logger.info(
-            f"Stream: Respuesta guardada en conversación {conversacion_id}, mensaje_id={mensaje_guardado.id}"
-        )
 
     yield sse_format(
         "done",
         {
             "conversation_id": str(conversacion_id) if conversacion_id else None,
-            "mensaje_id": str(mensaje_guardado.id) if mensaje_guardado else None,
+            "mensaje_id": str(mensaje_id) if mensaje_id else None,
             "sql": sql_final,
-            "metodo": resultado_sql.get("metodo", "claude"),
+            "metodo": metodo,
             "filas": len(datos),
+            "narrativa": origen_narrativa,
+            "compresion_datos": compresion_datos,
         },
     )
 
 
-def generar_eventos_cfo_stream(
+async def _generar_eventos_turno(
     db: Session,
     *,
     pregunta: str,
     conversation_id: Optional[UUID],
     usuario_id: UUID,
-) -> Generator[str, None, None]:
-    """Genera la secuencia SSE completa del chat CFO sin acoplarla al router HTTP."""
+    planificador: PlanificadorEtapas,
+    db_analitica: Session,
+) -> AsyncGenerator[str, None]:
+    """Secuencia SSE de un turno: conversación, informe o flujo SQL, narrativa."""
     conversacion_id: Optional[UUID] = None
     contexto: list[dict[str, Any]] = []
     respuesta_completa: list[str] = []
 
     try:
-        conversacion_id, contexto, eventos_iniciales = _inicializar_conversacion(
-            db,
-            pregunta=pregunta,
-            conversation_id=conversation_id,
-            usuario_id=usuario_id,
-        )
+        # Los metadatos temporales no dependen de la conversación: arrancan ya
+        planificador.lanzar("metadatos", obtener_metadatos_temporales, pregunta, sesion_propia=True)
+
+        with etapa("conversacion"):
+            conversacion_id, contexto, eventos_iniciales = await run_in_threadpool(
+                _inicializar_conversacion,
+                db,
+                pregunta=pregunta,
+                conversation_id=conversation_id,
+                usuario_id=usuario_id,
+            )
+        if conversacion_id:
+            planificador.lanzar(
+                "mensaje_usuario", _guardar_pregunta, conversacion_id, pregunta, sesion_propia=True
+            )
         for evento in eventos_iniciales:
             yield evento
 
@@ -560,20 +841,27 @@ def generar_eventos_cfo_stream(
             contexto=contexto,
             conversacion_id=conversacion_id,
             respuesta_completa=respuesta_completa,
+            planificador=planificador,
+            db_analitica=db_analitica,
         )
         if flujo_informe is not None:
-            for evento in flujo_informe:
-                yield evento
-            if respuesta_completa:
-                return
-
-        yield from _generar_eventos_sql(
-            db,
-            pregunta=pregunta,
-            contexto=contexto,
-            conversacion_id=conversacion_id,
-            respuesta_completa=respuesta_completa,
-        )
+            async with aclosing(flujo_informe) as eventos:
+                async for evento in eventos:
+                    yield evento
+
+        # Si el orquestador de informes no resolvió, sigue el flujo SQL estándar
+        if not respuesta_completa:
+            async with aclosing(_generar_eventos_sql(
+                db,
+                pregunta=pregunta,
+                contexto=contexto,
+                conversacion_id=conversacion_id,
+                respuesta_completa=respuesta_completa,
+                planificador=planificador,
+                db_analitica=db_analitica,
+            )) as eventos:
+                async for evento in eventos:
+                    yield evento
 
     except Exception as exc:
         logger.error(f"Stream: Error general - {exc}", exc_info=True)
@@ -585,3 +873,64 @@ def generar_eventos_cfo_stream(
                 "detail": str(exc)[:100],
             },
         )
+
+
+async def generar_eventos_cfo_stream(
+    db: Session,
+    *,
+    pregunta: str,
+    conversation_id: Optional[UUID],
+    usuario_id: UUID,
+    db_analitica: Optional[Session] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Genera la secuencia SSE completa del chat CFO sin acoplarla al router HTTP.
+
+    db_analitica (pool read-only, ver get_analytics_db) ejecuta el SQL generado,
+    su EXPLAIN y los informes; sin ella se usa db.
+
+    Cada turno se traza (ver trazas_cfo): la traza se crea antes de lanzar
+    etapas para que las tareas del planificador la hereden, y se cierra al
+    final —también si el cliente se desconecta— con los tiempos del planificador.
+
+    El llamador debe cerrar el generador (aclose) si deja de consumirlo: así
+    la desconexión del cliente cancela las etapas pendientes y el stream de Claude.
+    """
+    traza = iniciar_traza()
+    planificador = PlanificadorEtapas()
+    completo = False
+    done_emitido = False
+
+    try:
+        async with aclosing(_generar_eventos_turno(
+            db,
+            pregunta=pregunta,
+            conversation_id=conversation_id,
+            usuario_id=usuario_id,
+            planificador=planificador,
+            db_analitica=db_analitica or db,
+        )) as eventos:
+            async for evento in eventos:
+                if evento.startswith("event: token"):
+                    traza.marcar("primer_token")
+                elif evento.startswith("event: data_chunk"):
+                    traza.marcar("primeras_filas")
+                elif evento.startswith("event: error"):
+                    traza.resultado = "error"
+                elif evento.startswith("event: done"):
+                    done_emitido = True
+                yield evento
+
+        # El done ya salió: la persistencia en segundo plano se espera recién acá
+        await planificador.esperar_pendientes()
+        completo = True
+    finally:
+        if not completo:
+            traza.resultado = "cancelado"
+            # Cliente desconectado a mitad del turno: nada de lo pendiente le sirve.
+            # Después del done solo queda persistencia, que se deja terminar.
+            if not done_emitido:
+                canceladas = planificador.cancelar_pendientes()
+                if canceladas:
+                    logger.info(f"Stream: cliente desconectado, etapas canceladas: {', '.join(canceladas)}")
+        finalizar_traza(traza, planificador.tiempos)
@@ -3,15 +3,22 @@ Generador de SQL con Claude — System/User split para prompt caching
 Usa AIOrchestrator con system_prompt separado para mayor adherencia a reglas.
 """
 
+import re
 from datetime import date
 
+from app.core.config import settings
 from app.core.logger import get_logger
 from app.core.constants import CLAUDE_MAX_TOKENS, CLAUDE_TEMPERATURE
 from app.services.ai.ai_orchestrator import AIOrchestrator
+from app.services.ai.prompt_cache import ContenidoMensaje, construir_contenido_usuario
+from app.services.ejemplos_sql import formatear_ejemplos, seleccionar_ejemplos
 from app.services.sql_generator_prompts import build_sql_system_prompt
 
 logger = get_logger(__name__)
 
+# Separador de cada SQL en la respuesta de un lote: "-- PREGUNTA 3"
+_RE_SEPARADOR_LOTE = re.compile(r"^\s*--\s*PREGUNTA\s+(\d+)\s*$", re.IGNORECASE | re.MULTILINE)
+
 
 class ClaudeSQLGenerator:
     """Generador de SQL con system/user split: reglas como system, pregunta como user."""
@@ -19,7 +26,10 @@ class ClaudeSQLGenerator:
     def __init__(self) -> None:
         """Inicializa el orquestador y el prompt de sistema persistente."""
         self._orchestrator = AIOrchestrator()
-        self._system_prompt = build_sql_system_prompt()
+        # Con ejemplos dinámicos el system prompt es el núcleo (reglas + esquema) y
+        # los k ejemplos más parecidos a la pregunta van en el user message
+        self._ejemplos_k = settings.cfo_sql_ejemplos_k
+        self._system_prompt = build_sql_system_prompt(ejemplos_dinamicos=self._ejemplos_k > 0)
         logger.info("ClaudeSQLGenerator inicializado con AIOrchestrator (system/user split)")
 
     def generar_sql(
@@ -31,7 +41,8 @@ class ClaudeSQLGenerator:
         Genera SQL usando Claude con system/user split.
 
         El modelo mental (esquema, reglas, mapa de navegacion) va como system message
-        (mayor adherencia, cacheable). La pregunta y contexto van como user message.
+        cacheable. En el user message, fecha + contexto forman un prefijo cacheable
+        y la pregunta va al final.
 
         Args:
             pregunta: Pregunta del usuario en lenguaje natural
@@ -42,16 +53,18 @@ class ClaudeSQLGenerator:
         """
         contexto = contexto or []
 
-        # Construir user prompt (solo la parte dinamica)
-        user_prompt = self._build_user_prompt(pregunta, contexto)
+        # Construir user content (prefijo estable cacheable + pregunta)
+        user_content = self._build_user_content(pregunta, contexto)
 
         try:
             # System/user split: reglas como system, pregunta como user
             sql_generado = self._orchestrator.complete(
-                prompt=user_prompt,
+                prompt=user_content,
                 system_prompt=self._system_prompt,
                 max_tokens=CLAUDE_MAX_TOKENS,
-                temperature=CLAUDE_TEMPERATURE
+                temperature=CLAUDE_TEMPERATURE,
+                cache_system=True,
+                origen="sql"
             )
 
             if not sql_generado:
@@ -67,20 +80,108 @@ class ClaudeSQLGenerator:
             logger.error(f"Error en SQL Generator: {e}", exc_info=True)
             return f"ERROR: {str(e)}"
 
-    def _build_user_prompt(self, pregunta: str, contexto: list[dict[str, str]]) -> str:
-        """Construye el user message: solo fecha, contexto conversacional y pregunta."""
+    def generar_sql_lote(
+        self,
+        preguntas: list[str],
+        contexto: list[dict[str, str]] | None = None
+    ) -> list[str | None]:
+        """
+        Genera el SQL de varias preguntas en una sola llamada a Claude.
+
+        Comparte el mismo system prompt cacheable y el mismo prefijo de contexto
+        que generar_sql; la respuesta trae un bloque "-- PREGUNTA n" por pregunta.
+
+        Args:
+            preguntas: Preguntas en lenguaje natural (en orden)
+            contexto: Lista de mensajes previos compartida por todas
+
+        Returns:
+            Lista alineada con preguntas: SQL crudo de cada una o None si no vino.
+            Si la llamada falla, todas son None (el router cae a generación individual).
+        """
+        contexto = contexto or []
+        prefijo, _ = self._partes_user_prompt("", contexto)
+        listado = "\n".join(f"{i}. {pregunta}" for i, pregunta in enumerate(preguntas, start=1))
+        sufijo = "\n".join([
+            self._bloque_ejemplos(preguntas),
+            f"\n\nPREGUNTAS:\n{listado}",
+            "\nGenera un SQL query en PostgreSQL por pregunta, sin explicaciones ni markdown.",
+            "Antes de cada query escribi una linea '-- PREGUNTA n' con su numero.",
+        ])
+        user_content = construir_contenido_usuario(prefijo, sufijo) if contexto else prefijo + sufijo
+
+        try:
+            respuesta = self._orchestrator.complete(
+                prompt=user_content,
+                system_prompt=self._system_prompt,
+                max_tokens=CLAUDE_MAX_TOKENS,
+                temperature=CLAUDE_TEMPERATURE,
+                cache_system=True,
+                origen="sql_lote"
+            )
+        except Exception as e:
+            logger.error(f"Error en SQL Generator (lote): {e}", exc_info=True)
+            return [None] * len(preguntas)
+
+        if not respuesta:
+            logger.error("AIOrchestrator retorno None para el lote")
+            return [None] * len(preguntas)
+
+        sqls: list[str | None] = [None] * len(preguntas)
+        partes = _RE_SEPARADOR_LOTE.split(respuesta)
+        # split con grupo: [previo, n1, sql1, n2, sql2, ...]
+        for numero, bloque in zip(partes[1::2], partes[2::2]):
+            indice = int(numero) - 1
+            if 0 <= indice < len(preguntas) and bloque.strip():
+                sqls[indice] = self._limpiar_sql(bloque)
+        logger.info(f"SQL de lote generado: {sum(s is not None for s in sqls)}/{len(preguntas)} preguntas")
+        return sqls
+
+    def _partes_user_prompt(self, pregunta: str, contexto: list[dict[str, str]]) -> tuple[str, str]:
+        """Divide el user message en prefijo estable (fecha + contexto) y sufijo (pregunta)."""
         partes = [f"Fecha actual: {date.today().isoformat()}"]
 
         if contexto:
             partes.append("\nCONTEXTO DE CONVERSACION PREVIA:")
             for msg in contexto:
+                if msg["role"] == "resumen":
+                    # Ya viene acotado (ver resumen_conversacion): va completo
+                    partes.append(msg["content"])
+                    continue
                 role = "Usuario" if msg["role"] == "user" else "Asistente"
                 content = msg['content'][:500] if len(msg['content']) > 500 else msg['content']
                 partes.append(f"{role}: {content}")
 
-        partes.append(f"\nPREGUNTA: {pregunta}")
-        partes.append("\nGenera SOLO el SQL query en PostgreSQL, sin explicaciones ni markdown.")
-        return "\n".join(partes)
+        prefijo = "\n".join(partes)
+        sufijo = "\n".join([
+            f"\n\nPREGUNTA: {pregunta}",
+            "\nGenera SOLO el SQL query en PostgreSQL, sin explicaciones ni markdown.",
+        ])
+        return prefijo, sufijo
+
+    def _bloque_ejemplos(self, preguntas: list[str]) -> str:
+        """Ejemplos relevantes a las preguntas ("" si los ejemplos van fijos en el system prompt)."""
+        if self._ejemplos_k <= 0:
+            return ""
+        ejemplos = seleccionar_ejemplos(preguntas, self._ejemplos_k)
+        return f"\n\n{formatear_ejemplos(ejemplos)}" if ejemplos else ""
+
+    def _build_user_prompt(self, pregunta: str, contexto: list[dict[str, str]]) -> str:
+        """Construye el user message: fecha, contexto conversacional, ejemplos y pregunta."""
+        prefijo, sufijo = self._partes_user_prompt(pregunta, contexto)
+        return prefijo + self._bloque_ejemplos([pregunta]) + sufijo
+
+    def _build_user_content(self, pregunta: str, contexto: list[dict[str, str]]) -> ContenidoMensaje:
+        """
+        User message cache-aware: con contexto, fecha + historial van en un bloque
+        con cache_control (crece append-only entre turnos); sin contexto, texto plano.
+        """
+        prefijo, sufijo = self._partes_user_prompt(pregunta, contexto)
+        # Los ejemplos dependen de la pregunta: van después del prefijo cacheable
+        sufijo = self._bloque_ejemplos([pregunta]) + sufijo
+        if not contexto:
+            return prefijo + sufijo
+        return construir_contenido_usuario(prefijo, sufijo)
 
     def _limpiar_sql(self, sql: str) -> str:
         """Limpia SQL de markdown y espacios."""
@@ -0,0 +1,99 @@
+"""
+Consultas cancelables del chat CFO - Sistema CFO Inteligente
+
+Si el cliente cierra la pestaña, Starlette cancela el generador SSE. Un await
+sobre el threadpool no interrumpe el hilo: la query seguiría corriendo en
+PostgreSQL y reteniendo una conexión del pool hasta terminar.
+
+ejecutar_cancelable() corre func(db, ...) en el threadpool registrando el PID
+del backend de la sesión. Si el turno se cancela mientras la query corre:
+1. envía pg_cancel_backend(pid) desde una conexión aparte del mismo engine
+   que la sesión (el PID de una réplica analítica no existe en el primario)
+2. espera (blindado contra la cancelación) a que el hilo suelte la sesión,
+   así get_db no la cierra mientras todavía está en uso
+3. re-lanza la cancelación
+
+Si la cancelación llega antes de que el hilo empiece la query, la query no
+se ejecuta.
+"""
+
+import asyncio
+import threading
+from typing import Any, Callable, Optional
+
+import anyio
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ConsultaCancelada(Exception):
+    """La consulta no llegó a ejecutarse porque el turno ya estaba cancelado."""
+
+
+def obtener_pid_backend(db: Session) -> Optional[int]:
+    """PID del backend de PostgreSQL que atiende la transacción de la sesión."""
+    try:
+        return db.execute(text("SELECT pg_backend_pid()")).scalar()
+    except Exception as exc:
+        logger.warning(f"No se pudo obtener el PID del backend: {exc}")
+        return None
+
+
+def obtener_engine(db: Session) -> Engine:
+    """Engine de la sesión (la sesión puede estar ligada a una Connection)."""
+    bind = db.get_bind()
+    return getattr(bind, "engine", bind)
+
+
+def cancelar_backend(pid: int, engine: Engine) -> bool:
+    """Cancela el statement en curso del backend (no cierra su conexión).
+
+    engine debe ser el de la sesión que obtuvo el PID: los PIDs son por servidor.
+    """
+    try:
+        with engine.connect() as conexion:
+            cancelado = bool(conexion.execute(text("SELECT pg_cancel_backend(:pid)"), {"pid": pid}).scalar())
+        logger.info(f"pg_cancel_backend({pid}) → {cancelado}")
+        return cancelado
+    except Exception as exc:
+        logger.warning(f"pg_cancel_backend({pid}) falló: {exc}")
+        return False
+
+
+async def ejecutar_cancelable(db: Session, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Ejecuta func(db, *args, **kwargs) en el threadpool; si el await se cancela,
+    cancela también la query en PostgreSQL.
+    """
+    estado: dict[str, Any] = {"pid": None, "cancelado": False}
+    candado = threading.Lock()
+    engine = obtener_engine(db)
+
+    def correr() -> Any:
+        pid = obtener_pid_backend(db)
+        with candado:
+            if estado["cancelado"]:
+                raise ConsultaCancelada()
+            estado["pid"] = pid
+        return func(db, *args, **kwargs)
+
+    hilo = asyncio.ensure_future(run_in_threadpool(correr))
+    try:
+        return await asyncio.shield(hilo)
+    except asyncio.CancelledError:
+        with candado:
+            estado["cancelado"] = True
+            pid = estado["pid"]
+        with anyio.CancelScope(shield=True):
+            if pid is not None:
+                await run_in_threadpool(cancelar_backend, pid, engine)
+            # La query cancelada devuelve error enseguida; se espera para liberar la sesión
+            await asyncio.gather(hilo, return_exceptions=True)
+        logger.info(f"Consulta cancelada por desconexión del cliente ({getattr(func, '__name__', func)})")
+        raise
@@ -2,12 +2,14 @@
 
 from datetime import datetime, timezone
 from typing import List, Optional
-from uuid import UUID
+from uuid import UUID, uuid4
 
 from sqlalchemy import desc
 from sqlalchemy.orm import Session
 
+from app.core.constants import CONTEXTO_MENSAJES_RECIENTES, RESUMEN_MIN_MENSAJES_NUEVOS
 from app.models.conversacion import Conversacion, Mensaje
+from app.services.resumen_conversacion import texto_contexto_resumen
 
 
 class ConversacionService:
@@ -52,11 +54,18 @@ class ConversacionService:
         conversacion_id: UUID, 
         rol: str, 
         contenido: str,
-        sql_generado: Optional[str] = None
+        sql_generado: Optional[str] = None,
+        mensaje_id: Optional[UUID] = None
     ) -> Mensaje:
-        """Agrega un mensaje a la conversación"""
+        """
+        Agrega un mensaje a la conversación.
+
+        mensaje_id permite pre-generar el UUID (p.ej. para informarlo al cliente
+        antes de que la persistencia en segundo plano termine).
+        """
         try:
             mensaje = Mensaje(
+                id=mensaje_id or uuid4(),
                 conversacion_id=conversacion_id,
                 rol=rol,
                 contenido=contenido,
@@ -98,6 +107,41 @@ class ConversacionService:
             for msg in mensajes
         ]
     
+    @staticmethod
+    def obtener_contexto_compacto(db: Session, conversacion_id: UUID) -> List[dict]:
+        """
+        Contexto de tamaño acotado para los prompts del chat CFO.
+
+        Un primer mensaje {"role": "resumen"} con el resumen de los turnos viejos
+        y el estado de la última consulta (si hay), seguido de los mensajes
+        todavía no plegados. Esos son a lo sumo la ventana reciente más los que
+        esperan el próximo plegado (ver resumen_conversacion.actualizar_resumen).
+
+        Los mensajes del asistente (y el resumen) llevan además "sql": el SQL de
+        ese turno, del que parten las preguntas de seguimiento (seguimiento_sql).
+        """
+        conversacion = db.get(Conversacion, conversacion_id)
+        query = db.query(Mensaje).filter(Mensaje.conversacion_id == conversacion_id)
+        if conversacion is not None and conversacion.resumen_hasta is not None:
+            query = query.filter(Mensaje.created_at > conversacion.resumen_hasta)
+        mensajes = query.order_by(desc(Mensaje.created_at)).limit(
+            CONTEXTO_MENSAJES_RECIENTES + RESUMEN_MIN_MENSAJES_NUEVOS
+        ).all()
+
+        contexto = []
+        bloque_resumen = texto_contexto_resumen(conversacion)
+        if bloque_resumen:
+            resumen = {"role": "resumen", "content": bloque_resumen}
+            if conversacion.estado_consulta:
+                resumen["sql"] = conversacion.estado_consulta.get("sql")
+            contexto.append(resumen)
+        for msg in reversed(mensajes):
+            if msg.rol == "user":
+                contexto.append({"role": "user", "content": msg.contenido})
+            else:
+                contexto.append({"role": "assistant", "content": msg.contenido, "sql": msg.sql_generado})
+        return contexto
+
     @staticmethod
     def generar_titulo(pregunta: str) -> str:
         """Genera título corto de la primera pregunta"""
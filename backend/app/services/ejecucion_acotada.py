@@ -0,0 +1,87 @@
+"""
+Ejecución acotada de SQL generado por el modelo - Sistema CFO Inteligente
+
+Una query generada mal (UNION cartesiano, GROUP BY faltante) no debe poder
+retener una conexión del pool ni agotar la memoria del worker. Cada ejecución:
+- corre dentro de un SAVEPOINT marcado read-only
+- tiene statement_timeout propio (SET LOCAL, se revierte con el savepoint)
+- lee con cursor del lado del servidor (stream_results) en lotes de fetchmany
+- corta en un máximo de filas e informa si el resultado quedó truncado
+- opcionalmente entrega cada lote a un callback a medida que llega (el SSE
+  del chat emite las primeras filas sin esperar el resultado completo)
+
+El savepoint se revierte siempre (la query es de solo lectura), así que la
+sesión del request queda usable aunque la query falle o exceda el timeout.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.constants import CFO_SQL_LOTE_FETCH
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def ejecutar_acotado(
+    db: Session,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    max_filas: Optional[int] = None,
+    timeout_ms: Optional[int] = None,
+    al_lote: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Ejecuta una query de lectura con límite de tiempo y de filas.
+
+    Args:
+        db: Sesión de BD.
+        sql: Query a ejecutar.
+        params: Parámetros bindeados.
+        max_filas: Máximo de filas a materializar (default: settings.cfo_sql_max_filas).
+        timeout_ms: statement_timeout en ms (default: settings.cfo_sql_timeout_ms).
+        al_lote: Se llama con las filas de cada lote leído del cursor (en el
+            hilo de la query, sin la fila extra de detección de truncado).
+            Si la query falla después, las filas ya entregadas no se retractan.
+
+    Returns:
+        Tupla (filas como dicts, truncado). Las excepciones de ejecución se propagan.
+    """
+    max_filas = settings.cfo_sql_max_filas if max_filas is None else max_filas
+    timeout_ms = settings.cfo_sql_timeout_ms if timeout_ms is None else timeout_ms
+
+    filas: List[Dict[str, Any]] = []
+    savepoint = db.begin_nested()
+    try:
+        db.execute(text("SET TRANSACTION READ ONLY"))
+        db.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+        result = db.execute(
+            text(sql),
+            params or {},
+            execution_options={"stream_results": True, "max_row_buffer": CFO_SQL_LOTE_FETCH},
+        )
+        try:
+            # Se pide una fila extra para distinguir "exactamente max_filas" de "truncado"
+            while len(filas) <= max_filas:
+                lote = result.fetchmany(min(CFO_SQL_LOTE_FETCH, max_filas + 1 - len(filas)))
+                if not lote:
+                    break
+                nuevas = [dict(row._mapping) for row in lote]
+                if al_lote is not None:
+                    entregables = nuevas[:max(max_filas - len(filas), 0)]
+                    if entregables:
+                        al_lote(entregables)
+                filas.extend(nuevas)
+        finally:
+            result.close()
+    finally:
+        savepoint.rollback()
+
+    truncado = len(filas) > max_filas
+    if truncado:
+        logger.warning(f"Resultado SQL truncado a {max_filas} filas")
+        del filas[max_filas:]
+    return filas, truncado
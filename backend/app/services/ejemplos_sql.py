@@ -0,0 +1,206 @@
+"""
+Ejemplos pregunta/SQL seleccionados por pregunta - Sistema CFO Inteligente
+
+El system prompt de generación SQL mandaba los ~25 ejemplos de <ejemplos>
+en cada llamada, fuera cual fuera la pregunta (casi un tercio del prompt).
+Acá los ejemplos viven en un índice local y cada llamada recibe solo los k
+más parecidos a la pregunta (CFO_SQL_EJEMPLOS_K).
+
+Fuentes del índice:
+- los ejemplos curados de sql_generator_prompts (<ejemplos>)
+- las queries canónicas validadas (canonical_queries_config), una por query
+- historial: SQL generado por Claude que se ejecutó bien (registrar_ejemplo),
+  acotado a EJEMPLOS_SQL_HISTORIAL_MAX en memoria
+
+Similitud: TF-IDF sobre n-gramas de caracteres de la pregunta normalizada
+(sin tildes ni puntuación), coseno. Los n-gramas toleran flexiones
+("facturó" / "facturación") sin stemmer ni dependencias; todo corre en
+memoria, sin red.
+"""
+
+import math
+import re
+import textwrap
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from app.core.constants import EJEMPLOS_SQL_HISTORIAL_MAX, EJEMPLOS_SQL_NGRAMAS
+from app.core.logger import get_logger
+from app.services.canonical_queries_config import QUERIES_CANONICAS
+from app.services.sql_cache import _sin_tildes
+from app.services.sql_generator_prompts import EJEMPLOS_SQL
+
+logger = get_logger(__name__)
+
+# Un ejemplo de <ejemplos>: encabezado "PATRON CRITICO -- ...:" opcional, P: "...", y el SQL hasta la línea en blanco
+_RE_EJEMPLO = re.compile(
+    r'(?:^(?P<nota>PATRON CRITICO[^\n]*)\n)?^P: "(?P<pregunta>[^"\n]+)"\n(?P<sql>.+?)(?=\n\s*\n|\Z)',
+    re.MULTILINE | re.DOTALL,
+)
+
+# Interrogativos y artículos: no distinguen una pregunta de otra
+_PALABRAS_VACIAS = frozenset({
+    "cuanto", "cuanta", "cuantos", "cuantas", "cual", "cuales", "que", "como", "donde", "cuando",
+    "el", "la", "los", "las", "un", "una", "de", "del", "en", "a", "al", "y", "o", "es", "se", "fue",
+})
+
+
+@dataclass(frozen=True)
+class EjemploSQL:
+    """Par pregunta/SQL con su origen ('prompt', 'canonica' o 'historial')."""
+
+    pregunta: str
+    sql: str
+    origen: str
+    nota: Optional[str] = None
+
+
+def parsear_ejemplos(bloque: str) -> List[EjemploSQL]:
+    """Ejemplos del formato de <ejemplos> (P: "pregunta" + SQL)."""
+    return [
+        EjemploSQL(m.group("pregunta"), m.group("sql").strip(), "prompt", m.group("nota"))
+        for m in _RE_EJEMPLO.finditer(bloque)
+    ]
+
+
+def formatear_ejemplos(ejemplos: Sequence[EjemploSQL]) -> str:
+    """Bloque <ejemplos> en el mismo formato del system prompt ("" si no hay)."""
+    if not ejemplos:
+        return ""
+    partes = []
+    for ejemplo in ejemplos:
+        encabezado = f"{ejemplo.nota}\n" if ejemplo.nota else ""
+        partes.append(f'{encabezado}P: "{ejemplo.pregunta}"\n{ejemplo.sql}')
+    return "<ejemplos>\n" + "\n\n".join(partes) + "\n</ejemplos>"
+
+
+def _normalizar(pregunta: str) -> str:
+    # Sin resolver fechas relativas como normalizar_pregunta: "este mes" debe coincidir con los ejemplos
+    return " ".join(re.sub(r"[^\w\s]", " ", _sin_tildes((pregunta or "").lower())).split())
+
+
+def _ngramas(pregunta: str) -> Counter:
+    ngramas: Counter = Counter()
+    for palabra in _normalizar(pregunta).split():
+        if palabra in _PALABRAS_VACIAS:
+            continue
+        ngramas[palabra] += 1
+        relleno = f" {palabra} "
+        for n in EJEMPLOS_SQL_NGRAMAS:
+            for i in range(len(relleno) - n + 1):
+                ngramas[relleno[i:i + n]] += 1
+    return ngramas
+
+
+class IndiceEjemplos:
+    """Índice TF-IDF en memoria; se recalcula perezosamente al agregar ejemplos."""
+
+    def __init__(self, base: Sequence[EjemploSQL] = (), historial_max: int = EJEMPLOS_SQL_HISTORIAL_MAX):
+        self.historial_max = historial_max
+        self._base = list(base)
+        self._historial: "OrderedDict[str, EjemploSQL]" = OrderedDict()
+        self._vectores: Optional[List[Dict[str, float]]] = None
+        self._ejemplos: List[EjemploSQL] = []
+        self._idf: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._base) + len(self._historial)
+
+    def agregar(self, ejemplo: EjemploSQL) -> None:
+        """Agrega (o refresca) un ejemplo de historial; el más viejo sale al superar el máximo."""
+        clave = _normalizar(ejemplo.pregunta)
+        with self._lock:
+            self._historial.pop(clave, None)
+            self._historial[clave] = ejemplo
+            while len(self._historial) > self.historial_max:
+                self._historial.popitem(last=False)
+            self._vectores = None
+
+    def _vector(self, ngramas: Counter) -> Dict[str, float]:
+        vector = {
+            ngrama: (1 + math.log(cantidad)) * self._idf[ngrama]
+            for ngrama, cantidad in ngramas.items() if ngrama in self._idf
+        }
+        norma = math.sqrt(sum(peso * peso for peso in vector.values())) or 1.0
+        return {ngrama: peso / norma for ngrama, peso in vector.items()}
+
+    def _indexar(self) -> None:
+        # Las preguntas de historial que repiten una curada no duplican el ejemplo
+        curadas = {_normalizar(e.pregunta) for e in self._base}
+        self._ejemplos = self._base + [e for c, e in self._historial.items() if c not in curadas]
+        documentos = [_ngramas(e.pregunta) for e in self._ejemplos]
+        frecuencia = Counter(ngrama for documento in documentos for ngrama in documento)
+        total = len(documentos)
+        self._idf = {ngrama: math.log((1 + total) / (1 + df)) + 1 for ngrama, df in frecuencia.items()}
+        self._vectores = [self._vector(documento) for documento in documentos]
+
+    def buscar(self, pregunta: str, k: int) -> List[EjemploSQL]:
+        """Los k ejemplos más parecidos a la pregunta (sin preguntas repetidas ni similitud nula)."""
+        if k <= 0:
+            return []
+        with self._lock:
+            if self._vectores is None:
+                self._indexar()
+            consulta = self._vector(_ngramas(pregunta))
+            puntajes = [
+                (sum(peso * vector.get(ngrama, 0.0) for ngrama, peso in consulta.items()), i)
+                for i, vector in enumerate(self._vectores)
+            ]
+            ejemplos = self._ejemplos
+
+        elegidos: List[EjemploSQL] = []
+        vistos = set()
+        for puntaje, i in sorted(puntajes, key=lambda p: (-p[0], p[1])):
+            if puntaje <= 0 or len(elegidos) == k:
+                break
+            ejemplo = ejemplos[i]
+            if ejemplo.sql in vistos:
+                continue
+            vistos.add(ejemplo.sql)
+            elegidos.append(ejemplo)
+        return elegidos
+
+
+def _ejemplos_canonicos() -> List[EjemploSQL]:
+    return [
+        EjemploSQL(config["patrones"][0], textwrap.dedent(config["sql_control"]).strip(), "canonica")
+        for config in QUERIES_CANONICAS.values()
+    ]
+
+
+_indice: Optional[IndiceEjemplos] = None
+_indice_lock = threading.Lock()
+
+
+def get_indice_ejemplos() -> IndiceEjemplos:
+    """Índice compartido (curados + canónicos), armado en el primer uso."""
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                _indice = IndiceEjemplos(parsear_ejemplos(EJEMPLOS_SQL) + _ejemplos_canonicos())
+                logger.info(f"Índice de ejemplos SQL inicializado con {len(_indice)} ejemplos")
+    return _indice
+
+
+def seleccionar_ejemplos(preguntas: Sequence[str], k: int) -> List[EjemploSQL]:
+    """
+    Ejemplos relevantes para una o varias preguntas (lote): los k de cada una,
+    sin repetir, en orden de aparición.
+    """
+    indice = get_indice_ejemplos()
+    elegidos: Dict[str, EjemploSQL] = {}
+    for pregunta in preguntas:
+        for ejemplo in indice.buscar(pregunta, k):
+            elegidos.setdefault(ejemplo.sql, ejemplo)
+    return list(elegidos.values())
+
+
+def registrar_ejemplo(pregunta: str, sql: str) -> None:
+    """Suma al índice un SQL generado que se ejecutó bien para una pregunta autocontenida."""
+    if not pregunta or not sql:
+        return
+    get_indice_ejemplos().agregar(EjemploSQL(pregunta.strip(), sql.strip(), "historial"))
@@ -0,0 +1,119 @@
+"""
+Guardia de costo para SQL generado por el modelo - Sistema CFO Inteligente
+
+Los pre-validadores (validators/sql_pre_validators.py) detectan problemas
+semánticos, pero una query válida puede ser patológica: UNION que recorre el
+libro varias veces, JOIN sin condición, subconsulta correlacionada por fila.
+Antes de ejecutarla se pide su plan con EXPLAIN (FORMAT JSON) —sin ANALYZE,
+así que no se ejecuta— y se rechaza si el costo o las filas estimadas del nodo
+raíz superan los límites configurados.
+
+Cada plan se guarda en planes_sql_cfo junto a la pregunta para analizar
+después las queries más caras (GET /api/cfo/planes-sql/costosos).
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.models.plan_sql import PlanSQL
+
+logger = get_logger(__name__)
+
+
+def obtener_plan(db: Session, sql: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Retorna el plan JSON del nodo raíz de EXPLAIN (FORMAT JSON).
+
+    Corre en un SAVEPOINT read-only que se revierte siempre, igual que la
+    ejecución acotada. Las excepciones (SQL inválido) se propagan.
+    """
+    savepoint = db.begin_nested()
+    try:
+        db.execute(text("SET TRANSACTION READ ONLY"))
+        resultado = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params or {}).scalar()
+    finally:
+        savepoint.rollback()
+
+    # psycopg2 ya decodifica el json; otros drivers lo devuelven como texto
+    if isinstance(resultado, str):
+        resultado = json.loads(resultado)
+    return resultado[0]["Plan"]
+
+
+def evaluar_costo_sql(
+    db: Session,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    costo_maximo: Optional[float] = None,
+    filas_maximo: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Evalúa el SQL contra los límites de costo del planner.
+
+    Si EXPLAIN falla la query no se rechaza acá: el error real lo informa la
+    ejecución. En ese caso plan es None y no hay nada que registrar.
+
+    Returns:
+        Dict con aprobado, costo_total, filas_estimadas, motivo y plan.
+    """
+    costo_maximo = settings.cfo_sql_costo_maximo if costo_maximo is None else costo_maximo
+    filas_maximo = settings.cfo_sql_filas_estimadas_maximo if filas_maximo is None else filas_maximo
+
+    try:
+        plan = obtener_plan(db, sql, params)
+    except Exception as e:
+        logger.warning(f"Guardia de costo: EXPLAIN falló, se omite la evaluación — {str(e)[:120]}")
+        return {"aprobado": True, "costo_total": None, "filas_estimadas": None, "motivo": None, "plan": None}
+
+    costo = float(plan.get("Total Cost", 0))
+    filas = float(plan.get("Plan Rows", 0))
+
+    motivo = None
+    if costo_maximo and costo > costo_maximo:
+        motivo = f"Costo estimado {costo:,.0f} supera el máximo {costo_maximo:,.0f}"
+    elif filas_maximo and filas > filas_maximo:
+        motivo = f"Filas estimadas {filas:,.0f} superan el máximo {filas_maximo:,.0f}"
+
+    if motivo:
+        logger.warning(f"Guardia de costo: SQL rechazado — {motivo}")
+
+    return {
+        "aprobado": motivo is None,
+        "costo_total": costo,
+        "filas_estimadas": filas,
+        "motivo": motivo,
+        "plan": plan,
+    }
+
+
+def registrar_plan(db: Session, pregunta: str, sql: str, evaluacion: Dict[str, Any]) -> Optional[PlanSQL]:
+    """Guarda el plan evaluado junto a la pregunta (no hace nada si no hubo plan)."""
+    if evaluacion.get("plan") is None:
+        return None
+    registro = PlanSQL(
+        pregunta=pregunta,
+        sql=sql,
+        costo_total=evaluacion["costo_total"],
+        filas_estimadas=evaluacion["filas_estimadas"],
+        plan=evaluacion["plan"],
+        rechazado=not evaluacion["aprobado"],
+        motivo=evaluacion.get("motivo"),
+    )
+    db.add(registro)
+    db.commit()
+    return registro
+
+
+def listar_planes_mas_costosos(
+    db: Session, limite: int = 20, solo_rechazados: bool = False
+) -> List[PlanSQL]:
+    """Planes registrados ordenados por costo estimado descendente."""
+    query = db.query(PlanSQL)
+    if solo_rechazados:
+        query = query.filter(PlanSQL.rechazado.is_(True))
+    return query.order_by(PlanSQL.costo_total.desc(), PlanSQL.created_at.desc()).limit(limite).all()
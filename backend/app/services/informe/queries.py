@@ -1,11 +1,16 @@
-"""Queries SQL predefinidas para informes financieros multi-query."""
+"""Queries SQL predefinidas para informes financieros multi-query.
+
+Las queries agregadas por tipo, área, localidad, moneda y fecha leen el rollup
+operaciones_diarias (solo operaciones activas, ver rollup_operaciones); las que
+necesitan cliente, proveedor o socio siguen yendo a operaciones.
+"""
 
 from typing import Any, Optional
 
-from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.core.logger import get_logger
+from app.services.result_cache import ejecutar_con_cache
 
 logger = get_logger(__name__)
 
@@ -21,10 +26,9 @@ def _query_totales_por_tipo() -> str:
             tipo_operacion,
             SUM(total_pesificado) AS total_uyu,
             SUM(total_dolarizado) AS total_usd,
-            COUNT(*) AS cantidad
-        FROM operaciones
-        WHERE deleted_at IS NULL
-          AND fecha >= :fecha_desde
+            SUM(cantidad_operaciones) AS cantidad
+        FROM operaciones_diarias
+        WHERE fecha >= :fecha_desde
           AND fecha <= :fecha_hasta
         GROUP BY tipo_operacion
         ORDER BY tipo_operacion
@@ -50,10 +54,9 @@ def _query_operativo_por_area() -> str:
                     SUM(CASE WHEN o.tipo_operacion = 'INGRESO' THEN o.total_pesificado ELSE 0 END), 1
                 )
             END AS rentabilidad
-        FROM operaciones o
+        FROM operaciones_diarias o
         INNER JOIN areas a ON o.area_id = a.id
-        WHERE o.deleted_at IS NULL
-          AND o.tipo_operacion IN ('INGRESO', 'GASTO')
+        WHERE o.tipo_operacion IN ('INGRESO', 'GASTO')
           AND o.fecha >= :fecha_desde
           AND o.fecha <= :fecha_hasta
         GROUP BY a.nombre
@@ -91,10 +94,9 @@ def _query_retiros_por_localidad() -> str:
             localidad,
             SUM(total_pesificado) AS total_uyu,
             SUM(CASE WHEN moneda_original = 'USD' THEN monto_original ELSE 0 END) AS retiros_usd_real,
-            COUNT(*) AS cantidad
-        FROM operaciones
+            SUM(cantidad_operaciones) AS cantidad
+        FROM operaciones_diarias
         WHERE tipo_operacion = 'RETIRO'
-          AND deleted_at IS NULL
           AND fecha >= :fecha_desde
           AND fecha <= :fecha_hasta
         GROUP BY localidad
@@ -120,9 +122,8 @@ def _query_desglose_por_localidad() -> str:
             SUM(CASE WHEN tipo_operacion = 'RETIRO' THEN total_dolarizado ELSE 0 END) AS retiros_usd,
             SUM(CASE WHEN tipo_operacion = 'DISTRIBUCION' THEN total_pesificado ELSE 0 END) AS distribuciones_uyu,
             SUM(CASE WHEN tipo_operacion = 'DISTRIBUCION' THEN total_dolarizado ELSE 0 END) AS distribuciones_usd
-        FROM operaciones
-        WHERE deleted_at IS NULL
-          AND fecha >= :fecha_desde
+        FROM operaciones_diarias
+        WHERE fecha >= :fecha_desde
           AND fecha <= :fecha_hasta
         GROUP BY localidad
         ORDER BY localidad
@@ -138,10 +139,9 @@ def _query_evolucion_mensual() -> str:
             SUM(CASE WHEN tipo_operacion = 'GASTO' THEN total_pesificado ELSE 0 END) AS gastos_uyu,
             SUM(CASE WHEN tipo_operacion = 'RETIRO' THEN total_pesificado ELSE 0 END) AS retiros_uyu,
             SUM(CASE WHEN tipo_operacion = 'DISTRIBUCION' THEN total_pesificado ELSE 0 END) AS distribuciones_uyu,
-            COUNT(*) AS total_operaciones
-        FROM operaciones
-        WHERE deleted_at IS NULL
-          AND fecha >= :fecha_desde
+            SUM(cantidad_operaciones) AS total_operaciones
+        FROM operaciones_diarias
+        WHERE fecha >= :fecha_desde
           AND fecha <= :fecha_hasta
         GROUP BY EXTRACT(MONTH FROM fecha)
         ORDER BY mes
@@ -155,10 +155,9 @@ def _query_composicion_por_moneda() -> str:
             tipo_operacion,
             moneda_original,
             SUM(total_pesificado) AS total_uyu,
-            COUNT(*) AS cantidad
-        FROM operaciones
-        WHERE deleted_at IS NULL
-          AND fecha >= :fecha_desde
+            SUM(cantidad_operaciones) AS cantidad
+        FROM operaciones_diarias
+        WHERE fecha >= :fecha_desde
           AND fecha <= :fecha_hasta
         GROUP BY tipo_operacion, moneda_original
         ORDER BY tipo_operacion, moneda_original
@@ -225,11 +224,10 @@ def _query_matriz_area_localidad() -> str:
                     SUM(CASE WHEN o.tipo_operacion = 'INGRESO' THEN o.total_pesificado ELSE 0 END), 1
                 )
             END AS rentabilidad,
-            COUNT(*) AS cantidad_operaciones
-        FROM operaciones o
+            SUM(o.cantidad_operaciones) AS cantidad_operaciones
+        FROM operaciones_diarias o
         INNER JOIN areas a ON o.area_id = a.id
-        WHERE o.deleted_at IS NULL
-          AND o.tipo_operacion IN ('INGRESO', 'GASTO')
+        WHERE o.tipo_operacion IN ('INGRESO', 'GASTO')
           AND o.fecha >= :fecha_desde
           AND o.fecha <= :fecha_hasta
         GROUP BY a.nombre, o.localidad
@@ -243,13 +241,12 @@ def _query_ticket_promedio_por_area() -> str:
         SELECT
             a.nombre AS area,
             o.tipo_operacion,
-            COUNT(*) AS cantidad,
+            SUM(o.cantidad_operaciones) AS cantidad,
             SUM(o.total_pesificado) AS total_uyu,
-            ROUND(SUM(o.total_pesificado) / COUNT(*), 2) AS ticket_promedio_uyu
-        FROM operaciones o
+            ROUND(SUM(o.total_pesificado) / SUM(o.cantidad_operaciones), 2) AS ticket_promedio_uyu
+        FROM operaciones_diarias o
         INNER JOIN areas a ON o.area_id = a.id
-        WHERE o.deleted_at IS NULL
-          AND o.tipo_operacion IN ('INGRESO', 'GASTO')
+        WHERE o.tipo_operacion IN ('INGRESO', 'GASTO')
           AND o.fecha >= :fecha_desde
           AND o.fecha <= :fecha_hasta
         GROUP BY a.nombre, o.tipo_operacion
@@ -262,9 +259,8 @@ def _query_concentracion_clientes() -> str:
     return """
         WITH total_ingresos AS (
             SELECT SUM(total_pesificado) AS total
-            FROM operaciones
+            FROM operaciones_diarias
             WHERE tipo_operacion = 'INGRESO'
-              AND deleted_at IS NULL
               AND fecha >= :fecha_desde
               AND fecha <= :fecha_hasta
         ),
@@ -327,9 +323,8 @@ def _query_capital_trabajo() -> str:
                      SUM(CASE WHEN tipo_operacion = 'GASTO' THEN total_pesificado ELSE 0 END)), 1
                 )
             END AS ratio_distribuciones_sobre_resultado
-        FROM operaciones
-        WHERE deleted_at IS NULL
-          AND fecha >= :fecha_desde
+        FROM operaciones_diarias
+        WHERE fecha >= :fecha_desde
           AND fecha <= :fecha_hasta
     """
 
@@ -357,10 +352,9 @@ def _query_evolucion_trimestral() -> str:
             SUM(CASE WHEN tipo_operacion = 'INGRESO' THEN total_pesificado ELSE 0 END) -
             SUM(CASE WHEN tipo_operacion = 'GASTO' THEN total_pesificado ELSE 0 END) -
             SUM(CASE WHEN tipo_operacion = 'DISTRIBUCION' THEN total_pesificado ELSE 0 END) AS capital_retenido_uyu,
-            COUNT(*) AS total_operaciones
-        FROM operaciones
-        WHERE deleted_at IS NULL
-          AND fecha >= :fecha_desde
+            SUM(cantidad_operaciones) AS total_operaciones
+        FROM operaciones_diarias
+        WHERE fecha >= :fecha_desde
           AND fecha <= :fecha_hasta
         GROUP BY EXTRACT(QUARTER FROM fecha), EXTRACT(YEAR FROM fecha)
         ORDER BY anio, trimestre
@@ -414,9 +408,8 @@ def _query_clientes_nuevos_perdidos() -> dict:
 # ══════════════════════════════════════════════════════════════
 
 def _ejecutar_query(db: Session, sql: str, params: dict) -> list[dict]:
-    """Ejecuta una query parametrizada y retorna lista de dicts."""
-    result = db.execute(text(sql), params)
-    return [dict(row._mapping) for row in result]
+    """Ejecuta una query parametrizada (cacheada por versión de datos) y retorna lista de dicts."""
+    return ejecutar_con_cache(db, sql, params)
 
 
 def _ejecutar_query_opcional(
@@ -0,0 +1,266 @@
+"""
+Motor de intenciones compilado - Sistema CFO Inteligente
+
+La detección de intención y período estaba repartida en barridos lineales
+que se repetían con cada pregunta: keywords de informe y regex de período
+(informe/detector.py), KEYWORDS_TEMPORALES (SQLRouter._necesita_metadatos),
+los patrones de ValidadorCanonico y los de SQLTypeDetector. Cada regla nueva
+agregaba otro `kw in pregunta` por pregunta.
+
+Acá todas las reglas de frase fija se compilan una sola vez (al arrancar la
+app, ver main.lifespan) en un autómata Aho-Corasick, y las pocas reglas que
+necesitan regex quedan precompiladas. analizar_pregunta hace una pasada
+sobre la pregunta normalizada (minúsculas, sin espacios en los extremos) y
+devuelve todos los hallazgos juntos:
+
+- grupos de keywords encontrados (informe, temporal, tipo de query, ...)
+  con sus posiciones, para chequear palabra completa cuando hace falta
+- candidatas canónicas (query, patrón) en el orden de QUERIES_CANONICAS
+- años y rango de meses ("de marzo a junio")
+
+El costo de clasificar es lineal en el largo de la pregunta más los
+hallazgos, no en la cantidad de reglas. La semántica es la de los barridos
+originales (subcadena sobre la pregunta en minúsculas): los patrones ya
+traen sus variantes con y sin tilde.
+"""
+
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from app.core.constants import KEYWORDS_TEMPORALES, MOTOR_INTENCIONES_CACHE_MAX
+from app.core.logger import get_logger
+from app.services.canonical_queries_config import QUERIES_CANONICAS
+
+logger = get_logger(__name__)
+
+
+# ══════════════════════════════════════════════════════════════
+# REGLAS
+# ══════════════════════════════════════════════════════════════
+
+# Frases que indican pedido de informe/resumen completo
+KEYWORDS_INFORME = (
+    "informe comparativo del desempeño", "informe comparativo", "comparativo financiero",
+    "comparar el desempeño financiero", "desempeño financiero", "comparar años", "comparar el año",
+    "informe financiero completo", "informe financiero", "informe completo", "informe ejecutivo",
+    "reporte financiero", "reporte completo", "resumen financiero completo", "resumen financiero",
+    "resumen completo", "resumen ejecutivo", "situación financiera", "situacion financiera",
+    "cómo cerró el año", "como cerro el año", "como cerro el ano", "cómo cerró el ano",
+    "cómo viene el año", "como viene el año", "como viene el ano", "reporte ejecutivo",
+    "informe general", "resumen general del año", "resumen general del ano",
+    "informe de", "informe del", "reporte de", "reporte del", "resumen de", "resumen del", "informe",
+)
+
+# Keywords que EXCLUYEN la intención informe (preguntas puntuales)
+KEYWORDS_EXCLUSION_INFORME = (
+    "por área", "por area", "por mes", "por localidad", "por socio",
+    "cuánto", "cuanto", "cuál", "cual ", "top ", "ranking",
+)
+
+MESES = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4,
+    "mayo": 5, "junio": 6, "julio": 7, "agosto": 8,
+    "septiembre": 9, "setiembre": 9, "octubre": 10,
+    "noviembre": 11, "diciembre": 12,
+}
+
+# Ordinal -> (mes desde, mes hasta)
+TRIMESTRES = {
+    "primer": (1, 3), "1er": (1, 3), "primero": (1, 3), "q1": (1, 3),
+    "segundo": (4, 6), "2do": (4, 6), "q2": (4, 6),
+    "tercer": (7, 9), "3er": (7, 9), "tercero": (7, 9), "q3": (7, 9),
+    "cuarto": (10, 12), "4to": (10, 12), "q4": (10, 12),
+}
+SEMESTRES = {
+    "primer": (1, 6), "1er": (1, 6), "primero": (1, 6),
+    "segundo": (7, 12), "2do": (7, 12),
+}
+
+ANIO_RELATIVO = ("este año", "este ano", "el año", "el ano", "del año", "del ano")
+
+# Nombres de socios (distribuciones y retiros por socio)
+SOCIOS = ("bruno", "agustina", "viviana", "gonzalo", "pancho")
+
+# Raíces que usa SQLTypeDetector para clasificar la query
+KEYWORDS_TIPO_QUERY = (
+    "rentabilidad", "margen", "retir", "tipo de cambio", "cambio", "distribu", "recib", "toca",
+    "socio", "porcentaje", "factur", "ingreso", "gast", "día", "hoy",
+)
+
+GRUPOS: Dict[str, Iterable[str]] = {
+    "informe": KEYWORDS_INFORME,
+    "informe_exclusion": KEYWORDS_EXCLUSION_INFORME,
+    "temporal": KEYWORDS_TEMPORALES,
+    "anio_relativo": ANIO_RELATIVO,
+    "mes": MESES,
+    "trimestre_ordinal": TRIMESTRES,
+    "trimestre": ("trimestre",),
+    "semestre_ordinal": SEMESTRES,
+    "semestre": ("semestre",),
+    "nombre_socio": SOCIOS,
+    "tipo_query": KEYWORDS_TIPO_QUERY,
+}
+
+_RE_ANIO = re.compile(r"\b(20[2-3]\d)\b")
+_MESES_REGEX = "|".join(sorted(MESES, key=len, reverse=True))
+_RE_RANGO_MESES = re.compile(rf"(?:de\s+)?({_MESES_REGEX})\s+(?:a|hasta)\s+({_MESES_REGEX})\b")
+_RE_PALABRA = re.compile(r"\w+")
+
+
+# ══════════════════════════════════════════════════════════════
+# AUTÓMATA
+# ══════════════════════════════════════════════════════════════
+
+class AutomataAhoCorasick:
+    """
+    Autómata Aho-Corasick sobre caracteres: encuentra todas las apariciones
+    (también solapadas) de todos los patrones en una sola pasada.
+    """
+
+    def __init__(self, patrones: Iterable[Tuple[str, Hashable]]):
+        self._transiciones: List[Dict[str, int]] = [{}]
+        self._fallo: List[int] = [0]
+        self._salidas: List[List[Tuple[int, Hashable]]] = [[]]
+        for patron, etiqueta in patrones:
+            if patron:
+                self._agregar(patron, etiqueta)
+        self._construir_fallos()
+
+    def __len__(self) -> int:
+        return len(self._transiciones)
+
+    def _agregar(self, patron: str, etiqueta: Hashable) -> None:
+        nodo = 0
+        for caracter in patron:
+            siguiente = self._transiciones[nodo].get(caracter)
+            if siguiente is None:
+                siguiente = len(self._transiciones)
+                self._transiciones[nodo][caracter] = siguiente
+                self._transiciones.append({})
+                self._fallo.append(0)
+                self._salidas.append([])
+            nodo = siguiente
+        self._salidas[nodo].append((len(patron), etiqueta))
+
+    def _construir_fallos(self) -> None:
+        # BFS: el fallo de cada nodo es el sufijo propio más largo que también es prefijo
+        cola = deque(self._transiciones[0].values())
+        while cola:
+            nodo = cola.popleft()
+            for caracter, hijo in self._transiciones[nodo].items():
+                fallo = self._fallo[nodo]
+                while fallo and caracter not in self._transiciones[fallo]:
+                    fallo = self._fallo[fallo]
+                self._fallo[hijo] = self._transiciones[fallo].get(caracter, 0)
+                # Los patrones que terminan en el nodo de fallo también terminan acá
+                self._salidas[hijo] = self._salidas[hijo] + self._salidas[self._fallo[hijo]]
+                cola.append(hijo)
+
+    def buscar(self, texto: str) -> List[Tuple[int, int, Hashable]]:
+        """Apariciones (inicio, fin, etiqueta) en orden de fin."""
+        encontrados = []
+        nodo = 0
+        for fin, caracter in enumerate(texto, start=1):
+            while nodo and caracter not in self._transiciones[nodo]:
+                nodo = self._fallo[nodo]
+            nodo = self._transiciones[nodo].get(caracter, 0)
+            for largo, etiqueta in self._salidas[nodo]:
+                encontrados.append((fin - largo, fin, etiqueta))
+        return encontrados
+
+
+# ══════════════════════════════════════════════════════════════
+# ANÁLISIS
+# ══════════════════════════════════════════════════════════════
+
+@dataclass
+class AnalisisPregunta:
+    """Hallazgos de una pasada del motor sobre una pregunta. No modificar: se comparte vía cache."""
+
+    texto: str
+    grupos: Dict[str, Set[str]] = field(default_factory=dict)
+    posiciones: Dict[str, List[Tuple[int, int]]] = field(default_factory=dict)
+    canonicas: List[Tuple[str, str]] = field(default_factory=list)
+    anios: List[int] = field(default_factory=list)
+    rango_meses: Optional[Tuple[str, str]] = None
+    palabras: List[str] = field(default_factory=list)
+
+    def contiene(self, grupo: str, patron: Optional[str] = None) -> bool:
+        """Si apareció algún patrón del grupo (o ese patrón en particular)."""
+        encontrados = self.grupos.get(grupo, ())
+        return patron in encontrados if patron is not None else bool(encontrados)
+
+    def palabra_completa(self, patron: str) -> bool:
+        """Si el patrón aparece como palabra completa (equivale a \\bpatron\\b)."""
+        for inicio, fin in self.posiciones.get(patron, ()):
+            antes = self.texto[inicio - 1] if inicio else " "
+            despues = self.texto[fin] if fin < len(self.texto) else " "
+            if not _es_caracter_palabra(antes) and not _es_caracter_palabra(despues):
+                return True
+        return False
+
+
+def _es_caracter_palabra(caracter: str) -> bool:
+    return caracter.isalnum() or caracter == "_"
+
+
+class MotorIntenciones:
+    """Reglas de grupos y patrones canónicos compiladas en un único autómata."""
+
+    def __init__(self, grupos: Dict[str, Iterable[str]], canonicas: Dict[str, dict]):
+        etiquetas = [(patron, ("grupo", grupo)) for grupo, patrones in grupos.items() for patron in patrones]
+        # El orden (query, patrón) de la config define la prioridad entre candidatas
+        self._orden_canonicas: Dict[Tuple[str, str], int] = {}
+        for key, config in canonicas.items():
+            for patron in config["patrones"]:
+                self._orden_canonicas.setdefault((key, patron), len(self._orden_canonicas))
+                etiquetas.append((patron, ("canonica", key)))
+        self.cantidad_reglas = len(etiquetas)
+        self._automata = AutomataAhoCorasick(etiquetas)
+        logger.info(
+            f"Motor de intenciones compilado: {self.cantidad_reglas} reglas, {len(self._automata)} estados"
+        )
+
+    def analizar(self, pregunta: str) -> AnalisisPregunta:
+        texto = (pregunta or "").lower().strip()
+        analisis = AnalisisPregunta(texto=texto)
+        canonicas: Set[Tuple[str, str]] = set()
+        for inicio, fin, (clase, valor) in self._automata.buscar(texto):
+            patron = texto[inicio:fin]
+            if clase == "canonica":
+                canonicas.add((valor, patron))
+                continue
+            analisis.grupos.setdefault(valor, set()).add(patron)
+            spans = analisis.posiciones.setdefault(patron, [])
+            if (inicio, fin) not in spans:
+                spans.append((inicio, fin))
+        analisis.canonicas = sorted(canonicas, key=self._orden_canonicas.__getitem__)
+        analisis.anios = [int(anio) for anio in _RE_ANIO.findall(texto)]
+        rango = _RE_RANGO_MESES.search(texto)
+        analisis.rango_meses = (rango.group(1), rango.group(2)) if rango else None
+        analisis.palabras = _RE_PALABRA.findall(texto)
+        return analisis
+
+
+_motor: Optional[MotorIntenciones] = None
+_motor_lock = threading.Lock()
+
+
+def get_motor_intenciones() -> MotorIntenciones:
+    """Motor compartido; se compila una vez (main.lifespan lo hace al arrancar)."""
+    global _motor
+    if _motor is None:
+        with _motor_lock:
+            if _motor is None:
+                _motor = MotorIntenciones(GRUPOS, QUERIES_CANONICAS)
+    return _motor
+
+
+@lru_cache(maxsize=MOTOR_INTENCIONES_CACHE_MAX)
+def analizar_pregunta(pregunta: str) -> AnalisisPregunta:
+    """Análisis de la pregunta con el motor compartido (cacheado por texto)."""
+    return get_motor_intenciones().analizar(pregunta)
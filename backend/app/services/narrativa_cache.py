@@ -0,0 +1,113 @@
+"""
+Cache de narrativas del chat CFO - Sistema CFO Inteligente
+
+La narrativa de Sonnet es la etapa más cara del turno. Cuando el resultado
+es idéntico al de un turno anterior (p.ej. dos socios pidiendo el mismo KPI
+el mismo día) se reproduce la respuesta ya generada en lugar de volver a
+llamar a Claude. La clave combina:
+- la pregunta normalizada (sql_cache.normalizar_pregunta)
+- la huella del resultado (filas o texto de informe, serializados estables)
+- la huella del contexto conversacional
+- las opciones de formato (modelo, max_tokens, system prompt, truncado...)
+- la fecha: el prompt narrativo lleva la fecha actual
+
+Solo se guardan narrativas completas de Claude: ni el fallback de datos
+crudos ni un stream cortado por desconexión del cliente. La advertencia de
+la validación canónica no forma parte de la entrada, se recalcula por turno.
+"""
+
+import hashlib
+import json
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.constants import (
+    NARRATIVA_CACHE_MAX_ENTRADAS,
+    NARRATIVA_CACHE_TTL_SEGUNDOS,
+    STREAM_MAX_CARACTERES_TOKEN,
+)
+from app.services.sql_cache import SQLCache, huella_contexto, normalizar_pregunta
+
+_cache = SQLCache(
+    max_entradas=NARRATIVA_CACHE_MAX_ENTRADAS,
+    ttl_segundos=NARRATIVA_CACHE_TTL_SEGUNDOS,
+)
+
+
+def huella_resultado(datos: Any) -> str:
+    """Hash estable de un resultado (lista de filas o texto ya formateado)."""
+    if isinstance(datos, str):
+        serializado = datos
+    else:
+        serializado = json.dumps(datos, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(serializado.encode("utf-8")).hexdigest()
+
+
+def construir_clave_narrativa(
+    pregunta: str,
+    datos: Any,
+    *,
+    contexto: Optional[List[Dict[str, Any]]] = None,
+    opciones: Optional[Dict[str, Any]] = None,
+    hoy: Optional[date] = None,
+) -> str:
+    """
+    Construye la clave de cache de una narrativa.
+
+    Args:
+        pregunta: Pregunta del usuario.
+        datos: Filas del resultado SQL o texto del informe que se narra.
+        contexto: Mensajes previos de la conversación.
+        opciones: Parámetros que cambian la respuesta (modelo, max_tokens, prompt...).
+        hoy: Fecha de referencia (default: hoy).
+    """
+    hoy = hoy or date.today()
+    partes = [
+        normalizar_pregunta(pregunta, hoy),
+        huella_resultado(datos),
+        huella_contexto(contexto),
+        json.dumps(opciones or {}, sort_keys=True, default=str),
+        hoy.isoformat(),
+    ]
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+
+def obtener_narrativa(clave: str) -> Optional[str]:
+    """Texto de la narrativa cacheada o None."""
+    entrada = _cache.obtener(clave)
+    return entrada["texto"] if entrada is not None else None
+
+
+def guardar_narrativa(clave: str, texto: str) -> None:
+    """Guarda una narrativa completa (los textos vacíos se ignoran)."""
+    if texto.strip():
+        _cache.guardar(clave, {"texto": texto})
+
+
+def fragmentar_narrativa(texto: str, max_caracteres: int = STREAM_MAX_CARACTERES_TOKEN) -> Iterator[str]:
+    """
+    Parte una narrativa cacheada en tokens SSE para reproducirla sin pausas.
+
+    Los cortes caen en fin de palabra, igual que el coalescing del stream de
+    Claude; una palabra más larga que el máximo sale entera.
+    """
+    palabras = texto.split(" ")
+    buffer = palabras[0]
+    for palabra in palabras[1:]:
+        if buffer and len(buffer) + 1 + len(palabra) > max_caracteres:
+            yield buffer + " "
+            buffer = palabra
+        else:
+            buffer = f"{buffer} {palabra}"
+    if buffer:
+        yield buffer
+
+
+def limpiar_cache_narrativas() -> None:
+    """Vacía el cache de narrativas (tests / mantenimiento)."""
+    _cache.limpiar()
+
+
+def estadisticas_cache_narrativas() -> Dict[str, Any]:
+    """Contadores de uso del cache de narrativas."""
+    return _cache.estadisticas()
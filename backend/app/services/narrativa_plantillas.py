@@ -0,0 +1,306 @@
+"""
+Narrativa por plantillas para resultados chicos - Sistema CFO Inteligente
+
+Cuando el SQL devuelve un número o un puñado de filas, la segunda llamada a
+Claude solo convierte "123456.78" en una oración. Este módulo redacta esas
+respuestas con plantillas deterministas (moneda, período, participación y
+variación entre dos períodos) y el stream las emite como tokens al instante.
+
+Es conservador: retorna None —y la narrativa la escribe Claude— si la
+pregunta pide análisis ("por qué", "recomendá"...), si alguna columna no se
+reconoce, si la moneda de un monto no es inequívoca o si el resultado supera
+el umbral de complejidad (filas configurables, NARRATIVA_PLANTILLA_MAX_METRICAS
+columnas numéricas, una sola dimensión).
+"""
+
+import re
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.constants import NARRATIVA_PLANTILLA_MAX_METRICAS
+from app.core.logger import get_logger
+from app.services.informe.formatters import _fmt_delta, _fmt_pct, _fmt_usd, _fmt_uyu
+
+logger = get_logger(__name__)
+
+# Preguntas que piden interpretación: siempre van a Claude
+_PALABRAS_ANALITICAS = (
+    "por qué", "por que", "porqué", "explic", "analiz", "análisis", "analisis",
+    "recomend", "conviene", "deberí", "deberi", "proyec", "estrategia", "evalu",
+    "opin", "tendencia", "sugier", "interpret", "riesgo", "mejorar", "conclus",
+)
+
+_MESES = {
+    1: "enero", 2: "febrero", 3: "marzo", 4: "abril", 5: "mayo", 6: "junio",
+    7: "julio", 8: "agosto", 9: "septiembre", 10: "octubre", 11: "noviembre", 12: "diciembre",
+}
+
+_COLS_TEMPORALES = {"anio", "año", "year", "mes", "month", "trimestre", "semestre", "periodo", "fecha"}
+
+# Orden de detección: la moneda explícita va primero ("variacion_uyu" es un
+# monto, no un porcentaje), "total_operaciones" es conteo. Un "monto" sin
+# moneda en el nombre toma la moneda del SQL o de la pregunta (_moneda_contexto)
+_TIPOS_POR_NOMBRE = (
+    ("usd", ("usd", "dolarizado", "dolares")),
+    ("uyu", ("uyu", "pesificado", "pesos")),
+    ("pct", ("pct", "porcentaje", "rentabilidad", "margen", "participacion", "variacion")),
+    ("cantidad", ("cantidad", "count", "operaciones", "ops", "cant_", "clientes", "proveedores")),
+    ("monto", (
+        "monto", "total", "ingreso", "gasto", "neto", "resultado",
+        "retiro", "distribu", "factur", "ticket", "promedio", "suma", "sum", "importe", "capital",
+    )),
+)
+
+# Columnas de monto por moneda que puede leer el SQL, y menciones en la pregunta
+_RE_SQL_USD = re.compile(r"\b(?:total_dolarizado|monto_usd)\b", re.IGNORECASE)
+_RE_SQL_UYU = re.compile(r"\b(?:total_pesificado|monto_uyu)\b", re.IGNORECASE)
+_RE_PREGUNTA_USD = re.compile(r"\bd[oó]lar(?:es)?\b|\busd\b|\bu\$s\b|\bus\$")
+_RE_PREGUNTA_UYU = re.compile(r"\bpesos\b|\buyu\b")
+
+# Etiquetas de columna que no dicen de qué se habla: el tema sale de la pregunta
+_ETIQUETAS_GENERICAS = {"total", "suma", "sum", "monto", "valor", "cantidad", "count", "porcentaje", "resultado"}
+
+_TEMAS_PREGUNTA = (
+    ("capital de trabajo", "Capital de trabajo"),
+    ("rentabilidad", "Rentabilidad"),
+    ("margen", "Margen"),
+    ("factur", "Facturación"),
+    ("ingres", "Ingresos"),
+    ("gast", "Gastos"),
+    ("retir", "Retiros"),
+    ("distribu", "Distribuciones"),
+    ("ticket", "Ticket promedio"),
+    ("resultado", "Resultado neto"),
+    ("operaciones", "Operaciones"),
+)
+
+# "¿Cuántas operaciones...?": un COUNT(*) AS total es conteo, no pesos
+_RE_PREGUNTA_CONTEO = re.compile(r"\bcu[aá]nt[oa]s\b|\bcantidad\b|\bn[uú]mero de\b")
+_RE_ANIO = re.compile(r"\b(20\d{2})\b")
+_RE_MES = re.compile(r"\b(" + "|".join(list(_MESES.values()) + ["setiembre"]) + r")\b")
+_PERIODOS_RELATIVOS = ("este año", "este mes", "año pasado", "mes pasado", "este trimestre", "este semestre")
+
+
+# ══════════════════════════════════════════════════════════════
+# CLASIFICACIÓN
+# ══════════════════════════════════════════════════════════════
+
+def _es_numero(valor: Any) -> bool:
+    return isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool)
+
+
+def _tipo_columna(columna: str, valores: List[Any]) -> Optional[str]:
+    """'dimension', 'temporal', 'pct', 'usd', 'uyu', 'cantidad', 'monto' (sin moneda) o None."""
+    nombre = columna.lower()
+    presentes = [v for v in valores if v is not None]
+    if nombre in _COLS_TEMPORALES:
+        return "temporal"
+    if not presentes or not all(_es_numero(v) for v in presentes):
+        return "dimension" if all(isinstance(v, str) for v in presentes) else None
+    for tipo, claves in _TIPOS_POR_NOMBRE:
+        if any(clave in nombre for clave in claves):
+            return tipo
+    return None
+
+
+def _moneda_contexto(pregunta_lower: str, sql: Optional[str]) -> Optional[str]:
+    """
+    Moneda de los montos sin moneda en el nombre: 'usd', 'uyu' o None si es ambigua.
+
+    Sale de las columnas de monto que lee el SQL y de la pregunta ("en dólares").
+    Señales que se contradicen (SQL pesificado, pregunta en dólares) son ambiguas;
+    sin SQL ni mención en la pregunta vale la moneda del sistema (pesos).
+    """
+    monedas = set()
+    if sql is not None:
+        if _RE_SQL_USD.search(sql):
+            monedas.add("usd")
+        if _RE_SQL_UYU.search(sql):
+            monedas.add("uyu")
+        if not monedas:
+            return None
+    if _RE_PREGUNTA_USD.search(pregunta_lower):
+        monedas.add("usd")
+    if _RE_PREGUNTA_UYU.search(pregunta_lower):
+        monedas.add("uyu")
+    if not monedas:
+        return "uyu"
+    return monedas.pop() if len(monedas) == 1 else None
+
+
+def _etiqueta(columna: str) -> str:
+    etiqueta = columna.lower()
+    for sufijo in ("_uyu", "_usd", "_pesificado", "_dolarizado", "_pesos", "_dolares", "_pct"):
+        etiqueta = etiqueta.replace(sufijo, "")
+    return etiqueta.replace("_", " ").strip()
+
+
+def _tema_pregunta(pregunta_lower: str) -> Optional[str]:
+    return next((tema for clave, tema in _TEMAS_PREGUNTA if clave in pregunta_lower), None)
+
+
+def _periodo_pregunta(pregunta_lower: str) -> str:
+    """Período mencionado en la pregunta ('marzo 2025', '2024', 'este año') o ''."""
+    relativo = next((p for p in _PERIODOS_RELATIVOS if p in pregunta_lower), None)
+    if relativo:
+        return relativo
+    mes = _RE_MES.search(pregunta_lower)
+    anios = _RE_ANIO.findall(pregunta_lower)
+    partes = ([mes.group(1)] if mes else []) + anios[:1]
+    if len(anios) > 1:
+        return f"{anios[0]} y {anios[1]}"
+    return " ".join(partes)
+
+
+def _formatear(tipo: str, valor: Any) -> str:
+    if valor is None:
+        return "sin dato"
+    if tipo == "uyu":
+        return _fmt_uyu(valor)
+    if tipo == "usd":
+        return _fmt_usd(valor)
+    if tipo == "pct":
+        return _fmt_pct(valor)
+    return f"{int(round(float(valor))):,}".replace(",", ".")
+
+
+def _formatear_dimension(columna: str, valor: Any) -> str:
+    if _es_numero(valor) and float(valor).is_integer():
+        # Un mes numérico se nombra; años y trimestres quedan como número
+        if columna.lower() in ("mes", "month") and 1 <= int(valor) <= 12:
+            return _MESES[int(valor)]
+        return str(int(valor))
+    return str(valor)
+
+
+# ══════════════════════════════════════════════════════════════
+# PLANTILLAS
+# ══════════════════════════════════════════════════════════════
+
+def _titulo(etiqueta: str, tema: Optional[str], periodo: str) -> str:
+    base = tema if (etiqueta in _ETIQUETAS_GENERICAS and tema) else etiqueta.capitalize()
+    return f"{base} {periodo}".strip()
+
+
+def _plantilla_fila_unica(fila: Dict[str, Any], metricas: Dict[str, str], tema: Optional[str], periodo: str) -> str:
+    if len(metricas) == 1:
+        columna, tipo = next(iter(metricas.items()))
+        return f"**{_titulo(_etiqueta(columna), tema, periodo)}:** {_formatear(tipo, fila.get(columna))}"
+
+    encabezado = f"**{(tema or 'Resultado')} {periodo}**".replace(" **", "**")
+    lineas = [encabezado, ""]
+    lineas.extend(
+        f"- {_etiqueta(columna).capitalize()}: {_formatear(tipo, fila.get(columna))}"
+        for columna, tipo in metricas.items()
+    )
+    return "\n".join(lineas)
+
+
+def _plantilla_por_dimension(
+    datos: List[Dict[str, Any]],
+    dimension: str,
+    tipo_dimension: str,
+    metricas: Dict[str, str],
+    tema: Optional[str],
+    periodo: str,
+) -> str:
+    principal, tipo_principal = next(iter(metricas.items()))
+    valores = [fila.get(principal) for fila in datos]
+    sumable = tipo_principal in ("uyu", "usd", "cantidad") and all(
+        v is not None and float(v) >= 0 for v in valores
+    )
+    total = sum(float(v) for v in valores) if sumable else None
+
+    titulo = _titulo(_etiqueta(principal), tema, "")
+    sufijo_periodo = f" ({periodo})" if periodo else ""
+    lineas = [f"**{titulo} por {_etiqueta(dimension)}{sufijo_periodo}:**", ""]
+
+    for fila in datos:
+        partes = [
+            f"{_formatear(tipo, fila.get(columna))}" if columna == principal
+            else f"{_etiqueta(columna)}: {_formatear(tipo, fila.get(columna))}"
+            for columna, tipo in metricas.items()
+        ]
+        if total:
+            partes[0] += f" ({_fmt_pct(float(fila.get(principal)) * 100.0 / total)})"
+        lineas.append(f"- {_formatear_dimension(dimension, fila.get(dimension))}: {' | '.join(partes)}")
+
+    if total is not None and len(datos) > 1:
+        lineas.extend(["", f"**Total:** {_formatear(tipo_principal, total)}"])
+
+    # Comparación entre dos períodos: variación del segundo contra el primero
+    if tipo_dimension == "temporal" and len(datos) == 2 and valores[0] not in (None, 0) and valores[1] is not None:
+        anterior, actual = float(valores[0]), float(valores[1])
+        if tipo_principal == "pct":
+            variacion = _fmt_delta(actual - anterior)
+        else:
+            variacion = (
+                f"{_fmt_delta((actual - anterior) * 100.0 / abs(anterior), es_porcentaje=True)} "
+                f"({_formatear(tipo_principal, abs(actual - anterior))})"
+            )
+        desde = _formatear_dimension(dimension, datos[0].get(dimension))
+        hasta = _formatear_dimension(dimension, datos[1].get(dimension))
+        lineas.append(f"**Variación {desde} → {hasta}:** {variacion}")
+
+    return "\n".join(lineas)
+
+
+def renderizar_narrativa_simple(
+    pregunta: str,
+    datos: List[Dict[str, Any]],
+    max_filas: Optional[int] = None,
+    sql: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Redacta la respuesta sin Claude si el resultado es simple.
+
+    Args:
+        pregunta: Pregunta del usuario (tema, período y moneda).
+        datos: Filas devueltas por el SQL.
+        sql: SQL ejecutado; define la moneda de los montos sin moneda en el nombre.
+        max_filas: Umbral de filas (default: settings.cfo_narrativa_plantilla_max_filas; 0 desactiva).
+
+    Returns:
+        Texto markdown listo para emitir, o None si la narrativa debe escribirla Claude.
+    """
+    max_filas = settings.cfo_narrativa_plantilla_max_filas if max_filas is None else max_filas
+    pregunta_lower = (pregunta or "").lower()
+    if max_filas <= 0 or len(datos) > max_filas:
+        return None
+    if any(palabra in pregunta_lower for palabra in _PALABRAS_ANALITICAS):
+        return None
+
+    periodo = _periodo_pregunta(pregunta_lower)
+    if not datos:
+        sufijo = f" para {periodo}" if periodo else ""
+        return f"No hay operaciones registradas que coincidan con la consulta{sufijo}."
+
+    columnas = list(datos[0].keys())
+    tipos = {columna: _tipo_columna(columna, [fila.get(columna) for fila in datos]) for columna in columnas}
+    if None in tipos.values():
+        return None
+    if _RE_PREGUNTA_CONTEO.search(pregunta_lower):
+        for columna, tipo in tipos.items():
+            valores = [fila.get(columna) for fila in datos if fila.get(columna) is not None]
+            if tipo == "monto" and _etiqueta(columna) in _ETIQUETAS_GENERICAS and all(
+                float(v).is_integer() for v in valores
+            ):
+                tipos[columna] = "cantidad"
+    if "monto" in tipos.values():
+        moneda = _moneda_contexto(pregunta_lower, sql)
+        if moneda is None:
+            return None
+        tipos = {columna: moneda if tipo == "monto" else tipo for columna, tipo in tipos.items()}
+
+    metricas = {c: t for c, t in tipos.items() if t not in ("dimension", "temporal")}
+    dimensiones = [c for c, t in tipos.items() if t in ("dimension", "temporal")]
+    if not metricas or len(metricas) > NARRATIVA_PLANTILLA_MAX_METRICAS:
+        return None
+
+    tema = _tema_pregunta(pregunta_lower)
+    if not dimensiones and len(datos) == 1:
+        return _plantilla_fila_unica(datos[0], metricas, tema, periodo)
+    if len(dimensiones) == 1:
+        return _plantilla_por_dimension(datos, dimensiones[0], tipos[dimensiones[0]], metricas, tema, periodo)
+    return None
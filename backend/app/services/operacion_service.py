@@ -12,6 +12,7 @@ from app.models import Operacion, TipoOperacion, Moneda, Localidad, Distribucion
 from app.models.cliente import Cliente
 from app.models.proveedor import Proveedor
 from app.schemas.operacion import IngresoCreate, GastoCreate, RetiroCreate, DistribucionCreate
+from app.services.rollup_operaciones import sumar_operacion
 
 
 def _buscar_o_crear_cliente(
@@ -106,6 +107,7 @@ def _crear_operacion_base(
         )
         
         db.add(operacion)
+        sumar_operacion(db, operacion)
         db.commit()
         db.refresh(operacion)
         return operacion
@@ -215,6 +217,7 @@ def crear_retiro(db: Session, data: RetiroCreate) -> Operacion:
         )
         
         db.add(operacion)
+        sumar_operacion(db, operacion)
         db.commit()
         db.refresh(operacion)
         return operacion
@@ -308,6 +311,7 @@ def crear_distribucion(db: Session, data: DistribucionCreate) -> Operacion:
                 )
                 db.add(detalle)
         
+        sumar_operacion(db, operacion)
         db.commit()
         db.refresh(operacion)
         return operacion
@@ -0,0 +1,137 @@
+"""
+Planificador de etapas del pipeline CFO - Sistema CFO Inteligente
+
+Permite solapar etapas independientes del chat SSE:
+- metadatos temporales y contexto conversacional mientras se clasifica la pregunta
+- query de control canónica mientras se streamea la narrativa
+- persistencia de mensajes en segundo plano (el evento done no la espera)
+
+Cada etapa corre en el threadpool. Las que se solapan con otras usan su propia
+sesión de BD (una Session de SQLAlchemy no admite uso concurrente).
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.database import AnalyticsSessionLocal, SessionLocal
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Referencias fuertes a tareas en curso: la persistencia lanzada después del
+# done sigue hasta terminar aunque el generador SSE ya se haya cerrado.
+_TAREAS_VIVAS: Set[asyncio.Task] = set()
+
+
+def ejecutar_con_sesion_propia(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Ejecuta func(db, *args, **kwargs) con una sesión nueva que se cierra al terminar."""
+    db = SessionLocal()
+    try:
+        return func(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+def ejecutar_con_sesion_analitica(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Como ejecutar_con_sesion_propia, con una sesión read-only del pool analítico."""
+    db = AnalyticsSessionLocal()
+    try:
+        return func(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+class PlanificadorEtapas:
+    """Lanza etapas como tareas async y permite esperarlas por nombre."""
+
+    def __init__(self):
+        self._tareas: Dict[str, asyncio.Task] = {}
+        self.tiempos: Dict[str, float] = {}
+
+    def lanzar(
+        self,
+        nombre: str,
+        func: Callable[..., Any],
+        *args,
+        sesion_propia: bool = False,
+        depende_de: Optional[Iterable[str]] = None,
+        **kwargs,
+    ) -> asyncio.Task:
+        """
+        Programa una etapa en el threadpool.
+
+        Args:
+            nombre: Identificador de la etapa (para esperarla después).
+            func: Función bloqueante a ejecutar.
+            sesion_propia: True para inyectar una sesión nueva como primer argumento.
+            depende_de: Etapas que deben terminar antes (con o sin error).
+        """
+        previas = [self._tareas[n] for n in (depende_de or []) if n in self._tareas]
+        tarea = asyncio.create_task(
+            self._correr(nombre, func, args, kwargs, sesion_propia, previas),
+            name=f"cfo-etapa-{nombre}",
+        )
+        self._tareas[nombre] = tarea
+        _TAREAS_VIVAS.add(tarea)
+        tarea.add_done_callback(_TAREAS_VIVAS.discard)
+        return tarea
+
+    async def _correr(
+        self,
+        nombre: str,
+        func: Callable[..., Any],
+        args: tuple,
+        kwargs: dict,
+        sesion_propia: bool,
+        previas: list,
+    ) -> Any:
+        if previas:
+            await asyncio.gather(*previas, return_exceptions=True)
+        inicio = time.monotonic()
+        try:
+            if sesion_propia:
+                return await run_in_threadpool(ejecutar_con_sesion_propia, func, *args, **kwargs)
+            return await run_in_threadpool(func, *args, **kwargs)
+        finally:
+            self.tiempos[nombre] = round(time.monotonic() - inicio, 4)
+            logger.debug(f"Etapa '{nombre}' terminó en {self.tiempos[nombre] * 1000:.1f}ms")
+
+    def lanzada(self, nombre: str) -> bool:
+        """True si la etapa fue programada."""
+        return nombre in self._tareas
+
+    async def resultado(self, nombre: str, default: Any = None) -> Any:
+        """Espera la etapa y retorna su resultado (default si no fue lanzada). Propaga errores."""
+        tarea = self._tareas.get(nombre)
+        if tarea is None:
+            return default
+        return await tarea
+
+    def cancelar_pendientes(self) -> list[str]:
+        """
+        Cancela las etapas que no terminaron (p.ej. el cliente se desconectó).
+
+        Una etapa que todavía espera a sus dependencias no llega a ejecutarse;
+        una que ya corre en el threadpool termina su hilo pero su resultado se descarta.
+
+        Returns:
+            Nombres de las etapas canceladas.
+        """
+        canceladas = [nombre for nombre, tarea in self._tareas.items() if not tarea.done()]
+        for nombre in canceladas:
+            self._tareas[nombre].cancel()
+        return canceladas
+
+    async def esperar_pendientes(self) -> None:
+        """Espera todas las etapas; errores y etapas canceladas no se propagan."""
+        for nombre, tarea in list(self._tareas.items()):
+            # wait no cancela la tarea si se cancela quien espera (como shield)
+            await asyncio.wait([tarea])
+            if tarea.cancelled():
+                continue
+            exc = tarea.exception()
+            if exc is not None:
+                logger.error(f"Etapa '{nombre}' falló: {exc}", exc_info=exc)
@@ -0,0 +1,390 @@
+"""
+Plantillas SQL parametrizadas para intenciones analíticas recurrentes - Sistema CFO Inteligente
+
+Totales de un período, aperturas por área/localidad/moneda, evolución mes a
+mes y rankings de clientes/proveedores se repiten todo el tiempo, y
+ClaudeSQLGenerator escribía el SQL desde cero cada vez. Acá cada intención es
+una plantilla revisada con huecos (slots) que se llenan desde la pregunta:
+
+- periodo: año, trimestre o mes, explícito o relativo a hoy ("este mes",
+  "el año pasado"); sin período, el año actual (misma regla que el prompt)
+- tipo: facturación/ingresos, gastos, retiros, distribuciones
+- filtros: área, localidad, moneda de origen ("solo en dólares")
+- moneda de los montos ("en dólares": solo total_dolarizado)
+- top N de los rankings
+
+SQLRouter prueba las plantillas después de los atajos de cache y seguimiento
+y antes de llamar al modelo (metodo='plantilla'). Igual que en
+seguimiento_sql, una pregunta entra solo si, quitando los fragmentos
+reconocidos, quedan palabras de relleno; cualquier otra palabra ("promedio",
+"rentabilidad", ...) la manda al modelo.
+
+Los literales salen de diccionarios fijos, nunca del texto del usuario. Cada
+plantilla declara los índices que puede usar su plan: los rangos de fecha se
+escriben sargables (fecha >= 'desde' AND fecha < 'hasta') y
+tests/test_plantillas_sql.py verifica con EXPLAIN que alguno aparece.
+"""
+
+import re
+from dataclasses import asdict, dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.logger import get_logger
+from app.services.seguimiento_sql import _AREAS, _MESES, _MONEDAS, _normalizar
+
+logger = get_logger(__name__)
+
+_TOP_N_DEFAULT = 10
+_TOP_N_MAXIMO = 100
+
+_TRIMESTRES = {"primer": 1, "1er": 1, "segundo": 2, "2do": 2, "tercer": 3, "3er": 3, "cuarto": 4, "4to": 4}
+_DIMENSIONES = {
+    "area": "area", "areas": "area",
+    "localidad": "localidad", "localidades": "localidad", "oficina": "localidad", "oficinas": "localidad",
+    "sede": "localidad", "sedes": "localidad",
+    "moneda": "moneda", "monedas": "moneda",
+    "mes": "mes", "meses": "mes",
+    "cliente": "cliente", "clientes": "cliente",
+    "proveedor": "proveedor", "proveedores": "proveedor",
+}
+_TIPO_POR_DIMENSION = {"cliente": "INGRESO", "proveedor": "GASTO"}
+
+_RELLENO = frozenset({
+    "cuanto", "cuanta", "cuantos", "cuantas", "cual", "cuales", "que", "quien", "quienes",
+    "el", "la", "los", "las", "lo", "un", "una", "de", "del", "en", "a", "al", "y", "para", "con",
+    "durante", "fue", "fueron", "es", "son", "se", "hubo", "hay", "tuvimos", "tenemos", "hicimos",
+    "total", "totales", "monto", "montos", "importe", "suma", "mostrame", "dame", "decime", "ver",
+    "quiero", "saber", "nuestros", "nuestras", "nos", "estudio", "firma", "area", "oficina", "sede",
+    "ano", "mes", "trimestre", "por", "evolucion", "apertura", "desglose", "detalle", "periodo",
+})
+
+_PERIODO_RELATIVO = {"este": 0, "actual": 0, "curso": 0, "va": 0, "pasado": -1, "anterior": -1}
+
+# (patrón, slot) en orden: cada fragmento reconocido se quita antes del siguiente patrón
+_PATRONES: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"\b(" + "|".join(_AREAS) + r")\b"), "area"),
+    (re.compile(
+        r"\b(" + "|".join(_TRIMESTRES) + r") trimestre(?: (?:de |del )?(?:ano )?(20\d{2}))?\b"
+    ), "trimestre"),
+    (re.compile(r"\b(?:trimestre |q)([1-4])(?: (?:de |del )?(?:ano )?(20\d{2}))?\b"), "trimestre"),
+    (re.compile(r"\b(" + "|".join(_MESES) + r")(?: (?:de |del )?(?:ano )?(20\d{2}))?\b"), "mes"),
+    (re.compile(r"\b(este) (ano|mes|trimestre)\b"), "relativo"),
+    (re.compile(r"\b(ano|mes|trimestre) (actual|en curso|pasado|anterior)\b"), "relativo"),
+    (re.compile(r"\ben lo que (va) del (ano|mes|trimestre)\b"), "relativo"),
+    (re.compile(r"\b(20\d{2})\b"), "anio"),
+    (re.compile(r"\btop (\d{1,3})\b"), "top"),
+    (re.compile(r"\b(\d{1,3}) (?=(?:principales |mayores |mejores )?(?:clientes|proveedores|areas)\b)"), "top"),
+    (re.compile(r"\b(?:top|ranking|principales|mayores|mejores|mas)\b"), "ranking"),
+    (re.compile(r"\b(?:por|cada) (" + "|".join(_DIMENSIONES) + r")\b"), "dimension"),
+    (re.compile(r"\b(mensual|mensuales|mes a mes)\b"), "mensual"),
+    (re.compile(r"\b(clientes|proveedores|areas|localidades|oficinas)\b"), "dimension"),
+    (re.compile(r"\bsolo (?:en |lo cobrado en |operaciones en )?(dolares|usd|pesos|uyu)\b"), "moneda_origen"),
+    (re.compile(r"\ben (dolares|usd|pesos|uyu)\b"), "moneda"),
+    (re.compile(r"\b(montevideo|mercedes)\b"), "localidad"),
+    (re.compile(r"\b(?:factur|ingres|cobr)\w*\b"), "INGRESO"),
+    (re.compile(r"\b(?:gast|egres)\w*\b"), "GASTO"),
+    (re.compile(r"\bretir\w*\b"), "RETIRO"),
+    (re.compile(r"\b(?:distribuciones|distribuimos|distribuido|distribuidos|distribuyo)\b"), "DISTRIBUCION"),
+]
+
+
+@dataclass
+class Slots:
+    """Huecos de una plantilla llenados desde la pregunta (hasta es exclusivo)."""
+
+    tipo: Optional[str] = None
+    desde: Optional[date] = None
+    hasta: Optional[date] = None
+    area: Optional[str] = None
+    localidad: Optional[str] = None
+    moneda_origen: Optional[str] = None
+    moneda: Optional[str] = None
+    top_n: Optional[int] = None
+    ranking: bool = False
+    dimension: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class PlantillaSQL:
+    """Intención analítica: dimensión, tipos que admite, índices válidos para su plan y pregunta de ejemplo."""
+
+    nombre: str
+    dimension: Optional[str]
+    tipos: Tuple[str, ...]
+    indices: Tuple[str, ...]
+    ejemplo: str
+
+
+# ══════════════════════════════════════════════════════════════
+# EXTRACCIÓN DE SLOTS
+# ══════════════════════════════════════════════════════════════
+
+def _periodo_mes(anio: int, mes: int) -> Tuple[date, date]:
+    fin = date(anio + 1, 1, 1) if mes == 12 else date(anio, mes + 1, 1)
+    return date(anio, mes, 1), fin
+
+
+def _periodo_trimestre(anio: int, trimestre: int) -> Tuple[date, date]:
+    return date(anio, 3 * trimestre - 2, 1), _periodo_mes(anio, 3 * trimestre)[1]
+
+
+def _periodo_relativo(unidad: str, desplazamiento: int, hoy: date) -> Tuple[date, date]:
+    if unidad == "ano":
+        anio = hoy.year + desplazamiento
+        return date(anio, 1, 1), date(anio + 1, 1, 1)
+    meses = 3 if unidad == "trimestre" else 1
+    # Meses absolutos (año * 12 + mes - 1) del inicio del período actual, desplazado
+    inicio = hoy.year * 12 + (hoy.month - 1) // meses * meses + desplazamiento * meses
+    fin = inicio + meses
+    return date(inicio // 12, inicio % 12 + 1, 1), date(fin // 12, fin % 12 + 1, 1)
+
+
+def _asignar(slots: Slots, campo: str, valor: Any) -> bool:
+    """Asigna un slot; False si ya tenía otro valor (pregunta ambigua)."""
+    actual = getattr(slots, campo)
+    if actual is not None and actual != valor:
+        return False
+    setattr(slots, campo, valor)
+    return True
+
+
+def _aplicar(slots: Slots, slot: str, m: re.Match, hoy: date) -> bool:
+    if slot in ("INGRESO", "GASTO", "RETIRO", "DISTRIBUCION"):
+        return _asignar(slots, "tipo", slot)
+    if slot == "area":
+        return _asignar(slots, "area", _AREAS[m.group(1)])
+    if slot == "localidad":
+        return _asignar(slots, "localidad", m.group(1).upper())
+    if slot in ("moneda", "moneda_origen"):
+        return _asignar(slots, slot, _MONEDAS[m.group(1)])
+    if slot == "top":
+        n = int(m.group(1))
+        slots.ranking = True
+        return 0 < n <= _TOP_N_MAXIMO and _asignar(slots, "top_n", n)
+    if slot == "ranking":
+        slots.ranking = True
+        return True
+    if slot == "dimension":
+        return _asignar(slots, "dimension", _DIMENSIONES[m.group(1)])
+    if slot == "mensual":
+        return _asignar(slots, "dimension", "mes")
+
+    if slot == "anio":
+        periodo = (date(int(m.group(1)), 1, 1), date(int(m.group(1)) + 1, 1, 1))
+    elif slot == "trimestre":
+        trimestre = _TRIMESTRES.get(m.group(1)) or int(m.group(1))
+        periodo = _periodo_trimestre(int(m.group(2) or hoy.year), trimestre)
+    elif slot == "mes":
+        periodo = _periodo_mes(int(m.group(2) or hoy.year), _MESES[m.group(1)])
+    else:
+        # relativo: ("este", "mes") o ("mes", "pasado")
+        primero, segundo = m.group(1), m.group(2)
+        if primero in _PERIODO_RELATIVO:
+            primero, segundo = segundo, primero
+        periodo = _periodo_relativo(primero, _PERIODO_RELATIVO[segundo.split()[-1]], hoy)
+    return _asignar(slots, "desde", periodo[0]) and _asignar(slots, "hasta", periodo[1])
+
+
+def extraer_slots(pregunta: str, hoy: Optional[date] = None) -> Optional[Slots]:
+    """
+    Slots de la pregunta, o None si tiene algo que ninguna plantilla cubre.
+
+    "top 5 clientes de 2025" -> Slots(dimension='cliente', top_n=5, desde=2025-01-01, ...)
+    "gastos de Mercedes en marzo" -> Slots(tipo='GASTO', localidad='MERCEDES', desde=<marzo>)
+    """
+    hoy = hoy or date.today()
+    texto = _normalizar(pregunta)
+    slots = Slots()
+    for patron, slot in _PATRONES:
+        for m in patron.finditer(texto):
+            if not _aplicar(slots, slot, m, hoy):
+                return None
+        texto = patron.sub(" ", texto)
+
+    if any(palabra not in _RELLENO for palabra in texto.split()):
+        return None
+    if slots.desde is None:
+        slots.desde, slots.hasta = date(hoy.year, 1, 1), date(hoy.year + 1, 1, 1)
+    if slots.dimension in _TIPO_POR_DIMENSION and not _asignar(
+        slots, "tipo", _TIPO_POR_DIMENSION[slots.dimension]
+    ):
+        return None
+    return slots
+
+
+# ══════════════════════════════════════════════════════════════
+# PLANTILLAS
+# ══════════════════════════════════════════════════════════════
+
+# La clave única del rollup también empieza por fecha: cualquiera de los dos sirve al rango
+_INDICES_ROLLUP = ("idx_operaciones_diarias_fecha", "uq_operaciones_diarias_clave")
+_INDICES_OPERACIONES = ("idx_operaciones_deleted_fecha",)
+_TIPOS_CON_AREA = ("INGRESO", "GASTO")
+_TODOS_LOS_TIPOS = ("INGRESO", "GASTO", "RETIRO", "DISTRIBUCION")
+
+PLANTILLAS: Tuple[PlantillaSQL, ...] = (
+    PlantillaSQL("total_periodo", None, _TODOS_LOS_TIPOS, _INDICES_ROLLUP,
+                 "¿Cuánto facturamos en el primer trimestre de 2025?"),
+    PlantillaSQL("apertura_area", "area", _TIPOS_CON_AREA, _INDICES_ROLLUP,
+                 "Gastos por área en 2025"),
+    PlantillaSQL("apertura_localidad", "localidad", _TODOS_LOS_TIPOS, _INDICES_ROLLUP,
+                 "Facturación por localidad del año pasado"),
+    PlantillaSQL("apertura_moneda", "moneda", _TODOS_LOS_TIPOS, _INDICES_ROLLUP,
+                 "Ingresos por moneda en marzo 2025"),
+    PlantillaSQL("evolucion_mensual", "mes", _TODOS_LOS_TIPOS, _INDICES_ROLLUP,
+                 "Evolución mensual de la facturación 2025 en dólares"),
+    PlantillaSQL("ranking_clientes", "cliente", ("INGRESO",), _INDICES_OPERACIONES,
+                 "Top 5 clientes de 2025"),
+    PlantillaSQL("ranking_proveedores", "proveedor", ("GASTO",), _INDICES_OPERACIONES,
+                 "¿Cuáles son los 10 principales proveedores de este año?"),
+)
+
+# Columna agrupada de cada apertura (sobre operaciones_diarias od / areas a)
+_COLUMNA_DIMENSION = {
+    "area": "a.nombre AS area",
+    "localidad": "od.localidad",
+    "moneda": "od.moneda_original AS moneda",
+}
+_GRUPO_DIMENSION = {"area": "a.nombre", "localidad": "od.localidad", "moneda": "od.moneda_original"}
+
+
+def _montos(slots: Slots, alias: str) -> List[str]:
+    columnas = []
+    if slots.moneda != "USD":
+        columnas.append(f"SUM({alias}.total_pesificado) AS total_uyu")
+    if slots.moneda != "UYU":
+        columnas.append(f"SUM({alias}.total_dolarizado) AS total_usd")
+    return columnas
+
+
+def _orden(slots: Slots) -> str:
+    return "total_usd" if slots.moneda == "USD" else "total_uyu"
+
+
+def _condiciones(slots: Slots, alias: str) -> List[str]:
+    condiciones = [
+        f"{alias}.tipo_operacion = '{slots.tipo}'",
+        f"{alias}.fecha >= '{slots.desde.isoformat()}'",
+        f"{alias}.fecha < '{slots.hasta.isoformat()}'",
+    ]
+    if slots.area:
+        condiciones.append(f"a.nombre = '{slots.area}'")
+    if slots.localidad:
+        condiciones.append(f"{alias}.localidad = '{slots.localidad}'")
+    if slots.moneda_origen:
+        condiciones.append(f"{alias}.moneda_original = '{slots.moneda_origen}'")
+    return condiciones
+
+
+def _armar(
+    columnas: List[str],
+    tabla: str,
+    condiciones: List[str],
+    grupo: Optional[str] = None,
+    orden: Optional[str] = None,
+    limite: Optional[int] = None,
+) -> str:
+    lineas = ["SELECT " + ",\n       ".join(columnas), f"FROM {tabla}"]
+    lineas.append("WHERE " + "\n  AND ".join(condiciones))
+    if grupo:
+        lineas.append(f"GROUP BY {grupo}")
+    if orden:
+        lineas.append(f"ORDER BY {orden}")
+    if limite:
+        lineas.append(f"LIMIT {limite}")
+    return "\n".join(lineas)
+
+
+def construir_sql(plantilla: PlantillaSQL, slots: Slots) -> str:
+    """SQL de la plantilla con los slots ya validados por elegir_plantilla."""
+    if plantilla.dimension in ("cliente", "proveedor"):
+        columna = f"o.{plantilla.dimension}"
+        condiciones = ["o.deleted_at IS NULL"] + _condiciones(slots, "o") + [
+            f"{columna} IS NOT NULL",
+            f"{columna} <> ''",
+        ]
+        tabla = "operaciones o"
+        if slots.area:
+            tabla += "\nJOIN areas a ON a.id = o.area_id"
+        return _armar(
+            [columna] + _montos(slots, "o") + ["COUNT(*) AS cantidad_operaciones"],
+            tabla,
+            condiciones,
+            grupo=columna,
+            orden=f"{_orden(slots)} DESC",
+            limite=slots.top_n or _TOP_N_DEFAULT,
+        )
+
+    tabla = "operaciones_diarias od"
+    if slots.area or plantilla.dimension == "area":
+        tabla += "\nJOIN areas a ON a.id = od.area_id"
+    condiciones = _condiciones(slots, "od")
+
+    if plantilla.dimension is None:
+        return _armar(_montos(slots, "od"), tabla, condiciones)
+    if plantilla.dimension == "mes":
+        return _armar(
+            [
+                "EXTRACT(MONTH FROM od.fecha)::INTEGER AS mes",
+                "TO_CHAR(MIN(od.fecha), 'TMMonth') AS nombre_mes",
+            ] + _montos(slots, "od"),
+            tabla,
+            condiciones,
+            grupo="EXTRACT(MONTH FROM od.fecha)",
+            orden="mes",
+        )
+    return _armar(
+        [_COLUMNA_DIMENSION[plantilla.dimension]] + _montos(slots, "od"),
+        tabla,
+        condiciones,
+        grupo=_GRUPO_DIMENSION[plantilla.dimension],
+        orden=f"{_orden(slots)} DESC",
+        limite=slots.top_n,
+    )
+
+
+def elegir_plantilla(slots: Slots) -> Optional[PlantillaSQL]:
+    """Plantilla que cubre los slots, o None si la combinación no tiene plantilla."""
+    if slots.tipo is None:
+        return None
+    if slots.area and slots.tipo not in _TIPOS_CON_AREA:
+        return None
+    # EXTRACT(MONTH) agrupa bien solo dentro de un mismo año
+    if slots.dimension == "mes" and slots.hasta > date(slots.desde.year + 1, 1, 1):
+        return None
+    if slots.ranking and slots.dimension in (None, "mes"):
+        return None
+    # "¿cuántos clientes tenemos?" no es un ranking: los de clientes/proveedores lo piden explícito
+    if slots.dimension in _TIPO_POR_DIMENSION and not slots.ranking:
+        return None
+    for plantilla in PLANTILLAS:
+        if plantilla.dimension == slots.dimension:
+            return plantilla if slots.tipo in plantilla.tipos else None
+    return None
+
+
+def resolver_plantilla(pregunta: str, hoy: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """
+    SQL de plantilla para la pregunta.
+
+    Returns:
+        {"sql", "plantilla", "indices", "slots"} o None si la pregunta va al modelo.
+    """
+    slots = extraer_slots(pregunta, hoy)
+    if slots is None:
+        return None
+    plantilla = elegir_plantilla(slots)
+    if plantilla is None:
+        return None
+    sql = construir_sql(plantilla, slots)
+    logger.debug(f"Plantilla SQL '{plantilla.nombre}' para: {pregunta[:70]}")
+    return {
+        "sql": sql,
+        "plantilla": plantilla.nombre,
+        "indices": plantilla.indices,
+        "slots": {
+            campo: valor.isoformat() if isinstance(valor, date) else valor
+            for campo, valor in asdict(slots).items() if valor not in (None, False)
+        },
+    }
@@ -0,0 +1,149 @@
+"""
+Presupuesto de tokens para los datos del prompt narrativo - Sistema CFO Inteligente
+
+post_procesar_resultado_sql formatea todas las filas: un listado de miles de
+filas metía decenas de miles de tokens en la llamada narrativa (latencia y
+costo proporcionales al resultado). Acá se estima el tamaño de datos +
+resumen pre-calculado y, si supera CFO_NARRATIVA_PRESUPUESTO_TOKENS, los
+datos se reemplazan por:
+- las primeras y últimas filas del resultado
+- las filas mayores por la columna principal (la de mayor suma)
+El resumen pre-calculado sigue cubriendo todas las filas, así que totales,
+subtotales y extremos no se pierden. La muestra se achica a la mitad hasta
+entrar en el presupuesto.
+
+La estimación es por caracteres (CARACTERES_POR_TOKEN): alcanza para acotar,
+no pretende contar tokens exactos.
+"""
+
+import heapq
+import json
+import math
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.constants import (
+    CARACTERES_POR_TOKEN,
+    COMPRESION_FILAS_FINAL,
+    COMPRESION_FILAS_INICIO,
+    COMPRESION_TOP_GRUPOS,
+)
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def estimar_tokens(texto: str) -> int:
+    """Tokens aproximados de un texto."""
+    return math.ceil(len(texto or "") / CARACTERES_POR_TOKEN)
+
+
+def _tokens_resumen(resumen: Optional[Dict[str, Any]]) -> int:
+    """Tokens del resumen tal como lo serializa el prompt narrativo."""
+    if not resumen or not resumen.get("sumas"):
+        return 0
+    return estimar_tokens(json.dumps(resumen, indent=2, ensure_ascii=False, default=str))
+
+
+def _valor(valor: Any) -> str:
+    if isinstance(valor, (float, Decimal)):
+        return f"{float(valor):.2f}"
+    return str(valor)
+
+
+def _formatear_filas(datos: List[Dict[str, Any]], indices: List[int]) -> List[str]:
+    return [
+        f"  {i + 1}. " + "  |  ".join(f"{col}: {_valor(v)}" for col, v in datos[i].items() if v is not None)
+        for i in indices
+    ]
+
+
+def _columna_principal(resumen: Optional[Dict[str, Any]]) -> Optional[str]:
+    sumas = (resumen or {}).get("sumas") or {}
+    if not sumas:
+        return None
+    return max(sumas.items(), key=lambda item: item[1])[0]
+
+
+def _texto_comprimido(
+    datos: List[Dict[str, Any]],
+    columna: Optional[str],
+    n_inicio: int,
+    n_final: int,
+    n_top: int,
+) -> Tuple[str, int]:
+    """Texto de la muestra y cantidad de filas distintas que incluye."""
+    total = len(datos)
+    inicio = list(range(min(n_inicio, total)))
+    final = list(range(max(len(inicio), total - n_final), total))
+    lineas = [
+        f"RESULTADO COMPRIMIDO: {total} filas en total, se muestra una muestra.",
+        "Los totales, subtotales y extremos de <resumen_precalculado> cubren TODAS las filas: usarlos para cifras globales.",
+        f"COLUMNAS: {', '.join(datos[0].keys())}",
+        "",
+        f"PRIMERAS {len(inicio)} FILAS:",
+        *_formatear_filas(datos, inicio),
+    ]
+    if final:
+        lineas += ["", f"ÚLTIMAS {len(final)} FILAS:", *_formatear_filas(datos, final)]
+
+    top: List[int] = []
+    if columna and n_top:
+        top = heapq.nlargest(
+            n_top, range(total), key=lambda i: float(datos[i].get(columna) or 0)
+        )
+        lineas += ["", f"MAYORES {len(top)} POR {columna}:", *_formatear_filas(datos, top)]
+    return "\n".join(lineas), len(set(inicio) | set(final) | set(top))
+
+
+def ajustar_datos_a_presupuesto(
+    datos: List[Dict[str, Any]],
+    datos_texto: str,
+    resumen: Optional[Dict[str, Any]] = None,
+    presupuesto_tokens: Optional[int] = None,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Acota los datos del prompt narrativo al presupuesto de tokens.
+
+    Args:
+        datos: Filas completas del resultado SQL.
+        datos_texto: Texto pre-formateado de todas las filas (post_procesar_resultado_sql).
+        resumen: Resumen pre-calculado (computar_resumen) que acompaña a los datos.
+        presupuesto_tokens: Máximo de datos + resumen (default: settings; 0 = sin límite).
+
+    Returns:
+        Tupla (texto para <financial_data>, metadatos de la compresión o None si no se aplicó).
+    """
+    presupuesto = settings.cfo_narrativa_presupuesto_tokens if presupuesto_tokens is None else presupuesto_tokens
+    tokens_resumen = _tokens_resumen(resumen)
+    tokens_originales = estimar_tokens(datos_texto) + tokens_resumen
+    if not presupuesto or not datos or tokens_originales <= presupuesto:
+        return datos_texto, None
+
+    columna = _columna_principal(resumen)
+    n_inicio, n_final, n_top = COMPRESION_FILAS_INICIO, COMPRESION_FILAS_FINAL, COMPRESION_TOP_GRUPOS
+    while True:
+        texto, filas_muestra = _texto_comprimido(datos, columna, n_inicio, n_final, n_top)
+        tokens = estimar_tokens(texto) + tokens_resumen
+        if tokens <= presupuesto or n_inicio <= 1:
+            break
+        n_inicio, n_final, n_top = max(1, n_inicio // 2), n_final // 2, n_top // 2
+    if tokens >= tokens_originales:
+        # Pocas filas muy anchas: la muestra no ahorra nada
+        return datos_texto, None
+
+    compresion = {
+        "aplicada": "resumen_y_muestra",
+        "filas_totales": len(datos),
+        "filas_muestra": filas_muestra,
+        "columna_top": columna if n_top else None,
+        "tokens_estimados_originales": tokens_originales,
+        "tokens_estimados": tokens,
+        "presupuesto_tokens": presupuesto,
+    }
+    logger.info(
+        f"Narrativa: datos comprimidos {tokens_originales} -> {tokens} tokens estimados "
+        f"({filas_muestra} de {len(datos)} filas)"
+    )
+    return texto, compresion
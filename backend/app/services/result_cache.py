@@ -0,0 +1,206 @@
+"""
+Cache de resultados SQL versionado por datos - Sistema CFO Inteligente
+
+Las consultas de lectura del CFO AI, los informes y las queries de control
+canónicas se repiten mucho (cierres de mes: los mismos agregados una y otra vez).
+Este módulo cachea las filas resultantes con una clave que combina:
+- el SQL normalizado (espacios colapsados, sin ';' final)
+- los parámetros bindeados
+- la identidad de la base (URL del engine)
+- las versiones de datos (data_versions) de las tablas versionadas que lee el SQL
+
+Las versiones las suben triggers en cada escritura de esas tablas, vengan de
+cualquier worker o de fuera de la app, así que una entrada vale hasta que
+cambian los datos que leyó. Leerlas es una query por clave primaria. El TTL
+acota la desactualización de SQL que solo lee tablas sin versionar.
+"""
+
+import hashlib
+import json
+import re
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.constants import (
+    RESULT_CACHE_MAX_ENTRADAS,
+    RESULT_CACHE_MAX_FILAS,
+    RESULT_CACHE_TTL_SEGUNDOS,
+)
+from app.core.logger import get_logger
+from app.services.ejecucion_acotada import ejecutar_acotado
+from app.services.sql_ast import parsear_sql
+from app.services.sql_cache import SQLCache
+from app.services.versiones_datos import TABLAS_VERSIONADAS, obtener_versiones_datos
+
+logger = get_logger(__name__)
+
+# SQL cuyo resultado depende del día en que se ejecuta
+_PATRON_SQL_DEPENDIENTE_FECHA = re.compile(
+    r"\b(?:CURRENT_DATE|CURRENT_TIMESTAMP|LOCALTIMESTAMP|NOW\s*\()", re.IGNORECASE
+)
+
+
+# ══════════════════════════════════════════════════════════════
+# CACHE DE RESULTADOS
+# ══════════════════════════════════════════════════════════════
+
+_cache = SQLCache(
+    max_entradas=RESULT_CACHE_MAX_ENTRADAS,
+    ttl_segundos=RESULT_CACHE_TTL_SEGUNDOS,
+)
+
+
+def normalizar_sql(sql: str) -> str:
+    """Colapsa espacios y quita el ';' final para que variantes de formato compartan clave."""
+    sql = re.sub(r"\s+", " ", sql or "").strip()
+    return sql.rstrip(";").strip()
+
+
+def _identidad_bd(db: Any) -> Optional[str]:
+    """
+    URL del engine al que está ligada la sesión, o None si no se puede cachear.
+
+    Solo se cachean sesiones SQLAlchemy reales: con dobles de test u objetos sin
+    bind resoluble se ejecuta siempre contra la base.
+    """
+    if not isinstance(db, Session):
+        return None
+    try:
+        bind = db.get_bind()
+    except Exception:
+        return None
+    url = getattr(bind, "url", None) or getattr(getattr(bind, "engine", None), "url", None)
+    return url.render_as_string(hide_password=True) if url is not None else None
+
+
+def tablas_versionadas_leidas(sql: str) -> List[str]:
+    """
+    Tablas versionadas que nombra el SQL. Cualquier mención cuenta (alias o
+    columna con el mismo nombre incluidos): de más solo invalida de más.
+    """
+    palabras = parsear_sql(sql).palabras
+    return [tabla for tabla in TABLAS_VERSIONADAS if tabla.upper() in palabras]
+
+
+def construir_clave_resultado(
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    identidad_bd: str = "",
+    versiones: Optional[Dict[str, int]] = None,
+    hoy: Optional[date] = None,
+    modo: str = "",
+) -> str:
+    """
+    Construye la clave de cache de un resultado SQL.
+
+    Args:
+        sql: Query a ejecutar.
+        params: Parámetros bindeados.
+        identidad_bd: Identificador de la base (URL sin password).
+        versiones: Versión de datos de cada tabla versionada que lee el SQL.
+        hoy: Fecha de referencia, solo se usa si el SQL depende del día.
+        modo: Variante de ejecución (p.ej. límite de filas); "" para la ejecución completa.
+    """
+    sql_normalizado = normalizar_sql(sql)
+    dependiente_fecha = bool(_PATRON_SQL_DEPENDIENTE_FECHA.search(sql_normalizado))
+    partes = [
+        identidad_bd,
+        json.dumps(versiones or {}, sort_keys=True),
+        (hoy or date.today()).isoformat() if dependiente_fecha else "",
+        sql_normalizado,
+        json.dumps(params or {}, sort_keys=True, default=str),
+    ]
+    if modo:
+        partes.append(modo)
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+
+def _servir_con_cache(
+    db: Session,
+    sql: str,
+    params: Optional[Dict[str, Any]],
+    ejecutar: Callable[[], Tuple[List[Dict[str, Any]], bool]],
+    modo: str = "",
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Sirve (filas, truncado) desde cache o ejecuta y guarda si el tamaño lo permite."""
+    identidad = _identidad_bd(db)
+    if identidad is None:
+        return ejecutar()
+
+    versiones = obtener_versiones_datos(db, tablas_versionadas_leidas(sql))
+    clave = construir_clave_resultado(sql, params, identidad, versiones=versiones, modo=modo)
+    cacheado = _cache.obtener(clave)
+    if cacheado is not None:
+        return [dict(fila) for fila in cacheado["filas"]], cacheado.get("truncado", False)
+
+    filas, truncado = ejecutar()
+
+    if len(filas) <= RESULT_CACHE_MAX_FILAS:
+        _cache.guardar(clave, {"filas": [dict(fila) for fila in filas], "truncado": truncado})
+    else:
+        logger.debug(f"Resultado de {len(filas)} filas excede el máximo cacheable")
+    return filas, truncado
+
+
+def ejecutar_con_cache(
+    db: Session,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Ejecuta una query de lectura sirviendo el resultado desde cache si no
+    cambiaron las versiones de datos de las tablas que lee.
+
+    Las excepciones de ejecución se propagan y nunca se cachean.
+
+    Returns:
+        Lista de filas como dicts (copias, el llamador puede mutarlas).
+    """
+    def ejecutar():
+        result = db.execute(text(sql), params or {})
+        return [dict(row._mapping) for row in result], False
+
+    filas, _ = _servir_con_cache(db, sql, params, ejecutar)
+    return filas
+
+
+def ejecutar_acotado_con_cache(
+    db: Session,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    max_filas: Optional[int] = None,
+    timeout_ms: Optional[int] = None,
+    al_lote: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Variante de ejecutar_con_cache para SQL generado por el modelo: read-only,
+    con statement_timeout y tope de filas (ver ejecucion_acotada).
+
+    al_lote recibe los lotes del cursor solo si la query se ejecuta: un
+    resultado servido desde cache se devuelve entero, sin callbacks.
+
+    Returns:
+        Tupla (filas, truncado).
+    """
+    max_filas = settings.cfo_sql_max_filas if max_filas is None else max_filas
+    return _servir_con_cache(
+        db,
+        sql,
+        params,
+        lambda: ejecutar_acotado(db, sql, params, max_filas=max_filas, timeout_ms=timeout_ms, al_lote=al_lote),
+        modo=f"acotado:{max_filas}",
+    )
+
+
+def limpiar_cache_resultados() -> None:
+    """Vacía el cache de resultados (tests / mantenimiento)."""
+    _cache.limpiar()
+
+
+def estadisticas_cache_resultados() -> Dict[str, Any]:
+    """Contadores de uso del cache de resultados."""
+    return _cache.estadisticas()
@@ -0,0 +1,328 @@
+"""
+Resumen acumulado de conversaciones del chat CFO - Sistema CFO Inteligente
+
+El contexto conversacional eran los últimos N mensajes completos: en una
+conversación larga cada turno mandaba más tokens a la generación de SQL y a
+la narrativa. Ahora el prompt lleva un contexto de tamaño fijo:
+- los últimos CONTEXTO_MENSAJES_RECIENTES mensajes, textuales
+- un resumen de los turnos anteriores (Conversacion.resumen), que se
+  actualiza plegando los mensajes que salen de la ventana
+- el estado estructurado de la última consulta (Conversacion.estado_consulta):
+  SQL, tablas, filtros y período, extraídos con el AST de sql_ast
+
+actualizar_resumen() corre en segundo plano después de persistir la
+respuesta (etapa del planificador en el chat SSE, BackgroundTasks en el
+lote). El plegado usa Haiku; si Claude no responde, cae a un resumen
+extractivo (preguntas y primera línea de cada respuesta).
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+import anthropic
+from sqlalchemy import desc
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.constants import (
+    CONTEXTO_MENSAJES_RECIENTES,
+    ESTADO_CONSULTA_MAX_CARACTERES_SQL,
+    HAIKU_CLASSIFIER_MODEL,
+    RESUMEN_MAX_CARACTERES,
+    RESUMEN_MIN_MENSAJES_NUEVOS,
+)
+from app.core.logger import get_logger
+from app.models.conversacion import Conversacion, Mensaje
+from app.services.ai.prompt_cache import registrar_uso_cache
+from app.services.sql_ast import ConsultaSQL, parsear_sql
+
+logger = get_logger(__name__)
+
+# Cada mensaje nuevo entra al prompt de Haiku acotado a este largo
+_MAX_CARACTERES_MENSAJE = 1500
+_TIMEOUT_RESUMEN_SEGUNDOS = 20
+
+_RE_FECHA = re.compile(r"^\d{4}-\d{2}-\d{2}")
+# Funciones cuya sintaxis usa FROM sin referirse a una tabla
+_FUNCIONES_CON_FROM = frozenset({"EXTRACT", "SUBSTRING", "TRIM", "OVERLAY", "POSITION"})
+_MAX_FILTROS = 8
+
+_SYSTEM_RESUMEN = (
+    "Resumís conversaciones entre los socios de un estudio contable-jurídico y su "
+    "asistente financiero (CFO). Conservá lo que hace falta para entender preguntas "
+    "de seguimiento: qué se preguntó, cifras clave de las respuestas, períodos, "
+    "áreas, socios, monedas y filtros vigentes. Descartá saludos y redacción. "
+    f"Máximo {RESUMEN_MAX_CARACTERES} caracteres, en español, sin preámbulo."
+)
+
+_cliente: Optional[anthropic.Anthropic] = None
+
+
+# ══════════════════════════════════════════════════════════════
+# ESTADO DE LA ÚLTIMA CONSULTA
+# ══════════════════════════════════════════════════════════════
+
+def _dentro_de_funcion(consulta: ConsultaSQL, k: int) -> bool:
+    """True si la posición k está dentro de EXTRACT(... FROM ...) o similar."""
+    nivel = consulta.profundidades[k]
+    if nivel == 0:
+        return False
+    for j in range(k - 1, -1, -1):
+        if consulta.valores[j] == "(" and consulta.profundidades[j] == nivel - 1:
+            return j > 0 and consulta.valores[j - 1] in _FUNCIONES_CON_FROM
+    return False
+
+
+def _tablas(consulta: ConsultaSQL) -> List[str]:
+    """Tablas de FROM/JOIN, sin los nombres de CTEs."""
+    ctes = {
+        consulta.valores[k - 1] for k in consulta.buscar("AS", "(")
+        if k > 0 and consulta.tipos[k - 1] == "palabra"
+    }
+    tablas: List[str] = []
+    for k, valor in enumerate(consulta.valores[:-1]):
+        if valor not in ("FROM", "JOIN") or consulta.tipos[k] != "palabra":
+            continue
+        if valor == "FROM" and (_dentro_de_funcion(consulta, k) or consulta.valores[k - 1] == "DISTINCT"):
+            continue
+        siguiente = k + 1
+        if consulta.tipos[siguiente] not in ("palabra", "identificador"):
+            continue
+        if consulta.valores[siguiente] in ctes or consulta.valores[siguiente] == "LATERAL":
+            continue
+        tabla = consulta.texto_entre(siguiente, siguiente + 1)
+        if tabla not in tablas:
+            tablas.append(tabla)
+    return tablas
+
+
+def _filtros(consulta: ConsultaSQL) -> List[str]:
+    """Condiciones de los WHERE separadas por AND de su nivel (sin el filtro de borrado lógico)."""
+    filtros: List[str] = []
+    for inicio, fin in consulta.clausulas("WHERE"):
+        nivel = consulta.profundidades[inicio]
+        cortes = [inicio + 1]
+        entre_between = False
+        for k in range(inicio + 1, fin):
+            if consulta.profundidades[k] != nivel:
+                continue
+            if consulta.valores[k] == "BETWEEN":
+                entre_between = True
+            elif consulta.valores[k] == "AND":
+                if entre_between:
+                    entre_between = False
+                else:
+                    cortes.append(k)
+        cortes.append(fin)
+        for desde, hasta in zip(cortes, cortes[1:]):
+            desde = desde + 1 if consulta.valores[desde] == "AND" else desde
+            if "DELETED_AT" in consulta.valores[desde:hasta]:
+                continue
+            condicion = " ".join(consulta.texto_entre(desde, hasta).split())
+            if condicion and condicion not in filtros:
+                filtros.append(condicion)
+    return filtros[:_MAX_FILTROS]
+
+
+def _periodo(consulta: ConsultaSQL) -> Dict[str, Any]:
+    """Años, fechas literales, intervalos y si el SQL es relativo a la fecha actual."""
+    anios = sorted({
+        int(valor) for tipo, valor in zip(consulta.tipos, consulta.valores)
+        if tipo == "numero" and valor.isdigit() and 2000 <= int(valor) <= 2100
+    })
+    fechas = sorted({literal for literal in consulta.literales if _RE_FECHA.match(literal)})
+    intervalos = [
+        consulta.valores[k + 1].strip("'") for k in consulta.buscar("INTERVAL")
+        if k + 1 < len(consulta.valores) and consulta.tipos[k + 1] == "string"
+    ]
+    periodo: Dict[str, Any] = {}
+    if anios:
+        periodo["anios"] = anios
+    if fechas:
+        periodo["fechas"] = fechas
+    if intervalos:
+        periodo["intervalos"] = intervalos
+    if "CURRENT_DATE" in consulta.palabras or "NOW" in consulta.funciones:
+        periodo["relativo_a_hoy"] = True
+    return periodo
+
+
+def extraer_estado_consulta(sql: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Estado estructurado de la última consulta de un turno.
+
+    Si el turno guardó varias sentencias (lote) se toma la última. Retorna
+    None si no hay un SELECT (p.ej. el marcador de los informes multi-query).
+    """
+    consulta = parsear_sql(sql)
+    if not consulta.sentencias:
+        return None
+    ultima = consulta.sentencias[-1]
+    texto = consulta.texto_entre(ultima.inicio, ultima.fin).strip().rstrip(";").strip()
+    if len(consulta.sentencias) > 1:
+        consulta = parsear_sql(texto)
+    if consulta.tipo_sentencia != "SELECT":
+        return None
+    return {
+        "sql": texto,
+        "tablas": _tablas(consulta),
+        "filtros": _filtros(consulta),
+        "periodo": _periodo(consulta),
+    }
+
+
+# ══════════════════════════════════════════════════════════════
+# PLEGADO DEL RESUMEN
+# ══════════════════════════════════════════════════════════════
+
+def _acotar(texto: str) -> str:
+    """Recorta al máximo conservando lo más reciente (el final), en límite de línea."""
+    texto = texto.strip()
+    if len(texto) <= RESUMEN_MAX_CARACTERES:
+        return texto
+    recorte = texto[-(RESUMEN_MAX_CARACTERES - 2):]
+    if "\n" in recorte:
+        recorte = recorte.split("\n", 1)[1]
+    return "… " + recorte.lstrip()
+
+
+def _texto_mensajes(mensajes: List[Mensaje]) -> str:
+    lineas = []
+    for mensaje in mensajes:
+        rol = "Usuario" if mensaje.rol == "user" else "CFO"
+        lineas.append(f"{rol}: {mensaje.contenido[:_MAX_CARACTERES_MENSAJE]}")
+    return "\n".join(lineas)
+
+
+def _resumen_extractivo(previo: Optional[str], mensajes: List[Mensaje]) -> str:
+    """Fallback sin Claude: cada pregunta y la primera línea de su respuesta."""
+    lineas = [previo] if previo else []
+    for mensaje in mensajes:
+        primera_linea = next((l.strip() for l in mensaje.contenido.splitlines() if l.strip()), "")
+        if mensaje.rol == "user":
+            lineas.append(f"- Preguntó: {primera_linea[:160]}")
+        else:
+            lineas.append(f"  Respuesta: {primera_linea[:200]}")
+    return "\n".join(lineas)
+
+
+def _resumir_con_claude(previo: Optional[str], mensajes: List[Mensaje]) -> Optional[str]:
+    """Pide a Haiku el resumen actualizado. None si Claude no está configurado."""
+    global _cliente
+    if not settings.anthropic_api_key:
+        return None
+    if _cliente is None:
+        _cliente = anthropic.Anthropic(api_key=settings.anthropic_api_key.strip())
+
+    prompt = (
+        f"<resumen_previo>\n{previo or '(vacío)'}\n</resumen_previo>\n\n"
+        f"<turnos_nuevos>\n{_texto_mensajes(mensajes)}\n</turnos_nuevos>\n\n"
+        "Devolvé el resumen actualizado que integre los turnos nuevos."
+    )
+    respuesta = _cliente.messages.create(
+        model=HAIKU_CLASSIFIER_MODEL,
+        max_tokens=600,
+        temperature=0.0,
+        system=_SYSTEM_RESUMEN,
+        messages=[{"role": "user", "content": prompt}],
+        timeout=_TIMEOUT_RESUMEN_SEGUNDOS,
+    )
+    registrar_uso_cache(getattr(respuesta, "usage", None), "resumen_conversacion")
+    return respuesta.content[0].text.strip()
+
+
+def plegar_resumen(previo: Optional[str], mensajes: List[Mensaje]) -> str:
+    """Integra mensajes al resumen previo; nunca supera RESUMEN_MAX_CARACTERES."""
+    try:
+        resumen = _resumir_con_claude(previo, mensajes)
+    except Exception as exc:
+        logger.warning(f"Resumen de conversación: Claude falló, se usa resumen extractivo — {exc}")
+        resumen = None
+    return _acotar(resumen or _resumen_extractivo(previo, mensajes))
+
+
+def actualizar_resumen(db: Session, conversacion_id: UUID) -> bool:
+    """
+    Actualiza el estado de la última consulta y pliega los mensajes viejos.
+
+    Se pliegan los mensajes todavía no resumidos que quedan fuera de la
+    ventana reciente, recién cuando son al menos RESUMEN_MIN_MENSAJES_NUEVOS
+    (una llamada a Haiku cada pocos turnos, no en cada uno).
+
+    Returns:
+        True si la conversación existe y se actualizó.
+    """
+    conversacion = db.get(Conversacion, conversacion_id)
+    if conversacion is None:
+        return False
+
+    ultimo_sql = db.query(Mensaje.sql_generado).filter(
+        Mensaje.conversacion_id == conversacion_id,
+        Mensaje.rol == "assistant",
+    ).order_by(desc(Mensaje.created_at)).limit(1).scalar()
+    estado = extraer_estado_consulta(ultimo_sql) if ultimo_sql else None
+    if estado:
+        conversacion.estado_consulta = estado
+
+    query = db.query(Mensaje).filter(Mensaje.conversacion_id == conversacion_id)
+    if conversacion.resumen_hasta is not None:
+        query = query.filter(Mensaje.created_at > conversacion.resumen_hasta)
+    sin_plegar = query.order_by(Mensaje.created_at).all()
+    a_plegar = sin_plegar[:-CONTEXTO_MENSAJES_RECIENTES] if CONTEXTO_MENSAJES_RECIENTES else sin_plegar
+
+    if len(a_plegar) >= RESUMEN_MIN_MENSAJES_NUEVOS:
+        conversacion.resumen = plegar_resumen(conversacion.resumen, a_plegar)
+        conversacion.resumen_hasta = a_plegar[-1].created_at
+        logger.info(
+            f"Resumen de conversación {conversacion_id}: {len(a_plegar)} mensajes plegados "
+            f"({len(conversacion.resumen)} caracteres)"
+        )
+
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return True
+
+
+# ══════════════════════════════════════════════════════════════
+# CONTEXTO PARA LOS PROMPTS
+# ══════════════════════════════════════════════════════════════
+
+def _texto_estado(estado: Dict[str, Any]) -> str:
+    lineas = ["Última consulta:"]
+    if estado.get("tablas"):
+        lineas.append(f"- Tablas: {', '.join(estado['tablas'])}")
+    if estado.get("filtros"):
+        lineas.append(f"- Filtros: {'; '.join(estado['filtros'])}")
+    periodo = estado.get("periodo") or {}
+    partes_periodo = []
+    if periodo.get("anios"):
+        partes_periodo.append("años " + ", ".join(str(a) for a in periodo["anios"]))
+    if periodo.get("fechas"):
+        partes_periodo.append("fechas " + ", ".join(periodo["fechas"]))
+    if periodo.get("intervalos"):
+        partes_periodo.append("intervalos " + ", ".join(periodo["intervalos"]))
+    if periodo.get("relativo_a_hoy"):
+        partes_periodo.append("relativo a la fecha actual")
+    if partes_periodo:
+        lineas.append(f"- Período: {'; '.join(partes_periodo)}")
+    sql = estado.get("sql") or ""
+    if len(sql) > ESTADO_CONSULTA_MAX_CARACTERES_SQL:
+        sql = sql[:ESTADO_CONSULTA_MAX_CARACTERES_SQL] + "..."
+    lineas.append(f"- SQL: {sql}")
+    return "\n".join(lineas)
+
+
+def texto_contexto_resumen(conversacion: Optional[Conversacion]) -> Optional[str]:
+    """Resumen + estado de la última consulta como un bloque de texto (None si no hay nada)."""
+    if conversacion is None:
+        return None
+    partes = []
+    if conversacion.resumen:
+        partes.append(f"Resumen de los turnos anteriores:\n{conversacion.resumen}")
+    if conversacion.estado_consulta:
+        partes.append(_texto_estado(conversacion.estado_consulta))
+    return "\n\n".join(partes) or None
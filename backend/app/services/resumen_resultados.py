@@ -0,0 +1,256 @@
+"""
+Resumen pre-calculado de resultados SQL - Sistema CFO Inteligente
+
+Calcula para el prompt narrativo: sumas, promedios, máximo/mínimo con fila de
+referencia, subtotales por columna de agrupación, ticket promedio y
+concentración top-N de la columna principal.
+
+Las filas se recorren una sola vez: en esa pasada se arman los vectores por
+columna numérica y se reparten los valores por grupo. Los agregados por
+columna se calculan sobre esos vectores (con NumPy a partir de
+RESUMEN_UMBRAL_NUMPY_FILAS filas, p.ej. rankings de miles de clientes) y la
+referencia de texto se resuelve solo para las filas extremas.
+"""
+
+import heapq
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.constants import RESUMEN_UMBRAL_NUMPY_FILAS
+
+# Columnas que indican agrupación (valores tipo string para subtotales)
+_COLUMNAS_AGRUPACION = {
+    "localidad",
+    "area",
+    "nombre_area",
+    "tipo_operacion",
+    "tipo",
+    "nombre_mes",
+    "socio",
+    "nombre",
+    "cliente",
+    "proveedor",
+    "moneda_original",
+    "trimestre",
+    "semestre",
+    "anio",
+}
+
+# Columnas de porcentaje que NO deben re-sumarse
+_COLUMNAS_PORCENTAJE = {"porcentaje", "rentabilidad", "rentabilidad_porcentaje", "participacion"}
+
+# Columnas numéricas que NO tiene sentido sumar (temporales/identificadores)
+_COLS_NO_SUMAR = {
+    "mes",
+    "mes_num",
+    "numero_mes",
+    "anio",
+    "año",
+    "anio_num",
+    "year",
+    "trimestre",
+    "semestre",
+    "numero",
+    "id",
+}
+
+_COLS_MONTO = ("total_pesificado", "ingresos_uyu", "total_uyu", "monto_uyu")
+_COLS_CANTIDAD = ("operaciones", "cantidad", "cantidad_operaciones")
+
+# Con más valores distintos la columna no se subtotaliza
+_MAX_GRUPOS_SUBTOTAL = 20
+
+
+def _clasificar_columnas(primera_fila: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """Detecta columnas numéricas sumables y de agrupación a partir de la primera fila."""
+    cols_numericas = []
+    cols_agrupacion = []
+    for col, val in primera_fila.items():
+        col_lower = col.lower()
+        if (
+            col_lower in _COLUMNAS_PORCENTAJE
+            or col_lower in _COLS_NO_SUMAR
+            or col_lower.endswith("_id")
+        ):
+            continue
+        if isinstance(val, (int, float, Decimal)) and not isinstance(val, bool):
+            cols_numericas.append(col)
+        elif isinstance(val, str) and col_lower in _COLUMNAS_AGRUPACION:
+            cols_agrupacion.append(col)
+    return cols_numericas, cols_agrupacion
+
+
+def _referencia_fila(row: Dict[str, Any], cols_agrupacion: List[str], col: str) -> Optional[str]:
+    """Texto que identifica la fila: primera agrupación con valor, o primer string no vacío."""
+    for col_agrupacion in cols_agrupacion:
+        if row.get(col_agrupacion):
+            return str(row[col_agrupacion])
+    for key, raw_val in row.items():
+        if key != col and isinstance(raw_val, str) and raw_val:
+            return raw_val
+    return None
+
+
+def _recorrer_filas(
+    datos: List[Dict[str, Any]],
+    cols_numericas: List[str],
+    cols_agrupacion: List[str],
+) -> Tuple[Dict[str, List[Optional[float]]], Dict[str, Dict[str, List[List[float]]]]]:
+    """
+    Única pasada sobre las filas.
+
+    Returns:
+        (vectores por columna numérica con None para nulos,
+         columna de agrupación -> grupo -> valores por columna numérica).
+        Las agrupaciones que superan _MAX_GRUPOS_SUBTOTAL grupos se descartan.
+    """
+    vectores: Dict[str, List[Optional[float]]] = {col: [] for col in cols_numericas}
+    grupos: Dict[str, Dict[str, List[List[float]]]] = {col: {} for col in cols_agrupacion}
+    grupos_validos: Dict[str, set] = {col: set() for col in cols_agrupacion}
+    activas = list(cols_agrupacion)
+
+    for row in datos:
+        fila = []
+        for col in cols_numericas:
+            valor = row.get(col)
+            valor = None if valor is None else float(valor)
+            vectores[col].append(valor)
+            fila.append(valor or 0.0)
+
+        for col_agrupacion in list(activas):
+            clave = str(row.get(col_agrupacion, ""))
+            # Filas sin valor no definen grupo, pero suman si su clave coincide con uno
+            if row.get(col_agrupacion) is not None:
+                grupos_validos[col_agrupacion].add(clave)
+                if len(grupos_validos[col_agrupacion]) > _MAX_GRUPOS_SUBTOTAL:
+                    activas.remove(col_agrupacion)
+                    del grupos[col_agrupacion]
+                    continue
+            columnas_grupo = grupos[col_agrupacion].get(clave)
+            if columnas_grupo is None:
+                columnas_grupo = grupos[col_agrupacion][clave] = [[] for _ in cols_numericas]
+            for valores, valor in zip(columnas_grupo, fila):
+                valores.append(valor)
+
+    for col_agrupacion in list(grupos):
+        validos = grupos_validos[col_agrupacion]
+        if len(validos) <= 1:
+            del grupos[col_agrupacion]
+            continue
+        grupos[col_agrupacion] = {
+            clave: columnas for clave, columnas in grupos[col_agrupacion].items() if clave in validos
+        }
+    return vectores, grupos
+
+
+def _agregados_columna(valores: List[Optional[float]]) -> Optional[Tuple[float, int, int, int]]:
+    """(suma, cantidad no nula, índice del máximo, índice del mínimo) o None si no hay valores."""
+    if len(valores) >= RESUMEN_UMBRAL_NUMPY_FILAS:
+        vector = np.array(valores, dtype=float)  # None -> nan
+        presentes = vector[~np.isnan(vector)]
+        if not presentes.size:
+            return None
+        # sum() sobre la lista (compensada en 3.12) da el mismo redondeo que el cálculo fila a fila
+        return (
+            sum(presentes.tolist()),
+            int(presentes.size),
+            int(np.nanargmax(vector)),
+            int(np.nanargmin(vector)),
+        )
+
+    presentes = []
+    idx_max = idx_min = -1
+    for i, valor in enumerate(valores):
+        if valor is None:
+            continue
+        presentes.append(valor)
+        if idx_max < 0 or valor > valores[idx_max]:
+            idx_max = i
+        if idx_min < 0 or valor < valores[idx_min]:
+            idx_min = i
+    if not presentes:
+        return None
+    return sum(presentes), len(presentes), idx_max, idx_min
+
+
+def _mayores(valores: List[Optional[float]], k: int) -> List[float]:
+    """Los k mayores valores (nulos como 0) en orden descendente."""
+    if len(valores) >= RESUMEN_UMBRAL_NUMPY_FILAS:
+        vector = np.nan_to_num(np.array(valores, dtype=float), nan=0.0)
+        k = min(k, len(vector))
+        top = vector[np.argpartition(-vector, k - 1)[:k]]
+        return sorted(top.tolist(), reverse=True)
+    return heapq.nlargest(k, (valor or 0.0 for valor in valores))
+
+
+def computar_resumen(datos: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Pre-computa totales, subtotales y extremos de resultados SQL."""
+    if not datos:
+        return {}
+
+    resumen: Dict[str, Any] = {"total_filas": len(datos)}
+
+    cols_numericas, cols_agrupacion = _clasificar_columnas(datos[0])
+    if not cols_numericas:
+        return resumen
+
+    vectores, grupos_por_columna = _recorrer_filas(datos, cols_numericas, cols_agrupacion)
+
+    sumas = {}
+    promedios = {}
+    extremos = {}
+    for col in cols_numericas:
+        agregados = _agregados_columna(vectores[col])
+        if agregados is None:
+            continue
+        total, cantidad, idx_max, idx_min = agregados
+        sumas[col] = round(total, 2)
+        promedios[col] = round(total / cantidad, 2)
+        if len(datos) > 1 and cantidad > 1:
+            extremos[col] = (idx_max, idx_min)
+    resumen["sumas"] = sumas
+    resumen["promedios"] = promedios
+
+    if extremos:
+        resumen["maximo"] = {}
+        resumen["minimo"] = {}
+        for col, (idx_max, idx_min) in extremos.items():
+            for clave, idx in (("maximo", idx_max), ("minimo", idx_min)):
+                resumen[clave][col] = {
+                    "valor": round(vectores[col][idx], 2),
+                    "fila": _referencia_fila(datos[idx], cols_agrupacion, col),
+                }
+
+    for col_agrupacion, grupos in grupos_por_columna.items():
+        resumen[f"subtotales_por_{col_agrupacion.lower()}"] = {
+            grupo: {col: round(sum(grupos[grupo][i]), 2) for i, col in enumerate(cols_numericas)}
+            for grupo in sorted(grupos)
+        }
+
+    monto_col = next((col for col in _COLS_MONTO if col in sumas), None)
+    cantidad_col = next((col for col in _COLS_CANTIDAD if col in sumas), None)
+    if monto_col and cantidad_col:
+        cantidad_total = float(sumas.get(cantidad_col, 0) or 0)
+        if cantidad_total > 0:
+            resumen["ticket_promedio"] = {
+                "valor": round(float(sumas[monto_col]) / cantidad_total, 2),
+                "monto_col": monto_col,
+                "cantidad_col": cantidad_col,
+            }
+
+    if len(datos) >= 5 and sumas:
+        col_principal = max(sumas.items(), key=lambda item: item[1])[0]
+        total_principal = float(sumas.get(col_principal, 0) or 0)
+        if total_principal > 0:
+            mayores = _mayores(vectores[col_principal], 10)
+            concentracion = {
+                "top_3_pct": round(sum(mayores[:3]) * 100.0 / total_principal, 2),
+                "top_5_pct": round(sum(mayores[:5]) * 100.0 / total_principal, 2),
+            }
+            if len(datos) >= 10:
+                concentracion["top_10_pct"] = round(sum(mayores[:10]) * 100.0 / total_principal, 2)
+            resumen["concentracion"] = concentracion
+
+    return resumen
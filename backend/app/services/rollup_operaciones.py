@@ -0,0 +1,126 @@
+"""
+Rollup diario de operaciones - Sistema CFO Inteligente
+
+Mantiene la tabla operaciones_diarias: una fila por (fecha, tipo_operacion,
+area_id, localidad, moneda_original) con la cantidad de operaciones activas y
+las sumas de monto_original, monto_uyu, monto_usd, total_pesificado y
+total_dolarizado. Las consultas agregadas (informes, dashboard, CFO AI) leen
+esta tabla y escalan con la cantidad de días en lugar de filas del libro.
+
+Mantenimiento incremental, en la misma transacción que la escritura:
+- alta:     sumar_operacion() después de agregar la operación
+- anulación: restar_operacion() antes de marcar deleted_at
+- edición:  restar_operacion() ANTES de modificar, sumar_operacion() después
+
+Los deltas se leen de la fila guardada en operaciones (valores ya redondeados
+por la columna), así el rollup coincide exactamente con un rebuild.
+"""
+
+from datetime import date
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.logger import get_logger
+from app.models.operacion import Operacion
+
+logger = get_logger(__name__)
+
+_COLUMNAS_CLAVE = "fecha, tipo_operacion, area_id, localidad, moneda_original"
+_COLUMNAS_SUMA = ("monto_original", "monto_uyu", "monto_usd", "total_pesificado", "total_dolarizado")
+
+_SQL_APLICAR_DELTA = f"""
+    INSERT INTO operaciones_diarias (
+        id, {_COLUMNAS_CLAVE}, cantidad_operaciones, {", ".join(_COLUMNAS_SUMA)}, updated_at
+    )
+    SELECT
+        gen_random_uuid(), {_COLUMNAS_CLAVE}, :signo,
+        {", ".join(f":signo * {col}" for col in _COLUMNAS_SUMA)},
+        timezone('utc', now())
+    FROM operaciones
+    WHERE id = :operacion_id
+    ON CONFLICT ({_COLUMNAS_CLAVE}) DO UPDATE SET
+        cantidad_operaciones = operaciones_diarias.cantidad_operaciones + EXCLUDED.cantidad_operaciones,
+        {", ".join(f"{col} = operaciones_diarias.{col} + EXCLUDED.{col}" for col in _COLUMNAS_SUMA)},
+        updated_at = EXCLUDED.updated_at
+"""
+
+# Claves que quedaron sin operaciones se eliminan para no agregar grupos vacíos
+_SQL_ELIMINAR_VACIA = """
+    DELETE FROM operaciones_diarias d
+    USING operaciones o
+    WHERE o.id = :operacion_id
+      AND d.fecha = o.fecha
+      AND d.tipo_operacion = o.tipo_operacion
+      AND d.area_id IS NOT DISTINCT FROM o.area_id
+      AND d.localidad = o.localidad
+      AND d.moneda_original = o.moneda_original
+      AND d.cantidad_operaciones <= 0
+"""
+
+_SQL_RECONSTRUIR = f"""
+    INSERT INTO operaciones_diarias (
+        id, {_COLUMNAS_CLAVE}, cantidad_operaciones, {", ".join(_COLUMNAS_SUMA)}, updated_at
+    )
+    SELECT
+        gen_random_uuid(), {_COLUMNAS_CLAVE}, COUNT(*),
+        {", ".join(f"SUM({col})" for col in _COLUMNAS_SUMA)},
+        timezone('utc', now())
+    FROM operaciones
+    WHERE deleted_at IS NULL
+      AND (CAST(:fecha_desde AS DATE) IS NULL OR fecha >= :fecha_desde)
+      AND (CAST(:fecha_hasta AS DATE) IS NULL OR fecha <= :fecha_hasta)
+    GROUP BY {_COLUMNAS_CLAVE}
+"""
+
+
+def _aplicar_delta(db: Session, operacion: Operacion, signo: int) -> None:
+    """Suma (signo=1) o resta (signo=-1) una operación de su fila del rollup."""
+    # El flush persiste una operación recién agregada y le asigna el id
+    db.flush()
+    params = {"operacion_id": operacion.id, "signo": signo}
+    db.execute(text(_SQL_APLICAR_DELTA), params)
+    if signo < 0:
+        db.execute(text(_SQL_ELIMINAR_VACIA), {"operacion_id": operacion.id})
+
+
+def sumar_operacion(db: Session, operacion: Operacion) -> None:
+    """Agrega una operación activa al rollup. No hace commit."""
+    _aplicar_delta(db, operacion, 1)
+
+
+def restar_operacion(db: Session, operacion: Operacion) -> None:
+    """
+    Quita una operación del rollup. No hace commit.
+
+    Llamar antes de modificar la operación: la fila se lee de la base y un
+    flush de cambios pendientes restaría los valores nuevos.
+    """
+    _aplicar_delta(db, operacion, -1)
+
+
+def reconstruir_rollup(
+    db: Session,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+) -> int:
+    """
+    Recalcula el rollup desde operaciones (todo o un rango de fechas). No hace commit.
+
+    Returns:
+        Cantidad de filas generadas.
+    """
+    params = {"fecha_desde": fecha_desde, "fecha_hasta": fecha_hasta}
+    db.execute(
+        text(
+            """
+            DELETE FROM operaciones_diarias
+            WHERE (CAST(:fecha_desde AS DATE) IS NULL OR fecha >= :fecha_desde)
+              AND (CAST(:fecha_hasta AS DATE) IS NULL OR fecha <= :fecha_hasta)
+            """
+        ),
+        params,
+    )
+    filas = db.execute(text(_SQL_RECONSTRUIR), params).rowcount
+    logger.info(f"Rollup reconstruido: {filas} filas ({fecha_desde or 'inicio'} → {fecha_hasta or 'hoy'})")
+    return filas
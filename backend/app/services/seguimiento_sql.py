@@ -0,0 +1,729 @@
+"""
+Preguntas de seguimiento resueltas transformando el SQL anterior - Sistema CFO Inteligente
+
+"¿y el mes anterior?", "solo Montevideo", "¿y por área?" o "¿en dólares?"
+hacían que SQLRouter regenerara la consulta entera con Claude a partir del
+contexto. Cuando la pregunta es SOLO un refinamiento del turno anterior, acá
+se reescribe el SQL de ese turno sobre el AST compartido (sql_ast):
+
+- período: año explícito, año/mes/trimestre anterior, otro mes del año
+- filtro: localidad, área, tipo de operación, moneda de origen ("solo ...");
+  si el filtro ya existe con otro valor, se cambia el literal
+- agrupación: por área, localidad, moneda, tipo o mes
+- moneda de los montos: total_pesificado <-> total_dolarizado (y sus alias)
+
+Una pregunta es refinamiento si, quitando los fragmentos reconocidos, solo
+quedan palabras de relleno; cualquier otra palabra la convierte en pregunta
+nueva y va al modelo. Las transformaciones solo se aplican a SQL con una
+única referencia a operaciones/operaciones_diarias (un solo ámbito a
+editar); ante cualquier forma que no reconocen devuelven None y también se
+cae al modelo.
+"""
+
+import calendar
+import re
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.logger import get_logger
+from app.services.sql_ast import ConsultaSQL, parsear_sql
+from app.services.sql_cache import _sin_tildes
+
+logger = get_logger(__name__)
+
+_MESES = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+    "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+}
+_AREAS = {
+    "juridica": "Jurídica",
+    "notarial": "Notarial",
+    "contable": "Contable",
+    "recuperacion": "Recuperación",
+    "otros gastos": "Otros Gastos",
+    "administracion": "Administración",
+}
+_TIPOS = {"ingresos": "INGRESO", "gastos": "GASTO", "retiros": "RETIRO", "distribuciones": "DISTRIBUCION"}
+_MONEDAS = {"dolares": "USD", "usd": "USD", "pesos": "UYU", "uyu": "UYU"}
+_DIMENSIONES = {
+    "area": "area", "areas": "area",
+    "localidad": "localidad", "localidades": "localidad", "oficina": "localidad", "oficinas": "localidad",
+    "moneda": "moneda", "monedas": "moneda",
+    "tipo": "tipo", "tipos": "tipo",
+    "mes": "mes", "meses": "mes",
+}
+
+_RELLENO = frozenset({
+    "y", "e", "o", "que", "tal", "el", "la", "los", "las", "lo", "del", "de", "en", "para", "a", "al",
+    "con", "solo", "solamente", "unicamente", "ahora", "pero", "mismo", "misma", "igual", "eso",
+    "esto", "tambien", "como", "fue", "es", "seria", "da", "ver", "mostrame", "dame", "decime",
+    "operaciones", "area", "oficina", "ano", "mes", "sobre", "cuanto",
+})
+
+_PATRONES: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"\b(?:ano|trimestre|mes) (?:anterior|pasado)\b"), "desplazamiento"),
+    (re.compile(r"\b(20\d{2})\b"), "anio"),
+    (re.compile(r"\b(" + "|".join(_MESES) + r")\b"), "mes"),
+    (re.compile(r"\bpor (" + "|".join(_DIMENSIONES) + r")\b"), "agrupar"),
+    (re.compile(r"\bsolo (?:en |lo que entro en |operaciones en )?(dolares|usd|pesos|uyu)\b"), "filtro_moneda"),
+    (re.compile(r"\ben (dolares|usd|pesos|uyu)\b"), "moneda"),
+    (re.compile(r"\b(montevideo|mercedes)\b"), "filtro_localidad"),
+    (re.compile(r"\b(" + "|".join(_AREAS) + r")\b"), "filtro_area"),
+    (re.compile(r"\b(" + "|".join(_TIPOS) + r")\b"), "filtro_tipo"),
+]
+
+# Palabras que no pueden ser alias de tabla
+_NO_ALIAS = frozenset({
+    "WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "ON", "GROUP", "ORDER", "LIMIT",
+    "OFFSET", "HAVING", "UNION", "INTERSECT", "EXCEPT", "WINDOW", "USING", "NATURAL",
+})
+_TABLAS_OPERACIONES = ("OPERACIONES", "OPERACIONES_DIARIAS")
+_AGREGADOS = frozenset({"SUM", "COUNT", "AVG", "MIN", "MAX"})
+_OPERADORES_CONJUNTO = frozenset({"UNION", "INTERSECT", "EXCEPT"})
+_RE_FECHA = re.compile(r"^'(\d{4})-(\d{2})-(\d{2})'$")
+# Un número 20xx es un año si alguna de estas palabras aparece en los tokens previos
+_PALABRAS_ANIO = frozenset({"YEAR", "'year'", "'YEAR'", "FECHA", "ANIO", "MAKE_DATE"})
+_VENTANA_ANIO = 8
+# Meses de cada unidad de DATE_TRUNC / EXTRACT en que CURRENT_DATE se puede correr
+_UNIDADES_TRUNC = {"'month'": 1, "'quarter'": 3, "'year'": 12}
+_UNIDADES_EXTRACT = {"MONTH": 1, "QUARTER": 3, "YEAR": 12}
+
+
+@dataclass
+class Refinamiento:
+    """Un refinamiento reconocido en la pregunta: tipo y valor."""
+
+    tipo: str
+    valor: Any
+
+
+# ══════════════════════════════════════════════════════════════
+# DETECCIÓN
+# ══════════════════════════════════════════════════════════════
+
+def _normalizar(pregunta: str) -> str:
+    texto = _sin_tildes((pregunta or "").lower())
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def detectar_refinamientos(pregunta: str) -> Optional[List[Refinamiento]]:
+    """
+    Refinamientos de una pregunta de seguimiento, o None si es una pregunta nueva.
+
+    "¿y el mes anterior?" -> [Refinamiento("desplazar_meses", -1)]
+    "solo Montevideo en dólares" -> [filtro localidad, moneda USD]
+    """
+    texto = _normalizar(pregunta)
+    refinamientos: List[Refinamiento] = []
+    for patron, tipo in _PATRONES:
+        for m in patron.finditer(texto):
+            refinamientos.append(_refinamiento(tipo, m))
+        texto = patron.sub(" ", texto)
+
+    sobrantes = [palabra for palabra in texto.split() if palabra not in _RELLENO]
+    if not refinamientos or sobrantes:
+        return None
+    return refinamientos
+
+
+def _refinamiento(tipo: str, m: re.Match) -> Refinamiento:
+    if tipo == "desplazamiento":
+        unidad = m.group(0).split()[0]
+        if unidad == "ano":
+            return Refinamiento("desplazar_anios", -1)
+        return Refinamiento("desplazar_meses", -3 if unidad == "trimestre" else -1)
+    if tipo == "anio":
+        return Refinamiento("anio", int(m.group(1)))
+    if tipo == "mes":
+        return Refinamiento("mes", _MESES[m.group(1)])
+    if tipo == "agrupar":
+        return Refinamiento("agrupar", _DIMENSIONES[m.group(1)])
+    if tipo == "moneda":
+        return Refinamiento("moneda", _MONEDAS[m.group(1)])
+    if tipo == "filtro_moneda":
+        return Refinamiento("filtro", ("moneda_original", _MONEDAS[m.group(1)]))
+    if tipo == "filtro_localidad":
+        return Refinamiento("filtro", ("localidad", m.group(1).upper()))
+    if tipo == "filtro_area":
+        return Refinamiento("filtro", ("area", _AREAS[m.group(1)]))
+    return Refinamiento("filtro", ("tipo_operacion", _TIPOS[m.group(1)]))
+
+
+# ══════════════════════════════════════════════════════════════
+# ÁMBITO DE OPERACIONES
+# ══════════════════════════════════════════════════════════════
+
+@dataclass
+class _Ambito:
+    """El SELECT que lee operaciones: límites, nivel y alias."""
+
+    consulta: ConsultaSQL
+    tabla: int          # posición del nombre de la tabla
+    fin_tabla: int      # posición siguiente a la tabla y su alias
+    alias: str
+    inicio: int
+    fin: int
+    profundidad: int
+
+    def clausula(self, nombre: str) -> Optional[Tuple[int, int]]:
+        encontradas = self.consulta.clausulas(nombre, self.inicio, self.fin, self.profundidad)
+        return encontradas[-1] if encontradas else None
+
+    def items(self, inicio: int, fin: int) -> List[Tuple[int, int]]:
+        """Rangos separados por comas del nivel del ámbito."""
+        rangos, desde = [], inicio
+        for k in range(inicio, fin):
+            if self.consulta.valores[k] == "," and self.consulta.profundidades[k] == self.profundidad:
+                rangos.append((desde, k))
+                desde = k + 1
+        rangos.append((desde, fin))
+        return rangos
+
+    def alias_areas(self) -> Optional[str]:
+        c = self.consulta
+        for k in c.buscar("JOIN", "AREAS", inicio=self.inicio, fin=self.fin):
+            if c.profundidades[k] != self.profundidad:
+                continue
+            j = k + 2
+            if j < self.fin and c.valores[j] == "AS":
+                j += 1
+            if j < self.fin and c.tipos[j] == "palabra" and c.valores[j] not in _NO_ALIAS:
+                return c.texto_entre(j, j + 1)
+            return c.texto_entre(k + 1, k + 2)
+        return None
+
+
+def _ambito_operaciones(consulta: ConsultaSQL) -> Optional[_Ambito]:
+    """Único FROM/JOIN de operaciones del SQL (None si hay cero o varios)."""
+    valores, tipos = consulta.valores, consulta.tipos
+    referencias = [
+        k for k in range(len(valores) - 1)
+        if valores[k] in ("FROM", "JOIN") and tipos[k + 1] == "palabra" and valores[k + 1] in _TABLAS_OPERACIONES
+    ]
+    if len(referencias) != 1 or len(consulta.sentencias) != 1:
+        return None
+
+    k = referencias[0]
+    tabla = k + 1
+    fin_tabla = tabla + 1
+    alias = consulta.texto_entre(tabla, tabla + 1)
+    j = fin_tabla + 1 if fin_tabla < len(valores) and valores[fin_tabla] == "AS" else fin_tabla
+    if j < len(valores) and tipos[j] == "palabra" and valores[j] not in _NO_ALIAS:
+        alias = consulta.texto_entre(j, j + 1)
+        fin_tabla = j + 1
+
+    # Límites del SELECT que contiene la tabla: sin salir del paréntesis ni
+    # cruzar UNION/INTERSECT/EXCEPT o ';' del mismo nivel
+    nivel = consulta.profundidades[k]
+
+    def corta(j: int) -> bool:
+        if consulta.profundidades[j] < nivel:
+            return True
+        return consulta.profundidades[j] == nivel and (valores[j] in _OPERADORES_CONJUNTO or valores[j] == ";")
+
+    inicio = k
+    while inicio > 0 and not corta(inicio - 1):
+        inicio -= 1
+    fin = k
+    while fin < len(valores) and not corta(fin):
+        fin += 1
+    return _Ambito(consulta, tabla, fin_tabla, alias, inicio, fin, nivel)
+
+
+def _texto_normalizado(consulta: ConsultaSQL, inicio: int, fin: int) -> str:
+    return " ".join(consulta.texto_entre(inicio, fin).split()).upper()
+
+
+def _insercion(consulta: ConsultaSQL, k: int, texto: str) -> Tuple[int, int, str]:
+    """Inserción antes del token k (o al final) con un espacio del lado que falta."""
+    if k >= len(consulta.valores):
+        return k, k, " " + texto
+    return k, k, texto + " "
+
+
+def _editar(sql: str, cambios: List[Tuple[int, int, str]]) -> str:
+    consulta = parsear_sql(sql).copia()
+    consulta.editar(cambios)
+    return consulta.a_sql()
+
+
+# ══════════════════════════════════════════════════════════════
+# PERÍODO
+# ══════════════════════════════════════════════════════════════
+
+def _es_anio(consulta: ConsultaSQL, k: int) -> bool:
+    """Número 20xx usado como año: con YEAR/fecha poco antes (no montos ni LIMIT)."""
+    if consulta.tipos[k] != "numero" or not consulta.valores[k].isdigit():
+        return False
+    if not 2000 <= int(consulta.valores[k]) <= 2100:
+        return False
+    previos = consulta.valores[max(0, k - _VENTANA_ANIO):k]
+    return any(valor in _PALABRAS_ANIO for valor in previos)
+
+
+def _posiciones_anio(consulta: ConsultaSQL) -> List[int]:
+    return [k for k in range(len(consulta.valores)) if _es_anio(consulta, k)]
+
+
+def _posiciones_fecha(consulta: ConsultaSQL) -> List[int]:
+    return [
+        k for k, (tipo, valor) in enumerate(zip(consulta.tipos, consulta.valores))
+        if tipo == "string" and _RE_FECHA.match(valor)
+    ]
+
+
+def _posiciones_extract(consulta: ConsultaSQL, campo: str) -> List[int]:
+    """Números comparados con EXTRACT(campo FROM ...) = N."""
+    posiciones = []
+    for k in consulta.buscar("EXTRACT", "(", campo, "FROM"):
+        cierre = consulta.pareja.get(k + 1)
+        if cierre is None or cierre + 2 >= len(consulta.valores):
+            continue
+        if consulta.valores[cierre + 1] == "=" and consulta.tipos[cierre + 2] == "numero":
+            posiciones.append(cierre + 2)
+    return posiciones
+
+
+def _posiciones_hoy(consulta: ConsultaSQL) -> List[int]:
+    return [k for k, valor in enumerate(consulta.valores) if valor == "CURRENT_DATE"]
+
+
+def _periodo(consulta: ConsultaSQL, apertura: int) -> Optional[Tuple[str, int]]:
+    """(función, meses de la unidad) si el '(' en apertura es de DATE_TRUNC('unidad', ...) o EXTRACT(UNIDAD FROM ...)."""
+    valores = consulta.valores
+    if apertura == 0 or apertura + 2 >= len(valores):
+        return None
+    funcion, unidad = valores[apertura - 1], valores[apertura + 1]
+    if funcion == "DATE_TRUNC" and unidad.lower() in _UNIDADES_TRUNC and valores[apertura + 2] == ",":
+        return funcion, _UNIDADES_TRUNC[unidad.lower()]
+    if funcion == "EXTRACT" and unidad in _UNIDADES_EXTRACT and valores[apertura + 2] == "FROM":
+        return funcion, _UNIDADES_EXTRACT[unidad]
+    return None
+
+
+def _periodo_de_hoy(consulta: ConsultaSQL, k: int, aperturas: Dict[int, int]) -> Optional[int]:
+    """
+    Meses de la unidad del DATE_TRUNC/EXTRACT que contiene el CURRENT_DATE en k,
+    si está comparado por igualdad con la misma función y unidad del otro lado
+    (DATE_TRUNC('month', fecha) = DATE_TRUNC('month', CURRENT_DATE)). None si no.
+    """
+    valores, pareja = consulta.valores, consulta.pareja
+    contenedoras = [a for a, c in pareja.items() if a < k < c and _periodo(consulta, a)]
+    if not contenedoras:
+        return None
+    apertura = max(contenedoras)
+    periodo = _periodo(consulta, apertura)
+    cierre = pareja[apertura]
+
+    if cierre + 3 < len(valores) and valores[cierre + 1] == "=" and valores[cierre + 3] == "(":
+        if _periodo(consulta, cierre + 3) == periodo:
+            return periodo[1]
+    if apertura >= 3 and valores[apertura - 2] == "=" and valores[apertura - 3] == ")":
+        otra = aperturas.get(apertura - 3)
+        if otra is not None and _periodo(consulta, otra) == periodo:
+            return periodo[1]
+    return None
+
+
+def _hoy_desplazable(consulta: ConsultaSQL, hoy: List[int], meses: int) -> bool:
+    """
+    CURRENT_DATE solo se corre dentro de un período con granularidad: cada
+    aparición en un DATE_TRUNC/EXTRACT comparado con el mismo período de la
+    columna, y la unidad más fina divide al corrimiento. Correr un
+    EXTRACT(YEAR ...) un mes o una ventana 'CURRENT_DATE - 30 days' cambia
+    el resultado sin cambiar el período.
+    """
+    aperturas = {c: a for a, c in consulta.pareja.items()}
+    unidades = [_periodo_de_hoy(consulta, k, aperturas) for k in hoy]
+    if not unidades or None in unidades:
+        return False
+    return meses % min(unidades) == 0
+
+
+def _literal_fecha(valor: str) -> date:
+    anio, mes, dia = _RE_FECHA.match(valor).groups()
+    return date(int(anio), int(mes), int(dia))
+
+
+def _desplazar_fecha(fecha: date, meses: int) -> date:
+    """Corre una fecha `meses` meses; un fin de mes sigue siendo fin de mes."""
+    anio, mes = divmod(fecha.year * 12 + fecha.month - 1 + meses, 12)
+    mes += 1
+    ultimo = calendar.monthrange(anio, mes)[1]
+    fin_de_mes = fecha.day == calendar.monthrange(fecha.year, fecha.month)[1]
+    return date(anio, mes, ultimo if fin_de_mes else min(fecha.day, ultimo))
+
+
+def _hoy_desplazado(meses: int) -> str:
+    if meses % 12 == 0:
+        cantidad, unidad = abs(meses) // 12, "year"
+    else:
+        cantidad, unidad = abs(meses), "month"
+    plural = "s" if cantidad > 1 else ""
+    return f"(CURRENT_DATE {'+' if meses > 0 else '-'} INTERVAL '{cantidad} {unidad}{plural}')"
+
+
+def _cambios_fechas(consulta: ConsultaSQL, meses: int) -> List[Tuple[int, int, str]]:
+    return [
+        (k, k + 1, f"'{_desplazar_fecha(_literal_fecha(consulta.valores[k]), meses).isoformat()}'")
+        for k in _posiciones_fecha(consulta)
+    ]
+
+
+def desplazar_anios(sql: str, delta: int) -> Optional[str]:
+    """Corre el período `delta` años: años, fechas literales y CURRENT_DATE."""
+    consulta = parsear_sql(sql)
+    cambios = [(k, k + 1, str(int(consulta.valores[k]) + delta)) for k in _posiciones_anio(consulta)]
+    cambios += _cambios_fechas(consulta, 12 * delta)
+    hoy = _posiciones_hoy(consulta)
+    if hoy and not _hoy_desplazable(consulta, hoy, 12 * delta):
+        return None
+    cambios += [(k, k + 1, _hoy_desplazado(12 * delta)) for k in hoy]
+    if not cambios or not delta:
+        return None
+    return _editar(sql, cambios)
+
+
+def fijar_anio(sql: str, anio: int) -> Optional[str]:
+    """Lleva el período a otro año: requiere un único año en el SQL o un período relativo a hoy."""
+    consulta = parsear_sql(sql)
+    anios = {int(consulta.valores[k]) for k in _posiciones_anio(consulta)}
+    fechas = [_literal_fecha(consulta.valores[k]) for k in _posiciones_fecha(consulta)]
+    if fechas and (max(fechas) - min(fechas)).days <= 366:
+        # Un rango de hasta un año ('2025-01-01'..'2026-01-01') es del año en que empieza
+        anios.add(min(fechas).year)
+    else:
+        anios |= {fecha.year for fecha in fechas}
+    if _posiciones_hoy(consulta):
+        # Período relativo a hoy: se corre la fecha de referencia
+        return None if anios else desplazar_anios(sql, anio - date.today().year)
+    if len(anios) != 1:
+        return None
+    return desplazar_anios(sql, anio - anios.pop())
+
+
+def desplazar_meses(sql: str, delta: int) -> Optional[str]:
+    """
+    Corre el período `delta` meses. Formas soportadas (una sola por SQL):
+    fechas literales, CURRENT_DATE dentro de un período de un mes o trimestre
+    (ver _hoy_desplazable), o EXTRACT(MONTH/QUARTER ...) = N con un único año
+    (si el corrimiento cruza de año, el año también cambia).
+    """
+    consulta = parsear_sql(sql)
+    fechas = _posiciones_fecha(consulta)
+    hoy = _posiciones_hoy(consulta)
+    meses = _posiciones_extract(consulta, "MONTH")
+    trimestres = _posiciones_extract(consulta, "QUARTER")
+    anios = _posiciones_anio(consulta)
+
+    if hoy and not (fechas or anios or meses or trimestres):
+        if not _hoy_desplazable(consulta, hoy, delta):
+            return None
+        return _editar(sql, [(k, k + 1, _hoy_desplazado(delta)) for k in hoy])
+    if hoy:
+        return None
+    if fechas and not (anios or meses or trimestres):
+        # Rango de hasta `delta` meses: correr un rango anual un mes sería ambiguo
+        valores_fecha = [_literal_fecha(consulta.valores[k]) for k in fechas]
+        if (max(valores_fecha) - min(valores_fecha)).days > 31 * abs(delta) + 1:
+            return None
+        return _editar(sql, _cambios_fechas(consulta, delta))
+
+    valores_anio = {int(consulta.valores[k]) for k in anios}
+    if fechas or len(valores_anio) != 1:
+        return None
+    if meses and not trimestres:
+        posiciones, unidad = meses, 1
+    elif trimestres and not meses and delta % 3 == 0:
+        posiciones, unidad = trimestres, 3
+    else:
+        return None
+    valores = {int(float(consulta.valores[k])) for k in posiciones}
+    if len(valores) != 1:
+        return None
+    anio = valores_anio.pop()
+    nuevo_anio, resto = divmod(anio * 12 + (valores.pop() - 1) * unidad + delta, 12)
+    cambios = [(k, k + 1, str(resto // unidad + 1)) for k in posiciones]
+    if nuevo_anio != anio:
+        cambios += [(k, k + 1, str(nuevo_anio)) for k in anios]
+    return _editar(sql, cambios)
+
+
+def fijar_mes(sql: str, mes: int) -> Optional[str]:
+    """Lleva un período de un mes a otro mes del mismo año."""
+    consulta = parsear_sql(sql)
+    meses = _posiciones_extract(consulta, "MONTH")
+    if meses:
+        if len({int(float(consulta.valores[k])) for k in meses}) != 1:
+            return None
+        return _editar(sql, [(k, k + 1, str(mes)) for k in meses])
+
+    fechas = [_literal_fecha(consulta.valores[k]) for k in _posiciones_fecha(consulta)]
+    if fechas:
+        # Solo rangos de hasta un mes: "marzo" sobre un rango anual sería ambiguo
+        if (max(fechas) - min(fechas)).days > 31 or min(fechas).day != 1:
+            return None
+        return desplazar_meses(sql, mes - min(fechas).month)
+
+    hoy = _posiciones_hoy(consulta)
+    # Solo CURRENT_DATE sin corrimiento propio: MAKE_DATE(...) - INTERVAL '1 month' ya no sería el mes pedido
+    if not hoy or any(consulta.valores[k + 1:k + 2] != [")"] for k in hoy) or not _hoy_desplazable(consulta, hoy, 1):
+        return None
+    referencia = f"MAKE_DATE(EXTRACT(YEAR FROM CURRENT_DATE)::INT, {mes}, 1)"
+    return _editar(sql, [(k, k + 1, referencia) for k in hoy])
+
+
+# ══════════════════════════════════════════════════════════════
+# FILTROS
+# ══════════════════════════════════════════════════════════════
+
+def _comparaciones(ambito: _Ambito, columna: str, calificador: Optional[str], inicio: int, fin: int) -> Tuple[List[int], bool]:
+    """
+    Literales comparados por igualdad con la columna en [inicio, fin) y si la
+    columna aparece de alguna otra forma (IN, <>, función...).
+    """
+    c = ambito.consulta
+    literales, otra_forma = [], False
+    for k in range(inicio, fin):
+        if c.tipos[k] != "palabra" or c.valores[k] != columna.upper():
+            continue
+        calificada = k >= 2 and c.valores[k - 1] == "."
+        if calificador and (not calificada or c.valores[k - 2] != calificador.upper()):
+            continue
+        if k + 2 < fin and c.valores[k + 1] == "=" and c.tipos[k + 2] == "string":
+            literales.append(k + 2)
+        else:
+            otra_forma = True
+    return literales, otra_forma
+
+
+def agregar_filtro(sql: str, columna: str, valor: str) -> Optional[str]:
+    """Agrega (o cambia) un filtro de igualdad en el WHERE del ámbito de operaciones."""
+    ambito = _ambito_operaciones(parsear_sql(sql))
+    if ambito is None:
+        return None
+    c = ambito.consulta
+    literal = "'" + valor.replace("'", "''") + "'"
+
+    calificador = None
+    if columna == "area":
+        areas = ambito.alias_areas()
+        if areas:
+            columna, calificador = "nombre", areas
+            condicion = f"{areas}.nombre = {literal}"
+        else:
+            condicion = f"{ambito.alias}.area_id IN (SELECT id FROM areas WHERE nombre = {literal})"
+    else:
+        condicion = f"{ambito.alias}.{columna} = {literal}"
+
+    where = ambito.clausula("WHERE")
+    if where:
+        literales, otra_forma = _comparaciones(ambito, columna, calificador, where[0] + 1, where[1])
+        if otra_forma or len(literales) > 1:
+            return None
+        if literales:
+            if c.valores[literales[0]] == literal:
+                return sql
+            return _editar(sql, [(literales[0], literales[0] + 1, literal)])
+        hay_or = any(
+            c.valores[k] == "OR" and c.profundidades[k] == ambito.profundidad for k in range(*where)
+        )
+        if hay_or:
+            return _editar(sql, [(where[0] + 1, where[0] + 1, "("), _insercion(c, where[1], f") AND {condicion}")])
+        return _editar(sql, [_insercion(c, where[1], f"AND {condicion}")])
+
+    desde = ambito.clausula("FROM")
+    if desde is None:
+        return None
+    return _editar(sql, [_insercion(c, desde[1], f"WHERE {condicion}")])
+
+
+# ══════════════════════════════════════════════════════════════
+# AGRUPACIÓN Y MONEDA
+# ══════════════════════════════════════════════════════════════
+
+def _dimension(ambito: _Ambito, dimension: str) -> Optional[Tuple[str, str, List[Tuple[int, int, str]]]]:
+    """(expresión, alias, cambios extra) de una dimensión de agrupación, o None si no se puede."""
+    a = ambito.alias
+    if dimension == "area":
+        areas = ambito.alias_areas()
+        if areas:
+            return f"{areas}.nombre", "area", []
+        # El JOIN se inserta tras "FROM operaciones o"; con el alias ocupado no se arriesga
+        if ambito.consulta.valores[ambito.tabla - 1] != "FROM" or "AR" in ambito.consulta.palabras:
+            return None
+        join = f"LEFT JOIN areas ar ON ar.id = {a}.area_id"
+        return "ar.nombre", "area", [_insercion(ambito.consulta, ambito.fin_tabla, join)]
+    if dimension == "mes":
+        return f"TO_CHAR({a}.fecha, 'YYYY-MM')", "mes", []
+    columna = {"localidad": "localidad", "moneda": "moneda_original", "tipo": "tipo_operacion"}[dimension]
+    return f"{a}.{columna}", columna, []
+
+
+def _separar_alias(consulta: ConsultaSQL, inicio: int, fin: int) -> Tuple[str, Optional[str]]:
+    """(expresión normalizada, alias) de un ítem del SELECT."""
+    if fin - inicio >= 2 and consulta.valores[fin - 2] == "AS":
+        return _texto_normalizado(consulta, inicio, fin - 2), consulta.valores[fin - 1]
+    return _texto_normalizado(consulta, inicio, fin), None
+
+
+def cambiar_agrupacion(sql: str, dimension: str) -> Optional[str]:
+    """Reemplaza la única agrupación del ámbito (o agrupa un total) por otra dimensión."""
+    ambito = _ambito_operaciones(parsear_sql(sql))
+    if ambito is None:
+        return None
+    c = ambito.consulta
+    select = ambito.clausula("SELECT")
+    if select is None or select[0] > ambito.tabla:
+        return None
+    dimension_nueva = _dimension(ambito, dimension)
+    if dimension_nueva is None:
+        return None
+    expresion, alias, cambios = dimension_nueva
+    inicio_items = select[0] + 1
+    if inicio_items < select[1] and c.valores[inicio_items] == "DISTINCT":
+        inicio_items += 1
+    items = ambito.items(inicio_items, select[1])
+
+    agrupacion = ambito.clausula("GROUP BY")
+    if agrupacion is None:
+        # Un total: todos los ítems agregados -> se agrupa por la dimensión
+        if not all(any(v in _AGREGADOS for v in c.valores[i:f]) for i, f in items):
+            return None
+        cambios.append((inicio_items, inicio_items, f"{expresion} AS {alias}, "))
+        posterior = [ambito.clausula(n) for n in ("HAVING", "ORDER BY", "LIMIT")]
+        destino = min([p[0] for p in posterior if p] + [ambito.fin])
+        cambios.append(_insercion(c, destino, f"GROUP BY {expresion}"))
+        return _editar(sql, cambios)
+
+    grupos = ambito.items(agrupacion[0] + 2, agrupacion[1])
+    if len(grupos) != 1:
+        return None
+    anterior = _texto_normalizado(c, *grupos[0])
+    if anterior == expresion.upper():
+        return None
+
+    # Ítem del SELECT agrupado: por posición (GROUP BY 1), expresión o alias
+    item_agrupado, alias_anterior = None, None
+    if anterior.isdigit():
+        if 0 < int(anterior) <= len(items):
+            item_agrupado = items[int(anterior) - 1]
+            alias_anterior = _separar_alias(c, *item_agrupado)[1]
+    else:
+        for i, f in items:
+            expr_item, alias_item = _separar_alias(c, i, f)
+            if anterior in (expr_item, alias_item):
+                item_agrupado, alias_anterior = (i, f), alias_item
+                break
+    if item_agrupado is None:
+        return None
+
+    cambios.append((item_agrupado[0], item_agrupado[1], f"{expresion} AS {alias}"))
+    if not anterior.isdigit():
+        cambios.append((grupos[0][0], grupos[0][1], expresion))
+    orden = ambito.clausula("ORDER BY")
+    if orden:
+        for i, f in ambito.items(orden[0] + 2, orden[1]):
+            fin_expr = f - 1 if c.valores[f - 1] in ("ASC", "DESC") else f
+            if _texto_normalizado(c, i, fin_expr) in (anterior, alias_anterior):
+                cambios.append((i, fin_expr, alias))
+    return _editar(sql, cambios)
+
+
+_SUFIJOS_MONEDA = {
+    "USD": (("PESIFICADO", "dolarizado"), ("UYU", "usd"), ("PESOS", "dolares")),
+    "UYU": (("DOLARIZADO", "pesificado"), ("USD", "uyu"), ("DOLARES", "pesos")),
+}
+
+
+def cambiar_moneda(sql: str, moneda: str) -> Optional[str]:
+    """Expresa los montos en otra moneda: total_pesificado <-> total_dolarizado y sus alias."""
+    consulta = parsear_sql(sql)
+    origen, destino = ("TOTAL_PESIFICADO", "total_dolarizado") if moneda == "USD" else ("TOTAL_DOLARIZADO", "total_pesificado")
+    palabras = consulta.palabras
+    if origen not in palabras or destino.upper() in palabras or {"MONTO_UYU", "MONTO_USD"} & palabras:
+        return None
+
+    renombres: Dict[str, str] = {origen: destino}
+    for k in range(1, len(consulta.valores)):
+        if consulta.valores[k - 1] != "AS" or consulta.tipos[k] != "palabra":
+            continue
+        nuevo = consulta.valores[k].lower()
+        for viejo, reemplazo in _SUFIJOS_MONEDA[moneda]:
+            nuevo = nuevo.replace(viejo.lower(), reemplazo)
+        if nuevo != consulta.valores[k].lower():
+            renombres[consulta.valores[k]] = nuevo
+
+    cambios = [
+        (k, k + 1, renombres[valor]) for k, (tipo, valor) in enumerate(zip(consulta.tipos, consulta.valores))
+        if tipo == "palabra" and valor in renombres
+    ]
+    return _editar(sql, cambios)
+
+
+# ══════════════════════════════════════════════════════════════
+# RESOLUCIÓN
+# ══════════════════════════════════════════════════════════════
+
+def _aplicar(sql: str, refinamiento: Refinamiento) -> Optional[str]:
+    tipo, valor = refinamiento.tipo, refinamiento.valor
+    if tipo == "desplazar_anios":
+        return desplazar_anios(sql, valor)
+    if tipo == "desplazar_meses":
+        return desplazar_meses(sql, valor)
+    if tipo == "anio":
+        return fijar_anio(sql, valor)
+    if tipo == "mes":
+        return fijar_mes(sql, valor)
+    if tipo == "filtro":
+        return agregar_filtro(sql, *valor)
+    if tipo == "agrupar":
+        return cambiar_agrupacion(sql, valor)
+    if tipo == "moneda":
+        return cambiar_moneda(sql, valor)
+    return None
+
+
+def sql_previo(contexto: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+    """
+    SQL del último turno del asistente en el contexto (ver obtener_contexto_compacto):
+    el del último mensaje, o el del estado del resumen si ya se plegó.
+    """
+    for mensaje in reversed(contexto or []):
+        if mensaje.get("role") in ("assistant", "resumen"):
+            return mensaje.get("sql")
+    return None
+
+
+def resolver_seguimiento(pregunta: str, contexto: Optional[List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    SQL de una pregunta de seguimiento derivado del SQL del turno anterior.
+
+    Returns:
+        {"sql", "sql_previo", "refinamientos"} o None si la pregunta es nueva,
+        no hay SQL previo o alguna transformación no aplica.
+    """
+    anterior = sql_previo(contexto)
+    if not anterior:
+        return None
+    # Un turno de lote guarda sus SQL unidos con ';': reescribirlos daría un multi-sentencia que no se ejecuta
+    previa = parsear_sql(anterior)
+    if previa.tipo_sentencia != "SELECT" or len(previa.sentencias) != 1:
+        return None
+    refinamientos = detectar_refinamientos(pregunta)
+    if not refinamientos:
+        return None
+
+    sql = anterior
+    for refinamiento in refinamientos:
+        sql = _aplicar(sql, refinamiento)
+        if sql is None:
+            logger.info(f"Seguimiento: '{refinamiento.tipo}' no aplica al SQL previo, se usa el modelo")
+            return None
+    return {
+        "sql": sql,
+        "sql_previo": anterior,
+        "refinamientos": [{"tipo": r.tipo, "valor": r.valor} for r in refinamientos],
+    }
@@ -0,0 +1,443 @@
+"""
+AST liviano de SQL - Sistema CFO Inteligente
+
+Un mismo SQL generado pasaba por extracción y validar_sql (sql_utils), los
+pre-validadores, el post-procesador, el detector de tipo y la lista de
+comandos prohibidos de cfo_ai_service. Cada capa re-escaneaba el texto con
+.upper(), find() y regex, y confundía palabras dentro de strings o
+comentarios con SQL.
+
+ConsultaSQL tokeniza el texto UNA vez (una regex con alternativas, Python
+puro) y arma encima una estructura mínima:
+- tokens sin pérdida (espacios y comentarios incluidos): a_sql() re-emite
+  el texto original si nada cambió
+- profundidad de paréntesis y pares ( ) de cada token significativo
+- sentencias (';' de nivel 0)
+- grupos de UNION/INTERSECT/EXCEPT de cada nivel, con sus ramas
+- cláusulas (SELECT, FROM, WHERE, GROUP BY, HAVING, ORDER BY, LIMIT...) al
+  nivel de cada rama
+
+Los validadores consultan esa estructura y las reescrituras del
+post-procesador la mutan; el SQL se emite una vez al final. parsear_sql()
+cachea por texto, así las capas que reciben el mismo string comparten el
+parseo. Las instancias cacheadas no se mutan: para reescribir, .copia().
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from app.core.constants import SQL_AST_CACHE_MAX_ENTRADAS
+
+# En E'...' la barra escapa (E'\'' es una comilla); en '...' es un carácter más
+_RE_TOKEN = re.compile(
+    r"""
+      (?P<espacio>\s+)
+    | (?P<comentario>--[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<escape>[eE]'(?:[^'\\]|\\.|'')*')
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<dolar>\$(?P<etiqueta>(?:[^\W\d]\w*)?)\$.*?\$(?P=etiqueta)\$)
+    | (?P<identificador>"(?:[^"]|"")*")
+    | (?P<numero>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    | (?P<palabra>[^\W\d]\w*)
+    | (?P<parametro>:[^\W\d]\w*|%\(\w+\)s|\$\d+)
+    | (?P<operador>::|<=|>=|<>|!=|\|\||[-+*/%<>=~!@#^&|])
+    | (?P<puntuacion>[(),;.\[\]])
+    | (?P<otro>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_TIPOS_IGNORADOS = frozenset({"espacio", "comentario"})
+_OPERACIONES_CONJUNTO = frozenset({"UNION", "INTERSECT", "EXCEPT"})
+_CLAUSULAS_SIMPLES = frozenset({"SELECT", "FROM", "WHERE", "HAVING", "WINDOW", "LIMIT", "OFFSET", "FETCH"})
+_COMANDOS = frozenset({
+    "SELECT", "VALUES", "INSERT", "UPDATE", "DELETE", "MERGE", "CREATE", "DROP", "ALTER",
+    "TRUNCATE", "GRANT", "REVOKE", "COPY",
+})
+# Opciones sin paréntesis entre EXPLAIN y la sentencia explicada
+_OPCIONES_EXPLAIN = frozenset({"ANALYZE", "ANALYSE", "VERBOSE"})
+
+
+@dataclass(frozen=True, slots=True)
+class Token:
+    tipo: str
+    texto: str
+
+
+def _tokenizar(sql: str) -> List[Token]:
+    tokens = []
+    for m in _RE_TOKEN.finditer(sql):
+        tipo = m.lastgroup
+        tokens.append(Token("string" if tipo in ("dolar", "escape") else tipo, m.group(tipo)))
+    return tokens
+
+
+# ══════════════════════════════════════════════════════════════
+# ESTRUCTURA
+# ══════════════════════════════════════════════════════════════
+
+@dataclass
+class Rama:
+    """Una rama de un grupo UNION/INTERSECT/EXCEPT (o la sentencia entera si no hay)."""
+
+    consulta: "ConsultaSQL"
+    inicio: int
+    fin: int
+    profundidad: int
+
+    @property
+    def valores(self) -> List[str]:
+        return self.consulta.valores[self.inicio:self.fin]
+
+    @property
+    def parentizada(self) -> bool:
+        """True si la rama es un único '( ... )'."""
+        return (
+            self.fin > self.inicio
+            and self.consulta.valores[self.inicio] == "("
+            and self.consulta.pareja.get(self.inicio) == self.fin - 1
+        )
+
+    def clausula(self, nombre: str) -> Optional[Tuple[int, int]]:
+        """(inicio, fin) de la última cláusula `nombre` del nivel de la rama, palabra clave incluida."""
+        encontradas = self.consulta.clausulas(nombre, self.inicio, self.fin, self.profundidad)
+        return encontradas[-1] if encontradas else None
+
+    def tiene_clausula(self, nombre: str, desde: Optional[int] = None) -> bool:
+        clausulas = self.consulta.clausulas(nombre, self.inicio, self.fin, self.profundidad)
+        desde = self.inicio if desde is None else desde
+        return any(inicio >= desde for inicio, _ in clausulas)
+
+    def texto(self) -> str:
+        return self.consulta.texto_entre(self.inicio, self.fin)
+
+
+@dataclass
+class GrupoConjunto:
+    """Ramas de un mismo nivel unidas por UNION/INTERSECT/EXCEPT."""
+
+    profundidad: int
+    ramas: List[Rama]
+    separadores: List[Tuple[int, int]] = field(default_factory=list)
+
+    @property
+    def inicio(self) -> int:
+        return self.ramas[0].inicio
+
+    @property
+    def fin(self) -> int:
+        return self.ramas[-1].fin
+
+    @property
+    def operadores(self) -> List[str]:
+        """'UNION ALL', 'UNION', 'EXCEPT'... en orden."""
+        valores = self.ramas[0].consulta.valores
+        return [" ".join(valores[inicio:fin]) for inicio, fin in self.separadores]
+
+
+@dataclass
+class _Ambito:
+    inicio: int
+    profundidad: int
+    cortes: List[Tuple[int, int]] = field(default_factory=list)
+
+
+# ══════════════════════════════════════════════════════════════
+# CONSULTA
+# ══════════════════════════════════════════════════════════════
+
+class ConsultaSQL:
+    """
+    SQL tokenizado una vez. Las posiciones (inicio, fin) que usan los métodos
+    indexan `valores`: los tokens significativos (sin espacios ni comentarios),
+    con las palabras en mayúsculas.
+    """
+
+    def __init__(self, sql: Optional[str]):
+        self.tokens: List[Token] = _tokenizar(sql or "")
+        self._indexar()
+
+    def _indexar(self) -> None:
+        self._posiciones = [i for i, t in enumerate(self.tokens) if t.tipo not in _TIPOS_IGNORADOS]
+        significativos = [self.tokens[i] for i in self._posiciones]
+        self.tipos: List[str] = [t.tipo for t in significativos]
+        self.valores: List[str] = [
+            t.texto.upper() if t.tipo == "palabra" else t.texto for t in significativos
+        ]
+
+        self.profundidades: List[int] = []
+        self.pareja: Dict[int, int] = {}
+        abiertos: List[int] = []
+        self.parentesis_abiertos = self.parentesis_cerrados = 0
+        for k, (tipo, valor) in enumerate(zip(self.tipos, self.valores)):
+            if tipo == "puntuacion" and valor == ")":
+                self.parentesis_cerrados += 1
+                if abiertos:
+                    self.pareja[abiertos.pop()] = k
+            self.profundidades.append(len(abiertos))
+            if tipo == "puntuacion" and valor == "(":
+                self.parentesis_abiertos += 1
+                abiertos.append(k)
+
+        self.palabras = frozenset(v for t, v in zip(self.tipos, self.valores) if t == "palabra")
+        self.funciones = frozenset(
+            self.valores[k] for k in range(len(self.valores) - 1)
+            if self.tipos[k] == "palabra" and self.valores[k + 1] == "("
+        )
+        self.literales: List[str] = [
+            t.texto[t.texto.index("'") + 1:-1].replace("''", "'")
+            for t in significativos if t.tipo == "string" and t.texto.endswith("'")
+        ]
+        self.sentencias, self.grupos = self._estructurar()
+
+    def _estructurar(self) -> Tuple[List[GrupoConjunto], List[GrupoConjunto]]:
+        """Recorre los tokens una vez: sentencias y grupos de conjunto de cada nivel."""
+        sentencias: List[GrupoConjunto] = []
+        grupos: List[GrupoConjunto] = []
+        total = len(self.valores)
+
+        def cerrar(ambito: _Ambito, fin: int) -> GrupoConjunto:
+            ramas, inicio = [], ambito.inicio
+            for inicio_corte, fin_corte in ambito.cortes:
+                ramas.append(Rama(self, inicio, inicio_corte, ambito.profundidad))
+                inicio = fin_corte
+            ramas.append(Rama(self, inicio, fin, ambito.profundidad))
+            grupo = GrupoConjunto(ambito.profundidad, ramas, list(ambito.cortes))
+            if ambito.cortes:
+                grupos.append(grupo)
+            return grupo
+
+        pila = [_Ambito(0, 0)]
+        for k, (tipo, valor) in enumerate(zip(self.tipos, self.valores)):
+            if tipo == "puntuacion":
+                if valor == "(":
+                    pila.append(_Ambito(k + 1, self.profundidades[k] + 1))
+                elif valor == ")" and len(pila) > 1:
+                    cerrar(pila.pop(), k)
+                elif valor == ";" and len(pila) == 1:
+                    if k > pila[0].inicio:
+                        sentencias.append(cerrar(pila[0], k))
+                    pila[0] = _Ambito(k + 1, 0)
+            elif tipo == "palabra" and valor in _OPERACIONES_CONJUNTO:
+                fin = k + 1
+                if fin < total and self.valores[fin] in ("ALL", "DISTINCT"):
+                    fin += 1
+                pila[-1].cortes.append((k, fin))
+
+        while len(pila) > 1:
+            cerrar(pila.pop(), total)
+        if total > pila[0].inicio:
+            sentencias.append(cerrar(pila[0], total))
+        return sentencias, grupos
+
+    # ── Consultas ─────────────────────────────────────────────
+
+    @property
+    def vacia(self) -> bool:
+        return not self.valores
+
+    @property
+    def ramas(self) -> List[Rama]:
+        """Ramas del nivel superior de la primera sentencia ([] si está vacía)."""
+        return self.sentencias[0].ramas if self.sentencias else []
+
+    def buscar(self, *secuencia: str, inicio: int = 0, fin: Optional[int] = None) -> Iterator[int]:
+        """Posiciones donde aparece la secuencia de valores (palabras en mayúsculas)."""
+        fin = len(self.valores) if fin is None else fin
+        largo = len(secuencia)
+        for k in range(inicio, fin - largo + 1):
+            if self.valores[k] == secuencia[0] and tuple(self.valores[k:k + largo]) == secuencia:
+                yield k
+
+    def tiene(self, *secuencia: str, inicio: int = 0, fin: Optional[int] = None) -> bool:
+        return next(self.buscar(*secuencia, inicio=inicio, fin=fin), None) is not None
+
+    def contar(self, *secuencia: str) -> int:
+        return sum(1 for _ in self.buscar(*secuencia))
+
+    def valor_numerico(self, k: int) -> Optional[float]:
+        if 0 <= k < len(self.valores) and self.tipos[k] == "numero":
+            return float(self.valores[k])
+        return None
+
+    def _inicia_clausula(self, k: int) -> bool:
+        valor = self.valores[k]
+        if self.tipos[k] != "palabra":
+            return False
+        if valor in _CLAUSULAS_SIMPLES:
+            return True
+        return valor in ("GROUP", "ORDER") and k + 1 < len(self.valores) and self.valores[k + 1] == "BY"
+
+    def fin_clausula(self, k: int, profundidad: int, limite: int) -> int:
+        """Primera posición desde k donde termina una cláusula de ese nivel."""
+        while k < limite:
+            nivel = self.profundidades[k]
+            if nivel < profundidad:
+                break
+            if nivel == profundidad and (
+                self._inicia_clausula(k) or self.valores[k] in _OPERACIONES_CONJUNTO or self.valores[k] == ";"
+            ):
+                break
+            k += 1
+        return k
+
+    def clausulas(
+        self,
+        nombre: str,
+        inicio: int = 0,
+        fin: Optional[int] = None,
+        profundidad: Optional[int] = None,
+    ) -> List[Tuple[int, int]]:
+        """
+        Cláusulas `nombre` ('WHERE', 'ORDER BY'...) como (inicio, fin), palabra clave
+        incluida. Con profundidad solo las de ese nivel; sin ella, las de todos.
+        """
+        secuencia = tuple(nombre.upper().split())
+        fin = len(self.valores) if fin is None else fin
+        encontradas = []
+        for k in self.buscar(*secuencia, inicio=inicio, fin=fin):
+            nivel = self.profundidades[k]
+            if profundidad is not None and nivel != profundidad:
+                continue
+            encontradas.append((k, self.fin_clausula(k + len(secuencia), nivel, fin)))
+        return encontradas
+
+    @property
+    def comandos(self) -> List[str]:
+        """
+        Primera palabra de cada sentencia y de cada paréntesis (incluye CTEs que
+        modifican datos), más la sentencia principal que sigue a una lista WITH y
+        la sentencia de un EXPLAIN (WITH x AS (...) DELETE, EXPLAIN ANALYZE DELETE).
+        """
+        comandos = []
+        for k, (tipo, valor) in enumerate(zip(self.tipos, self.valores)):
+            if tipo != "palabra" or not (k == 0 or self.valores[k - 1] in ("(", ";")):
+                continue
+            comandos.append(valor)
+            interno = self._comando_interno(k)
+            if interno is not None:
+                comandos.append(interno)
+        return comandos
+
+    def _comando_interno(self, k: int) -> Optional[str]:
+        """Comando que sigue a WITH (después de los CTEs) o a EXPLAIN (después de sus opciones)."""
+        if self.valores[k] not in ("WITH", "EXPLAIN"):
+            return None
+        nivel = self.profundidades[k]
+        j = k + 1
+        while j < len(self.valores) and self.profundidades[j] >= nivel and self.valores[j] != ";":
+            if self.profundidades[j] == nivel and self.tipos[j] == "palabra":
+                if self.valores[k] == "EXPLAIN" and self.valores[j] not in _OPCIONES_EXPLAIN:
+                    return self.valores[j]
+                # La sentencia principal sigue al ")" del último CTE; "x(a, b) AS" no cuenta
+                if self.valores[k] == "WITH" and self.valores[j - 1] == ")" and self.valores[j] != "AS":
+                    return self.valores[j]
+            j += 1
+        return None
+
+    @property
+    def tipo_sentencia(self) -> str:
+        """Comando de la primera sentencia (el de menor profundidad; WITH resuelve al que sigue)."""
+        if not self.sentencias:
+            return "UNKNOWN"
+        sentencia = self.sentencias[0]
+        candidatos = [
+            (self.profundidades[k], k) for k in range(sentencia.inicio, sentencia.fin)
+            if self.tipos[k] == "palabra" and self.valores[k] in _COMANDOS
+        ]
+        if not candidatos:
+            return "UNKNOWN"
+        return self.valores[min(candidatos)[1]]
+
+    def texto_entre(self, inicio: int, fin: int) -> str:
+        """Texto original de los tokens significativos [inicio, fin), con lo que haya entre ellos."""
+        if fin <= inicio:
+            return ""
+        return "".join(t.texto for t in self.tokens[self._posiciones[inicio]:self._posiciones[fin - 1] + 1])
+
+    def a_sql(self) -> str:
+        return "".join(t.texto for t in self.tokens)
+
+    # ── Reescrituras ──────────────────────────────────────────
+
+    def copia(self) -> "ConsultaSQL":
+        """Copia mutable sin re-tokenizar (los tokens son inmutables)."""
+        nueva = ConsultaSQL.__new__(ConsultaSQL)
+        nueva.tokens = list(self.tokens)
+        nueva._indexar()
+        return nueva
+
+    def reemplazar_literales(self, reemplazos: Dict[str, str]) -> int:
+        """Reemplaza literales string completos ("'Juridica'" → "'Jurídica'"); retorna cuántos."""
+        cambios = 0
+        for i, token in enumerate(self.tokens):
+            if token.tipo == "string" and token.texto in reemplazos:
+                self.tokens[i] = Token("string", reemplazos[token.texto])
+                cambios += 1
+        if cambios:
+            self._indexar()
+        return cambios
+
+    def editar(self, cambios: Sequence[Tuple[int, int, str]]) -> None:
+        """
+        Reemplaza rangos [inicio, fin) de tokens significativos por texto nuevo,
+        conservando espacios y comentarios de alrededor. inicio == fin inserta
+        antes del token inicio (len(valores) inserta al final). Los rangos no
+        deben solaparse.
+        """
+        tokens = list(self.tokens)
+        total = len(self.valores)
+        for inicio, fin, texto in sorted(cambios, key=lambda cambio: cambio[0], reverse=True):
+            if inicio >= total:
+                desde = hasta = self._posiciones[-1] + 1 if self._posiciones else len(tokens)
+            else:
+                desde = self._posiciones[inicio]
+                hasta = self._posiciones[fin - 1] + 1 if fin > inicio else desde
+            tokens[desde:hasta] = _tokenizar(texto)
+        self.tokens = tokens
+        self._indexar()
+
+    def reconstruir(self, partes: Sequence[Union[str, Tuple[int, int]]]) -> None:
+        """Rearma la consulta con rangos (inicio, fin) propios y fragmentos de texto nuevos."""
+        tokens: List[Token] = []
+        for parte in partes:
+            if isinstance(parte, str):
+                tokens.extend(_tokenizar(parte))
+            elif parte[1] > parte[0]:
+                tokens.extend(self.tokens[self._posiciones[parte[0]]:self._posiciones[parte[1] - 1] + 1])
+        self.tokens = tokens
+        self._indexar()
+
+
+# ══════════════════════════════════════════════════════════════
+# CACHE DE PARSEOS
+# ══════════════════════════════════════════════════════════════
+
+_cache: "OrderedDict[str, ConsultaSQL]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def registrar_consulta(consulta: ConsultaSQL) -> None:
+    """Cachea una consulta (p.ej. ya post-procesada) bajo el texto que emite."""
+    sql = consulta.a_sql()
+    with _lock:
+        _cache[sql] = consulta
+        _cache.move_to_end(sql)
+        while len(_cache) > SQL_AST_CACHE_MAX_ENTRADAS:
+            _cache.popitem(last=False)
+
+
+def parsear_sql(sql: Optional[str]) -> ConsultaSQL:
+    """ConsultaSQL compartida para `sql`. No mutarla: usar .copia() para reescribir."""
+    sql = sql or ""
+    with _lock:
+        consulta = _cache.get(sql)
+        if consulta is not None:
+            _cache.move_to_end(sql)
+            return consulta
+    consulta = ConsultaSQL(sql)
+    registrar_consulta(consulta)
+    return consulta
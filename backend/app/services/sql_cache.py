@@ -0,0 +1,179 @@
+"""
+Cache de SQL generado - Sistema CFO Inteligente
+
+Evita repetir el round-trip a Claude cuando la misma pregunta ya fue resuelta
+con SQL validado. La clave combina:
+- la pregunta normalizada (sin tildes, minúsculas, sin puntuación, espacios colapsados)
+- las fechas relativas resueltas ("este mes" -> "mes 2025-10"), para que el cache
+  no sirva SQL de otro período
+- la huella del contexto conversacional (follow-ups no colisionan con preguntas nuevas)
+
+Eviction LRU por cantidad de entradas + TTL por entrada. Thread-safe: el endpoint
+de streaming corre en el threadpool de FastAPI.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.core.constants import SQL_CACHE_MAX_ENTRADAS, SQL_CACHE_TTL_SEGUNDOS
+
+
+def _sin_tildes(texto: str) -> str:
+    """Elimina diacríticos (á -> a, ñ -> n) preservando el resto del texto."""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def _mes_anterior(hoy: date) -> date:
+    """Retorna el primer día del mes anterior a la fecha dada."""
+    return (hoy.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def _resolver_fechas_relativas(texto: str, hoy: date) -> str:
+    """Reemplaza expresiones temporales relativas por su valor absoluto."""
+    trimestre = (hoy.month - 1) // 3 + 1
+    semana = hoy.isocalendar()
+    reemplazos = [
+        (r"\bhoy\b", hoy.isoformat()),
+        (r"\bayer\b", (hoy - timedelta(days=1)).isoformat()),
+        (r"\b(?:este mes|mes actual|mes en curso)\b", f"mes {hoy:%Y-%m}"),
+        (r"\b(?:mes pasado|mes anterior|ultimo mes)\b", f"mes {_mes_anterior(hoy):%Y-%m}"),
+        (r"\b(?:este ano|ano actual|ano en curso)\b", f"ano {hoy.year}"),
+        (r"\b(?:ano pasado|ano anterior)\b", f"ano {hoy.year - 1}"),
+        (r"\b(?:este trimestre|trimestre actual)\b", f"trimestre {hoy.year}-t{trimestre}"),
+        (r"\besta semana\b", f"semana {semana[0]}-w{semana[1]:02d}"),
+    ]
+    for patron, valor in reemplazos:
+        texto = re.sub(patron, valor, texto)
+    return texto
+
+
+def normalizar_pregunta(pregunta: str, hoy: Optional[date] = None) -> str:
+    """
+    Normaliza una pregunta para usarla como clave de cache.
+
+    Args:
+        pregunta: Pregunta del usuario en lenguaje natural.
+        hoy: Fecha de referencia para resolver fechas relativas (default: hoy).
+
+    Returns:
+        Texto normalizado, p.ej. "¿Cuánto facturamos ESTE MES?" -> "cuanto facturamos mes 2025-10".
+    """
+    hoy = hoy or date.today()
+    texto = _sin_tildes((pregunta or "").lower())
+    texto = re.sub(r"[^\w\s%-]", " ", texto)
+    texto = re.sub(r"\s+", " ", texto).strip()
+    return _resolver_fechas_relativas(texto, hoy)
+
+
+def huella_contexto(contexto: Optional[List[Dict[str, Any]]]) -> str:
+    """Hash estable del contexto conversacional ("" si no hay contexto)."""
+    if not contexto:
+        return ""
+    mensajes = [[msg.get("role", ""), msg.get("content", "")] for msg in contexto]
+    serializado = json.dumps(mensajes, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(serializado.encode("utf-8")).hexdigest()
+
+
+class SQLCache:
+    """Cache LRU + TTL de resultados exitosos de generación SQL."""
+
+    def __init__(
+        self,
+        max_entradas: int = SQL_CACHE_MAX_ENTRADAS,
+        ttl_segundos: float = SQL_CACHE_TTL_SEGUNDOS,
+    ):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._entradas: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def construir_clave(
+        pregunta: str,
+        contexto: Optional[List[Dict[str, Any]]] = None,
+        hoy: Optional[date] = None,
+        incluir_fecha: bool = False,
+    ) -> str:
+        """
+        Construye la clave de cache para una pregunta.
+
+        Args:
+            pregunta: Pregunta del usuario.
+            contexto: Mensajes previos de la conversación.
+            hoy: Fecha de referencia.
+            incluir_fecha: True si el SQL depende del día (p.ej. preguntas con
+                metadatos temporales); la entrada deja de valer al cambiar de día.
+        """
+        hoy = hoy or date.today()
+        partes = [
+            normalizar_pregunta(pregunta, hoy),
+            huella_contexto(contexto),
+            hoy.isoformat() if incluir_fecha else "",
+        ]
+        return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+    def obtener(self, clave: str) -> Optional[Dict[str, Any]]:
+        """Retorna una copia del valor cacheado o None (cuenta hit/miss)."""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+
+            guardado_en, valor = entrada
+            if time.monotonic() - guardado_en > self.ttl_segundos:
+                del self._entradas[clave]
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            return dict(valor)
+
+    def guardar(self, clave: str, valor: Dict[str, Any]) -> None:
+        """Guarda un valor, desalojando la entrada menos usada si se supera el máximo."""
+        with self._lock:
+            self._entradas[clave] = (time.monotonic(), dict(valor))
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.evictions += 1
+
+    def invalidar(self, clave: str) -> None:
+        """Elimina una entrada puntual si existe."""
+        with self._lock:
+            self._entradas.pop(clave, None)
+
+    def limpiar(self) -> None:
+        """Vacía el cache y reinicia los contadores."""
+        with self._lock:
+            self._entradas.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores de uso del cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl_segundos,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
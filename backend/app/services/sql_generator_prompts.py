@@ -163,6 +163,28 @@ RELACION operaciones <-> distribuciones_detalle:
   se repite 5 veces por el JOIN).
   REGLA: con JOIN a distribuciones_detalle, SIEMPRE sumar dd.total_pesificado (nunca o.total_pesificado).
 
+== TABLA: operaciones_diarias (ROLLUP) ==
+Totales diarios pre-agregados de operaciones ACTIVAS (ya excluye anuladas: no tiene deleted_at).
+Una fila por (fecha, tipo_operacion, area_id, localidad, moneda_original). Se mantiene al dia con cada alta, edicion y anulacion.
+CREATE TABLE operaciones_diarias (
+    fecha DATE NOT NULL,
+    tipo_operacion VARCHAR(20) NOT NULL,    -- mismo enum que operaciones
+    area_id UUID REFERENCES areas(id),      -- NULL para RETIRO y DISTRIBUCION
+    localidad VARCHAR(20) NOT NULL,         -- mismo enum que operaciones
+    moneda_original VARCHAR(3) NOT NULL,    -- mismo enum que operaciones
+    cantidad_operaciones INTEGER NOT NULL,  -- Cantidad de operaciones del grupo. Usar SUM(cantidad_operaciones), NUNCA COUNT(*).
+    monto_original NUMERIC(18,2),           -- SUM(monto_original) del grupo (en su moneda_original)
+    monto_uyu NUMERIC(18,2),
+    monto_usd NUMERIC(18,2),
+    total_pesificado NUMERIC(18,2),         -- SUM(total_pesificado) del grupo
+    total_dolarizado NUMERIC(18,2)          -- SUM(total_dolarizado) del grupo
+);
+PREFERIR operaciones_diarias para totales, evoluciones y rankings por tipo, fecha (dia/mes/trimestre/anio),
+area, localidad o moneda: SUM(total_pesificado) da el mismo resultado que sobre operaciones y es mucho mas rapido.
+Usar operaciones cuando la pregunta necesita cliente, proveedor, descripcion, tipo_cambio, operaciones
+individuales (detalle, ultimas N, mayor operacion) o JOIN a distribuciones_detalle.
+Conteos: SUM(cantidad_operaciones). Promedio por operacion: SUM(total_pesificado) / SUM(cantidad_operaciones).
+
 == VALORES ENUM (case sensitive) ==
   tipo_operacion: 'INGRESO', 'GASTO', 'RETIRO', 'DISTRIBUCION' (MAYUSCULAS)
   moneda_original: 'UYU', 'USD' (MAYUSCULAS)
@@ -175,22 +197,22 @@ RELACION operaciones <-> distribuciones_detalle:
 Dado que busco, desde donde parto y como navego:
 
 INTENCION                         | TABLA RAIZ             | JOINs                              | NOTAS
-Ingresos (total, por mes, etc.)   | operaciones            | --                                 | tipo='INGRESO'
-Ingresos por area                 | operaciones            | INNER JOIN areas                   | tipo='INGRESO'
+Ingresos (total, por mes, etc.)   | operaciones_diarias    | --                                 | tipo='INGRESO'
+Ingresos por area                 | operaciones_diarias    | INNER JOIN areas                   | tipo='INGRESO'
 Ingresos por cliente              | operaciones            | --                                 | tipo='INGRESO', GROUP BY cliente. cliente puede ser NULL.
-Gastos (total, por mes, etc.)     | operaciones            | --                                 | tipo='GASTO'
-Gastos por area                   | operaciones            | INNER JOIN areas                   | tipo='GASTO'
+Gastos (total, por mes, etc.)     | operaciones_diarias    | --                                 | tipo='GASTO'
+Gastos por area                   | operaciones_diarias    | INNER JOIN areas                   | tipo='GASTO'
 Gastos por proveedor              | operaciones            | --                                 | tipo='GASTO', GROUP BY proveedor
-Retiros (total, por mes)          | operaciones            | --                                 | tipo='RETIRO'. NO hay detalle por socio.
+Retiros (total, por mes)          | operaciones_diarias    | --                                 | tipo='RETIRO'. NO hay detalle por socio.
 Retiros: POR SOCIO                | --                     | --                                 | IMPOSIBLE. Los retiros NO tienen registros en distribuciones_detalle. Si preguntan retiros por socio → ERROR explicativo.
-Distribuciones: TOTAL             | operaciones            | --                                 | tipo='DISTRIBUCION'. NO usar distribuciones_detalle.
+Distribuciones: TOTAL             | operaciones_diarias    | --                                 | tipo='DISTRIBUCION'. NO usar distribuciones_detalle.
 Distribuciones: POR SOCIO         | distribuciones_detalle | JOIN operaciones + JOIN socios     | SUM(dd.total_X). NUNCA SUM(o.total_X).
-Resultado neto                    | operaciones            | --                                 | Solo INGRESO+GASTO. Nunca RETIRO/DISTRIBUCION.
-Rentabilidad                      | operaciones            | --                                 | (Ingresos-Gastos)/Ingresos*100. Division por cero con CASE WHEN.
-Resultado/Rentabilidad por area   | operaciones            | INNER JOIN areas                   | Solo INGRESO+GASTO.
+Resultado neto                    | operaciones_diarias    | --                                 | Solo INGRESO+GASTO. Nunca RETIRO/DISTRIBUCION.
+Rentabilidad                      | operaciones_diarias    | --                                 | (Ingresos-Gastos)/Ingresos*100. Division por cero con CASE WHEN.
+Resultado/Rentabilidad por area   | operaciones_diarias    | INNER JOIN areas                   | Solo INGRESO+GASTO.
 Resumen multi-tipo                | operaciones            | LEFT JOIN areas (si necesita area) | CASE WHEN o UNION ALL. Si UNION ALL: parentesis por rama.
-Capital de trabajo                | operaciones            | --                                 | Ingresos - Gastos - Distribuciones.
-% por moneda de origen            | operaciones            | --                                 | GROUP BY moneda_original. NUNCA derivar de totales.
+Capital de trabajo                | operaciones_diarias    | --                                 | Ingresos - Gastos - Distribuciones.
+% por moneda de origen            | operaciones_diarias    | --                                 | GROUP BY moneda_original. NUNCA derivar de totales.
 % de un subconjunto sobre total   | operaciones            | --                                 | Denominador = total SIN filtro de la dimension analizada.
 
 REGLAS DE JOIN:
@@ -210,7 +232,7 @@ Preferi una query rica con GROUP BY antes que un mega-UNION ALL.
 
 <guardrails_sql>
 SIEMPRE:
-1. deleted_at IS NULL en TODA referencia a operaciones (incluidas subconsultas y CTEs).
+1. deleted_at IS NULL en TODA referencia a operaciones (incluidas subconsultas y CTEs). operaciones_diarias NO tiene deleted_at (solo contiene activas).
 2. SUM(total_pesificado) para pesos, SUM(total_dolarizado) para dolares. NUNCA SUM(monto_uyu) ni SUM(monto_usd).
 3. CASE WHEN SUM(...)=0 THEN 0 ELSE ... END para evitar division por cero en rentabilidad.
 4. Filtro temporal con EXTRACT(YEAR FROM fecha) o equivalente. Sin anio explicito = anio actual.
@@ -546,6 +568,19 @@ Pregunta: {pregunta_usuario}
 # Parte estatica (se cachea entre llamadas -- todo antes de <consulta>):
 SQL_SYSTEM_PROMPT_STATIC = SQL_SYSTEM_PROMPT.split("<consulta>")[0].rstrip()
 
+# Ejemplos pregunta/SQL de <ejemplos>: fuente del indice de ejemplos_sql.py
+EJEMPLOS_SQL = SQL_SYSTEM_PROMPT_STATIC.split("<ejemplos>")[1].split("</ejemplos>")[0].strip()
+
+# Nucleo sin <ejemplos>: reglas y esquema fijos (cacheables); los ejemplos
+# relevantes a cada pregunta van en el user message (ver ejemplos_sql.py)
+SQL_SYSTEM_PROMPT_NUCLEO = (
+    SQL_SYSTEM_PROMPT_STATIC.split("<ejemplos>")[0].rstrip()
+    + "\n\n<ejemplos>\n"
+    + "Los ejemplos de SQL correcto mas parecidos a la pregunta llegan en el mensaje del usuario,\n"
+    + "dentro de <ejemplos>. Seguir sus patrones cuando apliquen.\n"
+    + "</ejemplos>"
+)
+
 
 def build_sql_prompt(fecha_actual: str, pregunta_usuario: str) -> str:
     """Arma el system prompt completo con la fecha y pregunta del usuario.
@@ -595,7 +630,7 @@ def build_anthropic_system_blocks(fecha_actual: str, pregunta_usuario: str) -> l
 # BACKWARD COMPATIBILITY — Aliases para imports existentes
 # Estos nombres son importados por:
 #   - chain_of_thought_sql.py  -> DDL_CONTEXT, BUSINESS_CONTEXT
-#   - claude_sql_generator.py  -> build_sql_system_prompt
+#   - claude_sql_generator.py  -> build_sql_system_prompt (nucleo si hay ejemplos dinamicos)
 #   - test_claude_sql_generator.py -> DDL_CONTEXT, BUSINESS_CONTEXT, build_sql_system_prompt
 #
 # Se mantienen para no romper esos modulos. El prompt principal es SQL_SYSTEM_PROMPT.
@@ -689,9 +724,12 @@ TEMPORAL:
 """
 
 
-def build_sql_system_prompt() -> str:
+def build_sql_system_prompt(ejemplos_dinamicos: bool = False) -> str:
     """Backward-compatible: retorna el prompt SQL estatico para callers que no usan prompt caching.
 
     Usado por claude_sql_generator.py que lo almacena como base y le agrega la pregunta.
+
+    Args:
+        ejemplos_dinamicos: True = nucleo sin <ejemplos> (los elige ejemplos_sql por pregunta)
     """
-    return SQL_SYSTEM_PROMPT_STATIC
+    return SQL_SYSTEM_PROMPT_NUCLEO if ejemplos_dinamicos else SQL_SYSTEM_PROMPT_STATIC
@@ -2,11 +2,16 @@
 Post-procesador inteligente de SQL
 Modifica SQL generado por el LLM según patrones detectados en la pregunta
 Principio: Convention over configuration, DRY, KISS
+
+Las correcciones mutan una copia del parseo compartido (app.services.sql_ast)
+y procesar_sql emite el SQL una sola vez al final.
 """
 
 import re
 from typing import Dict, Any, Optional
 
+from app.services.sql_ast import ConsultaSQL, parsear_sql, registrar_consulta
+
 
 class SQLPostProcessor:
     """
@@ -78,11 +83,13 @@ class SQLPostProcessor:
         if not sql:
             return sql
 
-        resultado = sql
-        for sin_tilde, con_tilde in SQLPostProcessor._AREA_ACCENT_MAP.items():
-            resultado = resultado.replace(sin_tilde, con_tilde)
+        consulta = parsear_sql(sql).copia()
+        return consulta.a_sql() if SQLPostProcessor._corregir_acentos(consulta) else sql
 
-        return resultado
+    @staticmethod
+    def _corregir_acentos(consulta: ConsultaSQL) -> bool:
+        """Solo toca literales string completos; identificadores y comentarios quedan igual."""
+        return consulta.reemplazar_literales(SQLPostProcessor._AREA_ACCENT_MAP) > 0
 
     @staticmethod
     def parentizar_union_all(sql: str) -> str:
@@ -103,116 +110,59 @@ class SQLPostProcessor:
         if not sql:
             return sql
 
-        sql_upper = sql.upper()
-
-        # Buscar UNION ALL o UNION (no dentro de subqueries ya parentizadas)
-        has_union = 'UNION ALL' in sql_upper or re.search(r'\bUNION\b', sql_upper)
-        if not has_union:
-            return sql
-
-        # Si ya está parentizado (empieza con '(' antes del primer SELECT), no tocar
-        stripped = sql.strip()
-        if stripped.startswith('('):
-            return sql
-
-        # Splitear respetando case del original: buscar posiciones de UNION ALL / UNION
-        # Usar regex para encontrar separadores UNION ALL o UNION (word boundary)
-        # Preservar el texto original entre separadores
-        separador_pattern = re.compile(r'\bUNION\s+ALL\b|\bUNION\b(?!\s+ALL)', re.IGNORECASE)
-        separadores = list(separador_pattern.finditer(sql))
-
-        if not separadores:
-            return sql
+        consulta = parsear_sql(sql).copia()
+        return consulta.a_sql() if SQLPostProcessor._parentizar_ramas(consulta) else sql
 
-        # Extraer las ramas
-        ramas = []
-        prev_end = 0
-        seps_text = []
-        for m in separadores:
-            ramas.append(sql[prev_end:m.start()])
-            seps_text.append(m.group())
-            prev_end = m.end()
-        ramas.append(sql[prev_end:])
+    @staticmethod
+    def _parentizar_ramas(consulta: ConsultaSQL) -> bool:
+        """
+        Envuelve las ramas del UNION de nivel superior. Solo cuentan los ORDER BY
+        y LIMIT al nivel de la rama: los de subqueries o CTEs no exigen paréntesis.
+        """
+        ramas = consulta.ramas
+        # Sin UNION, o ya parentizado desde el primer SELECT: no tocar
+        if len(ramas) < 2 or consulta.valores[0] == '(':
+            return False
 
-        # Limpiar whitespace de cada rama
-        ramas = [r.strip() for r in ramas]
+        limites = [(rama.inicio, rama.fin) for rama in ramas]
 
-        if len(ramas) < 2:
-            return sql
-
-        # Detectar ORDER BY final que aplica al UNION completo (en la última rama).
-        # Heurística: buscar el ÚLTIMO ORDER BY de nivel 0 (fuera de paréntesis)
-        # en la última rama. Es un ORDER BY del UNION solo si:
-        #   1) Las ramas anteriores tienen ORDER BY o LIMIT
-        #   2) NO hay LIMIT después de este ORDER BY (si hay LIMIT, pertenece al SELECT)
+        # El último ORDER BY de la última rama es del UNION completo si no le
+        # sigue un LIMIT (entonces sería del SELECT) y las ramas anteriores
+        # tienen su propio ORDER BY/LIMIT.
         ultima = ramas[-1]
-        ultima_upper = ultima.upper()
-        order_final = ''
-
-        # Encontrar todas las posiciones de ORDER BY de nivel 0 en la última rama
-        depth = 0
-        order_positions = []
-        i = 0
-        while i < len(ultima_upper):
-            if ultima[i] == '(':
-                depth += 1
-            elif ultima[i] == ')':
-                depth -= 1
-            elif depth == 0 and ultima_upper[i:i+8] == 'ORDER BY':
-                order_positions.append(i)
-            i += 1
-
-        if order_positions:
-            last_order_pos = order_positions[-1]
-            after_order = ultima_upper[last_order_pos:]
-            has_limit_after = 'LIMIT' in after_order
-
-            # Si hay LIMIT después del ORDER BY, el ORDER BY pertenece a este SELECT.
-            # Solo separar como ORDER BY final si NO tiene LIMIT después Y las
-            # ramas anteriores también tienen ORDER BY/LIMIT (señal de que el
-            # ORDER BY es del UNION, no del SELECT).
-            if not has_limit_after:
-                ramas_internas_tienen_order = all(
-                    'ORDER BY' in r.upper() or 'LIMIT' in r.upper()
-                    for r in ramas[:-1]
-                )
-                if ramas_internas_tienen_order:
-                    order_final = '\n' + ultima[last_order_pos:].strip()
-                    ramas[-1] = ultima[:last_order_pos].strip()
-
-        # Verificar si alguna rama necesita paréntesis
-        alguna_necesita = False
-        for rama in ramas:
-            rama_upper = rama.upper()
-            tiene_order = 'ORDER BY' in rama_upper
-            tiene_limit = 'LIMIT' in rama_upper
-            ya_parentizada = rama.strip().startswith('(') and rama.strip().endswith(')')
-            if (tiene_order or tiene_limit) and not ya_parentizada:
-                alguna_necesita = True
-                break
-
-        if not alguna_necesita:
-            return sql
-
-        # Envolver cada rama en paréntesis
-        ramas_parentizadas = []
-        for rama in ramas:
-            rama = rama.strip().rstrip(';')
-            ya_parentizada = rama.startswith('(') and rama.endswith(')')
-            if ya_parentizada:
-                ramas_parentizadas.append(rama)
-            else:
-                ramas_parentizadas.append(f'({rama})')
-
-        # Reconstruir con los separadores originales
-        resultado = ramas_parentizadas[0]
-        for i, sep in enumerate(seps_text):
-            resultado += f'\n{sep}\n{ramas_parentizadas[i + 1]}'
-
-        if order_final:
-            resultado += order_final
-
-        return resultado
+        orden = ultima.clausula('ORDER BY')
+        orden_final = None
+        if (
+            orden
+            and not ultima.tiene_clausula('LIMIT', desde=orden[0])
+            and all(r.tiene_clausula('ORDER BY') or r.tiene_clausula('LIMIT') for r in ramas[:-1])
+        ):
+            orden_final = (orden[0], ultima.fin)
+            limites[-1] = (ultima.inicio, orden[0])
+
+        def _parentizada(inicio: int, fin: int) -> bool:
+            return consulta.valores[inicio] == '(' and consulta.pareja.get(inicio) == fin - 1
+
+        def _tiene_orden_o_limite(rama, fin: int) -> bool:
+            return any(
+                consulta.clausulas(nombre, rama.inicio, fin, rama.profundidad)
+                for nombre in ('ORDER BY', 'LIMIT')
+            )
+
+        if not any(_tiene_orden_o_limite(rama, fin) for rama, (_, fin) in zip(ramas, limites)):
+            return False
+
+        separadores = consulta.sentencias[0].separadores
+        partes = []
+        for i, (inicio, fin) in enumerate(limites):
+            if i:
+                partes.extend(['\n', separadores[i - 1], '\n'])
+            partes.extend([(inicio, fin)] if _parentizada(inicio, fin) else ['(', (inicio, fin), ')'])
+        if orden_final:
+            partes.extend(['\n', orden_final])
+
+        consulta.reconstruir(partes)
+        return True
 
     @staticmethod
     def procesar_sql(pregunta: str, sql_generado: str) -> Dict[str, Any]:
@@ -244,17 +194,24 @@ class SQLPostProcessor:
         # DESACTIVADO: Claude ya genera el SQL correcto según la intención del usuario
         # La detección de moneda por keywords causaba conversiones incorrectas
 
+        # PASOS 3 y 4 sobre una copia del parseo compartido; se emite una vez
+        consulta = parsear_sql(sql_final).copia()
+        reescrito = False
+
         # PASO 3: Corregir acentos en nombres de áreas
-        sql_acentuado = SQLPostProcessor.corregir_acentos_areas(sql_final)
-        if sql_acentuado != sql_final:
-            sql_final = sql_acentuado
+        if SQLPostProcessor._corregir_acentos(consulta):
             cambios.append("Corregidos acentos en nombres de áreas")
+            reescrito = True
 
         # PASO 4: Corregir UNION ALL sin paréntesis cuando las ramas tienen ORDER BY/LIMIT
-        sql_corregido = SQLPostProcessor.parentizar_union_all(sql_final)
-        if sql_corregido != sql_final:
-            sql_final = sql_corregido
+        if SQLPostProcessor._parentizar_ramas(consulta):
             cambios.append("Parentizado ramas de UNION ALL con ORDER BY/LIMIT")
+            reescrito = True
+
+        if reescrito:
+            sql_final = consulta.a_sql()
+            # La ejecución (blocklist) y el detector de tipo reutilizan este parseo
+            registrar_consulta(consulta)
 
         return {
             'sql': sql_final,
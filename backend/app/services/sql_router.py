@@ -3,14 +3,32 @@ SQL Router - Sistema CFO Inteligente
 Arquitectura activa: Claude directo con enriquecimiento opcional de metadatos temporales.
 
 Con sql_engine=claude, este router delega exclusivamente en ClaudeSQLGenerator.
+Delante de Claude hay cuatro atajos, en orden:
+1. Camino rápido canónico: si la pregunta coincide con alta confianza con una
+   query canónica, se usa su SQL de control ya validado (metodo='canonica').
+2. Cache de SQL validado por pregunta normalizada (ver sql_cache.py).
+3. Pregunta de seguimiento ("¿y el mes anterior?", "solo Montevideo"): se
+   reescribe el SQL del turno anterior en vez de regenerarlo
+   (metodo='seguimiento', ver seguimiento_sql.py).
+4. Intención analítica recurrente (total del período, apertura por área,
+   localidad o moneda, evolución mensual, ranking de clientes/proveedores):
+   plantilla SQL parametrizada (metodo='plantilla', ver plantillas_sql.py).
+
+generar_sql_lote() aplica los mismos atajos a varias preguntas y resuelve las
+restantes con una sola llamada a Claude (metodo='claude_lote').
 """
 
 import time
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
+from app.core.config import settings
 from app.core.logger import get_logger
-from app.core.constants import KEYWORDS_TEMPORALES
 from app.services.claude_sql_generator import ClaudeSQLGenerator
+from app.services.motor_intenciones import analizar_pregunta
+from app.services.plantillas_sql import resolver_plantilla
+from app.services.seguimiento_sql import resolver_seguimiento
+from app.services.sql_cache import SQLCache
+from app.services.validador_canonico import ValidadorCanonico
 from app.utils.sql_utils import extraer_sql_limpio, validar_sql
 
 logger = get_logger(__name__)
@@ -20,8 +38,9 @@ class SQLRouter:
     """Router SQL simplificado: único path activo hacia Claude."""
 
     def __init__(self):
-        """Inicializa el generador de SQL con Claude."""
+        """Inicializa el generador de SQL con Claude y el cache de SQL validado."""
         self.claude_gen = ClaudeSQLGenerator()
+        self.cache = SQLCache()
         logger.info("SQLRouter inicializado (Claude directo)")
 
     def _necesita_metadatos(self, pregunta: str) -> bool:
@@ -32,10 +51,9 @@ class SQLRouter:
             pregunta: Pregunta del usuario en lenguaje natural.
 
         Returns:
-            True si alguna keyword temporal aparece en la pregunta.
+            True si alguna keyword temporal (KEYWORDS_TEMPORALES) aparece en la pregunta.
         """
-        pregunta_lower = (pregunta or "").lower()
-        return any(keyword in pregunta_lower for keyword in KEYWORDS_TEMPORALES)
+        return analizar_pregunta(pregunta or "").contiene("temporal")
 
     def _fetch_metadatos(self, db) -> str:
         """
@@ -60,7 +78,7 @@ class SQLRouter:
               ) AS meses_con_datos,
               12 - EXTRACT(MONTH FROM CURRENT_DATE)::INT AS meses_restantes,
               MAX(fecha) AS ultima_fecha_con_datos
-            FROM operaciones WHERE deleted_at IS NULL
+            FROM operaciones_diarias
         """
 
         try:
@@ -86,7 +104,102 @@ class SQLRouter:
             logger.warning(f"SQLRouter: no se pudieron obtener metadatos temporales: {e}")
             return ""
 
-    def generar_sql_con_claude(self, pregunta: str, contexto: list = None, db=None) -> Dict[str, Any]:
+    def _clave_cache(self, pregunta: str, contexto: list = None) -> str:
+        """Clave de cache; las preguntas temporales se atan al día actual (metadatos)."""
+        return SQLCache.construir_clave(
+            pregunta,
+            contexto,
+            incluir_fecha=self._necesita_metadatos(pregunta),
+        )
+
+    def invalidar_cache(self, pregunta: str, contexto: list = None) -> None:
+        """Descarta el SQL cacheado para la pregunta (p.ej. si falló al ejecutarse)."""
+        self.cache.invalidar(self._clave_cache(pregunta, contexto))
+
+    def _contexto_con_metadatos(
+        self, contexto: list, pregunta: str, db=None, metadatos: Optional[str] = None
+    ) -> list:
+        """Copia del contexto con los metadatos temporales agregados si corresponden."""
+        contexto_enriquecido = list(contexto or [])
+        metadatos_str = ""
+
+        if metadatos is not None:
+            metadatos_str = metadatos
+        elif db and self._necesita_metadatos(pregunta):
+            logger.info("SQLRouter: pregunta temporal detectada, obteniendo metadatos para Claude")
+            metadatos_str = self._fetch_metadatos(db)
+
+        if metadatos_str:
+            # ClaudeSQLGenerator no acepta metadatos explícitos: se inyectan en contexto.
+            contexto_enriquecido.append({
+                "role": "assistant",
+                "content": metadatos_str
+            })
+        return contexto_enriquecido
+
+    def _resultado_sql_raw(self, sql_raw: Optional[str], tiempo: float) -> Dict[str, Any]:
+        """Extrae y valida el SQL de una respuesta de Claude."""
+        if not sql_raw:
+            return {
+                'sql': None,
+                'sql_raw': '',
+                'exito': False,
+                'tiempo': tiempo,
+                'error': 'Claude no pudo generar una respuesta. Por favor, intenta de nuevo.'
+            }
+
+        # Verificar si es un mensaje de error del orchestrator
+        if sql_raw.startswith("ERROR:"):
+            return {
+                'sql': None,
+                'sql_raw': sql_raw,
+                'exito': False,
+                'tiempo': tiempo,
+                'error': 'El servicio de IA no está disponible temporalmente. Intenta en unos minutos.'
+            }
+
+        # Extraer SQL limpio
+        sql_limpio = extraer_sql_limpio(sql_raw)
+
+        logger.debug(f"SQL raw: {sql_raw[:200] if sql_raw else 'NONE'}")
+        logger.debug(f"SQL limpio: {sql_limpio[:200] if sql_limpio else 'NONE'}")
+
+        if not sql_limpio:
+            # Claude respondió pero no con SQL válido
+            return {
+                'sql': None,
+                'sql_raw': sql_raw,
+                'exito': False,
+                'tiempo': tiempo,
+                'error': 'No pude entender la consulta. ¿Podrías reformularla de otra manera?'
+            }
+
+        # Validar SQL
+        validacion = validar_sql(sql_limpio)
+
+        if not validacion['valido']:
+            return {
+                'sql': sql_limpio,
+                'sql_raw': sql_raw,
+                'exito': False,
+                'tiempo': tiempo,
+                'error': f"El SQL generado tiene un problema: {validacion['error']}"
+            }
+
+        logger.info(f"Claude exitoso en {tiempo:.2f}s - Tipo: {validacion['tipo']}")
+
+        return {
+            'sql': sql_limpio,
+            'sql_raw': sql_raw,
+            'exito': True,
+            'tiempo': tiempo,
+            'error': None,
+            'validacion': validacion
+        }
+
+    def generar_sql_con_claude(
+        self, pregunta: str, contexto: list = None, db=None, metadatos: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Genera SQL usando Claude con memoria de conversación.
 
@@ -94,6 +207,7 @@ class SQLRouter:
             pregunta: Pregunta del usuario en lenguaje natural
             contexto: Lista de mensajes previos para contexto
             db: Sesión de SQLAlchemy opcional para enriquecer con metadatos temporales
+            metadatos: XML de metadatos ya obtenido en paralelo (evita repetir la query)
 
         Returns:
             Dict con sql, exito, tiempo, error, etc.
@@ -101,18 +215,7 @@ class SQLRouter:
         inicio = time.time()
 
         try:
-            contexto_enriquecido = list(contexto or [])
-            metadatos_str = ""
-
-            if db and self._necesita_metadatos(pregunta):
-                logger.info("SQLRouter: pregunta temporal detectada, obteniendo metadatos para Claude")
-                metadatos_str = self._fetch_metadatos(db)
-                if metadatos_str:
-                    # ClaudeSQLGenerator no acepta metadatos explícitos: se inyectan en contexto.
-                    contexto_enriquecido.append({
-                        "role": "assistant",
-                        "content": metadatos_str
-                    })
+            contexto_enriquecido = self._contexto_con_metadatos(contexto, pregunta, db=db, metadatos=metadatos)
 
             logger.info(
                 f"Claude generando SQL para: '{pregunta[:60]}' "
@@ -120,65 +223,7 @@ class SQLRouter:
             )
 
             sql_raw = self.claude_gen.generar_sql(pregunta, contexto=contexto_enriquecido)
-            tiempo = time.time() - inicio
-
-            if not sql_raw:
-                return {
-                    'sql': None,
-                    'sql_raw': '',
-                    'exito': False,
-                    'tiempo': tiempo,
-                    'error': 'Claude no pudo generar una respuesta. Por favor, intenta de nuevo.'
-                }
-
-            # Verificar si es un mensaje de error del orchestrator
-            if sql_raw.startswith("ERROR:"):
-                return {
-                    'sql': None,
-                    'sql_raw': sql_raw,
-                    'exito': False,
-                    'tiempo': tiempo,
-                    'error': 'El servicio de IA no está disponible temporalmente. Intenta en unos minutos.'
-                }
-
-            # Extraer SQL limpio
-            sql_limpio = extraer_sql_limpio(sql_raw)
-
-            logger.debug(f"SQL raw: {sql_raw[:200] if sql_raw else 'NONE'}")
-            logger.debug(f"SQL limpio: {sql_limpio[:200] if sql_limpio else 'NONE'}")
-
-            if not sql_limpio:
-                # Claude respondió pero no con SQL válido
-                return {
-                    'sql': None,
-                    'sql_raw': sql_raw,
-                    'exito': False,
-                    'tiempo': tiempo,
-                    'error': 'No pude entender la consulta. ¿Podrías reformularla de otra manera?'
-                }
-
-            # Validar SQL
-            validacion = validar_sql(sql_limpio)
-
-            if not validacion['valido']:
-                return {
-                    'sql': sql_limpio,
-                    'sql_raw': sql_raw,
-                    'exito': False,
-                    'tiempo': tiempo,
-                    'error': f"El SQL generado tiene un problema: {validacion['error']}"
-                }
-
-            logger.info(f"Claude exitoso en {tiempo:.2f}s - Tipo: {validacion['tipo']}")
-
-            return {
-                'sql': sql_limpio,
-                'sql_raw': sql_raw,
-                'exito': True,
-                'tiempo': tiempo,
-                'error': None,
-                'validacion': validacion
-            }
+            return self._resultado_sql_raw(sql_raw, time.time() - inicio)
 
         except Exception as e:
             tiempo = time.time() - inicio
@@ -192,14 +237,86 @@ class SQLRouter:
                 'error': 'Error interno al procesar la consulta. Intenta de nuevo.'
             }
 
-    def generar_sql_inteligente(self, pregunta: str, contexto: list = None, db=None, **kwargs) -> Dict[str, Any]:
+    def _resolver_atajo(self, pregunta: str, contexto: list, inicio_total: float) -> Optional[Dict[str, Any]]:
+        """Camino canónico, cache de SQL, seguimiento o plantilla; None si la pregunta necesita a Claude."""
+        canonica = ValidadorCanonico.resolver_sql_canonico(pregunta or "")
+        if canonica:
+            tiempo_total = time.time() - inicio_total
+            logger.info(
+                f"SQLRouter: camino rápido canónico '{canonica['query_canonica']}' "
+                f"en {tiempo_total * 1000:.1f}ms"
+            )
+            return {
+                'sql': canonica['sql'],
+                'metodo': 'canonica',
+                'exito': True,
+                'tiempo_total': tiempo_total,
+                'tiempos': {'claude': None},
+                'intentos': {'claude': 0, 'total': 0},
+                'error': None,
+                'debug': {'query_canonica': canonica['query_canonica'], 'confianza': canonica['confianza']}
+            }
+
+        cacheado = self.cache.obtener(self._clave_cache(pregunta, contexto))
+        if cacheado:
+            tiempo_total = time.time() - inicio_total
+            logger.info(f"SQLRouter: cache hit en {tiempo_total * 1000:.1f}ms")
+            return {
+                'sql': cacheado['sql'],
+                'metodo': 'cache',
+                'exito': True,
+                'tiempo_total': tiempo_total,
+                'tiempos': {'claude': None},
+                'intentos': {'claude': 0, 'total': 0},
+                'error': None,
+                'debug': {'cache': 'hit', 'metodo_original': cacheado['metodo']}
+            }
+
+        seguimiento = resolver_seguimiento(pregunta, contexto)
+        if seguimiento and validar_sql(seguimiento['sql'])['valido']:
+            tiempo_total = time.time() - inicio_total
+            logger.info(
+                f"SQLRouter: seguimiento {[r['tipo'] for r in seguimiento['refinamientos']]} "
+                f"en {tiempo_total * 1000:.1f}ms"
+            )
+            return {
+                'sql': seguimiento['sql'],
+                'metodo': 'seguimiento',
+                'exito': True,
+                'tiempo_total': tiempo_total,
+                'tiempos': {'claude': None},
+                'intentos': {'claude': 0, 'total': 0},
+                'error': None,
+                'debug': {'refinamientos': seguimiento['refinamientos'], 'sql_previo': seguimiento['sql_previo']}
+            }
+
+        plantilla = resolver_plantilla(pregunta) if settings.cfo_sql_plantillas else None
+        if plantilla and validar_sql(plantilla['sql'])['valido']:
+            tiempo_total = time.time() - inicio_total
+            logger.info(f"SQLRouter: plantilla '{plantilla['plantilla']}' en {tiempo_total * 1000:.1f}ms")
+            return {
+                'sql': plantilla['sql'],
+                'metodo': 'plantilla',
+                'exito': True,
+                'tiempo_total': tiempo_total,
+                'tiempos': {'claude': None},
+                'intentos': {'claude': 0, 'total': 0},
+                'error': None,
+                'debug': {'plantilla': plantilla['plantilla'], 'slots': plantilla['slots']}
+            }
+        return None
+
+    def generar_sql_inteligente(
+        self, pregunta: str, contexto: list = None, db=None, metadatos: Optional[str] = None, **kwargs
+    ) -> Dict[str, Any]:
         """
-        Router principal: único path hacia Claude directo.
+        Router principal: camino canónico, cache de SQL, seguimiento, plantilla o Claude directo.
 
         Args:
             pregunta: Pregunta del usuario en lenguaje natural
             contexto: Lista de mensajes previos para contexto
             db: Sesión de SQLAlchemy opcional para enriquecer prompts de Claude con metadatos
+            metadatos: Metadatos temporales pre-obtenidos (None = obtenerlos si hacen falta)
             **kwargs: Argumentos adicionales (ignorados, para compatibilidad)
 
         Returns:
@@ -211,13 +328,21 @@ class SQLRouter:
 
         logger.info(f"SQLRouter procesando: '{pregunta[:70]}'")
 
+        atajo = self._resolver_atajo(pregunta, contexto, inicio_total)
+        if atajo:
+            return atajo
+
+        clave_cache = self._clave_cache(pregunta, contexto)
         # Path único: Claude directo
         logger.info("SQLRouter: SQL_ENGINE=claude — bypass directo a Claude")
         try:
-            resultado_claude = self.generar_sql_con_claude(pregunta, contexto=contexto, db=db)
+            resultado_claude = self.generar_sql_con_claude(
+                pregunta, contexto=contexto, db=db, metadatos=metadatos
+            )
             tiempos['claude'] = resultado_claude.get('tiempo')
 
             if resultado_claude.get('exito'):
+                self.cache.guardar(clave_cache, {'sql': resultado_claude['sql'], 'metodo': 'claude_direct'})
                 tiempo_total = time.time() - inicio_total
                 logger.info(f"SQLRouter: claude_direct en {tiempo_total:.2f}s")
                 return {
@@ -260,6 +385,62 @@ class SQLRouter:
             }
 
 
+    def generar_sql_lote(
+        self, preguntas: List[str], contexto: list = None, db=None, metadatos: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Genera el SQL de varias preguntas con un contexto compartido.
+
+        Canónicas y cacheadas se resuelven sin modelo; el resto va en una sola
+        llamada a Claude. Si una pregunta no vuelve en la respuesta del lote,
+        se genera individualmente (mismo camino que generar_sql_inteligente).
+
+        Returns:
+            Lista alineada con preguntas, cada elemento con el formato de
+            generar_sql_inteligente.
+        """
+        inicio_total = time.time()
+        resultados: List[Optional[Dict[str, Any]]] = [
+            self._resolver_atajo(pregunta, contexto, inicio_total) for pregunta in preguntas
+        ]
+        pendientes = [i for i, resultado in enumerate(resultados) if resultado is None]
+        if not pendientes:
+            return resultados
+
+        logger.info(f"SQLRouter: lote de {len(pendientes)}/{len(preguntas)} preguntas hacia Claude")
+        contexto_lote = self._contexto_con_metadatos(
+            contexto, " ".join(preguntas[i] for i in pendientes), db=db, metadatos=metadatos
+        )
+        inicio_claude = time.time()
+        sqls_raw = self.claude_gen.generar_sql_lote([preguntas[i] for i in pendientes], contexto=contexto_lote)
+        tiempo_claude = time.time() - inicio_claude
+
+        for indice, sql_raw in zip(pendientes, sqls_raw):
+            pregunta = preguntas[indice]
+            resultado_claude = self._resultado_sql_raw(sql_raw, tiempo_claude)
+            if not resultado_claude['exito']:
+                logger.warning(f"SQLRouter: lote sin SQL válido para '{pregunta[:60]}', generando individual")
+                resultados[indice] = self.generar_sql_inteligente(
+                    pregunta, contexto=contexto, db=db, metadatos=metadatos
+                )
+                continue
+
+            self.cache.guardar(
+                self._clave_cache(pregunta, contexto), {'sql': resultado_claude['sql'], 'metodo': 'claude_lote'}
+            )
+            resultados[indice] = {
+                'sql': resultado_claude['sql'],
+                'metodo': 'claude_lote',
+                'exito': True,
+                'tiempo_total': time.time() - inicio_total,
+                'tiempos': {'claude': tiempo_claude},
+                'intentos': {'claude': 1, 'total': 1},
+                'error': None,
+                'debug': {'lote': len(pendientes)}
+            }
+        return resultados
+
+
 # ══════════════════════════════════════════════════════════════
 # INSTANCIA GLOBAL DEL ROUTER (Singleton)
 # ══════════════════════════════════════════════════════════════
@@ -286,7 +467,9 @@ def get_sql_router() -> SQLRouter:
     return _router_instance
 
 
-def generar_sql_inteligente(pregunta: str, contexto: list = None, db=None) -> Dict[str, Any]:
+def generar_sql_inteligente(
+    pregunta: str, contexto: list = None, db=None, metadatos: Optional[str] = None
+) -> Dict[str, Any]:
     """
     Función wrapper para facilitar el uso.
 
@@ -294,9 +477,49 @@ def generar_sql_inteligente(pregunta: str, contexto: list = None, db=None) -> Di
         pregunta: Pregunta del usuario en lenguaje natural
         contexto: Lista de mensajes previos
         db: Sesión de SQLAlchemy opcional
+        metadatos: Metadatos temporales pre-obtenidos (ver obtener_metadatos_temporales)
 
     Returns:
         Dict con sql, exito, error, etc.
     """
     router = get_sql_router()
-    return router.generar_sql_inteligente(pregunta, contexto=contexto, db=db)
+    return router.generar_sql_inteligente(pregunta, contexto=contexto, db=db, metadatos=metadatos)
+
+
+def generar_sql_lote(
+    preguntas: List[str], contexto: list = None, db=None, metadatos: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Wrapper de SQLRouter.generar_sql_lote (una llamada a Claude para todo el lote)."""
+    return get_sql_router().generar_sql_lote(preguntas, contexto=contexto, db=db, metadatos=metadatos)
+
+
+def obtener_metadatos_temporales(db, pregunta: str) -> Optional[str]:
+    """
+    Obtiene los metadatos temporales si la pregunta los necesita.
+
+    Pensado para correr en paralelo con otras etapas del chat y pasar el
+    resultado a generar_sql_inteligente(metadatos=...).
+
+    Returns:
+        XML de metadatos ("" si falló) o None si la pregunta no es temporal.
+    """
+    router = get_sql_router()
+    if not router._necesita_metadatos(pregunta):
+        return None
+    logger.info("SQLRouter: pregunta temporal detectada, pre-obteniendo metadatos para Claude")
+    return router._fetch_metadatos(db)
+
+
+def invalidar_sql_cacheado(pregunta: str, contexto: list = None) -> None:
+    """
+    Descarta el SQL cacheado para una pregunta.
+
+    Se usa cuando el SQL servido (cacheado o recién generado) falla al
+    ejecutarse, para que la próxima vez se regenere con Claude.
+    """
+    get_sql_router().invalidar_cache(pregunta, contexto=contexto)
+
+
+def estadisticas_cache_sql() -> Dict[str, Any]:
+    """Contadores del cache de SQL validado del router."""
+    return get_sql_router().cache.estadisticas()
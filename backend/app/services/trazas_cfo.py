@@ -0,0 +1,324 @@
+"""
+Trazas por etapa del chat CFO - Sistema CFO Inteligente
+
+Tracer liviano en proceso: cada turno de /ask-stream abre una TrazaTurno que
+acumula duración por etapa (clasificación, metadatos, generación SQL,
+validaciones, ejecución, narrativa, persistencia...), tokens de Claude y
+filas devueltas. Al cerrar el turno las observaciones pasan a histogramas
+globales que /metrics exporta en formato de texto de Prometheus, sin
+colector externo.
+
+La traza viaja en un ContextVar: las etapas que corren en el threadpool o
+como tareas del PlanificadorEtapas heredan el contexto, así registrar_uso_cache
+suma los tokens al turno correcto sin pasar la traza por parámetro.
+
+Los histogramas son por proceso: con varios workers cada uno expone los suyos.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.constants import (
+    TRAZA_BUCKETS_FILAS,
+    TRAZA_BUCKETS_SEGUNDOS,
+    TRAZA_BUCKETS_TOKENS,
+)
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# ══════════════════════════════════════════════════════════════
+# HISTOGRAMAS
+# ══════════════════════════════════════════════════════════════
+
+def _formatear_numero(valor: float) -> str:
+    """Formato de número de Prometheus (enteros sin decimales, +Inf)."""
+    if valor == float("inf"):
+        return "+Inf"
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+def _escapar_etiqueta(valor: Any) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatear_etiquetas(etiquetas: Sequence[Tuple[str, str]]) -> str:
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{nombre}="{_escapar_etiqueta(valor)}"' for nombre, valor in etiquetas) + "}"
+
+
+class Histograma:
+    """Histograma acumulativo thread-safe con etiquetas, exportable a Prometheus."""
+
+    def __init__(self, nombre: str, ayuda: str, buckets: Sequence[float], etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = tuple(sorted(buckets))
+        self.etiquetas = tuple(etiquetas)
+        self._series: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, **etiquetas: str) -> None:
+        clave = tuple(str(etiquetas.get(nombre, "")) for nombre in self.etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = {"cuentas": [0] * len(self.buckets), "suma": 0.0, "total": 0}
+                self._series[clave] = serie
+            indice = bisect_left(self.buckets, valor)
+            if indice < len(self.buckets):
+                serie["cuentas"][indice] += 1
+            serie["suma"] += valor
+            serie["total"] += 1
+
+    def series(self) -> Dict[Tuple[str, ...], Dict[str, Any]]:
+        """Copia de las series (para tests / inspección)."""
+        with self._lock:
+            return {clave: {**serie, "cuentas": list(serie["cuentas"])} for clave, serie in self._series.items()}
+
+    def exportar(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for clave, serie in sorted(self.series().items()):
+            etiquetas = list(zip(self.etiquetas, clave))
+            acumulado = 0
+            for limite, cuenta in zip(self.buckets, serie["cuentas"]):
+                acumulado += cuenta
+                le = _formatear_etiquetas(etiquetas + [("le", _formatear_numero(limite))])
+                lineas.append(f"{self.nombre}_bucket{le} {acumulado}")
+            le = _formatear_etiquetas(etiquetas + [("le", "+Inf")])
+            lineas.append(f"{self.nombre}_bucket{le} {serie['total']}")
+            lineas.append(f"{self.nombre}_sum{_formatear_etiquetas(etiquetas)} {_formatear_numero(serie['suma'])}")
+            lineas.append(f"{self.nombre}_count{_formatear_etiquetas(etiquetas)} {serie['total']}")
+        return lineas
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+HISTOGRAMA_ETAPAS = Histograma(
+    "cfo_etapa_duracion_segundos",
+    "Duración de cada etapa del pipeline de chat CFO",
+    TRAZA_BUCKETS_SEGUNDOS,
+    ("etapa",),
+)
+HISTOGRAMA_TURNOS = Histograma(
+    "cfo_turno_duracion_segundos",
+    "Duración total de un turno de chat CFO",
+    TRAZA_BUCKETS_SEGUNDOS,
+    ("metodo", "resultado"),
+)
+HISTOGRAMA_TOKENS = Histograma(
+    "cfo_turno_tokens",
+    "Tokens de Claude consumidos por turno",
+    TRAZA_BUCKETS_TOKENS,
+    ("tipo",),
+)
+HISTOGRAMA_FILAS = Histograma(
+    "cfo_turno_filas",
+    "Filas devueltas por la consulta SQL del turno",
+    TRAZA_BUCKETS_FILAS,
+)
+
+_HISTOGRAMAS = (HISTOGRAMA_ETAPAS, HISTOGRAMA_TURNOS, HISTOGRAMA_TOKENS, HISTOGRAMA_FILAS)
+
+
+# ══════════════════════════════════════════════════════════════
+# TRAZA DE UN TURNO
+# ══════════════════════════════════════════════════════════════
+
+_CAMPOS_TOKENS = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+
+
+class TrazaTurno:
+    """Duraciones, tokens y filas de un turno de chat."""
+
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.duraciones: Dict[str, float] = {}
+        self.tokens: Dict[str, int] = {campo: 0 for campo in _CAMPOS_TOKENS}
+        self.filas: Optional[int] = None
+        self.metodo = "ninguno"
+        self.resultado = "ok"
+        self.cerrada = False
+        self._lock = threading.Lock()
+
+    def registrar_duracion(self, nombre: str, segundos: float) -> None:
+        """Suma la duración a la etapa (una etapa puede repetirse, p.ej. al regenerar SQL)."""
+        with self._lock:
+            self.duraciones[nombre] = self.duraciones.get(nombre, 0.0) + segundos
+
+    @contextmanager
+    def etapa(self, nombre: str) -> Iterator[None]:
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            self.registrar_duracion(nombre, time.monotonic() - inicio)
+
+    def marcar(self, nombre: str) -> None:
+        """Registra el tiempo transcurrido desde el inicio del turno (p.ej. primer_token)."""
+        with self._lock:
+            self.duraciones.setdefault(nombre, time.monotonic() - self.inicio)
+
+    def registrar_tokens(self, uso: Dict[str, int]) -> None:
+        with self._lock:
+            for campo in _CAMPOS_TOKENS:
+                self.tokens[campo] += int(uso.get(campo, 0) or 0)
+
+    def resumen(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "duracion_total": round(time.monotonic() - self.inicio, 4),
+                "etapas": {nombre: round(valor, 4) for nombre, valor in self.duraciones.items()},
+                "tokens": dict(self.tokens),
+                "filas": self.filas,
+                "metodo": self.metodo,
+                "resultado": self.resultado,
+            }
+
+
+_traza_actual: ContextVar[Optional[TrazaTurno]] = ContextVar("traza_cfo", default=None)
+
+
+def iniciar_traza() -> TrazaTurno:
+    """Crea la traza del turno y la deja como actual en el contexto."""
+    traza = TrazaTurno()
+    _traza_actual.set(traza)
+    return traza
+
+
+def traza_actual() -> Optional[TrazaTurno]:
+    return _traza_actual.get()
+
+
+@contextmanager
+def etapa(nombre: str) -> Iterator[None]:
+    """Mide una etapa en la traza actual (no hace nada fuera de un turno)."""
+    traza = _traza_actual.get()
+    if traza is None:
+        yield
+        return
+    with traza.etapa(nombre):
+        yield
+
+
+def anotar_traza(**campos: Any) -> None:
+    """Anota metodo / filas / resultado en la traza actual."""
+    traza = _traza_actual.get()
+    if traza is None:
+        return
+    for nombre, valor in campos.items():
+        setattr(traza, nombre, valor)
+
+
+def registrar_tokens(uso: Dict[str, int]) -> None:
+    """Suma el uso de una llamada a Claude a la traza actual (si hay)."""
+    traza = _traza_actual.get()
+    if traza is not None:
+        traza.registrar_tokens(uso)
+
+
+def finalizar_traza(traza: TrazaTurno, tiempos_etapas: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Cierra la traza y vuelca sus observaciones en los histogramas.
+
+    Args:
+        traza: Traza del turno.
+        tiempos_etapas: Duraciones medidas por el PlanificadorEtapas (etapas en
+            segundo plano). Los sufijos numéricos (plan_sql_1) se agrupan.
+
+    Returns:
+        Resumen del turno (también se loguea).
+    """
+    if traza.cerrada:
+        return traza.resumen()
+    traza.cerrada = True
+
+    for nombre, segundos in (tiempos_etapas or {}).items():
+        base, _, sufijo = nombre.rpartition("_")
+        traza.registrar_duracion(base if sufijo.isdigit() else nombre, segundos)
+
+    resumen = traza.resumen()
+    for nombre, segundos in resumen["etapas"].items():
+        HISTOGRAMA_ETAPAS.observar(segundos, etapa=nombre)
+    HISTOGRAMA_TURNOS.observar(resumen["duracion_total"], metodo=traza.metodo, resultado=traza.resultado)
+    if any(resumen["tokens"].values()):
+        for campo, valor in resumen["tokens"].items():
+            HISTOGRAMA_TOKENS.observar(valor, tipo=campo.replace("_input_tokens", "").replace("_tokens", ""))
+    if traza.filas is not None:
+        HISTOGRAMA_FILAS.observar(traza.filas)
+
+    etapas = " ".join(f"{nombre}={valor * 1000:.0f}ms" for nombre, valor in resumen["etapas"].items())
+    logger.info(
+        f"Traza CFO [{traza.metodo}/{traza.resultado}] total={resumen['duracion_total'] * 1000:.0f}ms "
+        f"{etapas} tokens_in={resumen['tokens']['input_tokens']} tokens_out={resumen['tokens']['output_tokens']} "
+        f"filas={traza.filas}"
+    )
+    return resumen
+
+
+# ══════════════════════════════════════════════════════════════
+# EXPORTACIÓN
+# ══════════════════════════════════════════════════════════════
+
+def _contador(nombre: str, ayuda: str, valores: List[Tuple[Dict[str, str], float]], tipo: str = "counter") -> List[str]:
+    lineas = [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+    for etiquetas, valor in valores:
+        lineas.append(f"{nombre}{_formatear_etiquetas(list(etiquetas.items()))} {_formatear_numero(valor)}")
+    return lineas
+
+
+def exportar_prometheus(
+    uso_claude: Optional[Dict[str, Any]] = None,
+    caches: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> str:
+    """
+    Texto de exposición de Prometheus con los histogramas del chat.
+
+    Args:
+        uso_claude: Totales de estadisticas_uso_cache() (tokens acumulados).
+        caches: Estadísticas por nombre de cache (hits, misses, evictions, entradas).
+    """
+    lineas: List[str] = []
+    for histograma in _HISTOGRAMAS:
+        lineas.extend(histograma.exportar())
+
+    if uso_claude:
+        lineas.extend(_contador(
+            "cfo_claude_tokens_total",
+            "Tokens de Claude acumulados por tipo",
+            [({"tipo": campo.replace("_input_tokens", "").replace("_tokens", "")}, uso_claude.get(campo, 0))
+             for campo in _CAMPOS_TOKENS],
+        ))
+        lineas.extend(_contador(
+            "cfo_claude_llamadas_total", "Llamadas a Claude registradas", [({}, uso_claude.get("llamadas", 0))]
+        ))
+
+    if caches:
+        for campo in ("hits", "misses", "evictions"):
+            lineas.extend(_contador(
+                f"cfo_cache_{campo}_total",
+                f"Contador {campo} de los caches del chat",
+                [({"cache": nombre}, stats.get(campo, 0)) for nombre, stats in sorted(caches.items())],
+            ))
+        lineas.extend(_contador(
+            "cfo_cache_entradas",
+            "Entradas actuales de los caches del chat",
+            [({"cache": nombre}, stats.get("entradas", 0)) for nombre, stats in sorted(caches.items())],
+            tipo="gauge",
+        ))
+
+    return "\n".join(lineas) + "\n"
+
+
+def reiniciar_metricas() -> None:
+    """Vacía los histogramas (tests / mantenimiento)."""
+    for histograma in _HISTOGRAMAS:
+        histograma.limpiar()
@@ -5,21 +5,36 @@ Sistema de validación automática que:
 - Identifica si una pregunta coincide con queries canónicas conocidas
 - Ejecuta queries de control pre-validadas
 - Compara resultados y genera advertencias si difieren >1%
+- Resuelve con su SQL de control las preguntas canónicas con alta confianza
+  (camino rápido del SQLRouter, sin generar SQL con Claude)
 
 Autor: Sistema CFO Inteligente
 Versión: 2.0 (modular)
 Fecha: Diciembre 2025
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import re
 
+from app.core.constants import CANONICA_CONFIANZA_MINIMA
 from app.core.logger import get_logger
 from app.services.canonical_queries_config import QUERIES_CANONICAS
+from app.services.motor_intenciones import analizar_pregunta
+from app.services.result_cache import ejecutar_con_cache
 
 logger = get_logger(__name__)
 
+# Palabras que no cambian qué se pregunta (interrogativos, artículos, verbos de
+# relleno). Cualquier otra palabra fuera del patrón ("por", "área", "dólares",
+# "mes"...) indica un recorte o desglose que el SQL canónico no contempla.
+_PALABRAS_NEUTRAS = frozenset({
+    "a", "al", "cual", "cuál", "cuanto", "cuánto", "cuanta", "cuánta", "de", "del",
+    "dame", "decime", "dime", "el", "en", "es", "esta", "está", "fue", "fueron",
+    "hasta", "ahora", "hoy", "la", "las", "lo", "los", "me", "mostrame", "muestra",
+    "nuestra", "nuestro", "nuestras", "nuestros", "que", "qué", "saber", "son",
+    "total", "un", "una", "y",
+})
+
 
 class ValidadorCanonico:
     """
@@ -43,15 +58,71 @@ class ValidadorCanonico:
         Returns:
             Key de la query canónica o None si no coincide
         """
-        pregunta_lower = pregunta.lower()
+        candidatas = analizar_pregunta(pregunta).canonicas
+        if not candidatas:
+            return None
         
-        for key, config in QUERIES_CANONICAS.items():
-            for patron in config["patrones"]:
-                if patron in pregunta_lower:
-                    logger.debug(f"Query canónica identificada: {key} (patrón: '{patron}')")
-                    return key
+        key, patron = candidatas[0]
+        logger.debug(f"Query canónica identificada: {key} (patrón: '{patron}')")
+        return key
+    
+    @staticmethod
+    def _confianza_patron(palabras: list, patron: str) -> float:
+        """Fracción de las palabras significativas de la pregunta que cubre el patrón."""
+        palabras_patron = set(re.findall(r"\w+", patron))
+        significativas = [p for p in palabras if p in palabras_patron or p not in _PALABRAS_NEUTRAS]
+        if not significativas:
+            return 0.0
+        cubiertas = sum(1 for p in significativas if p in palabras_patron)
+        return cubiertas / len(significativas)
+    
+    @classmethod
+    def identificar_con_confianza(cls, pregunta: str) -> Optional[Tuple[str, float]]:
+        """
+        Como identificar_query_canonica, pero retorna el mejor match y su confianza.
         
-        return None
+        La confianza es 1.0 cuando la pregunta no dice nada más que el patrón
+        (p.ej. "¿cuál fue la facturación 2024?") y baja con cada palabra extra
+        ("facturación 2024 por área" → 0.5).
+        
+        Returns:
+            (key, confianza) o None si ningún patrón aparece en la pregunta
+        """
+        analisis = analizar_pregunta(pregunta)
+        mejor: Optional[Tuple[str, float]] = None
+        
+        # Las candidatas vienen en el orden de QUERIES_CANONICAS: ante empate gana la primera
+        for key, patron in analisis.canonicas:
+            confianza = cls._confianza_patron(analisis.palabras, patron)
+            if mejor is None or confianza > mejor[1]:
+                mejor = (key, confianza)
+        
+        return mejor
+    
+    @classmethod
+    def resolver_sql_canonico(
+        cls, pregunta: str, confianza_minima: float = CANONICA_CONFIANZA_MINIMA
+    ) -> Optional[Dict[str, Any]]:
+        """
+        SQL de control para ejecutar directamente si la pregunta es canónica con alta confianza.
+        
+        Returns:
+            Dict con query_canonica, sql y confianza, o None si hay que generar SQL
+        """
+        match = cls.identificar_con_confianza(pregunta)
+        if match is None:
+            return None
+        
+        query_key, confianza = match
+        if confianza < confianza_minima:
+            logger.debug(f"Query canónica '{query_key}' descartada para camino rápido (confianza={confianza:.2f})")
+            return None
+        
+        return {
+            "query_canonica": query_key,
+            "sql": QUERIES_CANONICAS[query_key]["sql_control"].strip(),
+            "confianza": confianza,
+        }
     
     @classmethod
     def ejecutar_query_control(cls, db: Session, query_key: str) -> Optional[float]:
@@ -71,9 +142,10 @@ class ValidadorCanonico:
         sql = QUERIES_CANONICAS[query_key]["sql_control"]
         
         try:
-            result = db.execute(text(sql)).fetchone()
-            if result and result[0] is not None:
-                return float(result[0])
+            filas = ejecutar_con_cache(db, sql)
+            valor = next(iter(filas[0].values()), None) if filas else None
+            if valor is not None:
+                return float(valor)
             return 0.0  # Si es NULL, retornar 0
         except Exception as e:
             logger.error(f"Error ejecutando query de control '{query_key}': {e}")
@@ -151,13 +223,30 @@ class ValidadorCanonico:
         
         return None
     
+    @classmethod
+    def precalcular_control(cls, db: Session, pregunta: str) -> Optional[float]:
+        """
+        Ejecuta la query de control de la pregunta sin esperar la respuesta del CFO.
+        
+        Permite correr el control mientras se streamea la narrativa y pasar el
+        valor a validar_respuesta(valor_control=...).
+        
+        Returns:
+            Valor de control o None si la pregunta no es canónica o la query falla
+        """
+        query_key = cls.identificar_query_canonica(pregunta)
+        if not query_key:
+            return None
+        return cls.ejecutar_query_control(db, query_key)
+    
     @classmethod
     def validar_respuesta(
         cls, 
         db: Session, 
         pregunta: str, 
         respuesta: str, 
-        datos_raw: Any = None
+        datos_raw: Any = None,
+        valor_control: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Valida la respuesta del CFO AI contra query de control.
@@ -167,6 +256,7 @@ class ValidadorCanonico:
             pregunta: Pregunta original del usuario
             respuesta: Respuesta narrativa del CFO AI
             datos_raw: Datos crudos de la consulta
+            valor_control: Resultado ya calculado de la query de control (opcional)
             
         Returns:
             Dict con resultado de validación
@@ -181,8 +271,9 @@ class ValidadorCanonico:
         resultado["query_canonica"] = query_key
         config = QUERIES_CANONICAS[query_key]
         
-        # 2. Ejecutar query de control
-        valor_control = cls.ejecutar_query_control(db, query_key)
+        # 2. Ejecutar query de control (salvo que venga precalculada)
+        if valor_control is None:
+            valor_control = cls.ejecutar_query_control(db, query_key)
         if valor_control is None:
             logger.warning(f"Validación canónica: No se pudo ejecutar query de control para '{query_key}'")
             return resultado
@@ -263,7 +354,8 @@ def validar_respuesta_cfo(
     db: Session, 
     pregunta: str, 
     respuesta: str, 
-    datos_raw: Any = None
+    datos_raw: Any = None,
+    valor_control: Optional[float] = None
 ) -> Dict[str, Any]:
     """
     Función wrapper para validar respuesta del CFO AI.
@@ -275,4 +367,4 @@ def validar_respuesta_cfo(
         if validacion.get('advertencia'):
             respuesta += validacion['advertencia']
     """
-    return ValidadorCanonico.validar_respuesta(db, pregunta, respuesta, datos_raw)
+    return ValidadorCanonico.validar_respuesta(db, pregunta, respuesta, datos_raw, valor_control)
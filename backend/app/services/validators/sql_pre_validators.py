@@ -2,9 +2,21 @@
 SQL Pre-Validators - Validación ANTES de ejecutar SQL.
 Detecta problemas lógicos y sintaxis básica.
 Extraído de validador_sql.py para responsabilidad única.
+
+Todas las reglas consultan el mismo parseo (app.services.sql_ast): palabras
+dentro de strings o comentarios no cuentan y las cláusulas se miden a su nivel.
 """
 from typing import Dict, Any, Optional
 
+from app.services.sql_ast import ConsultaSQL, parsear_sql
+
+# Marcadores de window function (PostgreSQL no las permite en HAVING)
+_MARCADORES_WINDOW = frozenset({'OVER', 'ROW_NUMBER', 'RANK', 'DENSE_RANK', 'NTILE', 'LAG', 'LEAD'})
+_LITERALES_TOTAL = frozenset({'TOTAL GENERAL', 'TOTAL', 'TOTALES'})
+_ALIASES_SENSIBLES = frozenset({'LOCALIDAD', 'TIPO_OPERACION', 'MONEDA_ORIGINAL', 'AREA', 'NOMBRE', 'SOCIO'})
+_COLUMNAS_ENUM = ('LOCALIDAD', 'TIPO_OPERACION', 'MONEDA_ORIGINAL')
+_OPERADORES_COMPARACION = frozenset({'=', '<', '>', '<=', '>=', '<>', '!=', 'BETWEEN'})
+
 
 class SQLPreValidators:
     """Validadores pre-ejecución para SQL."""
@@ -22,19 +34,19 @@ class SQLPreValidators:
             {'valido': bool, 'problemas': List[str], 'sugerencia_fallback': str|None}
         """
         pregunta_lower = pregunta.lower()
-        sql_upper = sql.upper()
+        consulta = parsear_sql(sql)
         
         problemas = []
         
         # Ejecutar validaciones
-        cls._validar_rankings(pregunta_lower, sql_upper, problemas)
-        cls._validar_proyecciones(pregunta_lower, sql_upper, sql, problemas)
-        cls._validar_porcentaje_moneda(pregunta_lower, sql_upper, sql, problemas)
-        cls._validar_filtro_temporal(pregunta_lower, sql_upper, problemas)
-        cls._validar_window_en_having(sql_upper, problemas)
-        cls._validar_union_order_by(sql_upper, sql, problemas)
-        cls._validar_union_enum_literal(sql_upper, problemas)
-        cls._validar_union_excesivo(sql_upper, problemas)
+        cls._validar_rankings(pregunta_lower, consulta, problemas)
+        cls._validar_proyecciones(pregunta_lower, consulta, problemas)
+        cls._validar_porcentaje_moneda(pregunta_lower, consulta, problemas)
+        cls._validar_filtro_temporal(pregunta_lower, consulta, problemas)
+        cls._validar_window_en_having(consulta, problemas)
+        cls._validar_union_order_by(consulta, problemas)
+        cls._validar_union_enum_literal(consulta, problemas)
+        cls._validar_union_excesivo(consulta, problemas)
         
         # Sugerencia de fallback si hay problemas
         sugerencia = cls._obtener_sugerencia_fallback(pregunta, problemas)
@@ -52,178 +64,150 @@ class SQLPreValidators:
         }
     
     @staticmethod
-    def _validar_rankings(pregunta: str, sql_upper: str, problemas: list) -> None:
+    def _validar_rankings(pregunta: str, consulta: ConsultaSQL, problemas: list) -> None:
         """Valida rankings con LIMIT 1 sospechoso."""
         keywords_ranking = ['ranking', 'top', 'mejores', 'principales', 'cuáles', 'cuales']
         excepciones = ['el mejor', 'el mayor', 'el más', 'cuál es']
         
         if any(kw in pregunta for kw in keywords_ranking):
-            if 'LIMIT 1' in sql_upper:
+            if consulta.tiene('LIMIT', '1'):
                 if not any(kw in pregunta for kw in excepciones):
                     problemas.append("Ranking pidió múltiples pero SQL tiene LIMIT 1")
     
     @staticmethod
-    def _validar_proyecciones(pregunta: str, sql_upper: str, sql: str, problemas: list) -> None:
+    def _validar_proyecciones(pregunta: str, consulta: ConsultaSQL, problemas: list) -> None:
         """Valida proyecciones sin calcular meses restantes."""
         keywords_proyeccion = ['proyecc', 'proyect', 'fin de año', 'fin del año', 'cierre', 'estimar']
         
         if any(kw in pregunta for kw in keywords_proyeccion):
-            tiene_extract = 'EXTRACT(MONTH FROM' in sql_upper
-            tiene_calculo = '12 -' in sql or '365 -' in sql
+            tiene_extract = consulta.tiene('EXTRACT', '(', 'MONTH', 'FROM')
+            tiene_calculo = consulta.tiene('12', '-') or consulta.tiene('365', '-')
             
             if not (tiene_extract or tiene_calculo):
                 problemas.append("Proyección sin calcular meses/días restantes dinámicamente")
     
     @staticmethod
-    def _validar_porcentaje_moneda(pregunta: str, sql_upper: str, sql: str, problemas: list) -> None:
+    def _validar_porcentaje_moneda(pregunta: str, consulta: ConsultaSQL, problemas: list) -> None:
         """Valida porcentajes de moneda sin usar moneda_original."""
         keywords_moneda = ['usd', 'uyu', 'dólar', 'peso', 'moneda', 'divisa']
         
         es_query_porcentaje_moneda = 'porcentaje' in pregunta and any(m in pregunta for m in keywords_moneda)
         
-        if es_query_porcentaje_moneda and 'moneda_original' not in sql.lower():
-            if 'COUNT(' in sql_upper or 'SUM(CASE WHEN' not in sql_upper:
+        if es_query_porcentaje_moneda and 'MONEDA_ORIGINAL' not in consulta.palabras:
+            if 'COUNT' in consulta.funciones or not consulta.tiene('SUM', '(', 'CASE', 'WHEN'):
                 problemas.append("Porcentaje de moneda debe usar columna moneda_original, no monto_usd/uyu")
     
     @staticmethod
-    def _validar_window_en_having(sql_upper: str, problemas: list) -> None:
+    def _validar_window_en_having(consulta: ConsultaSQL, problemas: list) -> None:
         """Detecta window functions dentro de HAVING (PostgreSQL no lo permite)."""
-        if 'HAVING' not in sql_upper:
-            return
-        idx = sql_upper.find('HAVING')
-        fragment = sql_upper[idx:]
-        # Recortar hasta ORDER BY, LIMIT o ; (fin de sentencia)
-        for sep in (' ORDER BY ', ' LIMIT ', ';'):
-            pos = fragment.find(sep)
-            if pos != -1:
-                fragment = fragment[:pos]
-        window_markers = [
-            'OVER (', 'OVER(',
-            'ROW_NUMBER', 'RANK(', 'DENSE_RANK', 'NTILE(', 'LAG(', 'LEAD(',
-        ]
-        if any(m in fragment for m in window_markers):
-            problemas.append(
-                "Window functions no permitidas en HAVING. Usar subconsulta o CTE."
-            )
+        for inicio, fin in consulta.clausulas('HAVING'):
+            if _MARCADORES_WINDOW.intersection(consulta.valores[inicio:fin]):
+                problemas.append(
+                    "Window functions no permitidas en HAVING. Usar subconsulta o CTE."
+                )
+                return
 
     @staticmethod
-    def _validar_union_order_by(sql_upper: str, sql: str, problemas: list) -> None:
+    def _validar_union_order_by(consulta: ConsultaSQL, problemas: list) -> None:
         """
         ORDER BY en UNION/INTERSECT/EXCEPT solo permite nombres de columnas.
         No expresiones, casts (::) ni funciones. Envolver en subquery si hace falta.
+        El ORDER BY que aplica al resultado es el de la última rama, a su nivel.
         """
-        keywords = ['UNION ALL', 'UNION', 'INTERSECT', 'EXCEPT']
-        if not any(kw in sql_upper for kw in keywords):
-            return
-        # Posición del último keyword de compound (para tomar el ORDER BY que aplica al resultado)
-        last_pos = -1
-        for kw in keywords:
-            idx = sql_upper.rfind(kw)
-            if idx != -1 and idx > last_pos:
-                last_pos = idx
-        if last_pos == -1:
-            return
-        suffix_upper = sql_upper[last_pos:]
-        order_by_idx = suffix_upper.find('ORDER BY')
-        if order_by_idx == -1:
-            return
-        # Extraer la cláusula ORDER BY hasta LIMIT, ; o fin
-        clause_start = last_pos + order_by_idx
-        clause_snippet = sql_upper[clause_start:]
-        end = len(clause_snippet)
-        for sep in (' LIMIT ', ';'):
-            pos = clause_snippet.find(sep)
-            if pos != -1:
-                end = min(end, pos)
-        order_by_clause = clause_snippet[:end]
-        # En el ORDER BY no debe haber casts (::) ni llamadas a funciones (...)
-        if '::' in order_by_clause or ('(' in order_by_clause and ')' in order_by_clause):
-            problemas.append(
-                "ORDER BY en UNION/INTERSECT/EXCEPT no permite expresiones ni casts. Envolver en subquery."
-            )
+        for grupo in consulta.grupos:
+            orden = grupo.ramas[-1].clausula('ORDER BY')
+            if not orden:
+                continue
+            valores = consulta.valores[orden[0]:orden[1]]
+            if '::' in valores or '(' in valores:
+                problemas.append(
+                    "ORDER BY en UNION/INTERSECT/EXCEPT no permite expresiones ni casts. Envolver en subquery."
+                )
+                return
 
     @staticmethod
-    def _validar_union_enum_literal(sql_upper: str, problemas: list) -> None:
+    def _validar_union_enum_literal(consulta: ConsultaSQL, problemas: list) -> None:
         """
         En UNION ALL: Detecta mezcla de literales string con columnas enum que causa
         type mismatch. Solo bloquea cuando hay literal ('TOTAL', 'TOTALES', etc.)
         en una rama y la columna enum real en otra. Si todas las ramas usan la misma
         columna enum de la tabla, es valido en PostgreSQL (mismo tipo en ambas ramas).
         """
-        if 'UNION ALL' not in sql_upper:
-            return
-        literales = ("'TOTAL GENERAL'", "'TOTAL'", "'TOTALES'")
-        aliases_sensibles = (
-            " AS LOCALIDAD", " AS TIPO_OPERACION", " AS MONEDA_ORIGINAL",
-            " AS AREA", " AS NOMBRE", " AS SOCIO",
-        )
-        columnas_enum = ('localidad', 'tipo_operacion', 'moneda_original')
+        for grupo in consulta.grupos:
+            if 'UNION ALL' not in grupo.operadores:
+                continue
+            if SQLPreValidators._union_mezcla_enum_y_literal(consulta, grupo, problemas):
+                return
 
-        def _recortar_hasta_fin_rama(seg: str) -> str:
-            for sep in (' ORDER BY ', ' LIMIT ', ';'):
-                idx = seg.find(sep)
-                if idx != -1:
-                    seg = seg[:idx]
-            return seg
+    @staticmethod
+    def _union_mezcla_enum_y_literal(consulta: ConsultaSQL, grupo, problemas: list) -> bool:
+        def _rango_sin_orden(rama):
+            # La rama sin su ORDER BY/LIMIT
+            fin = rama.fin
+            for nombre in ('ORDER BY', 'LIMIT'):
+                clausula = rama.clausula(nombre)
+                if clausula:
+                    fin = min(fin, clausula[0])
+            return rama.inicio, fin
 
-        def _extraer_select_portion(seg: str) -> str:
-            seg_lower = seg.lower()
-            from_idx = seg_lower.find(' from ')
-            return seg_lower[:from_idx] if from_idx != -1 else seg_lower
+        def _literales_total(inicio, fin):
+            return {
+                consulta.valores[k][1:-1].upper() for k in range(inicio, fin)
+                if consulta.tipos[k] == 'string'
+            } & _LITERALES_TOTAL
 
-        partes = sql_upper.split('UNION ALL')
+        rangos = [_rango_sin_orden(rama) for rama in grupo.ramas]
 
         # CHECK 1: literal 'TOTAL'/'TOTALES' asignado a alias de columna enum (siempre malo)
-        for i in range(1, len(partes)):
-            segmento = _recortar_hasta_fin_rama(partes[i])
-            if any(lit in segmento for lit in literales) and any(
-                al in segmento for al in aliases_sensibles
-            ):
+        for inicio, fin in rangos[1:]:
+            tiene_alias = any(
+                consulta.tiene('AS', alias, inicio=inicio, fin=fin) for alias in _ALIASES_SENSIBLES
+            )
+            if _literales_total(inicio, fin) and tiene_alias:
                 problemas.append(
                     "UNION ALL asigna literal 'TOTAL'/'TOTAL GENERAL' a columna enum/CHECK (localidad, area, etc.). "
                     "Usar CAST(col AS TEXT) o col::TEXT en la rama de datos."
                 )
-                return
+                return True
 
         # CHECK 2: columna enum sin cast — SOLO bloquear si alguna rama tiene
         # un literal string donde se espera la columna (type mismatch real).
         # Si TODAS las ramas usan la misma columna enum de la tabla, es valido.
-        hay_rama_con_literal = any(
-            any(lit in _recortar_hasta_fin_rama(partes[i]) for lit in literales)
-            for i in range(len(partes))
-        )
-
-        if not hay_rama_con_literal:
-            # Todas las ramas usan columnas reales de la tabla — no hay type mismatch
-            return
+        if not any(_literales_total(inicio, fin) for inicio, fin in rangos):
+            return False
 
         # Hay mezcla de literal + columna enum: verificar si la columna tiene CAST
-        for col in columnas_enum:
-            for i in range(len(partes)):
-                select_portion = _extraer_select_portion(
-                    _recortar_hasta_fin_rama(partes[i])
-                )
-                if col not in select_portion:
-                    continue
-                if f"{col}::text" in select_portion:
+        for rama in grupo.ramas:
+            seleccion = rama.clausula('SELECT')
+            if not seleccion:
+                continue
+            inicio, fin = seleccion
+            for k in range(inicio, fin):
+                if consulta.valores[k] not in _COLUMNAS_ENUM or consulta.tipos[k] != 'palabra':
                     continue
-                if f"cast({col} as text)" in select_portion or f"cast( {col} as text)" in select_portion:
-                    continue
-                problemas.append(
-                    "UNION ALL mezcla columna enum sin CAST con literal string. "
-                    "Usar col::TEXT o CAST(col AS TEXT) en todas las ramas."
+                # Inicio de la referencia: "o.localidad" empieza en el alias de tabla
+                ref = k - 2 if consulta.valores[k - 1] == '.' else k
+                sigue = consulta.valores[k + 1:k + 3]
+                con_cast = sigue == ['::', 'TEXT'] or (
+                    ref >= 2 and consulta.valores[ref - 2:ref] == ['CAST', '('] and sigue == ['AS', 'TEXT']
                 )
-                return
+                if not con_cast:
+                    problemas.append(
+                        "UNION ALL mezcla columna enum sin CAST con literal string. "
+                        "Usar col::TEXT o CAST(col AS TEXT) en todas las ramas."
+                    )
+                    return True
+        return False
 
     @staticmethod
-    def _validar_union_excesivo(sql_upper: str, problemas: list) -> None:
+    def _validar_union_excesivo(consulta: ConsultaSQL, problemas: list) -> None:
         """
         Detecta UNION ALL con demasiadas ramas (señal de mega-query problemática).
 
         4+ ramas = warning (riesgo de type mismatch).
         6+ ramas = bloqueante (casi siempre falla en PostgreSQL por tipos incompatibles).
         """
-        count = sql_upper.count('UNION ALL')
+        count = consulta.contar('UNION', 'ALL')
         if count >= 5:
             problemas.append(
                 f"SQL con 6+ ramas UNION ALL ({count + 1} ramas): "
@@ -236,19 +220,30 @@ class SQLPreValidators:
             )
 
     @staticmethod
-    def _validar_filtro_temporal(pregunta: str, sql_upper: str, problemas: list) -> None:
+    def _validar_filtro_temporal(pregunta: str, consulta: ConsultaSQL, problemas: list) -> None:
         """Valida pregunta genérica sin filtro temporal."""
         keywords_temporal = [
             'mes', 'año', 'trimestre', 'semestre', 'día', 'hoy', 'ayer', 'mañana',
             'histórico', 'desde inicio', 'total', 'todos', '2024', '2025', 'siempre'
         ]
-        filtros_sql = ['DATE_TRUNC', 'EXTRACT(YEAR', 'EXTRACT(MONTH', "fecha >= '202", "fecha < '202", 'WHERE fecha']
         
         no_tiene_periodo = not any(t in pregunta for t in keywords_temporal)
-        no_tiene_filtro = not any(f in sql_upper for f in filtros_sql)
-        
-        if no_tiene_periodo and no_tiene_filtro:
+        if no_tiene_periodo and not SQLPreValidators._tiene_filtro_temporal(consulta):
             problemas.append("Pregunta genérica sin filtro temporal - debería filtrar por año 2025")
+
+    @staticmethod
+    def _tiene_filtro_temporal(consulta: ConsultaSQL) -> bool:
+        """DATE_TRUNC, EXTRACT(YEAR|MONTH ...) o una comparación sobre fecha en un WHERE."""
+        if 'DATE_TRUNC' in consulta.funciones:
+            return True
+        if consulta.tiene('EXTRACT', '(', 'YEAR') or consulta.tiene('EXTRACT', '(', 'MONTH'):
+            return True
+        return any(
+            consulta.valores[k] == 'FECHA' and consulta.valores[k + 1:k + 2] and
+            consulta.valores[k + 1] in _OPERADORES_COMPARACION
+            for inicio, fin in consulta.clausulas('WHERE')
+            for k in range(inicio, fin)
+        )
     
     @staticmethod
     def _obtener_sugerencia_fallback(pregunta: str, problemas: list) -> Optional[str]:
@@ -270,35 +265,58 @@ class SQLPreValidators:
             {'valido': bool, 'problemas': List[str]}
         """
         problemas = []
-        sql_upper = sql.upper()
+        consulta = parsear_sql(sql)
+        valores = consulta.valores
         
         # FULL sin JOIN completo
-        if 'FULL' in sql_upper and 'FULL OUTER JOIN' not in sql_upper and 'FULL JOIN' not in sql_upper:
-            problemas.append("FULL keyword sin JOIN completo")
+        for k in consulta.buscar('FULL'):
+            if valores[k + 1:k + 2] != ['JOIN'] and valores[k + 1:k + 3] != ['OUTER', 'JOIN']:
+                problemas.append("FULL keyword sin JOIN completo")
+                break
         
-        # Paréntesis desbalanceados
-        if sql.count('(') != sql.count(')'):
-            problemas.append(f"Paréntesis desbalanceados: {sql.count('(')} abiertos, {sql.count(')')} cerrados")
+        # Paréntesis desbalanceados (los de strings y comentarios no cuentan)
+        if consulta.parentesis_abiertos != consulta.parentesis_cerrados:
+            problemas.append(
+                f"Paréntesis desbalanceados: {consulta.parentesis_abiertos} abiertos, "
+                f"{consulta.parentesis_cerrados} cerrados"
+            )
         
         # CTE vacío
-        if 'AS ()' in sql or 'AS ( )' in sql:
+        if consulta.tiene('AS', '(', ')'):
             problemas.append("CTE con cuerpo vacío detectado")
         
-        # JOIN sin ON o USING
-        joins = ['LEFT JOIN', 'RIGHT JOIN', 'INNER JOIN', 'FULL JOIN', 'FULL OUTER JOIN']
-        for join_type in joins:
-            if join_type in sql_upper:
-                idx = sql_upper.find(join_type)
-                # Buscar en los próximos 150 caracteres si hay ON o USING
-                siguiente = sql_upper[idx:idx+150]
-                if ' ON ' not in siguiente and ' USING' not in siguiente:
-                    problemas.append(f"{join_type} sin cláusula ON o USING")
+        # JOIN sin ON o USING (al nivel del JOIN: lo que está dentro de una subquery no cuenta)
+        for tipo_join in SQLPreValidators._joins_sin_condicion(consulta):
+            problemas.append(f"{tipo_join} sin cláusula ON o USING")
         
         return {
             'valido': len(problemas) == 0,
             'problemas': problemas
         }
 
+    @staticmethod
+    def _joins_sin_condicion(consulta: ConsultaSQL) -> list:
+        """Tipos de JOIN (LEFT/RIGHT/INNER/FULL) sin ON ni USING antes del siguiente JOIN o cláusula."""
+        valores, total = consulta.valores, len(consulta.valores)
+        faltantes = []
+        for k in consulta.buscar('JOIN'):
+            previos = [v for v in valores[max(0, k - 2):k] if v in ('LEFT', 'RIGHT', 'INNER', 'FULL', 'OUTER')]
+            if not previos or previos[0] == 'OUTER':
+                continue
+            tipo_join = 'FULL OUTER JOIN' if previos == ['FULL', 'OUTER'] else f"{previos[0]} JOIN"
+            nivel = consulta.profundidades[k]
+            fin = consulta.fin_clausula(k + 1, nivel, total)
+            siguiente_join = next(
+                (j for j in consulta.buscar('JOIN', inicio=k + 1, fin=fin) if consulta.profundidades[j] == nivel),
+                fin,
+            )
+            tramo = [
+                valores[j] for j in range(k + 1, siguiente_join) if consulta.profundidades[j] == nivel
+            ]
+            if 'ON' not in tramo and 'USING' not in tramo and tipo_join not in faltantes:
+                faltantes.append(tipo_join)
+        return faltantes
+
 
 # Alias retrocompatible para imports legacy.
 ValidadorPreSQL = SQLPreValidators
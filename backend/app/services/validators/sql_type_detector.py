@@ -4,12 +4,17 @@ Extraído de validador_sql.py para responsabilidad única.
 """
 from typing import Optional
 
+from app.services.motor_intenciones import AnalisisPregunta, analizar_pregunta
+from app.services.sql_ast import ConsultaSQL, parsear_sql
+
 
 class SQLTypeDetector:
-    """Detecta el tipo de query según patrones en pregunta y SQL."""
-    
-    # Nombres de socios para detección de distribuciones específicas
-    _SOCIOS = frozenset(['bruno', 'agustina', 'viviana', 'gonzalo', 'pancho'])
+    """
+    Detecta el tipo de query según patrones en pregunta y SQL.
+
+    Las keywords de la pregunta (grupos 'tipo_query' y 'nombre_socio') las encuentra
+    el motor de intenciones en una pasada; acá solo se decide el tipo.
+    """
     
     # Patrones simples: keyword -> tipo (orden no importa)
     _PATTERNS_SIMPLES = {
@@ -34,59 +39,68 @@ class SQLTypeDetector:
                           'facturacion', 'facturacion_dia', 'gastos', 'gastos_dia',
                           'retiros', 'tipo_cambio', 'general'
         """
-        pregunta_lower = pregunta.lower()
+        analisis = analizar_pregunta(pregunta)
         
         # Caso especial: distribuciones con nombre de socio
-        tipo_socio = cls._detectar_distribucion_socio(pregunta_lower)
+        tipo_socio = cls._detectar_distribucion_socio(analisis)
         if tipo_socio:
             return tipo_socio
         
         # Patrones simples (búsqueda en diccionario)
         for keyword, tipo in cls._PATTERNS_SIMPLES.items():
-            if keyword in pregunta_lower:
+            if analisis.contiene('tipo_query', keyword):
                 return tipo
         
         # Patrones con variantes día/hoy
-        return cls._detectar_con_variante_dia(pregunta_lower, sql.upper())
+        return cls._detectar_con_variante_dia(analisis, parsear_sql(sql))
     
     @classmethod
-    def _detectar_distribucion_socio(cls, pregunta: str) -> Optional[str]:
+    def _detectar_distribucion_socio(cls, analisis: AnalisisPregunta) -> Optional[str]:
         """Detecta distribuciones por socio (caso especial con nombres)."""
-        tiene_socio = any(s in pregunta for s in cls._SOCIOS)
+        def tiene(keyword: str) -> bool:
+            return analisis.contiene('tipo_query', keyword)
         
-        if tiene_socio:
-            if any(p in pregunta for p in ['distribu', 'recib', 'toca']):
+        if analisis.contiene('nombre_socio'):
+            if tiene('distribu') or tiene('recib') or tiene('toca'):
                 return 'distribucion_socio'
-            if 'retir' in pregunta:
+            if tiene('retir'):
                 return 'retiros'
         
-        if 'distribu' in pregunta and ('socio' in pregunta or 'cada socio' in pregunta):
+        if tiene('distribu') and tiene('socio'):
             return 'distribucion_socio'
         
         return None
     
     @staticmethod
-    def _detectar_con_variante_dia(pregunta: str, sql: str) -> str:
+    def _calcula_porcentaje(consulta: ConsultaSQL) -> bool:
+        """'* 100' (también '* 100.0') o un '%%' escapado fuera de strings."""
+        return consulta.tiene('%', '%') or any(
+            valor == '*' and consulta.valor_numerico(k + 1) == 100
+            for k, valor in enumerate(consulta.valores)
+        )
+
+    @classmethod
+    def _detectar_con_variante_dia(cls, analisis: AnalisisPregunta, consulta: ConsultaSQL) -> str:
         """Detecta tipos con variante día/hoy (facturación, gastos)."""
-        es_dia = 'día' in pregunta or 'hoy' in pregunta
+        def tiene(keyword: str) -> bool:
+            return analisis.contiene('tipo_query', keyword)
+        
+        es_dia = tiene('día') or tiene('hoy')
         
         # Porcentajes (verificar SQL también)
-        if 'porcentaje' in pregunta or '%%' in sql or '* 100' in sql:
+        if tiene('porcentaje') or cls._calcula_porcentaje(consulta):
             return 'porcentaje'
         
         # Facturación
-        if 'factur' in pregunta or 'ingreso' in pregunta:
+        if tiene('factur') or tiene('ingreso'):
             return 'facturacion_dia' if es_dia else 'facturacion'
         
         # Gastos
-        if 'gast' in pregunta:
+        if tiene('gast'):
             return 'gastos_dia' if es_dia else 'gastos'
         
         # Tipo de cambio (fallback si no se detectó antes)
-        if 'cambio' in pregunta:
+        if tiene('cambio'):
             return 'tipo_cambio'
         
         return 'general'
-
-
-
@@ -0,0 +1,56 @@
+"""
+Versiones de datos por tabla - Sistema CFO Inteligente
+
+data_versions guarda un contador por tabla versionada que incrementan
+triggers a nivel sentencia (migraciones m7n8o9p0q1r2 y n8o9p0q1r2s3) en cada
+INSERT, UPDATE, DELETE o TRUNCATE. Lo ven todos los workers y también
+registra cambios hechos fuera de la app (scripts, psql).
+
+Un cache guarda con cada entrada las versiones de las tablas de las que
+depende y la valida con versiones_vigentes(), o las incluye en la clave
+(result_cache): una lectura por clave primaria en lugar de recalcular.
+"""
+
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+TABLAS_VERSIONADAS = (
+    "operaciones",
+    "clientes",
+    "proveedores",
+    "distribuciones_detalle",
+    "expedientes",
+    "areas",
+    "socios",
+    "operaciones_diarias",
+)
+
+
+def obtener_versiones_datos(db: Session, tablas: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Versión actual de cada tabla, en una sola query por clave primaria.
+
+    Args:
+        db: Sesión de BD.
+        tablas: Tablas a leer (default: TABLAS_VERSIONADAS). Vacío no consulta la base.
+
+    Returns:
+        Dict tabla -> versión. Una tabla sin fila en data_versions vale 0.
+    """
+    tablas = list(TABLAS_VERSIONADAS if tablas is None else tablas)
+    if not tablas:
+        return {}
+    filas = db.execute(
+        text("SELECT tabla, version FROM data_versions WHERE tabla = ANY(:tablas)"),
+        {"tablas": tablas},
+    )
+    versiones = dict.fromkeys(tablas, 0)
+    versiones.update({tabla: int(version) for tabla, version in filas})
+    return versiones
+
+
+def versiones_vigentes(db: Session, versiones: Dict[str, int]) -> bool:
+    """True si ninguna de las tablas de versiones cambió desde que se leyeron."""
+    return obtener_versiones_datos(db, versiones) == versiones
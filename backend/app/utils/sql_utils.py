@@ -5,9 +5,10 @@ Extraído de SQLRouter para reducir God Object.
 """
 
 import re
-import sqlparse
 from typing import Dict, Any, Optional
 
+from app.services.sql_ast import parsear_sql
+
 
 def extraer_sql_limpio(texto: str) -> Optional[str]:
     """
@@ -65,6 +66,9 @@ def validar_sql(sql: str) -> Dict[str, Any]:
     """
     Valida que el SQL es sintácticamente correcto y ejecutable.
     
+    El parseo queda cacheado (app.services.sql_ast): los validadores y el
+    post-procesador que reciben este mismo SQL lo reutilizan.
+    
     Args:
         sql: Query SQL a validar
         
@@ -74,33 +78,17 @@ def validar_sql(sql: str) -> Dict[str, Any]:
     if not sql or len(sql) < 5:
         return {'valido': False, 'tipo': None, 'parseado': False, 'error': 'SQL vacío'}
     
-    sql_upper = sql.strip().upper()
+    consulta = parsear_sql(sql)
     
-    tiene_select = 'SELECT' in sql_upper
-    tiene_with = 'WITH' in sql_upper
-    
-    if not (tiene_select or tiene_with):
+    if not consulta.palabras & {'SELECT', 'WITH'}:
         return {'valido': False, 'tipo': 'OTRO', 'parseado': False, 
                 'error': 'SQL no contiene SELECT ni WITH'}
     
-    tipo = 'WITH' if sql_upper.strip().startswith('WITH') else 'SELECT'
+    tipo = 'WITH' if consulta.valores[0] == 'WITH' else 'SELECT'
     
-    try:
-        parsed = sqlparse.parse(sql)
-        if not parsed or len(parsed) == 0:
-            return {'valido': False, 'tipo': tipo, 'parseado': False,
-                    'error': 'sqlparse no pudo parsear el SQL'}
-        
-        primer_statement = parsed[0]
-        if primer_statement.get_type() not in ['SELECT', 'UNKNOWN']:
-            return {'valido': False, 'tipo': tipo, 'parseado': True,
-                    'error': f'Tipo inesperado: {primer_statement.get_type()}'}
-        
-        return {'valido': True, 'tipo': tipo, 'parseado': True, 'error': None}
+    tipo_sentencia = consulta.tipo_sentencia
+    if tipo_sentencia not in ('SELECT', 'UNKNOWN'):
+        return {'valido': False, 'tipo': tipo, 'parseado': True,
+                'error': f'Tipo inesperado: {tipo_sentencia}'}
     
-    except Exception as e:
-        return {'valido': False, 'tipo': tipo, 'parseado': False,
-                'error': f'Error en sqlparse: {str(e)}'}
-
-
-
+    return {'valido': True, 'tipo': tipo, 'parseado': True, 'error': None}
@@ -0,0 +1,74 @@
+"""Script para reconstruir el rollup operaciones_diarias desde operaciones.
+
+Recalcula los totales diarios de operaciones activas (todo el historial o un
+rango de fechas) y verifica que coincidan con la tabla operaciones.
+Usar después de cargas masivas por SQL directo o si se sospecha desvío.
+
+Uso:
+    cd ~/cfo-inteligente/backend
+    source .venv/bin/activate
+    python scripts/reconstruir_rollup_operaciones.py
+    python scripts/reconstruir_rollup_operaciones.py --desde 2025-01-01 --hasta 2025-12-31
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+from datetime import date
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Cargar .env
+env_path = BACKEND_DIR / ".env"
+if env_path.exists():
+    for line in env_path.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        key, _, value = line.partition("=")
+        os.environ.setdefault(key.strip(), value.strip().strip('"').strip("'"))
+
+from sqlalchemy import text
+
+from app.core.database import SessionLocal
+from app.services.rollup_operaciones import reconstruir_rollup
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye operaciones_diarias")
+    parser.add_argument("--desde", type=date.fromisoformat, default=None, help="Fecha inicial (YYYY-MM-DD)")
+    parser.add_argument("--hasta", type=date.fromisoformat, default=None, help="Fecha final (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        filas = reconstruir_rollup(db, fecha_desde=args.desde, fecha_hasta=args.hasta)
+        db.commit()
+        logger.info("Rollup reconstruido: %d filas", filas)
+
+        control = db.execute(
+            text(
+                """
+                SELECT
+                    (SELECT COALESCE(SUM(total_pesificado), 0) FROM operaciones WHERE deleted_at IS NULL) AS libro,
+                    (SELECT COALESCE(SUM(total_pesificado), 0) FROM operaciones_diarias) AS rollup
+                """
+            )
+        ).first()
+        if control.libro != control.rollup:
+            logger.error("Desvío: operaciones=%s rollup=%s", control.libro, control.rollup)
+            sys.exit(1)
+        logger.info("Control OK: total_pesificado = %s", control.rollup)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -51,6 +51,42 @@ def db_session():
     transaction.rollback()
     connection.close()
 
+# ============================================================
+# TRIGGERS DE data_versions (create_all no los crea)
+# ============================================================
+_MIGRACIONES_VERSIONES = ("m7n8o9p0q1r2_crear_data_versions.py", "n8o9p0q1r2s3_versionar_areas_socios_rollup.py")
+
+
+@pytest.fixture
+def migraciones_versiones():
+    """Módulos de las migraciones que instalan los triggers de data_versions."""
+    import importlib.util
+    from pathlib import Path
+
+    modulos = []
+    for archivo in _MIGRACIONES_VERSIONES:
+        ruta = Path(__file__).parents[1] / "alembic" / "versions" / archivo
+        spec = importlib.util.spec_from_file_location(ruta.stem, ruta)
+        modulo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(modulo)
+        modulos.append(modulo)
+    return modulos
+
+
+@pytest.fixture
+def db_con_triggers(db_session, migraciones_versiones):
+    """db_session con los triggers de data_versions instalados y contadores en 0."""
+    from sqlalchemy import text
+
+    migraciones = migraciones_versiones
+    db_session.execute(text(migraciones[0].SQL_FUNCION))
+    for migracion in migraciones:
+        for tabla in migracion.TABLAS_VERSIONADAS:
+            db_session.execute(text(f"DROP TRIGGER IF EXISTS trg_data_version_{tabla} ON {tabla}"))
+            db_session.execute(text(migracion.sql_trigger(tabla)))
+    db_session.execute(text("DELETE FROM data_versions"))
+    return db_session
+
 # ============================================================
 # FIXTURES DE DATOS BASE
 # ============================================================
@@ -0,0 +1,146 @@
+"""
+Tests para cfo_lote_service y el endpoint /api/cfo/ask-batch.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_cfo_lote.py -v
+"""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.constants import CFO_LOTE_MAX_PREGUNTAS
+from app.main import app
+from app.services.cfo_lote_service import responder_lote
+from app.services.conversacion_service import ConversacionService
+
+SERVICIO = 'app.services.cfo_lote_service'
+
+
+def _sql_ok(sql, metodo='claude_lote'):
+    return {'exito': True, 'sql': sql, 'metodo': metodo}
+
+
+@pytest.fixture
+def mocks_lote():
+    """Generación, costo y ejecución mockeados; las sesiones propias no tocan la BD."""
+    with patch(f'{SERVICIO}.generar_sql_lote') as mock_generar, \
+         patch(f'{SERVICIO}.obtener_metadatos_temporales', return_value=None), \
+         patch(f'{SERVICIO}.ejecutar_consulta_cfo') as mock_ejecutar, \
+         patch(f'{SERVICIO}.evaluar_costo_sql') as mock_costo, \
+         patch(f'{SERVICIO}.registrar_plan') as mock_registrar, \
+         patch(f'{SERVICIO}.invalidar_sql_cacheado') as mock_invalidar, \
+         patch(f'{SERVICIO}.ejecutar_con_sesion_analitica', side_effect=lambda func, *a, **k: func(None, *a, **k)), \
+         patch(f'{SERVICIO}.ejecutar_con_sesion_propia', side_effect=lambda func, *a, **k: func(None, *a, **k)):
+        mock_generar.return_value = [
+            _sql_ok("SELECT COUNT(*) AS total FROM operaciones WHERE deleted_at IS NULL"),
+            _sql_ok("SELECT SUM(total_pesificado) AS total FROM operaciones WHERE deleted_at IS NULL", 'canonica'),
+        ]
+        mock_ejecutar.side_effect = lambda db, sql: {
+            'success': True,
+            'data': [{'total': 2391}] if 'COUNT' in sql else [{'total': 12340660}],
+            'truncado': False,
+        }
+        mock_costo.return_value = {'aprobado': True, 'costo_total': 10.0, 'motivo': None}
+        yield {
+            'generar': mock_generar,
+            'ejecutar': mock_ejecutar,
+            'costo': mock_costo,
+            'registrar': mock_registrar,
+            'invalidar': mock_invalidar,
+        }
+
+
+def _responder(db_session, usuario, preguntas, conversation_id=None):
+    return asyncio.run(responder_lote(
+        db_session, preguntas=preguntas, conversation_id=conversation_id, usuario_id=usuario.id
+    ))
+
+
+class TestResponderLote:
+    """Un lote comparte conversación y devuelve un resultado por pregunta."""
+
+    def test_resultados_en_orden_con_narrativa(self, db_session, usuario_test, mocks_lote):
+        respuesta = _responder(db_session, usuario_test, ["¿Cuántas operaciones hay?", "facturación 2024"])
+
+        resultados = respuesta['resultados']
+        assert [r['pregunta'] for r in resultados] == ["¿Cuántas operaciones hay?", "facturación 2024"]
+        assert all(r['exito'] for r in resultados)
+        assert resultados[0]['narrativa'] == "**Operaciones:** 2.391"
+        assert resultados[1]['narrativa'] == "**Facturación 2024:** $12.340.660"
+        mocks_lote['generar'].assert_called_once()
+        # La canónica no pasa por la guardia de costo
+        assert mocks_lote['costo'].call_count == 1
+
+    def test_persiste_un_turno_en_la_conversacion(self, db_session, usuario_test, mocks_lote):
+        respuesta = _responder(db_session, usuario_test, ["¿Cuántas operaciones hay?", "facturación 2024"])
+
+        contexto = ConversacionService.obtener_contexto(db_session, respuesta['conversation_id'])
+        assert [m['role'] for m in contexto] == ['user', 'assistant']
+        assert "2. facturación 2024" in contexto[0]['content']
+        assert "### 2. facturación 2024" in contexto[1]['content']
+
+    def test_continua_conversacion_con_contexto(self, db_session, usuario_test, mocks_lote):
+        primera = _responder(db_session, usuario_test, ["¿Cuántas operaciones hay?", "facturación 2024"])
+        _responder(
+            db_session, usuario_test, ["¿Cuántas operaciones hay?", "facturación 2024"],
+            conversation_id=primera['conversation_id'],
+        )
+
+        contexto = mocks_lote['generar'].call_args.kwargs['contexto']
+        assert len(contexto) == 2
+
+    def test_fallas_aisladas_por_pregunta(self, db_session, usuario_test, mocks_lote):
+        mocks_lote['generar'].return_value = [
+            {'exito': False, 'sql': None, 'error': 'No pude entender la consulta'},
+            _sql_ok("SELECT COUNT(*) AS total FROM operaciones"),
+            _sql_ok("SELECT * FROM operaciones o1, operaciones o2"),
+        ]
+        mocks_lote['costo'].side_effect = lambda db, sql: (
+            {'aprobado': False, 'motivo': 'Costo estimado excesivo'} if 'o2' in sql
+            else {'aprobado': True, 'motivo': None}
+        )
+
+        resultados = _responder(db_session, usuario_test, ["???", "operaciones", "cruce"])['resultados']
+
+        assert [r['exito'] for r in resultados] == [False, True, False]
+        assert resultados[0]['tipo_error'] == 'sql_generation'
+        assert resultados[2]['tipo_error'] == 'sql_cost'
+        mocks_lote['invalidar'].assert_called_once()
+
+
+class TestEndpointLote:
+    """POST /api/cfo/ask-batch"""
+
+    @pytest.fixture
+    def client(self, db_session, usuario_test):
+        from app.core.database import get_db
+        from app.core.security import get_current_user
+
+        app.dependency_overrides[get_db] = lambda: db_session
+        app.dependency_overrides[get_current_user] = lambda: usuario_test
+        limiter = app.state.limiter
+        original_enabled = limiter.enabled
+        limiter.enabled = False
+        yield TestClient(app)
+        limiter.enabled = original_enabled
+        app.dependency_overrides.clear()
+
+    def test_respuesta_estructurada(self, client, mocks_lote):
+        response = client.post("/api/cfo/ask-batch", json={
+            "preguntas": ["¿Cuántas operaciones hay?", "facturación 2024"]
+        })
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body['conversation_id'] and body['mensaje_id']
+        assert body['resultados'][0]['datos'] == [{'total': 2391}]
+
+    def test_valida_cantidad_y_preguntas_vacias(self, client):
+        demasiadas = ["pregunta"] * (CFO_LOTE_MAX_PREGUNTAS + 1)
+        assert client.post("/api/cfo/ask-batch", json={"preguntas": demasiadas}).status_code == 422
+        assert client.post("/api/cfo/ask-batch", json={"preguntas": []}).status_code == 422
+        assert client.post("/api/cfo/ask-batch", json={"preguntas": ["ok", "  "]}).status_code == 422
@@ -1,5 +1,6 @@
 """
-Tests de cobertura exhaustiva para cfo_streaming.py
+Tests de cobertura exhaustiva para cfo_streaming.py (endpoint) y
+cfo_streaming_service.py (pipeline async)
 Objetivo: Llevar cobertura de 25% a 70%+
 
 Este archivo contiene tests para cada fase del flujo de streaming:
@@ -19,9 +20,12 @@ from sqlalchemy.orm import sessionmaker
 from uuid import uuid4
 import json
 import os
+import threading
+import time
 
 from app.main import app
 from app.core.config import settings
+from app.services.narrativa_cache import limpiar_cache_narrativas
 
 # URL de BD de test
 TEST_DATABASE_URL = os.environ.get(
@@ -78,7 +82,12 @@ def client_api(mock_user, db_session):
     
     app.dependency_overrides[get_current_user] = lambda: mock_user
     app.dependency_overrides[get_db] = lambda: db_session
+    # El límite de 20/min de /ask-stream no aplica a la suite (hay más de 20 requests)
+    limiter = app.state.limiter
+    original_enabled = limiter.enabled
+    limiter.enabled = False
     yield TestClient(app)
+    limiter.enabled = original_enabled
     app.dependency_overrides.clear()
 
 
@@ -133,16 +142,52 @@ class TestSSEFormat:
 # TESTS DEL ENDPOINT /ask-stream
 # ══════════════════════════════════════════════════════════════
 
+SERVICIO = 'app.services.cfo_streaming_service'
+
+
+class StreamFalso:
+    """Doble del stream async de AsyncAnthropic (async context manager + text_stream)."""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.cerrado = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.cerrado = True
+        return False
+
+    @property
+    def text_stream(self):
+        async def generar():
+            for chunk in self.chunks:
+                yield chunk
+        return generar()
+
+    async def get_final_message(self):
+        return Mock(usage=Mock(
+            input_tokens=120, output_tokens=40,
+            cache_read_input_tokens=7000, cache_creation_input_tokens=0,
+        ))
+
+
 @pytest.fixture
 def mock_streaming_dependencies():
     """Mock de todas las dependencias del streaming"""
-    with patch('app.api.cfo_streaming.generar_sql_inteligente') as mock_sql, \
-         patch('app.api.cfo_streaming.ejecutar_consulta_cfo') as mock_ejecutar, \
-         patch('app.api.cfo_streaming.client') as mock_client, \
-         patch('app.api.cfo_streaming.ValidadorSQL.validar_sql_antes_ejecutar') as mock_validar_pre, \
-         patch('app.api.cfo_streaming.ValidadorSQL.validar_resultado') as mock_validar_post, \
-         patch('app.api.cfo_streaming.SQLPostProcessor.procesar_sql') as mock_post_proc, \
-         patch('app.api.cfo_streaming.validar_respuesta_cfo') as mock_canonico:
+    limpiar_cache_narrativas()
+    with patch(f'{SERVICIO}.generar_sql_inteligente') as mock_sql, \
+         patch(f'{SERVICIO}.ejecutar_consulta_cfo') as mock_ejecutar, \
+         patch(f'{SERVICIO}.async_client') as mock_client, \
+         patch(f'{SERVICIO}.ValidadorSQL.validar_sql_antes_ejecutar') as mock_validar_pre, \
+         patch(f'{SERVICIO}.ValidadorSQL.validar_resultado') as mock_validar_post, \
+         patch(f'{SERVICIO}.SQLPostProcessor.procesar_sql') as mock_post_proc, \
+         patch(f'{SERVICIO}.validar_respuesta_cfo') as mock_canonico, \
+         patch(f'{SERVICIO}.evaluar_costo_sql') as mock_costo, \
+         patch(f'{SERVICIO}.registrar_plan') as mock_registrar_plan, \
+         patch.object(settings, 'cfo_narrativa_plantilla_max_filas', 0):
+        # Narrativa por plantillas desactivada: estos tests ejercitan el streaming de Claude
         
         # Configurar mocks por defecto
         mock_sql.return_value = {
@@ -161,13 +206,14 @@ def mock_streaming_dependencies():
             'modificado': False
         }
         mock_canonico.return_value = {'validado': False}
+        mock_costo.return_value = {
+            'aprobado': True, 'costo_total': 10.0, 'filas_estimadas': 1.0, 'motivo': None, 'plan': {}
+        }
         
-        # Mock del streaming de Claude
-        mock_stream = MagicMock()
-        mock_stream.__enter__ = Mock(return_value=mock_stream)
-        mock_stream.__exit__ = Mock(return_value=False)
-        mock_stream.text_stream = iter(["Hay ", "2,391 ", "operaciones ", "en total."])
-        mock_client.messages.stream.return_value = mock_stream
+        # Mock del streaming async de Claude
+        mock_client.messages.stream.return_value = StreamFalso(
+            ["Hay ", "2,391 ", "operaciones ", "en total."]
+        )
         
         yield {
             'sql': mock_sql,
@@ -176,7 +222,9 @@ def mock_streaming_dependencies():
             'validar_pre': mock_validar_pre,
             'validar_post': mock_validar_post,
             'post_proc': mock_post_proc,
-            'canonico': mock_canonico
+            'canonico': mock_canonico,
+            'costo': mock_costo,
+            'registrar_plan': mock_registrar_plan
         }
 
 
@@ -211,7 +259,124 @@ class TestStreamingEndpoint:
         assert 'event: sql' in content or 'SELECT' in content
         # Debe terminar con done
         assert 'event: done' in content or 'done' in content
-    
+
+    def test_streaming_informa_resultado_truncado(self, client_api, mock_streaming_dependencies):
+        """El evento data expone el flag truncado de la ejecución acotada"""
+        mock_streaming_dependencies['ejecutar'].return_value = {
+            'success': True,
+            'data': [{'total': 1}],
+            'truncado': True
+        }
+        response = client_api.post("/api/cfo/ask-stream", json={
+            "pregunta": "¿Cuántas operaciones hay?"
+        })
+
+        content = response.content.decode('utf-8')
+        evento_data = next(
+            bloque for bloque in content.split('\n\n') if bloque.startswith('event: data')
+        )
+        assert '"truncado": true' in evento_data
+
+    def test_streaming_narrativa_por_plantilla_sin_claude(self, client_api, mock_streaming_dependencies):
+        """Un resultado escalar se narra con plantilla y no se llama a Claude"""
+        with patch.object(settings, 'cfo_narrativa_plantilla_max_filas', 6):
+            response = client_api.post("/api/cfo/ask-stream", json={
+                "pregunta": "¿Cuántas operaciones hay?"
+            })
+
+        content = response.content.decode('utf-8')
+        assert 'event: token' in content
+        assert '2.391' in content
+        assert '"narrativa": "plantilla"' in content
+        mock_streaming_dependencies['client'].messages.stream.assert_not_called()
+        mock_streaming_dependencies['canonico'].assert_called_once()
+
+    def test_streaming_pregunta_analitica_usa_claude(self, client_api, mock_streaming_dependencies):
+        """Si la pregunta pide análisis la narrativa sigue siendo de Claude"""
+        with patch.object(settings, 'cfo_narrativa_plantilla_max_filas', 6):
+            response = client_api.post("/api/cfo/ask-stream", json={
+                "pregunta": "¿Por qué hay tantas operaciones?"
+            })
+
+        content = response.content.decode('utf-8')
+        assert '"narrativa": "claude"' in content
+        mock_streaming_dependencies['client'].messages.stream.assert_called_once()
+
+    def test_streaming_resultado_repetido_sale_de_cache_sin_claude(self, client_api, mock_streaming_dependencies):
+        """La misma pregunta con el mismo resultado reproduce la narrativa cacheada"""
+        primera = client_api.post("/api/cfo/ask-stream", json={
+            "pregunta": "¿Cuántas operaciones hay?"
+        }).content.decode('utf-8')
+        mock_streaming_dependencies['client'].messages.stream.reset_mock()
+
+        segunda = client_api.post("/api/cfo/ask-stream", json={
+            "pregunta": "¿cuantas operaciones hay"
+        }).content.decode('utf-8')
+
+        assert '"narrativa": "claude"' in primera
+        assert '"narrativa": "cache"' in segunda
+        assert 'en total.' in segunda
+        mock_streaming_dependencies['client'].messages.stream.assert_not_called()
+
+    def test_streaming_resultado_distinto_no_usa_cache(self, client_api, mock_streaming_dependencies):
+        """Si cambian las filas la narrativa vuelve a pedirse a Claude"""
+        client_api.post("/api/cfo/ask-stream", json={"pregunta": "¿Cuántas operaciones hay?"})
+        mock_streaming_dependencies['ejecutar'].return_value = {
+            'success': True,
+            'data': [{'total': 2392}]
+        }
+        mock_streaming_dependencies['client'].messages.stream.return_value = StreamFalso(["Hay ", "2,392."])
+
+        content = client_api.post("/api/cfo/ask-stream", json={
+            "pregunta": "¿Cuántas operaciones hay?"
+        }).content.decode('utf-8')
+
+        assert '"narrativa": "claude"' in content
+        assert mock_streaming_dependencies['client'].messages.stream.call_count == 2
+
+    def test_desconexion_aborta_claude_y_no_persiste_respuesta(
+        self, db_session, mock_user, mock_streaming_dependencies
+    ):
+        """Cerrar el generador a mitad de la narrativa cierra el stream de Claude y corta el turno"""
+        import asyncio
+        from app.services.cfo_streaming_service import generar_eventos_cfo_stream
+        from app.services.trazas_cfo import HISTOGRAMA_TURNOS, reiniciar_metricas
+
+        stream = StreamFalso(["Hay ", "2,391 ", "operaciones ", "en total."])
+        mock_streaming_dependencies['client'].messages.stream.return_value = stream
+
+        async def escenario():
+            eventos = generar_eventos_cfo_stream(
+                db_session, pregunta="¿Cuántas operaciones hay?", conversation_id=None, usuario_id=mock_user.id
+            )
+            vistos = []
+            async for evento in eventos:
+                vistos.append(evento)
+                if evento.startswith("event: token"):
+                    break
+            await eventos.aclose()
+            return vistos
+
+        reiniciar_metricas()
+        with patch(f'{SERVICIO}._guardar_respuesta_final') as mock_guardar:
+            vistos = asyncio.run(escenario())
+
+        assert not any(evento.startswith("event: done") for evento in vistos)
+        assert stream.cerrado
+        mock_guardar.assert_not_called()
+        assert ("claude", "cancelado") in HISTOGRAMA_TURNOS.series()
+
+    def test_streaming_registra_traza_por_etapa(self, client_api, mock_streaming_dependencies):
+        """Cada turno deja duraciones por etapa en los histogramas de /metrics"""
+        from app.services.trazas_cfo import HISTOGRAMA_ETAPAS, HISTOGRAMA_TURNOS, reiniciar_metricas
+
+        reiniciar_metricas()
+        client_api.post("/api/cfo/ask-stream", json={"pregunta": "¿Cuántas operaciones hay?"})
+
+        etapas = {clave[0] for clave in HISTOGRAMA_ETAPAS.series()}
+        assert {"conversacion", "generacion_sql", "ejecucion_sql", "narrativa", "primer_token"} <= etapas
+        assert ("claude", "ok") in HISTOGRAMA_TURNOS.series()
+
     def test_streaming_sin_autenticacion_error(self):
         """Sin token JWT debe retornar 401"""
         from fastapi.testclient import TestClient
@@ -270,6 +435,27 @@ class TestStreamingConversacion:
             assert response.status_code == 200
 
 
+    def test_streaming_persiste_mensajes_con_id_del_done(self, client_api, mock_streaming_dependencies, db_session):
+        """El mensaje_id del done se pre-genera y coincide con el mensaje persistido en segundo plano"""
+        from app.models.conversacion import Mensaje
+
+        response = client_api.post("/api/cfo/ask-stream", json={
+            "pregunta": "¿Cuántas operaciones hay?"
+        })
+        content = response.content.decode('utf-8')
+
+        bloque_done = content.split("event: done", 1)[1]
+        done = json.loads(bloque_done.split("data: ", 1)[1].split("\n", 1)[0])
+
+        db_session.expire_all()
+        mensajes = db_session.query(Mensaje).filter(
+            Mensaje.conversacion_id == done["conversation_id"]
+        ).order_by(Mensaje.created_at).all()
+
+        assert [m.rol for m in mensajes] == ["user", "assistant"]
+        assert str(mensajes[1].id) == done["mensaje_id"]
+
+
 @pytest.mark.integration  
 class TestStreamingGeneracionSQL:
     """Tests de la fase de generación SQL"""
@@ -321,6 +507,24 @@ class TestStreamingEjecucionSQL:
         
         # Debe contener evento de data
         assert 'data' in content.lower()
+
+    def test_streaming_filas_en_chunks_antes_del_evento_data(self, client_api, mock_streaming_dependencies):
+        """Todas las filas salen en data_chunk (con offset) antes del resumen data"""
+        filas = [{'n': i} for i in range(450)]
+        mock_streaming_dependencies['ejecutar'].return_value = {'success': True, 'data': filas}
+
+        content = client_api.post("/api/cfo/ask-stream", json={
+            "pregunta": "Listado de operaciones"
+        }).content.decode('utf-8')
+
+        bloques = content.split('\n\n')
+        chunks = [
+            json.loads(b.split('data: ', 1)[1]) for b in bloques if b.startswith('event: data_chunk')
+        ]
+        assert [c['offset'] for c in chunks] == [0, 200, 400]
+        assert [f for c in chunks for f in c['rows']] == filas
+        indice_data = next(i for i, b in enumerate(bloques) if b.startswith('event: data\n'))
+        assert all(not b.startswith('event: data_chunk') for b in bloques[indice_data:])
     
     def test_streaming_error_ejecucion_sql(self, client_api, mock_streaming_dependencies):
         """Error en ejecución SQL debe emitirse como evento error"""
@@ -354,6 +558,26 @@ class TestStreamingNarrativa:
         # Debe contener tokens de la respuesta
         assert 'token' in content or 'operaciones' in content or 'Hay' in content
     
+    def test_streaming_resultado_grande_informa_compresion(self, client_api, mock_streaming_dependencies):
+        """Un resultado que excede el presupuesto de tokens se comprime y el done lo informa"""
+        mock_streaming_dependencies['ejecutar'].return_value = {
+            'success': True,
+            'data': [{'cliente': f'Cliente {i}', 'total_pesificado': 1000.0 + i} for i in range(500)]
+        }
+        with patch.object(settings, 'cfo_narrativa_presupuesto_tokens', 1500):
+            response = client_api.post("/api/cfo/ask-stream", json={
+                "pregunta": "Ranking de clientes por facturación"
+            })
+
+        content = response.content.decode('utf-8')
+        evento_done = next(
+            bloque for bloque in content.split('\n\n') if bloque.startswith('event: done')
+        )
+        assert '"aplicada": "resumen_y_muestra"' in evento_done
+        assert '"filas_totales": 500' in evento_done
+        user_msg = mock_streaming_dependencies['client'].messages.stream.call_args.kwargs['messages'][0]['content']
+        assert 'RESULTADO COMPRIMIDO' in str(user_msg)
+
     def test_streaming_error_claude_fallback(self, client_api, mock_streaming_dependencies):
         """Error en Claude debe usar fallback"""
         mock_streaming_dependencies['client'].messages.stream.side_effect = Exception("API Error")
@@ -391,9 +615,77 @@ class TestStreamingValidacionCanonica:
         assert 'ADVERTENCIA' in content or 'advertencia' in content.lower()
 
 
+    def test_streaming_camino_canonico_omite_validacion(self, client_api, mock_streaming_dependencies):
+        """Con metodo 'canonica' el SQL ya es el de control: no se revalida la respuesta"""
+        mock_streaming_dependencies['sql'].return_value = {
+            'exito': True,
+            'sql': "SELECT SUM(total_pesificado) as total FROM operaciones",
+            'metodo': 'canonica'
+        }
+
+        response = client_api.post("/api/cfo/ask-stream", json={
+            "pregunta": "¿Cuál fue la facturación 2024?"
+        })
+
+        content = response.content.decode('utf-8')
+        evento_sql = next(
+            bloque for bloque in content.split('\n\n') if bloque.startswith('event: sql')
+        )
+        assert '"metodo": "canonica"' in evento_sql
+        mock_streaming_dependencies['canonico'].assert_not_called()
+
+
 @pytest.mark.integration
 class TestStreamingValidaciones:
     """Tests de validaciones SQL pre y post ejecución"""
+
+    def test_streaming_sql_costoso_se_regenera(self, client_api, mock_streaming_dependencies):
+        """Un SQL rechazado por la guardia de costo se regenera con el motivo en contexto"""
+        rechazo = {
+            'aprobado': False, 'costo_total': 9e9, 'filas_estimadas': 9e9,
+            'motivo': 'Costo estimado 9,000,000,000 supera el máximo 1,000,000', 'plan': {}
+        }
+        mock_streaming_dependencies['costo'].side_effect = [
+            rechazo, mock_streaming_dependencies['costo'].return_value
+        ]
+
+        response = client_api.post("/api/cfo/ask-stream", json={
+            "pregunta": "¿Cuántas operaciones hay?"
+        })
+
+        content = response.content.decode('utf-8')
+        assert 'regenerando' in content
+        assert 'event: done' in content
+        assert mock_streaming_dependencies['sql'].call_count == 2
+        contexto_regeneracion = mock_streaming_dependencies['sql'].call_args_list[1].kwargs['contexto']
+        assert 'sql_rechazado_por_costo' in contexto_regeneracion[-1]['content']
+        assert mock_streaming_dependencies['registrar_plan'].call_count == 2
+
+    def test_streaming_sql_costoso_dos_veces_emite_error(self, client_api, mock_streaming_dependencies):
+        """Si la regeneración también es costosa no se ejecuta nada"""
+        mock_streaming_dependencies['costo'].return_value = {
+            'aprobado': False, 'costo_total': 9e9, 'filas_estimadas': 1.0,
+            'motivo': 'Costo estimado demasiado alto', 'plan': {}
+        }
+
+        response = client_api.post("/api/cfo/ask-stream", json={
+            "pregunta": "¿Cuántas operaciones hay?"
+        })
+
+        content = response.content.decode('utf-8')
+        assert '"type": "sql_cost"' in content
+        mock_streaming_dependencies['ejecutar'].assert_not_called()
+
+    def test_streaming_sql_cacheado_no_pasa_por_guardia(self, client_api, mock_streaming_dependencies):
+        """El SQL servido desde cache ya fue evaluado cuando se generó"""
+        mock_streaming_dependencies['sql'].return_value = {
+            'exito': True, 'sql': "SELECT 1", 'metodo': 'cache'
+        }
+
+        client_api.post("/api/cfo/ask-stream", json={"pregunta": "¿Cuántas operaciones hay?"})
+
+        mock_streaming_dependencies['costo'].assert_not_called()
+
     
     def test_streaming_validacion_pre_advertencia(self, client_api, mock_streaming_dependencies):
         """Validación pre-ejecución con problemas debe emitir warning"""
@@ -444,6 +736,141 @@ class TestStreamingErrores:
         assert response.status_code in [200, 500, 503, 504]
 
 
+# ══════════════════════════════════════════════════════════════
+# TESTS DE COALESCING DE TOKENS (pipeline async)
+# ══════════════════════════════════════════════════════════════
+
+async def _consumir_tokens(chunks, tiempos):
+    """Ejecuta _stream_claude_response con reloj controlado y retorna (tokens, respuesta)."""
+    from app.services.cfo_streaming_service import _stream_claude_response
+
+    respuesta = []
+    tokens = []
+    with patch(f'{SERVICIO}.async_client') as mock_client, \
+         patch(f'{SERVICIO}.time.monotonic', side_effect=tiempos):
+        mock_client.messages.stream.return_value = StreamFalso(chunks)
+        async for evento in _stream_claude_response(
+            system_prompt="sys", user_message="msg", max_tokens=100, respuesta_completa=respuesta
+        ):
+            assert evento.startswith("event: token")
+            tokens.append(evento.split("data: ", 1)[1].rstrip("\n"))
+    return tokens, "".join(respuesta)
+
+
+class TestStreamingCoalescing:
+    """Tests de agrupación de tokens por ventana de tiempo"""
+
+    @pytest.mark.asyncio
+    async def test_primer_token_sale_inmediatamente_y_resto_se_agrupa(self):
+        """Dentro de la ventana los chunks se acumulan en un solo evento"""
+        tokens, respuesta = await _consumir_tokens(
+            ["Hay ", "2,391 ", "operaciones ", "en ", "total."],
+            [0.0, 0.01, 0.02, 0.03, 0.04],
+        )
+        assert tokens == ["Hay ", "2,391 operaciones en total."]
+        assert respuesta == "Hay 2,391 operaciones en total."
+
+    @pytest.mark.asyncio
+    async def test_ventana_vencida_emite(self):
+        """Pasada la ventana se emite el buffer en el siguiente fin de palabra"""
+        tokens, _ = await _consumir_tokens(
+            ["Hola ", "mundo ", "otra ", "vez."],
+            [0.0, 0.01, 1.0, 1.01],
+        )
+        assert tokens == ["Hola ", "mundo otra ", "vez."]
+
+    @pytest.mark.asyncio
+    async def test_no_corta_palabras(self):
+        """Un chunk que no cierra palabra nunca dispara un envío"""
+        tokens, _ = await _consumir_tokens(["Fac", "tura", "ción "], [0.0])
+        assert tokens == ["Facturación "]
+
+    @pytest.mark.asyncio
+    async def test_buffer_largo_emite_aunque_no_venza_la_ventana(self):
+        """Superado el máximo de caracteres se emite sin esperar la ventana"""
+        largo = "x" * 200 + " "
+        tokens, _ = await _consumir_tokens(["a ", largo, "fin."], [0.0, 0.001, 0.002])
+        assert tokens == ["a ", largo, "fin."]
+
+
+# ══════════════════════════════════════════════════════════════
+# TESTS DE FILAS PROGRESIVAS (data_chunk desde el cursor)
+# ══════════════════════════════════════════════════════════════
+
+def _filas_de_chunks(eventos):
+    return [
+        fila
+        for evento in eventos
+        for fila in json.loads(evento.split("data: ", 1)[1])["rows"]
+    ]
+
+
+class TestStreamingFilasProgresivas:
+    """_ejecutar_emitiendo_filas emite los lotes mientras la query sigue corriendo"""
+
+    @pytest.mark.asyncio
+    async def test_primeras_filas_antes_de_terminar_la_query(self):
+        from app.services.cfo_streaming_service import _ejecutar_emitiendo_filas
+
+        filas = [{'n': i} for i in range(700)]
+        primer_chunk_recibido = threading.Event()
+
+        def ejecutar_lento(db, sql, al_lote):
+            al_lote(filas[:500])
+            # La query "sigue" hasta que el consumidor ya tiene filas
+            assert primer_chunk_recibido.wait(timeout=5)
+            al_lote(filas[500:])
+            return {'success': True, 'data': filas, 'count': len(filas), 'truncado': False}
+
+        salida = {}
+        eventos = []
+        with patch(f'{SERVICIO}.ejecutar_consulta_cfo', ejecutar_lento), \
+             patch('app.services.consultas_cancelables.obtener_pid_backend', return_value=None):
+            async for evento in _ejecutar_emitiendo_filas(MagicMock(), "SELECT 1", salida):
+                eventos.append(evento)
+                primer_chunk_recibido.set()
+
+        assert [json.loads(e.split("data: ", 1)[1])["offset"] for e in eventos] == [0, 200, 400, 500]
+        assert _filas_de_chunks(eventos) == filas
+        assert salida["emitidas"] == 700
+        assert salida["resultado"]["success"] is True
+
+    @pytest.mark.asyncio
+    async def test_resultado_de_cache_no_emite_chunks(self):
+        """Sin lotes del cursor las filas las emite el llamador después"""
+        from app.services.cfo_streaming_service import _ejecutar_emitiendo_filas
+
+        salida = {}
+        with patch(f'{SERVICIO}.ejecutar_consulta_cfo', return_value={'success': True, 'data': [{'n': 1}]}), \
+             patch('app.services.consultas_cancelables.obtener_pid_backend', return_value=None):
+            eventos = [e async for e in _ejecutar_emitiendo_filas(MagicMock(), "SELECT 1", salida)]
+
+        assert eventos == []
+        assert salida["emitidas"] == 0
+
+    @pytest.mark.asyncio
+    async def test_cerrar_el_stream_espera_a_la_query(self):
+        """Desconexión a mitad de las filas: la ejecución se cancela y se espera"""
+        from app.services.cfo_streaming_service import _ejecutar_emitiendo_filas
+
+        terminada = threading.Event()
+
+        def ejecutar_infinito(db, sql, al_lote):
+            al_lote([{'n': 1}])
+            time.sleep(0.2)
+            terminada.set()
+            return {'success': True, 'data': [{'n': 1}]}
+
+        with patch(f'{SERVICIO}.ejecutar_consulta_cfo', ejecutar_infinito), \
+             patch('app.services.consultas_cancelables.obtener_pid_backend', return_value=None):
+            eventos = _ejecutar_emitiendo_filas(MagicMock(), "SELECT 1", {})
+            assert (await eventos.__anext__()).startswith("event: data_chunk")
+            await eventos.aclose()
+
+        # El hilo soltó la sesión antes de que aclose retornara
+        assert terminada.is_set()
+
+
 # ══════════════════════════════════════════════════════════════
 # TESTS UNITARIOS DE COMPONENTES
 # ══════════════════════════════════════════════════════════════
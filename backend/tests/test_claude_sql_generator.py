@@ -86,6 +86,20 @@ class TestInicializacion:
         assert len(prompt) > 500
         assert 'CREATE TABLE' in prompt
 
+    def test_ejemplos_dinamicos_van_en_el_user_message(self, mock_orchestrator):
+        """Con ejemplos dinámicos el system prompt es el núcleo y los ejemplos acompañan a la pregunta"""
+        generator = ClaudeSQLGenerator()
+        generator._ejemplos_k = 2
+        generator._system_prompt = build_sql_system_prompt(ejemplos_dinamicos=True)
+
+        generator.generar_sql("¿Cuánto retiró cada socio?")
+
+        call_kwargs = mock_orchestrator.complete.call_args.kwargs
+        assert 'P: "' not in call_kwargs['system_prompt']
+        assert call_kwargs['prompt'].count('P: "') == 2
+        assert 'P: "Cuanto retiro cada socio?"' in call_kwargs['prompt']
+        assert call_kwargs['prompt'].index('<ejemplos>') < call_kwargs['prompt'].index('PREGUNTA:')
+
 
 # ══════════════════════════════════════════════════════════════
 # GRUPO 2: TESTS DE GENERAR_SQL (Método principal)
@@ -153,8 +167,12 @@ class TestGenerarSQL:
         
         call_kwargs = mock_orchestrator.complete.call_args.kwargs
         prompt = call_kwargs['prompt']
-        # Debe incluir contexto previo
-        assert '¿Cuánto facturamos?' in prompt or 'contexto' in prompt.lower()
+        # Con contexto el prompt va en bloques: prefijo cacheable + pregunta
+        assert isinstance(prompt, list)
+        assert prompt[0]['cache_control'] == {'type': 'ephemeral'}
+        assert '¿Cuánto facturamos?' in prompt[0]['text']
+        assert pregunta in prompt[1]['text']
+        assert call_kwargs['cache_system'] is True
     
     def test_generar_sql_error_orchestrator_none(self, mock_orchestrator):
         """Si orchestrator retorna None, maneja el error"""
@@ -319,3 +337,36 @@ class TestIntegracionLigera:
         
         # Los prompts deben ser diferentes (contienen preguntas diferentes)
         assert prompt1 != prompt2
+
+
+# ══════════════════════════════════════════════════════════════
+# TESTS DE GENERACIÓN EN LOTE
+# ══════════════════════════════════════════════════════════════
+
+class TestGenerarSQLLote:
+    """Varias preguntas en una sola llamada al orchestrator"""
+
+    def test_parsea_un_sql_por_pregunta(self, generator_with_mock, mock_orchestrator):
+        """Cada bloque '-- PREGUNTA n' se asigna a su pregunta"""
+        mock_orchestrator.complete.return_value = (
+            "-- PREGUNTA 1\nSELECT 1 AS uno;\n-- PREGUNTA 2\n```sql\nSELECT 2 AS dos;\n```"
+        )
+
+        sqls = generator_with_mock.generar_sql_lote(["¿uno?", "¿dos?"])
+
+        assert sqls == ["SELECT 1 AS uno;", "SELECT 2 AS dos;"]
+        assert mock_orchestrator.complete.call_count == 1
+        prompt = mock_orchestrator.complete.call_args.kwargs['prompt']
+        assert "1. ¿uno?" in prompt and "2. ¿dos?" in prompt
+
+    def test_pregunta_faltante_queda_en_none(self, generator_with_mock, mock_orchestrator):
+        """Si el modelo omite una pregunta su posición queda en None"""
+        mock_orchestrator.complete.return_value = "-- PREGUNTA 2\nSELECT 2"
+
+        assert generator_with_mock.generar_sql_lote(["a", "b", "c"]) == [None, "SELECT 2", None]
+
+    def test_fallo_del_orchestrator(self, generator_with_mock, mock_orchestrator):
+        """Sin respuesta del modelo todas las posiciones son None"""
+        mock_orchestrator.complete.return_value = None
+
+        assert generator_with_mock.generar_sql_lote(["a", "b"]) == [None, None]
@@ -195,3 +195,37 @@ class TestComputarResumenMultiplesColumnas:
         assert sub["Jurídica"]["ingresos"] == 1500
         assert sub["Jurídica"]["gastos"] == 600
         assert sub["Contable"]["ingresos"] == 2000
+
+
+class TestComputarResumenResultadosGrandes:
+    """Tests del camino NumPy (rankings con miles de filas)."""
+
+    @staticmethod
+    def _ranking(cantidad):
+        areas = ["Jurídica", "Contable", "Notarial"]
+        return [
+            {"area": areas[i % 3], "cliente": f"Cliente {i}", "total_pesificado": Decimal(i)}
+            for i in range(cantidad)
+        ]
+
+    def test_numpy_mismo_resultado_que_camino_python(self):
+        """Misma salida con y sin NumPy para el mismo ranking"""
+        from unittest.mock import patch
+
+        datos = self._ranking(3000)
+        res_numpy = _computar_resumen(datos)
+        with patch("app.services.resumen_resultados.RESUMEN_UMBRAL_NUMPY_FILAS", 10**9):
+            res_python = _computar_resumen(datos)
+        assert res_numpy == res_python
+
+    def test_ranking_grande_extremos_y_concentracion(self):
+        datos = self._ranking(3000)
+        res = _computar_resumen(datos)
+        assert res["sumas"]["total_pesificado"] == sum(range(3000))
+        assert res["maximo"]["total_pesificado"] == {"valor": 2999, "fila": "Notarial"}
+        assert res["minimo"]["total_pesificado"] == {"valor": 0, "fila": "Jurídica"}
+        top_3 = (2999 + 2998 + 2997) * 100.0 / sum(range(3000))
+        assert res["concentracion"]["top_3_pct"] == round(top_3, 2)
+        # 3000 clientes distintos: sin subtotales por cliente, sí por área
+        assert "subtotales_por_cliente" not in res
+        assert set(res["subtotales_por_area"]) == {"Jurídica", "Contable", "Notarial"}
@@ -0,0 +1,97 @@
+"""
+Tests para consultas_cancelables - pg_cancel_backend al cancelar un turno.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_consultas_cancelables.py -v
+"""
+
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.services.consultas_cancelables import ejecutar_cancelable, obtener_engine
+
+
+def _dormir(db, segundos):
+    return db.execute(text("SELECT pg_sleep(:s)"), {"s": segundos}).scalar()
+
+
+@pytest.fixture
+def sesion():
+    db = SessionLocal()
+    yield db
+    db.rollback()
+    db.close()
+
+
+class TestEjecutarCancelable:
+    """La cancelación del await corta la query en PostgreSQL."""
+
+    def test_resultado_normal(self, sesion):
+        resultado = asyncio.run(ejecutar_cancelable(sesion, lambda db: db.execute(text("SELECT 41 + 1")).scalar()))
+        assert resultado == 42
+
+    def test_cancelar_corta_la_query(self, sesion):
+        async def escenario():
+            tarea = asyncio.create_task(ejecutar_cancelable(sesion, _dormir, 10))
+            await asyncio.sleep(0.5)
+            inicio = time.monotonic()
+            tarea.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await tarea
+            return time.monotonic() - inicio
+
+        # Sin pg_cancel_backend la espera sería de ~9.5s
+        assert asyncio.run(escenario()) < 5
+
+        # La sesión queda usable después del rollback
+        sesion.rollback()
+        assert sesion.execute(text("SELECT 1")).scalar() == 1
+
+
+class TestCancelarEnElEngineDeLaSesion:
+    """El PID es del servidor de la sesión: con réplica analítica se cancela ahí."""
+
+    def test_cancela_en_la_replica_y_no_en_el_primario(self):
+        primario = create_engine("postgresql://u:p@primario/cfo")
+        replica = create_engine("postgresql://u:p@replica/cfo")
+        db_analitica = Session(bind=replica)
+        empezo = threading.Event()
+        liberar = threading.Event()
+
+        def consulta_larga(db):
+            empezo.set()
+            liberar.wait(timeout=5)
+
+        async def escenario():
+            tarea = asyncio.create_task(ejecutar_cancelable(db_analitica, consulta_larga))
+            while not empezo.is_set():
+                await asyncio.sleep(0.01)
+            tarea.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await tarea
+
+        def cancelar(pid, engine):
+            liberar.set()
+            return True
+
+        with patch("app.services.consultas_cancelables.obtener_pid_backend", return_value=4321), \
+             patch("app.services.consultas_cancelables.cancelar_backend", side_effect=cancelar) as mock_cancelar:
+            asyncio.run(escenario())
+
+        mock_cancelar.assert_called_once_with(4321, replica)
+        assert mock_cancelar.call_args.args[1] is not primario
+
+    def test_sesion_ligada_a_una_conexion_usa_su_engine(self):
+        replica = MagicMock()
+        db = MagicMock()
+        db.get_bind.return_value = MagicMock(engine=replica)
+
+        assert obtener_engine(db) is replica
@@ -0,0 +1,48 @@
+"""
+Tests para el engine analítico read-only (app.core.database).
+
+Ejecutar:
+    cd backend
+    pytest tests/test_database_analitica.py -v
+"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.core.config import settings
+from app.core.database import AnalyticsSessionLocal, engine, analytics_engine, get_analytics_db
+
+
+@pytest.fixture
+def sesion_analitica():
+    db = AnalyticsSessionLocal()
+    yield db
+    db.rollback()
+    db.close()
+
+
+class TestEngineAnalitico:
+    """Las sesiones analíticas leen, no escriben y cortan queries largas."""
+
+    def test_pool_separado_del_principal(self):
+        assert analytics_engine is not engine
+        assert analytics_engine.pool is not engine.pool
+
+    def test_permite_lecturas(self, sesion_analitica):
+        assert sesion_analitica.execute(text("SELECT 1")).scalar() == 1
+
+    def test_rechaza_escrituras(self, sesion_analitica):
+        with pytest.raises(DBAPIError, match="read-only"):
+            sesion_analitica.execute(text("CREATE TEMP TABLE intento_escritura (id int)"))
+
+    def test_statement_timeout_propio(self, sesion_analitica):
+        timeout = sesion_analitica.execute(text("SHOW statement_timeout")).scalar()
+        assert timeout == f"{settings.analytics_statement_timeout_ms // 1000}s"
+
+    def test_get_analytics_db_cierra_la_sesion(self):
+        generador = get_analytics_db()
+        db = next(generador)
+        assert db.execute(text("SHOW default_transaction_read_only")).scalar() == "on"
+        generador.close()
+        assert not db.in_transaction()
@@ -0,0 +1,96 @@
+"""
+Tests para ejecucion_acotada - SQL generado con read-only, timeout y tope de filas.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_ejecucion_acotada.py -v
+"""
+
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.services.cfo_ai_service import ejecutar_consulta_cfo
+from app.services.ejecucion_acotada import ejecutar_acotado
+from app.services.result_cache import (
+    ejecutar_acotado_con_cache,
+    estadisticas_cache_resultados,
+    limpiar_cache_resultados,
+)
+
+
+SQL_SERIE = "SELECT n FROM generate_series(1, 50) AS n"
+
+
+@pytest.fixture(autouse=True)
+def cache_limpio():
+    limpiar_cache_resultados()
+    yield
+    limpiar_cache_resultados()
+
+
+class TestEjecucionAcotada:
+    """Tests contra PostgreSQL de test."""
+
+    def test_trunca_en_max_filas(self, db_session):
+        filas, truncado = ejecutar_acotado(db_session, SQL_SERIE, max_filas=10)
+        assert truncado is True
+        assert [f["n"] for f in filas] == list(range(1, 11))
+
+    def test_exactamente_max_filas_no_es_truncado(self, db_session):
+        filas, truncado = ejecutar_acotado(db_session, SQL_SERIE, max_filas=50)
+        assert len(filas) == 50
+        assert truncado is False
+
+    def test_transaccion_read_only_con_timeout(self, db_session):
+        filas, _ = ejecutar_acotado(
+            db_session,
+            "SELECT current_setting('transaction_read_only') AS ro, "
+            "current_setting('statement_timeout') AS timeout",
+            timeout_ms=1234,
+        )
+        assert filas == [{"ro": "on", "timeout": "1234ms"}]
+
+    def test_statement_timeout(self, db_session):
+        with pytest.raises(DBAPIError, match="statement timeout"):
+            ejecutar_acotado(db_session, "SELECT pg_sleep(2)", timeout_ms=50)
+
+    def test_sesion_queda_usable_y_sin_limites(self, db_session):
+        """El savepoint se revierte: ni read-only ni timeout quedan en la sesión"""
+        with pytest.raises(DBAPIError):
+            ejecutar_acotado(db_session, "SELECT pg_sleep(2)", timeout_ms=50)
+
+        assert db_session.execute(text("SHOW transaction_read_only")).scalar() == "off"
+        assert db_session.execute(text("SHOW statement_timeout")).scalar() == "0"
+
+    def test_al_lote_recibe_las_filas_por_lote_sin_la_extra(self, db_session):
+        lotes = []
+        with patch("app.services.ejecucion_acotada.CFO_SQL_LOTE_FETCH", 4):
+            filas, truncado = ejecutar_acotado(db_session, SQL_SERIE, max_filas=10, al_lote=lotes.append)
+        assert truncado is True
+        assert [len(lote) for lote in lotes] == [4, 4, 2]
+        assert [f for lote in lotes for f in lote] == filas
+
+    def test_al_lote_no_se_llama_con_resultado_cacheado(self, db_session):
+        ejecutar_acotado_con_cache(db_session, SQL_SERIE, max_filas=10)
+        lotes = []
+        filas, _ = ejecutar_acotado_con_cache(db_session, SQL_SERIE, max_filas=10, al_lote=lotes.append)
+        assert len(filas) == 10 and lotes == []
+
+    def test_truncado_se_cachea_por_limite(self, db_session):
+        ejecutar_acotado_con_cache(db_session, SQL_SERIE, max_filas=10)
+        filas, truncado = ejecutar_acotado_con_cache(db_session, SQL_SERIE, max_filas=10)
+        assert truncado is True and len(filas) == 10
+
+        # Otro límite es otra entrada: no reutiliza el resultado cortado
+        filas, truncado = ejecutar_acotado_con_cache(db_session, SQL_SERIE, max_filas=100)
+        assert truncado is False and len(filas) == 50
+        assert estadisticas_cache_resultados()["entradas"] == 2
+
+    def test_ejecutar_consulta_cfo_informa_truncado(self, db_session):
+        resultado = ejecutar_consulta_cfo(db_session, SQL_SERIE, max_filas=5)
+        assert resultado["success"] is True
+        assert resultado["count"] == 5
+        assert resultado["truncado"] is True
@@ -0,0 +1,81 @@
+"""
+Tests para ejemplos_sql - selección de ejemplos pregunta/SQL por similitud.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_ejemplos_sql.py -v
+"""
+
+from app.services.ejemplos_sql import (
+    EjemploSQL,
+    IndiceEjemplos,
+    formatear_ejemplos,
+    get_indice_ejemplos,
+    parsear_ejemplos,
+)
+from app.services.sql_generator_prompts import (
+    EJEMPLOS_SQL,
+    SQL_SYSTEM_PROMPT_NUCLEO,
+    SQL_SYSTEM_PROMPT_STATIC,
+)
+
+
+def _preguntas(ejemplos):
+    return [e.pregunta for e in ejemplos]
+
+
+class TestBancoDeEjemplos:
+    """Ejemplos curados del prompt y queries canónicas."""
+
+    def test_parsea_todos_los_ejemplos_del_prompt(self):
+        ejemplos = parsear_ejemplos(EJEMPLOS_SQL)
+        assert len(ejemplos) == EJEMPLOS_SQL.count('P: "')
+        retiros = next(e for e in ejemplos if e.pregunta == "Cuanto retiro cada socio?")
+        assert retiros.nota.startswith("PATRON CRITICO")
+        assert retiros.sql.startswith("ERROR:")
+
+    def test_formato_ida_y_vuelta(self):
+        ejemplos = parsear_ejemplos(EJEMPLOS_SQL)[:3]
+        bloque = formatear_ejemplos(ejemplos)
+        assert bloque.startswith("<ejemplos>\n") and bloque.endswith("\n</ejemplos>")
+        assert parsear_ejemplos(bloque[len("<ejemplos>\n"):-len("\n</ejemplos>")]) == ejemplos
+
+    def test_nucleo_sin_ejemplos_conserva_reglas(self):
+        assert len(SQL_SYSTEM_PROMPT_NUCLEO) < len(SQL_SYSTEM_PROMPT_STATIC) - len(EJEMPLOS_SQL) + 500
+        assert "<guardrails_sql>" in SQL_SYSTEM_PROMPT_NUCLEO
+        assert "CREATE TABLE operaciones" in SQL_SYSTEM_PROMPT_NUCLEO
+        assert 'P: "' not in SQL_SYSTEM_PROMPT_NUCLEO
+
+    def test_indice_incluye_canonicas(self):
+        origenes = {e.origen for e in get_indice_ejemplos().buscar("capital de trabajo", 3)}
+        assert "canonica" in origenes
+
+
+class TestSeleccion:
+    """Top-k por similitud de n-gramas."""
+
+    def test_ejemplos_relevantes_primero(self):
+        indice = get_indice_ejemplos()
+        assert _preguntas(indice.buscar("¿cuánto retiró cada socio?", 2))[0] == "Cuanto retiro cada socio?"
+        assert "Gastos de Jurídica por mes en 2024" in _preguntas(indice.buscar("gastos de notarial por mes", 3))
+        assert _preguntas(indice.buscar("que porcentaje cobramos en dólares", 1)) == [
+            "Que porcentaje se cobra en dolares vs pesos?"
+        ]
+
+    def test_k_acota_y_cero_desactiva(self):
+        indice = get_indice_ejemplos()
+        assert len(indice.buscar("ingresos por área", 3)) == 3
+        assert indice.buscar("ingresos por área", 0) == []
+
+    def test_sin_similitud_no_hay_ejemplos(self):
+        indice = IndiceEjemplos([EjemploSQL("ingresos por area", "SELECT 1", "prompt")])
+        assert indice.buscar("¿?", 3) == []
+
+    def test_historial_se_suma_y_respeta_el_maximo(self):
+        indice = IndiceEjemplos([EjemploSQL("ingresos por area", "SELECT 1", "prompt")], historial_max=2)
+        indice.agregar(EjemploSQL("clientes nuevos de octubre", "SELECT 2", "historial"))
+        assert _preguntas(indice.buscar("clientes nuevos", 1)) == ["clientes nuevos de octubre"]
+        indice.agregar(EjemploSQL("proveedores con mas gastos", "SELECT 3", "historial"))
+        indice.agregar(EjemploSQL("operaciones anuladas", "SELECT 4", "historial"))
+        assert len(indice) == 3
+        assert "clientes nuevos de octubre" not in _preguntas(indice.buscar("clientes nuevos", 3))
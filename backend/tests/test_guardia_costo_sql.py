@@ -0,0 +1,124 @@
+"""
+Tests para guardia_costo_sql - EXPLAIN previo al SQL generado y registro de planes.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_guardia_costo_sql.py -v
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.core.database import get_db
+from app.core.security import get_current_user
+from app.main import app
+from app.services.guardia_costo_sql import (
+    evaluar_costo_sql,
+    listar_planes_mas_costosos,
+    obtener_plan,
+    registrar_plan,
+)
+
+
+SQL_BARATO = "SELECT COUNT(*) AS total FROM operaciones WHERE deleted_at IS NULL"
+# Producto cartesiano del libro consigo mismo: válido pero patológico
+SQL_CARTESIANO = "SELECT COUNT(*) FROM operaciones a, operaciones b, operaciones c"
+
+
+class TestEvaluarCosto:
+    """Evaluación del plan contra los límites configurados."""
+
+    def test_plan_del_nodo_raiz(self, db_session):
+        plan = obtener_plan(db_session, SQL_BARATO)
+        assert plan["Node Type"] == "Aggregate"
+        assert plan["Total Cost"] > 0
+
+    def test_query_barata_aprobada(self, db_session):
+        evaluacion = evaluar_costo_sql(db_session, SQL_BARATO, costo_maximo=1_000_000, filas_maximo=1_000_000)
+        assert evaluacion["aprobado"] is True
+        assert evaluacion["motivo"] is None
+        assert evaluacion["filas_estimadas"] == 1
+
+    def test_cartesiano_rechazado_por_costo(self, db_session):
+        evaluacion = evaluar_costo_sql(db_session, SQL_CARTESIANO, costo_maximo=1_000, filas_maximo=0)
+        assert evaluacion["aprobado"] is False
+        assert "Costo estimado" in evaluacion["motivo"]
+
+    def test_rechazo_por_filas_estimadas(self, db_session):
+        sql = "SELECT a.id FROM operaciones a, operaciones b"
+        evaluacion = evaluar_costo_sql(db_session, sql, costo_maximo=0, filas_maximo=10)
+        assert evaluacion["aprobado"] is False
+        assert "Filas estimadas" in evaluacion["motivo"]
+
+    def test_limites_en_cero_desactivan_la_guardia(self, db_session):
+        evaluacion = evaluar_costo_sql(db_session, SQL_CARTESIANO, costo_maximo=0, filas_maximo=0)
+        assert evaluacion["aprobado"] is True
+
+    def test_explain_fallido_no_rechaza_y_deja_la_sesion_usable(self, db_session):
+        evaluacion = evaluar_costo_sql(db_session, "SELECT columna_inexistente FROM operaciones")
+        assert evaluacion["aprobado"] is True
+        assert evaluacion["plan"] is None
+        assert db_session.execute(text("SELECT 1")).scalar() == 1
+
+    def test_explain_no_ejecuta_la_query(self, db_session):
+        # Sin ANALYZE el planner no evalúa la división por cero
+        plan = obtener_plan(db_session, "SELECT 1 / (SELECT COUNT(*) - COUNT(*) FROM operaciones)")
+        assert "Total Cost" in plan
+
+
+class TestRegistroPlanes:
+    """Persistencia de planes y consulta de los más costosos."""
+
+    def test_registrar_y_listar_por_costo(self, db_session, monkeypatch):
+        monkeypatch.setattr(db_session, "commit", db_session.flush)
+        barato = evaluar_costo_sql(db_session, SQL_BARATO)
+        caro = evaluar_costo_sql(db_session, SQL_CARTESIANO, costo_maximo=1_000)
+        registrar_plan(db_session, "¿Cuántas operaciones hay?", SQL_BARATO, barato)
+        registrar_plan(db_session, "pregunta rara", SQL_CARTESIANO, caro)
+
+        planes = listar_planes_mas_costosos(db_session, limite=10)
+        assert [p.sql for p in planes[:2]] == [SQL_CARTESIANO, SQL_BARATO]
+        assert planes[0].rechazado is True
+        assert planes[0].plan["Node Type"] == "Aggregate"
+
+        rechazados = listar_planes_mas_costosos(db_session, solo_rechazados=True)
+        assert [p.pregunta for p in rechazados] == ["pregunta rara"]
+
+    def test_sin_plan_no_registra(self, db_session):
+        assert registrar_plan(db_session, "x", "SELECT", {"plan": None}) is None
+
+
+@pytest.fixture
+def cliente_planes(db_session):
+    usuario = SimpleNamespace(id=None, es_socio=True)
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_current_user] = lambda: usuario
+    yield TestClient(app), usuario
+    app.dependency_overrides.clear()
+
+
+class TestEndpointPlanesCostosos:
+    """GET /api/cfo/planes-sql/costosos"""
+
+    def test_lista_planes_ordenados(self, db_session, cliente_planes, monkeypatch):
+        client, _ = cliente_planes
+        monkeypatch.setattr(db_session, "commit", db_session.flush)
+        registrar_plan(db_session, "cara", SQL_CARTESIANO, evaluar_costo_sql(db_session, SQL_CARTESIANO))
+
+        response = client.get("/api/cfo/planes-sql/costosos", params={"limit": 1, "incluir_plan": True})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body[0]["pregunta"] == "cara"
+        assert "plan" in body[0]
+
+    def test_solo_socios(self, cliente_planes):
+        client, usuario = cliente_planes
+        usuario.es_socio = False
+
+        response = client.get("/api/cfo/planes-sql/costosos")
+
+        assert response.status_code == 403
@@ -0,0 +1,91 @@
+"""
+Tests para motor_intenciones - autómata Aho-Corasick y análisis de preguntas en una pasada.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_motor_intenciones.py -v
+"""
+
+import random
+
+from app.core.constants import KEYWORDS_TEMPORALES
+from app.services.canonical_queries_config import QUERIES_CANONICAS
+from app.services.motor_intenciones import (
+    GRUPOS,
+    AutomataAhoCorasick,
+    MotorIntenciones,
+    analizar_pregunta,
+)
+
+
+def _busqueda_lineal(patrones, texto):
+    return sorted(
+        (i, i + len(patron), patron)
+        for patron in patrones
+        for i in range(len(texto) - len(patron) + 1)
+        if texto.startswith(patron, i)
+    )
+
+
+class TestAutomata:
+    """Mismas apariciones que el barrido lineal, también solapadas."""
+
+    def test_patrones_solapados_y_sufijos(self):
+        automata = AutomataAhoCorasick([(p, p) for p in ("he", "she", "his", "hers")])
+        assert sorted(automata.buscar("ushers")) == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+    def test_equivale_a_busqueda_lineal(self):
+        azar = random.Random(7)
+        patrones = sorted({"".join(azar.choice("abc") for _ in range(azar.randint(1, 4))) for _ in range(30)})
+        automata = AutomataAhoCorasick([(p, p) for p in patrones])
+        for _ in range(50):
+            texto = "".join(azar.choice("abcd") for _ in range(azar.randint(0, 40)))
+            assert sorted(automata.buscar(texto)) == _busqueda_lineal(patrones, texto)
+
+    def test_misma_frase_en_varios_grupos(self):
+        automata = AutomataAhoCorasick([("informe", "a"), ("informe", "b")])
+        assert {etiqueta for _, _, etiqueta in automata.buscar("un informe")} == {"a", "b"}
+
+
+class TestAnalisis:
+    """Grupos, candidatas canónicas y períodos de una sola pasada."""
+
+    def test_grupos_equivalen_a_subcadenas(self):
+        pregunta = "¿Cuál es la tendencia de facturación del último trimestre vs anterior, hoy?"
+        analisis = analizar_pregunta(pregunta)
+        texto = pregunta.lower()
+        for grupo, patrones in GRUPOS.items():
+            esperados = {p for p in patrones if p in texto}
+            assert analisis.grupos.get(grupo, set()) == esperados, grupo
+
+    def test_temporal(self):
+        assert analizar_pregunta("Proyección de cierre a fin de año").contiene("temporal")
+        assert not analizar_pregunta("facturación 2024").contiene("temporal")
+        assert set(KEYWORDS_TEMPORALES) <= set(GRUPOS["temporal"])
+
+    def test_candidatas_canonicas_en_orden_de_config(self):
+        analisis = analizar_pregunta("ingresos 2024 y gastos 2024")
+        claves = list(QUERIES_CANONICAS)
+        indices = [claves.index(key) for key, _ in analisis.canonicas]
+        assert indices == sorted(indices)
+        assert ("facturacion_2024", "ingresos 2024") in analisis.canonicas
+        assert ("gastos_2024", "gastos 2024") in analisis.canonicas
+
+    def test_palabra_completa(self):
+        analisis = analizar_pregunta("informe de mayo")
+        assert analisis.palabra_completa("mayo")
+        assert not analizar_pregunta("los mayores clientes").palabra_completa("mayo")
+
+    def test_anios_y_rango_de_meses(self):
+        analisis = analizar_pregunta("Informe de marzo a junio 2025")
+        assert analisis.anios == [2025]
+        assert analisis.rango_meses == ("marzo", "junio")
+
+    def test_analisis_cacheado_por_pregunta(self):
+        assert analizar_pregunta("informe 2025") is analizar_pregunta("informe 2025")
+
+    def test_reglas_nuevas_no_cambian_el_recorrido(self):
+        grupos = dict(GRUPOS, extra=[f"regla {i}" for i in range(5000)])
+        motor = MotorIntenciones(grupos, QUERIES_CANONICAS)
+        assert motor.analizar("informe 2025").contiene("informe")
+        assert motor.analizar("ver regla 4321").contiene("extra", "regla 4321")
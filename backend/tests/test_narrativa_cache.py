@@ -0,0 +1,81 @@
+"""
+Tests para narrativa_cache - narrativas reutilizadas para resultados idénticos.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_narrativa_cache.py -v
+"""
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app.services.narrativa_cache import (
+    construir_clave_narrativa,
+    estadisticas_cache_narrativas,
+    fragmentar_narrativa,
+    guardar_narrativa,
+    huella_resultado,
+    limpiar_cache_narrativas,
+    obtener_narrativa,
+)
+
+HOY = date(2025, 10, 15)
+FILAS = [{"area": "Jurídica", "total": Decimal("1200.50")}, {"area": "Notarial", "total": Decimal("800")}]
+
+
+@pytest.fixture(autouse=True)
+def cache_limpio():
+    """Cada test arranca con el cache vacío."""
+    limpiar_cache_narrativas()
+    yield
+    limpiar_cache_narrativas()
+
+
+class TestClaveNarrativa:
+    """Qué cambia y qué no cambia la clave."""
+
+    def test_variantes_de_redaccion_comparten_clave(self):
+        a = construir_clave_narrativa("¿Facturación por área ESTE MES?", FILAS, hoy=HOY)
+        b = construir_clave_narrativa("facturacion por area este mes", FILAS, hoy=HOY)
+        assert a == b
+
+    def test_resultado_distinto_cambia_clave(self):
+        base = construir_clave_narrativa("facturación por área", FILAS, hoy=HOY)
+        otras_filas = [dict(FILAS[0], total=Decimal("1200.51")), FILAS[1]]
+        assert base != construir_clave_narrativa("facturación por área", otras_filas, hoy=HOY)
+
+    def test_orden_de_columnas_no_cambia_huella(self):
+        assert huella_resultado([{"a": 1, "b": 2}]) == huella_resultado([{"b": 2, "a": 1}])
+
+    def test_contexto_opciones_y_fecha_cambian_clave(self):
+        base = construir_clave_narrativa("facturación por área", FILAS, hoy=HOY)
+        contexto = [{"role": "user", "content": "¿y en dólares?"}]
+        assert base != construir_clave_narrativa("facturación por área", FILAS, contexto=contexto, hoy=HOY)
+        assert base != construir_clave_narrativa(
+            "facturación por área", FILAS, opciones={"max_tokens": 4000}, hoy=HOY
+        )
+        assert base != construir_clave_narrativa("facturación por área", FILAS, hoy=date(2025, 10, 16))
+
+
+class TestCacheNarrativas:
+    """Guardado, lectura y fragmentación para el replay SSE."""
+
+    def test_guardar_y_obtener(self):
+        clave = construir_clave_narrativa("facturación por área", FILAS, hoy=HOY)
+        assert obtener_narrativa(clave) is None
+        guardar_narrativa(clave, "Jurídica lidera con $1.200.")
+        assert obtener_narrativa(clave) == "Jurídica lidera con $1.200."
+        assert estadisticas_cache_narrativas()["hits"] == 1
+
+    def test_texto_vacio_no_se_guarda(self):
+        guardar_narrativa("clave", "   ")
+        assert estadisticas_cache_narrativas()["entradas"] == 0
+
+    def test_fragmentos_reconstruyen_el_texto_sin_cortar_palabras(self):
+        texto = "La facturación  de octubre creció 12%.\n\n**Jurídica** lidera con $1.200 y Notarial sigue."
+        fragmentos = list(fragmentar_narrativa(texto, max_caracteres=20))
+        assert "".join(fragmentos) == texto
+        assert len(fragmentos) > 1
+        assert all(f.endswith(" ") for f in fragmentos[:-1])
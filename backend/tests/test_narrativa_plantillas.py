@@ -0,0 +1,142 @@
+"""
+Tests para narrativa_plantillas - respuestas deterministas para resultados chicos.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_narrativa_plantillas.py -v
+"""
+
+from decimal import Decimal
+
+from app.services.narrativa_plantillas import renderizar_narrativa_simple
+
+
+class TestResultadosEscalares:
+    """Un número: tema y período salen de la pregunta."""
+
+    def test_monto_generico_usa_tema_y_periodo(self):
+        texto = renderizar_narrativa_simple(
+            "¿Cuánto facturamos en 2024?", [{"total": Decimal("12340660.40")}], max_filas=6
+        )
+        assert texto == "**Facturación 2024:** $12.340.660"
+
+    def test_count_generico_en_pregunta_de_cantidad(self):
+        texto = renderizar_narrativa_simple("¿Cuántas operaciones hay?", [{"total": 2391}], max_filas=6)
+        assert texto == "**Operaciones:** 2.391"
+
+    def test_usd_y_porcentaje(self):
+        assert renderizar_narrativa_simple(
+            "ingresos en dólares este año", [{"total_usd": 22838.4}], max_filas=6
+        ) == "**Ingresos este año:** US$ 22.838"
+        assert "67,7%" in renderizar_narrativa_simple(
+            "rentabilidad de marzo 2025", [{"rentabilidad": 67.66}], max_filas=6
+        )
+
+    def test_varias_metricas_en_una_fila(self):
+        texto = renderizar_narrativa_simple(
+            "ingresos y gastos 2025",
+            [{"ingresos": 1000, "gastos": 400, "cantidad_operaciones": 12}],
+            max_filas=6,
+        )
+        assert "- Ingresos: $1.000" in texto
+        assert "- Gastos: $400" in texto
+        assert "- Cantidad operaciones: 12" in texto
+
+    def test_sin_filas(self):
+        texto = renderizar_narrativa_simple("gastos de marzo 2025", [], max_filas=6)
+        assert texto.startswith("No hay operaciones registradas")
+        assert "marzo 2025" in texto
+
+
+class TestMonedaDeLosMontos:
+    """La moneda de un monto sin moneda en el nombre sale del SQL o de la pregunta."""
+
+    def test_pregunta_en_dolares(self):
+        texto = renderizar_narrativa_simple(
+            "¿Cuánto facturamos en dólares este año?", [{"total": Decimal("12345.67")}], max_filas=6
+        )
+        assert texto == "**Facturación este año:** US$ 12.346"
+
+    def test_moneda_del_sql(self):
+        sql_usd = "SELECT SUM(o.total_dolarizado) AS total_facturado FROM operaciones o"
+        assert renderizar_narrativa_simple(
+            "facturación 2025", [{"total_facturado": 1000}], max_filas=6, sql=sql_usd
+        ) == "**Total facturado 2025:** US$ 1.000"
+        sql_uyu = "SELECT SUM(o.total_pesificado) AS total FROM operaciones o"
+        assert renderizar_narrativa_simple(
+            "facturación 2025", [{"total": 1000}], max_filas=6, sql=sql_uyu
+        ) == "**Facturación 2025:** $1.000"
+
+    def test_variacion_con_moneda_es_monto(self):
+        texto = renderizar_narrativa_simple("variación de ingresos 2025", [{"variacion_uyu": -50000}], max_filas=6)
+        assert "%" not in texto
+        assert "50.000" in texto
+
+    def test_moneda_ambigua_va_a_claude(self):
+        # SQL pesificado y pregunta en dólares
+        sql_uyu = "SELECT SUM(total_pesificado) AS total FROM operaciones"
+        assert renderizar_narrativa_simple(
+            "facturación en dólares 2025", [{"total": 1}], max_filas=6, sql=sql_uyu
+        ) is None
+        # SQL que lee las dos monedas
+        sql_mixto = "SELECT SUM(monto_uyu) + SUM(monto_usd) AS total FROM operaciones"
+        assert renderizar_narrativa_simple("facturación 2025", [{"total": 1}], max_filas=6, sql=sql_mixto) is None
+        # SQL sin columnas de monto reconocibles
+        assert renderizar_narrativa_simple(
+            "facturación 2025", [{"total": 1}], max_filas=6, sql="SELECT SUM(x) AS total FROM t"
+        ) is None
+
+
+class TestResultadosPorDimension:
+    """Pocas filas con una dimensión: participación, total y variación."""
+
+    def test_participacion_y_total(self):
+        texto = renderizar_narrativa_simple(
+            "ingresos por área 2025",
+            [{"area": "Jurídica", "total": 750}, {"area": "Notarial", "total": 250}],
+            max_filas=6,
+        )
+        assert "- Jurídica: $750 (75,0%)" in texto
+        assert "**Total:** $1.000" in texto
+
+    def test_comparacion_entre_dos_anios(self):
+        texto = renderizar_narrativa_simple(
+            "facturación 2024 vs 2025",
+            [{"anio": 2024, "total": 1000}, {"anio": 2025, "total": 1200}],
+            max_filas=6,
+        )
+        assert "**Variación 2024 → 2025:** ▲ 20,0% ($200)" in texto
+
+    def test_mes_numerico_se_nombra(self):
+        texto = renderizar_narrativa_simple(
+            "gastos por mes", [{"mes": 3, "total": 10}, {"mes": 4, "total": 20}], max_filas=6
+        )
+        assert "- marzo:" in texto and "- abril:" in texto
+
+
+class TestDerivaAClaude:
+    """Casos que no se resuelven con plantilla."""
+
+    def test_supera_umbral_de_filas(self):
+        datos = [{"area": f"A{i}", "total": i} for i in range(7)]
+        assert renderizar_narrativa_simple("ingresos por área", datos, max_filas=6) is None
+
+    def test_umbral_cero_desactiva(self):
+        assert renderizar_narrativa_simple("facturación 2024", [{"total": 1}], max_filas=0) is None
+
+    def test_pregunta_analitica(self):
+        assert renderizar_narrativa_simple(
+            "¿Por qué bajó la facturación en 2024?", [{"total": 1}], max_filas=6
+        ) is None
+
+    def test_columna_no_reconocida(self):
+        assert renderizar_narrativa_simple("dame el dato", [{"xyz": 3.5}], max_filas=6) is None
+
+    def test_demasiadas_metricas_o_dimensiones(self):
+        fila = {"ingresos": 1, "gastos": 2, "retiros": 3, "distribuciones": 4}
+        assert renderizar_narrativa_simple("resumen 2025", [fila], max_filas=6) is None
+        assert renderizar_narrativa_simple(
+            "ingresos por área y localidad",
+            [{"area": "Jurídica", "localidad": "Montevideo", "total": 1}],
+            max_filas=6,
+        ) is None
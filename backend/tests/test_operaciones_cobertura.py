@@ -106,7 +106,7 @@ class TestAnularOperacion:
     def test_anular_operacion_no_encontrada(self, client_con_socio, mock_db):
         """Operación no encontrada debe retornar 404"""
         # Configurar mock para no encontrar operación
-        mock_db.query.return_value.filter.return_value.first.return_value = None
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = None
         
         id_random = str(uuid4())
         response = client_con_socio.patch(f"/api/operaciones/{id_random}/anular")
@@ -116,12 +116,14 @@ class TestAnularOperacion:
     def test_anular_operacion_exitosa(self, client_con_socio, mock_db, operacion_mock):
         """Anulación exitosa debe retornar 200"""
         # Configurar mock para encontrar operación
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         response = client_con_socio.patch(f"/api/operaciones/{operacion_mock.id}/anular")
         assert response.status_code == 200
         assert "anulada" in response.json()["message"]
         mock_db.commit.assert_called_once()
+        # La fila se bloquea antes de restar del rollup
+        mock_db.query.return_value.filter.return_value.with_for_update.assert_called_once()
 
 
 # ══════════════════════════════════════════════════════════════
@@ -210,7 +212,7 @@ class TestActualizarOperacion:
     
     def test_actualizar_operacion_no_encontrada(self, client_con_socio, mock_db):
         """Operación no existente debe retornar 404"""
-        mock_db.query.return_value.filter.return_value.first.return_value = None
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = None
         
         response = client_con_socio.patch(
             f"/api/operaciones/{uuid4()}",
@@ -220,7 +222,7 @@ class TestActualizarOperacion:
     
     def test_actualizar_operacion_descripcion(self, client_con_socio, mock_db, operacion_mock):
         """Actualizar descripción debe funcionar"""
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         response = client_con_socio.patch(
             f"/api/operaciones/{operacion_mock.id}",
@@ -228,10 +230,11 @@ class TestActualizarOperacion:
         )
         assert response.status_code == 200
         assert "actualizada" in response.json()["message"]
+        mock_db.query.return_value.filter.return_value.with_for_update.assert_called_once()
     
     def test_actualizar_operacion_fecha(self, client_con_socio, mock_db, operacion_mock):
         """Actualizar fecha debe funcionar"""
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         response = client_con_socio.patch(
             f"/api/operaciones/{operacion_mock.id}",
@@ -241,7 +244,7 @@ class TestActualizarOperacion:
     
     def test_actualizar_operacion_localidad(self, client_con_socio, mock_db, operacion_mock):
         """Actualizar localidad debe funcionar"""
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         response = client_con_socio.patch(
             f"/api/operaciones/{operacion_mock.id}",
@@ -251,7 +254,7 @@ class TestActualizarOperacion:
     
     def test_actualizar_operacion_cliente(self, client_con_socio, mock_db, operacion_mock):
         """Actualizar cliente debe funcionar"""
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         response = client_con_socio.patch(
             f"/api/operaciones/{operacion_mock.id}",
@@ -261,7 +264,7 @@ class TestActualizarOperacion:
     
     def test_actualizar_operacion_proveedor(self, client_con_socio, mock_db, operacion_mock):
         """Actualizar proveedor debe funcionar"""
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         response = client_con_socio.patch(
             f"/api/operaciones/{operacion_mock.id}",
@@ -271,7 +274,7 @@ class TestActualizarOperacion:
     
     def test_actualizar_operacion_area_id(self, client_con_socio, mock_db, operacion_mock):
         """Actualizar area_id debe funcionar"""
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         response = client_con_socio.patch(
             f"/api/operaciones/{operacion_mock.id}",
@@ -281,7 +284,7 @@ class TestActualizarOperacion:
     
     def test_actualizar_operacion_monto_original(self, client_con_socio, mock_db, operacion_mock):
         """Actualizar monto_original debe recalcular"""
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         with patch('app.api.operaciones.operacion_service.calcular_montos') as mock_calc:
             mock_calc.return_value = (Decimal("15000.00"), Decimal("375.00"))
@@ -294,7 +297,7 @@ class TestActualizarOperacion:
     
     def test_actualizar_operacion_moneda(self, client_con_socio, mock_db, operacion_mock):
         """Actualizar moneda debe recalcular"""
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         with patch('app.api.operaciones.operacion_service.calcular_montos') as mock_calc:
             mock_calc.return_value = (Decimal("400000.00"), Decimal("10000.00"))
@@ -307,7 +310,7 @@ class TestActualizarOperacion:
     
     def test_actualizar_operacion_tipo_cambio(self, client_con_socio, mock_db, operacion_mock):
         """Actualizar tipo_cambio debe recalcular"""
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         with patch('app.api.operaciones.operacion_service.calcular_montos') as mock_calc:
             mock_calc.return_value = (Decimal("10000.00"), Decimal("222.22"))
@@ -320,7 +323,7 @@ class TestActualizarOperacion:
     
     def test_actualizar_operacion_monto_uyu_directo(self, client_con_socio, mock_db, operacion_mock):
         """Actualizar monto_uyu directamente debe recalcular monto_usd"""
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         response = client_con_socio.patch(
             f"/api/operaciones/{operacion_mock.id}",
@@ -330,7 +333,7 @@ class TestActualizarOperacion:
     
     def test_actualizar_operacion_monto_usd_directo(self, client_con_socio, mock_db, operacion_mock):
         """Actualizar monto_usd directamente debe recalcular monto_uyu"""
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         response = client_con_socio.patch(
             f"/api/operaciones/{operacion_mock.id}",
@@ -340,7 +343,7 @@ class TestActualizarOperacion:
     
     def test_actualizar_operacion_multiples_campos(self, client_con_socio, mock_db, operacion_mock):
         """Actualizar múltiples campos a la vez"""
-        mock_db.query.return_value.filter.return_value.first.return_value = operacion_mock
+        mock_db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = operacion_mock
         
         with patch('app.api.operaciones.operacion_service.calcular_montos') as mock_calc:
             mock_calc.return_value = (Decimal("20000.00"), Decimal("500.00"))
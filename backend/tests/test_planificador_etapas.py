@@ -0,0 +1,105 @@
+"""
+Tests para PlanificadorEtapas - solapamiento de etapas del pipeline CFO.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_planificador_etapas.py -v
+"""
+
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.planificador_etapas import PlanificadorEtapas, ejecutar_con_sesion_propia
+
+
+class TestPlanificadorEtapas:
+    """Tests de lanzamiento, dependencias y espera de etapas."""
+
+    @pytest.mark.asyncio
+    async def test_etapas_independientes_se_solapan(self):
+        """Dos etapas lentas lanzadas juntas tardan ~lo que la más lenta"""
+        barrera = threading.Barrier(2, timeout=2)
+
+        def etapa(valor):
+            barrera.wait()  # Solo pasa si ambas corren a la vez
+            return valor
+
+        planificador = PlanificadorEtapas()
+        planificador.lanzar("a", etapa, 1)
+        planificador.lanzar("b", etapa, 2)
+
+        assert await planificador.resultado("a") == 1
+        assert await planificador.resultado("b") == 2
+
+    @pytest.mark.asyncio
+    async def test_depende_de_respeta_orden(self):
+        """Una etapa dependiente arranca recién cuando terminó la previa"""
+        orden = []
+
+        def lenta():
+            time.sleep(0.05)
+            orden.append("primera")
+
+        planificador = PlanificadorEtapas()
+        planificador.lanzar("primera", lenta)
+        planificador.lanzar("segunda", lambda: orden.append("segunda"), depende_de=["primera"])
+        await planificador.esperar_pendientes()
+
+        assert orden == ["primera", "segunda"]
+
+    @pytest.mark.asyncio
+    async def test_depende_de_etapa_fallida_igual_corre(self):
+        """El error de una etapa previa no bloquea a la dependiente"""
+        def falla():
+            raise ValueError("boom")
+
+        planificador = PlanificadorEtapas()
+        planificador.lanzar("falla", falla)
+        planificador.lanzar("sigue", lambda: "ok", depende_de=["falla"])
+
+        assert await planificador.resultado("sigue") == "ok"
+        with pytest.raises(ValueError):
+            await planificador.resultado("falla")
+
+    @pytest.mark.asyncio
+    async def test_esperar_pendientes_no_propaga_errores(self):
+        """esperar_pendientes registra errores sin romper el stream"""
+        planificador = PlanificadorEtapas()
+        planificador.lanzar("falla", lambda: 1 / 0)
+        await planificador.esperar_pendientes()
+        assert "falla" in planificador.tiempos
+
+    @pytest.mark.asyncio
+    async def test_cancelar_pendientes_no_arranca_dependientes(self):
+        """Una etapa que espera a otra no corre si se canceló antes"""
+        liberar = threading.Event()
+        corrio = []
+
+        planificador = PlanificadorEtapas()
+        planificador.lanzar("lenta", liberar.wait, 2)
+        planificador.lanzar("dependiente", lambda: corrio.append(1), depende_de=["lenta"])
+        planificador.lanzar("rapida", lambda: 1)
+        await planificador.resultado("rapida")
+
+        canceladas = planificador.cancelar_pendientes()
+        liberar.set()
+
+        assert sorted(canceladas) == ["dependiente", "lenta"]
+        await planificador.esperar_pendientes()
+        assert corrio == []
+
+    @pytest.mark.asyncio
+    async def test_resultado_de_etapa_no_lanzada(self):
+        planificador = PlanificadorEtapas()
+        assert await planificador.resultado("inexistente", default="x") == "x"
+        assert not planificador.lanzada("inexistente")
+
+    def test_sesion_propia_se_cierra(self):
+        sesion = MagicMock()
+        with patch("app.services.planificador_etapas.SessionLocal", return_value=sesion):
+            resultado = ejecutar_con_sesion_propia(lambda db, x: (db, x), 5)
+        assert resultado == (sesion, 5)
+        sesion.close.assert_called_once()
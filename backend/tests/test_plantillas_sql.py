@@ -0,0 +1,145 @@
+"""
+Tests para plantillas_sql - SQL parametrizado para intenciones analíticas recurrentes.
+
+TestIndicesPorPlantilla necesita la BD de test (EXPLAIN sobre el esquema real).
+
+Ejecutar:
+    cd backend
+    pytest tests/test_plantillas_sql.py -v
+"""
+
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from app.services.guardia_costo_sql import obtener_plan
+from app.services.plantillas_sql import PLANTILLAS, extraer_slots, resolver_plantilla
+from app.utils.sql_utils import validar_sql
+
+HOY = date(2026, 10, 16)
+
+
+def _indices(plan):
+    """Índices que usa cualquier nodo del plan."""
+    encontrados = {plan["Index Name"]} if "Index Name" in plan else set()
+    for hijo in plan.get("Plans", []):
+        encontrados |= _indices(hijo)
+    return encontrados
+
+
+class TestExtraccionSlots:
+    """Slots de período, tipo, filtros, moneda y top N."""
+
+    @pytest.mark.parametrize("pregunta,desde,hasta", [
+        ("¿Cuánto facturamos en 2025?", date(2025, 1, 1), date(2026, 1, 1)),
+        ("facturación de marzo de 2025", date(2025, 3, 1), date(2025, 4, 1)),
+        ("facturación de diciembre", date(2026, 12, 1), date(2027, 1, 1)),
+        ("ingresos del segundo trimestre 2025", date(2025, 4, 1), date(2025, 7, 1)),
+        ("ingresos del Q4", date(2026, 10, 1), date(2027, 1, 1)),
+        ("gastos del mes pasado", date(2026, 9, 1), date(2026, 10, 1)),
+        ("gastos del trimestre anterior", date(2026, 7, 1), date(2026, 10, 1)),
+        ("gastos de este mes", date(2026, 10, 1), date(2026, 11, 1)),
+        ("gastos del año pasado", date(2025, 1, 1), date(2026, 1, 1)),
+        ("gastos", date(2026, 1, 1), date(2027, 1, 1)),
+    ])
+    def test_periodos(self, pregunta, desde, hasta):
+        slots = extraer_slots(pregunta, HOY)
+        assert (slots.desde, slots.hasta) == (desde, hasta)
+
+    def test_mes_pasado_en_enero_cruza_el_anio(self):
+        slots = extraer_slots("gastos del mes pasado", date(2026, 1, 10))
+        assert (slots.desde, slots.hasta) == (date(2025, 12, 1), date(2026, 1, 1))
+
+    def test_filtros_y_monedas(self):
+        slots = extraer_slots("Cuánto gastó el área jurídica de Mercedes solo en dólares, en pesos", HOY)
+        assert slots.tipo == "GASTO"
+        assert slots.area == "Jurídica"
+        assert slots.localidad == "MERCEDES"
+        assert slots.moneda_origen == "USD"
+        assert slots.moneda == "UYU"
+
+    def test_otros_gastos_es_area_no_tipo(self):
+        slots = extraer_slots("facturación de otros gastos", HOY)
+        assert (slots.area, slots.tipo) == ("Otros Gastos", "INGRESO")
+
+    def test_top_n(self):
+        assert extraer_slots("los 3 principales clientes", HOY).top_n == 3
+        assert extraer_slots("top 7 proveedores", HOY).top_n == 7
+
+    @pytest.mark.parametrize("pregunta", [
+        "promedio de gastos 2025",              # palabra que ninguna plantilla cubre
+        "facturación 2024 y 2025",              # dos períodos
+        "ingresos y gastos de 2025",            # dos tipos
+        "rentabilidad por área",
+    ])
+    def test_pregunta_fuera_de_plantilla(self, pregunta):
+        assert extraer_slots(pregunta, HOY) is None
+
+
+class TestPlantillas:
+    """Cada plantilla: su pregunta de ejemplo, SQL válido y rangos sargables."""
+
+    @pytest.mark.parametrize("plantilla", PLANTILLAS, ids=lambda p: p.nombre)
+    def test_ejemplo_resuelve_su_plantilla(self, plantilla):
+        resultado = resolver_plantilla(plantilla.ejemplo, HOY)
+        assert resultado["plantilla"] == plantilla.nombre
+        assert resultado["indices"] == plantilla.indices
+        assert validar_sql(resultado["sql"])["valido"]
+        # Rango de fechas sobre la columna, nunca EXTRACT en el WHERE
+        assert "fecha >= '" in resultado["sql"] and "fecha < '" in resultado["sql"]
+        assert "EXTRACT(YEAR" not in resultado["sql"]
+
+    def test_total_periodo(self):
+        sql = resolver_plantilla("¿Cuánto facturamos en el primer trimestre de 2025?", HOY)["sql"]
+        assert "FROM operaciones_diarias od" in sql
+        assert "od.tipo_operacion = 'INGRESO'" in sql
+        assert "od.fecha >= '2025-01-01'" in sql and "od.fecha < '2025-04-01'" in sql
+        assert "GROUP BY" not in sql
+
+    def test_apertura_area_con_top(self):
+        sql = resolver_plantilla("top 3 áreas por facturación 2025", HOY)["sql"]
+        assert "JOIN areas a ON a.id = od.area_id" in sql
+        assert "GROUP BY a.nombre" in sql
+        assert sql.endswith("ORDER BY total_uyu DESC\nLIMIT 3")
+
+    def test_moneda_de_los_montos(self):
+        sql = resolver_plantilla("Evolución mensual de la facturación 2025 en dólares", HOY)["sql"]
+        assert "total_dolarizado" in sql and "total_pesificado" not in sql
+        assert "GROUP BY EXTRACT(MONTH FROM od.fecha)" in sql
+
+    def test_ranking_clientes_por_defecto_top_10(self):
+        sql = resolver_plantilla("clientes que más facturaron el mes pasado", HOY)["sql"]
+        assert "FROM operaciones o" in sql
+        assert "o.deleted_at IS NULL" in sql
+        assert "o.fecha >= '2026-09-01'" in sql
+        assert sql.endswith("LIMIT 10")
+
+    @pytest.mark.parametrize("pregunta", [
+        "cuántos clientes tenemos",             # conteo, no ranking
+        "retiros del área jurídica",            # los retiros no tienen área
+        "Montevideo 2025",                      # sin tipo de operación
+        "top 5 gastos",                         # ranking sin dimensión
+    ])
+    def test_sin_plantilla(self, pregunta):
+        assert resolver_plantilla(pregunta, HOY) is None
+
+
+class TestIndicesPorPlantilla:
+    """EXPLAIN de cada plantilla: el plan puede usar alguno de los índices que declara."""
+
+    @pytest.mark.parametrize("plantilla", PLANTILLAS, ids=lambda p: p.nombre)
+    def test_plan_usa_el_indice_declarado(self, db_session, plantilla):
+        # El índice parcial de operaciones lo crea una migración, no el modelo
+        db_session.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_operaciones_deleted_fecha "
+            "ON operaciones (fecha DESC) WHERE deleted_at IS NULL"
+        ))
+        # Con tablas de test casi vacías el planner prefiere seq scan: se descarta
+        # para comprobar que el WHERE es utilizable por el índice
+        db_session.execute(text("SET LOCAL enable_seqscan = off"))
+
+        resultado = resolver_plantilla(plantilla.ejemplo, HOY)
+        plan = obtener_plan(db_session, resultado["sql"])
+
+        assert _indices(plan) & set(plantilla.indices)
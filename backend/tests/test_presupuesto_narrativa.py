@@ -0,0 +1,63 @@
+"""
+Tests para presupuesto_narrativa - datos del prompt narrativo acotados en tokens.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_presupuesto_narrativa.py -v
+"""
+
+from app.services.presupuesto_narrativa import ajustar_datos_a_presupuesto, estimar_tokens
+from app.services.resumen_resultados import computar_resumen
+from app.services.sql_post_processor_narrativa import post_procesar_resultado_sql
+
+
+def _clientes(cantidad):
+    return [
+        {"cliente": f"Cliente {i:04d}", "total_pesificado": float(1000 + (i * 37) % 5000), "operaciones": i % 7 + 1}
+        for i in range(cantidad)
+    ]
+
+
+class TestPresupuestoNarrativa:
+    """Compresión de resultados grandes a resumen + muestra."""
+
+    def test_resultado_chico_pasa_sin_cambios(self):
+        datos = _clientes(5)
+        texto = post_procesar_resultado_sql(datos)
+        ajustado, compresion = ajustar_datos_a_presupuesto(
+            datos, texto, computar_resumen(datos), presupuesto_tokens=8000
+        )
+        assert ajustado == texto
+        assert compresion is None
+
+    def test_resultado_grande_se_comprime_dentro_del_presupuesto(self):
+        datos = _clientes(2000)
+        resumen = computar_resumen(datos)
+        texto = post_procesar_resultado_sql(datos)
+        ajustado, compresion = ajustar_datos_a_presupuesto(datos, texto, resumen, presupuesto_tokens=4000)
+
+        assert compresion["aplicada"] == "resumen_y_muestra"
+        assert compresion["filas_totales"] == 2000
+        assert compresion["tokens_estimados"] <= 4000 < compresion["tokens_estimados_originales"]
+        assert estimar_tokens(ajustado) < estimar_tokens(texto)
+        assert "2000 filas en total" in ajustado
+        # Primera y última fila, y la mayor por la columna principal
+        assert "Cliente 0000" in ajustado
+        assert "Cliente 1999" in ajustado
+        mayor = max(datos, key=lambda fila: fila["total_pesificado"])
+        assert "MAYORES" in ajustado and mayor["cliente"] in ajustado
+
+    def test_presupuesto_ajustado_reduce_la_muestra(self):
+        datos = _clientes(2000)
+        resumen = computar_resumen(datos)
+        texto = post_procesar_resultado_sql(datos)
+        _, amplia = ajustar_datos_a_presupuesto(datos, texto, resumen, presupuesto_tokens=4000)
+        _, chica = ajustar_datos_a_presupuesto(datos, texto, resumen, presupuesto_tokens=600)
+        assert chica["filas_muestra"] < amplia["filas_muestra"]
+
+    def test_presupuesto_cero_desactiva(self):
+        datos = _clientes(2000)
+        texto = post_procesar_resultado_sql(datos)
+        ajustado, compresion = ajustar_datos_a_presupuesto(datos, texto, presupuesto_tokens=0)
+        assert ajustado == texto
+        assert compresion is None
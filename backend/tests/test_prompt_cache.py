@@ -0,0 +1,127 @@
+"""
+Tests para prompt caching de Anthropic (app.services.ai.prompt_cache).
+
+Ejecutar:
+    cd backend
+    pytest tests/test_prompt_cache.py -v
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.core.cfo_narrative_prompt import build_cfo_user_content, build_cfo_user_message
+from app.services.ai.prompt_cache import (
+    CACHE_CONTROL_EPHEMERAL,
+    construir_contenido_usuario,
+    construir_system_cacheable,
+    estadisticas_uso_cache,
+    registrar_uso_cache,
+    reiniciar_estadisticas_uso,
+    texto_de_contenido,
+)
+
+
+@pytest.fixture(autouse=True)
+def limpiar_totales():
+    reiniciar_estadisticas_uso()
+    yield
+    reiniciar_estadisticas_uso()
+
+
+class TestConstruccionBloques:
+    """Tests de los bloques cacheables de system y user."""
+
+    def test_system_estatico_con_breakpoint(self):
+        bloques = construir_system_cacheable("REGLAS", "fecha: hoy")
+        assert bloques[0] == {"type": "text", "text": "REGLAS", "cache_control": CACHE_CONTROL_EPHEMERAL}
+        assert bloques[1] == {"type": "text", "text": "fecha: hoy"}
+
+    def test_contenido_sin_prefijo_es_texto_plano(self):
+        assert construir_contenido_usuario(None, "PREGUNTA") == "PREGUNTA"
+
+    def test_contenido_con_prefijo_conserva_texto(self):
+        contenido = construir_contenido_usuario("historial", " pregunta")
+        assert contenido[0]["cache_control"] == CACHE_CONTROL_EPHEMERAL
+        assert "cache_control" not in contenido[1]
+        assert texto_de_contenido(contenido) == "historial pregunta"
+
+    def test_narrativa_con_historial_mismo_texto_que_legacy(self):
+        """Los bloques concatenados equivalen al user message de siempre"""
+        historial = [
+            {"role": "user", "content": "¿Cuánto facturamos?"},
+            {"role": "assistant", "content": "Facturamos $100"},
+        ]
+        kwargs = dict(
+            pregunta="¿Y el mes anterior?",
+            financial_data=[{"total": 1}],
+            conversation_history=historial,
+            fecha_actual="2026-01-15",
+        )
+        contenido = build_cfo_user_content(**kwargs)
+        assert isinstance(contenido, list)
+        assert texto_de_contenido(contenido) == build_cfo_user_message(**kwargs)
+        assert "¿Y el mes anterior?" not in contenido[0]["text"]
+
+    def test_narrativa_sin_historial_es_texto(self):
+        contenido = build_cfo_user_content("¿Cuánto facturamos?", financial_data=[{"total": 1}])
+        assert isinstance(contenido, str)
+
+
+class TestRegistroUso:
+    """Tests del registro de cache_read/cache_creation."""
+
+    def test_registra_y_acumula(self):
+        usage = Mock(input_tokens=100, output_tokens=20,
+                     cache_read_input_tokens=900, cache_creation_input_tokens=0)
+        registrar_uso_cache(usage, "sql")
+        registrar_uso_cache(usage, "sql")
+
+        stats = estadisticas_uso_cache()
+        assert stats["llamadas"] == 2
+        assert stats["cache_read_input_tokens"] == 1800
+        assert stats["cache_hit_ratio"] == 0.9
+
+    def test_usage_ausente_cuenta_ceros(self):
+        uso = registrar_uso_cache(None, "narrativa")
+        assert uso["input_tokens"] == 0
+        assert estadisticas_uso_cache()["cache_hit_ratio"] == 0.0
+
+    def test_campos_no_enteros_se_ignoran(self):
+        """Un Mock sin atributos configurados no rompe los contadores"""
+        uso = registrar_uso_cache(Mock(), "sql")
+        assert uso["cache_read_input_tokens"] == 0
+
+
+class TestOrchestratorCache:
+    """Tests de cache_system en AIOrchestrator.complete."""
+
+    @patch('app.services.ai.ai_orchestrator.settings')
+    @patch('anthropic.Anthropic')
+    def test_cache_system_envia_bloques_y_registra_uso(self, mock_anthropic, mock_settings):
+        mock_settings.anthropic_api_key = "sk-ant-test-key"
+        respuesta = Mock()
+        respuesta.content = [Mock(text="SELECT 1")]
+        respuesta.usage = Mock(input_tokens=10, output_tokens=5,
+                               cache_read_input_tokens=3000, cache_creation_input_tokens=0)
+        mock_anthropic.return_value.messages.create.return_value = respuesta
+
+        from app.services.ai.ai_orchestrator import AIOrchestrator
+        resultado = AIOrchestrator().complete("prompt", system_prompt="SISTEMA", cache_system=True, origen="sql")
+
+        assert resultado == "SELECT 1"
+        kwargs = mock_anthropic.return_value.messages.create.call_args.kwargs
+        assert kwargs["system"][0]["cache_control"] == CACHE_CONTROL_EPHEMERAL
+        assert estadisticas_uso_cache()["cache_read_input_tokens"] == 3000
+
+    @patch('app.services.ai.ai_orchestrator.settings')
+    @patch('anthropic.Anthropic')
+    def test_sin_cache_system_mantiene_string(self, mock_anthropic, mock_settings):
+        mock_settings.anthropic_api_key = "sk-ant-test-key"
+        mock_anthropic.return_value.messages.create.return_value = Mock(content=[Mock(text="ok")])
+
+        from app.services.ai.ai_orchestrator import AIOrchestrator
+        AIOrchestrator().complete("prompt", system_prompt="SISTEMA")
+
+        kwargs = mock_anthropic.return_value.messages.create.call_args.kwargs
+        assert kwargs["system"] == "SISTEMA"
@@ -0,0 +1,182 @@
+"""
+Tests para result_cache - cache de resultados SQL versionado por datos.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_result_cache.py -v
+"""
+
+from datetime import date
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from sqlalchemy import text
+
+from app.schemas.operacion import GastoCreate
+from app.services import operacion_service
+from app.services.cfo_ai_service import ejecutar_consulta_cfo
+from app.services.result_cache import (
+    construir_clave_resultado,
+    ejecutar_con_cache,
+    estadisticas_cache_resultados,
+    limpiar_cache_resultados,
+    normalizar_sql,
+    tablas_versionadas_leidas,
+)
+
+
+SQL_CONTEO = "SELECT COUNT(*) AS cantidad FROM operaciones WHERE deleted_at IS NULL"
+
+
+@pytest.fixture(autouse=True)
+def cache_limpio():
+    """Cada test arranca con el cache vacío."""
+    limpiar_cache_resultados()
+    yield
+    limpiar_cache_resultados()
+
+
+# ══════════════════════════════════════════════════════════════
+# CLAVE DE CACHE
+# ══════════════════════════════════════════════════════════════
+
+class TestClaveResultado:
+    """Tests de normalización y construcción de clave."""
+
+    def test_normalizar_sql_colapsa_espacios_y_punto_y_coma(self):
+        assert normalizar_sql("  SELECT 1\n  FROM   t ; ") == "SELECT 1 FROM t"
+
+    def test_formato_distinto_misma_clave(self):
+        a = construir_clave_resultado("SELECT 1\nFROM t;", versiones={"operaciones": 1})
+        b = construir_clave_resultado("SELECT 1 FROM t", versiones={"operaciones": 1})
+        assert a == b
+
+    def test_params_y_versiones_cambian_clave(self):
+        base = construir_clave_resultado("SELECT :x", {"x": 1}, versiones={"operaciones": 1})
+        assert base != construir_clave_resultado("SELECT :x", {"x": 2}, versiones={"operaciones": 1})
+        assert base != construir_clave_resultado("SELECT :x", {"x": 1}, versiones={"operaciones": 2})
+
+    def test_sql_con_current_date_depende_del_dia(self):
+        sql = "SELECT * FROM operaciones WHERE fecha = CURRENT_DATE"
+        a = construir_clave_resultado(sql, versiones={"operaciones": 1}, hoy=date(2025, 10, 1))
+        b = construir_clave_resultado(sql, versiones={"operaciones": 1}, hoy=date(2025, 10, 2))
+        assert a != b
+
+    def test_sql_sin_fechas_relativas_no_depende_del_dia(self):
+        a = construir_clave_resultado(SQL_CONTEO, versiones={"operaciones": 1}, hoy=date(2025, 10, 1))
+        b = construir_clave_resultado(SQL_CONTEO, versiones={"operaciones": 1}, hoy=date(2025, 10, 2))
+        assert a == b
+
+    def test_version_de_otra_tabla_cambia_clave(self):
+        v1 = {"operaciones": 1, "clientes": 1}
+        v2 = {"operaciones": 1, "clientes": 2}
+        assert construir_clave_resultado(SQL_CONTEO, versiones=v1) != construir_clave_resultado(SQL_CONTEO, versiones=v2)
+
+    def test_tablas_versionadas_leidas(self):
+        sql = (
+            "SELECT c.nombre, SUM(o.total_pesificado) FROM operaciones o "
+            "JOIN clientes c ON c.id = o.cliente_id GROUP BY c.nombre"
+        )
+        assert tablas_versionadas_leidas(sql) == ["operaciones", "clientes"]
+        assert tablas_versionadas_leidas("SELECT 1") == []
+
+
+# ══════════════════════════════════════════════════════════════
+# EJECUCIÓN CON CACHE
+# ══════════════════════════════════════════════════════════════
+
+def _insertar_gasto(db_session, area_id):
+    """Inserta un gasto directo por ORM (sin pasar por operacion_service)."""
+    from app.models import Operacion, TipoOperacion, Moneda, Localidad
+    db_session.add(Operacion(
+        tipo_operacion=TipoOperacion.GASTO,
+        fecha=date(2025, 10, 1),
+        monto_original=Decimal("100"),
+        moneda_original=Moneda.UYU,
+        tipo_cambio=Decimal("40"),
+        monto_uyu=Decimal("100"),
+        monto_usd=Decimal("2.5"),
+        total_pesificado=Decimal("100"),
+        total_dolarizado=Decimal("2.5"),
+        area_id=area_id,
+        localidad=Localidad.MONTEVIDEO,
+    ))
+    db_session.flush()
+
+
+class TestEjecutarConCache:
+    """Tests de ejecutar_con_cache contra PostgreSQL de test."""
+
+    def test_segunda_ejecucion_sale_del_cache(self, db_session):
+        primero = ejecutar_con_cache(db_session, SQL_CONTEO)
+        execute = db_session.execute
+
+        def solo_versiones(sentencia, *args, **kwargs):
+            assert "data_versions" in str(sentencia), "no debería ejecutar"
+            return execute(sentencia, *args, **kwargs)
+
+        with patch.object(db_session, "execute", side_effect=solo_versiones):
+            segundo = ejecutar_con_cache(db_session, SQL_CONTEO)
+        assert primero == segundo
+        assert estadisticas_cache_resultados()["hits"] == 1
+
+    def test_retorna_copias(self, db_session):
+        ejecutar_con_cache(db_session, SQL_CONTEO)[0]["cantidad"] = -1
+        assert ejecutar_con_cache(db_session, SQL_CONTEO)[0]["cantidad"] >= 0
+
+    def test_escritura_por_orm_reejecuta(self, db_con_triggers, areas_test):
+        antes = ejecutar_con_cache(db_con_triggers, SQL_CONTEO)[0]["cantidad"]
+        _insertar_gasto(db_con_triggers, areas_test["Contable"].id)
+        assert ejecutar_con_cache(db_con_triggers, SQL_CONTEO)[0]["cantidad"] == antes + 1
+
+    def test_escritura_en_otra_tabla_leida_reejecuta(self, db_con_triggers):
+        """Un UPDATE por SQL crudo (otro worker, un script) también invalida."""
+        sql = "SELECT COUNT(*) AS cantidad FROM clientes WHERE activo"
+        ejecutar_con_cache(db_con_triggers, sql)
+        ejecutar_con_cache(db_con_triggers, sql)
+        assert estadisticas_cache_resultados()["hits"] == 1
+
+        db_con_triggers.execute(text("UPDATE clientes SET activo = activo WHERE false"))
+        ejecutar_con_cache(db_con_triggers, sql)
+        assert estadisticas_cache_resultados()["hits"] == 1
+
+    def test_escritura_en_tabla_no_leida_sirve_del_cache(self, db_con_triggers):
+        ejecutar_con_cache(db_con_triggers, SQL_CONTEO)
+        db_con_triggers.execute(text("UPDATE clientes SET activo = activo WHERE false"))
+        ejecutar_con_cache(db_con_triggers, SQL_CONTEO)
+        assert estadisticas_cache_resultados()["hits"] == 1
+
+    def test_crear_gasto_invalida_cache(self, db_con_triggers, areas_test):
+        db_session = db_con_triggers
+        antes = ejecutar_consulta_cfo(db_session, SQL_CONTEO)["data"][0]["cantidad"]
+        operacion_service.crear_gasto(db_session, GastoCreate(
+            fecha=date(2025, 10, 1),
+            monto_original=Decimal("100"),
+            moneda_original="UYU",
+            tipo_cambio=Decimal("40"),
+            area_id=areas_test["Contable"].id,
+            localidad="Montevideo",
+            descripcion="Gasto de prueba cache",
+        ))
+        despues = ejecutar_consulta_cfo(db_session, SQL_CONTEO)["data"][0]["cantidad"]
+        assert despues == antes + 1
+
+    def test_errores_no_se_cachean(self, db_session):
+        resultado = ejecutar_consulta_cfo(db_session, "SELECT * FROM tabla_inexistente")
+        db_session.rollback()
+        assert resultado["success"] is False
+        assert estadisticas_cache_resultados()["entradas"] == 0
+
+    def test_db_no_sqlalchemy_no_usa_cache(self):
+        fila = MagicMock()
+        fila._mapping = {"total": 10}
+        db = MagicMock(spec=["execute"])
+        db.execute.return_value = [fila]
+
+        ejecutar_con_cache(db, "SELECT 10 AS total")
+        ejecutar_con_cache(db, "SELECT 10 AS total")
+
+        assert db.execute.call_count == 2
+        assert estadisticas_cache_resultados()["entradas"] == 0
@@ -0,0 +1,129 @@
+"""
+Tests para resumen_conversacion - contexto acotado del chat CFO.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_resumen_conversacion.py -v
+"""
+
+from unittest.mock import patch
+
+from app.core.cfo_narrative_prompt import build_cfo_user_message
+from app.core.constants import CONTEXTO_MENSAJES_RECIENTES, RESUMEN_MAX_CARACTERES, RESUMEN_MIN_MENSAJES_NUEVOS
+from app.services.claude_sql_generator import ClaudeSQLGenerator
+from app.services.conversacion_service import ConversacionService
+from app.services.resumen_conversacion import actualizar_resumen, extraer_estado_consulta, plegar_resumen
+
+SERVICIO = 'app.services.resumen_conversacion'
+
+SQL_AREAS = (
+    "SELECT a.nombre, SUM(o.total_pesificado) AS total FROM operaciones o "
+    "JOIN areas a ON a.id = o.area_id "
+    "WHERE o.deleted_at IS NULL AND o.tipo_operacion = 'INGRESO' "
+    "AND EXTRACT(YEAR FROM o.fecha) = 2025 AND o.fecha BETWEEN '2025-01-01' AND '2025-06-30' "
+    "GROUP BY a.nombre ORDER BY total DESC"
+)
+
+
+def _conversacion_con_turnos(db_session, usuario, turnos):
+    conversacion = ConversacionService.crear_conversacion(db_session, usuario.id, "Resumen")
+    for i in range(turnos):
+        ConversacionService.agregar_mensaje(db_session, conversacion.id, "user", f"pregunta {i}")
+        ConversacionService.agregar_mensaje(
+            db_session, conversacion.id, "assistant", f"respuesta {i}", sql_generado=SQL_AREAS
+        )
+    return conversacion
+
+
+class TestEstadoConsulta:
+    """Tablas, filtros y período se extraen del AST del SQL."""
+
+    def test_extrae_tablas_filtros_y_periodo(self):
+        estado = extraer_estado_consulta(SQL_AREAS)
+        assert estado['tablas'] == ['operaciones', 'areas']
+        assert estado['filtros'] == [
+            "o.tipo_operacion = 'INGRESO'",
+            "EXTRACT(YEAR FROM o.fecha) = 2025",
+            "o.fecha BETWEEN '2025-01-01' AND '2025-06-30'",
+        ]
+        assert estado['periodo'] == {'anios': [2025], 'fechas': ['2025-01-01', '2025-06-30']}
+
+    def test_ctes_e_intervalos_relativos(self):
+        estado = extraer_estado_consulta(
+            "WITH base AS (SELECT * FROM operaciones WHERE fecha >= CURRENT_DATE - INTERVAL '3 months') "
+            "SELECT COUNT(*) FROM base"
+        )
+        assert estado['tablas'] == ['operaciones']
+        assert estado['periodo'] == {'intervalos': ['3 months'], 'relativo_a_hoy': True}
+
+    def test_lote_toma_la_ultima_sentencia(self):
+        estado = extraer_estado_consulta("SELECT 1 FROM areas;\n\nSELECT COUNT(*) FROM operaciones")
+        assert estado['sql'] == "SELECT COUNT(*) FROM operaciones"
+
+    def test_sin_select_no_hay_estado(self):
+        assert extraer_estado_consulta("(informe multi-query: 4 queries)") is None
+
+
+class TestPlegado:
+    """Los turnos viejos se pliegan cada RESUMEN_MIN_MENSAJES_NUEVOS mensajes."""
+
+    def test_no_pliega_dentro_de_la_ventana(self, db_session, usuario_test):
+        conversacion = _conversacion_con_turnos(db_session, usuario_test, CONTEXTO_MENSAJES_RECIENTES // 2)
+        with patch(f'{SERVICIO}._resumir_con_claude') as mock_claude:
+            assert actualizar_resumen(db_session, conversacion.id) is True
+        mock_claude.assert_not_called()
+        assert conversacion.resumen is None
+        assert conversacion.estado_consulta['tablas'] == ['operaciones', 'areas']
+
+    def test_pliega_mensajes_fuera_de_la_ventana(self, db_session, usuario_test):
+        turnos = (CONTEXTO_MENSAJES_RECIENTES + RESUMEN_MIN_MENSAJES_NUEVOS) // 2
+        conversacion = _conversacion_con_turnos(db_session, usuario_test, turnos)
+        with patch(f'{SERVICIO}._resumir_con_claude', return_value="Se revisaron ingresos 2025 por área.") as mock_claude:
+            actualizar_resumen(db_session, conversacion.id)
+
+        plegados = mock_claude.call_args.args[1]
+        assert len(plegados) == RESUMEN_MIN_MENSAJES_NUEVOS
+        assert conversacion.resumen == "Se revisaron ingresos 2025 por área."
+        assert conversacion.resumen_hasta == plegados[-1].created_at
+
+        contexto = ConversacionService.obtener_contexto_compacto(db_session, conversacion.id)
+        assert contexto[0]['role'] == 'resumen'
+        assert "Se revisaron ingresos 2025 por área." in contexto[0]['content']
+        assert "- Período: años 2025" in contexto[0]['content']
+        assert len(contexto) == 1 + CONTEXTO_MENSAJES_RECIENTES
+
+    def test_contexto_acotado_en_conversaciones_largas(self, db_session, usuario_test):
+        conversacion = _conversacion_con_turnos(db_session, usuario_test, 20)
+        with patch(f'{SERVICIO}._resumir_con_claude', return_value="resumen"):
+            actualizar_resumen(db_session, conversacion.id)
+        contexto = ConversacionService.obtener_contexto_compacto(db_session, conversacion.id)
+        assert len(contexto) == 1 + CONTEXTO_MENSAJES_RECIENTES
+        assert contexto[-1]['content'] == "respuesta 19"
+
+    def test_fallback_extractivo_si_claude_falla(self, db_session, usuario_test):
+        conversacion = _conversacion_con_turnos(db_session, usuario_test, 1)
+        mensajes = conversacion.mensajes
+        with patch(f'{SERVICIO}._resumir_con_claude', side_effect=TimeoutError("sin respuesta")):
+            resumen = plegar_resumen("x" * RESUMEN_MAX_CARACTERES, mensajes)
+        assert len(resumen) <= RESUMEN_MAX_CARACTERES
+        assert resumen.endswith("Respuesta: respuesta 0")
+
+
+class TestPrompts:
+    """El resumen entra completo a ambos prompts, fuera de la ventana de historial."""
+
+    CONTEXTO = [
+        {'role': 'resumen', 'content': "Resumen de los turnos anteriores:\n" + "r" * 700},
+        {'role': 'user', 'content': "¿y en 2024?"},
+    ]
+
+    def test_prompt_sql(self):
+        prefijo, _ = ClaudeSQLGenerator._partes_user_prompt(None, "pregunta", self.CONTEXTO)
+        assert "r" * 700 in prefijo
+        assert "Usuario: ¿y en 2024?" in prefijo
+
+    def test_prompt_narrativa(self):
+        mensaje = build_cfo_user_message("pregunta", "datos", conversation_history=self.CONTEXTO)
+        assert "<conversation_summary>" in mensaje
+        assert "r" * 700 in mensaje
+        assert "Usuario: ¿y en 2024?" in mensaje
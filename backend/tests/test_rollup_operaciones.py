@@ -0,0 +1,161 @@
+"""
+Tests para rollup_operaciones - tabla operaciones_diarias mantenida en cada escritura.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_rollup_operaciones.py -v
+"""
+
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import text
+
+from app.schemas.operacion import GastoCreate, IngresoCreate, RetiroCreate
+from app.services import operacion_service
+from app.services.informe.queries import _query_operativo_por_area, _query_totales_por_tipo
+from app.services.result_cache import limpiar_cache_resultados
+from app.services.rollup_operaciones import reconstruir_rollup, restar_operacion, sumar_operacion
+
+
+SQL_DESDE_OPERACIONES = """
+    SELECT fecha, tipo_operacion, area_id, localidad, moneda_original,
+           COUNT(*) AS cantidad_operaciones,
+           SUM(monto_original) AS monto_original,
+           SUM(total_pesificado) AS total_pesificado,
+           SUM(total_dolarizado) AS total_dolarizado
+    FROM operaciones
+    WHERE deleted_at IS NULL
+    GROUP BY fecha, tipo_operacion, area_id, localidad, moneda_original
+"""
+
+SQL_DESDE_ROLLUP = """
+    SELECT fecha, tipo_operacion, area_id, localidad, moneda_original,
+           cantidad_operaciones, monto_original, total_pesificado, total_dolarizado
+    FROM operaciones_diarias
+"""
+
+
+def _filas(db, sql):
+    return sorted(
+        (tuple(row) for row in db.execute(text(sql))),
+        key=lambda fila: tuple(str(valor) for valor in fila),
+    )
+
+
+def _assert_rollup_consistente(db):
+    assert _filas(db, SQL_DESDE_ROLLUP) == _filas(db, SQL_DESDE_OPERACIONES)
+
+
+@pytest.fixture(autouse=True)
+def cache_limpio():
+    limpiar_cache_resultados()
+    yield
+    limpiar_cache_resultados()
+
+
+@pytest.fixture
+def operaciones(db_session, areas_test):
+    """Dos ingresos del mismo día/clave, un gasto en USD y un retiro (area NULL)."""
+    contable = areas_test["Contable"].id
+    creadas = [
+        operacion_service.crear_ingreso(db_session, IngresoCreate(
+            fecha=date(2025, 3, 10), monto_original=Decimal("1000"), moneda_original="UYU",
+            tipo_cambio=Decimal("40"), area_id=contable, localidad="Montevideo",
+            descripcion="Honorarios", cliente="Cliente Uno",
+        )),
+        operacion_service.crear_ingreso(db_session, IngresoCreate(
+            fecha=date(2025, 3, 10), monto_original=Decimal("333.33"), moneda_original="UYU",
+            tipo_cambio=Decimal("39.7"), area_id=contable, localidad="Montevideo",
+            descripcion="Honorarios", cliente="Cliente Dos",
+        )),
+        operacion_service.crear_gasto(db_session, GastoCreate(
+            fecha=date(2025, 3, 11), monto_original=Decimal("50"), moneda_original="USD",
+            tipo_cambio=Decimal("40.123"), area_id=contable, localidad="Mercedes",
+            descripcion="Software",
+        )),
+        operacion_service.crear_retiro(db_session, RetiroCreate(
+            fecha=date(2025, 3, 12), monto_uyu=Decimal("700"), tipo_cambio=Decimal("40"),
+            localidad="Montevideo", descripcion="Retiro caja",
+        )),
+    ]
+    return creadas
+
+
+class TestMantenimientoIncremental:
+    """El rollup sigue a operaciones en altas, anulaciones y ediciones."""
+
+    def test_altas_agregan_por_clave(self, db_session, operaciones):
+        _assert_rollup_consistente(db_session)
+        fila = db_session.execute(text(
+            "SELECT cantidad_operaciones FROM operaciones_diarias "
+            "WHERE fecha = '2025-03-10' AND tipo_operacion = 'INGRESO'"
+        )).scalar()
+        assert fila == 2
+
+    def test_retiro_con_area_null_usa_una_sola_fila(self, db_session, operaciones):
+        otro = operacion_service.crear_retiro(db_session, RetiroCreate(
+            fecha=date(2025, 3, 12), monto_uyu=Decimal("300"), tipo_cambio=Decimal("40"),
+            localidad="Montevideo", descripcion="Otro retiro",
+        ))
+        assert otro.area_id is None
+        cantidad = db_session.execute(text(
+            "SELECT COUNT(*) FROM operaciones_diarias WHERE tipo_operacion = 'RETIRO'"
+        )).scalar()
+        assert cantidad == 1
+        _assert_rollup_consistente(db_session)
+
+    def test_anulacion_resta_y_elimina_clave_vacia(self, db_session, operaciones):
+        gasto = operaciones[2]
+        restar_operacion(db_session, gasto)
+        gasto.deleted_at = datetime.now(timezone.utc)
+        db_session.flush()
+
+        _assert_rollup_consistente(db_session)
+        gastos = db_session.execute(text(
+            "SELECT COUNT(*) FROM operaciones_diarias WHERE tipo_operacion = 'GASTO'"
+        )).scalar()
+        assert gastos == 0
+
+    def test_edicion_mueve_entre_claves(self, db_session, operaciones):
+        ingreso = operaciones[0]
+        restar_operacion(db_session, ingreso)
+        ingreso.fecha = date(2025, 4, 1)
+        ingreso.total_pesificado = Decimal("1500")
+        sumar_operacion(db_session, ingreso)
+
+        _assert_rollup_consistente(db_session)
+
+
+class TestReconstruccionYConsultas:
+    """Rebuild y queries de informe sobre el rollup."""
+
+    def test_reconstruir_equivale_a_incremental(self, db_session, operaciones):
+        antes = _filas(db_session, SQL_DESDE_ROLLUP)
+        filas = reconstruir_rollup(db_session)
+        assert filas == len(antes)
+        assert _filas(db_session, SQL_DESDE_ROLLUP) == antes
+
+    def test_reconstruir_rango_corrige_desvio(self, db_session, operaciones):
+        db_session.execute(text("UPDATE operaciones_diarias SET total_pesificado = 0"))
+        reconstruir_rollup(db_session, fecha_desde=date(2025, 3, 1), fecha_hasta=date(2025, 3, 31))
+        _assert_rollup_consistente(db_session)
+
+    def test_informe_totales_coincide_con_operaciones(self, db_session, operaciones):
+        params = {"fecha_desde": date(2025, 1, 1), "fecha_hasta": date(2025, 12, 31)}
+        desde_rollup = [dict(r._mapping) for r in db_session.execute(text(_query_totales_por_tipo()), params)]
+        desde_libro = [dict(r._mapping) for r in db_session.execute(text("""
+            SELECT tipo_operacion, SUM(total_pesificado) AS total_uyu,
+                   SUM(total_dolarizado) AS total_usd, COUNT(*) AS cantidad
+            FROM operaciones
+            WHERE deleted_at IS NULL AND fecha >= :fecha_desde AND fecha <= :fecha_hasta
+            GROUP BY tipo_operacion ORDER BY tipo_operacion
+        """), params)]
+        assert desde_rollup == desde_libro
+
+    def test_informe_por_area_usa_rollup(self, db_session, operaciones):
+        params = {"fecha_desde": date(2025, 1, 1), "fecha_hasta": date(2025, 12, 31)}
+        filas = [dict(r._mapping) for r in db_session.execute(text(_query_operativo_por_area()), params)]
+        assert filas[0]["area"] == "Contable"
+        assert filas[0]["ingresos_uyu"] == Decimal("1333.33")
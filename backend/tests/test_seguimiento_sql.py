@@ -0,0 +1,163 @@
+"""
+Tests para seguimiento_sql - preguntas de seguimiento resueltas reescribiendo el SQL anterior.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_seguimiento_sql.py -v
+"""
+
+from app.services.seguimiento_sql import detectar_refinamientos, resolver_seguimiento
+
+SQL_AREAS_MES = (
+    "SELECT a.nombre AS area, SUM(o.total_pesificado) AS total_pesos\n"
+    "FROM operaciones o JOIN areas a ON o.area_id = a.id\n"
+    "WHERE o.tipo_operacion = 'INGRESO' AND o.deleted_at IS NULL\n"
+    "  AND DATE_TRUNC('month', o.fecha) = DATE_TRUNC('month', CURRENT_DATE)\n"
+    "GROUP BY a.nombre ORDER BY total_pesos DESC"
+)
+SQL_GASTOS_ENERO = (
+    "SELECT SUM(total_pesificado) AS total FROM operaciones "
+    "WHERE tipo_operacion = 'GASTO' AND EXTRACT(YEAR FROM fecha) = 2025 AND EXTRACT(MONTH FROM fecha) = 1"
+)
+SQL_LOCALIDAD_ANIO = (
+    "SELECT localidad, SUM(total_dolarizado) AS total_usd FROM operaciones o "
+    "WHERE fecha >= '2025-01-01' AND fecha < '2026-01-01' GROUP BY localidad ORDER BY localidad"
+)
+SQL_ANIO_ACTUAL = (
+    "SELECT SUM(total_pesificado) AS total FROM operaciones "
+    "WHERE tipo_operacion = 'INGRESO' AND EXTRACT(YEAR FROM fecha) = EXTRACT(YEAR FROM CURRENT_DATE)"
+)
+SQL_MES_PASADO = (
+    "SELECT SUM(total_pesificado) AS total FROM operaciones "
+    "WHERE EXTRACT(YEAR FROM fecha) = EXTRACT(YEAR FROM CURRENT_DATE - INTERVAL '1 month') "
+    "AND EXTRACT(MONTH FROM fecha) = EXTRACT(MONTH FROM CURRENT_DATE - INTERVAL '1 month')"
+)
+SQL_ULTIMOS_30_DIAS = (
+    "SELECT SUM(total_pesificado) AS total FROM operaciones "
+    "WHERE fecha >= CURRENT_DATE - INTERVAL '30 days'"
+)
+
+
+def _resolver(pregunta, sql):
+    contexto = [
+        {"role": "user", "content": "pregunta anterior"},
+        {"role": "assistant", "content": "respuesta anterior", "sql": sql},
+    ]
+    resultado = resolver_seguimiento(pregunta, contexto)
+    return resultado["sql"] if resultado else None
+
+
+class TestDeteccion:
+    """Qué preguntas son refinamientos y cuáles son preguntas nuevas."""
+
+    def test_refinamientos_reconocidos(self):
+        assert [r.tipo for r in detectar_refinamientos("¿Y el mes anterior?")] == ["desplazar_meses"]
+        valores = [r.valor for r in detectar_refinamientos("solo Montevideo, en dólares")]
+        assert sorted(valores, key=str) == [("localidad", "MONTEVIDEO"), "USD"]
+        assert detectar_refinamientos("¿y por área?")[0].valor == "area"
+
+    def test_pregunta_nueva_no_es_refinamiento(self):
+        assert detectar_refinamientos("¿cuánto facturó Juan en marzo?") is None
+        assert detectar_refinamientos("¿qué clientes deben más?") is None
+
+
+class TestPeriodo:
+    """Corrimientos de período sobre las formas de fecha habituales."""
+
+    def test_mes_anterior_relativo_a_hoy(self):
+        sql = _resolver("¿y el mes anterior?", SQL_AREAS_MES)
+        assert "DATE_TRUNC('month', (CURRENT_DATE - INTERVAL '1 month'))" in sql
+
+    def test_mes_anterior_cruza_el_anio(self):
+        sql = _resolver("¿y el mes anterior?", SQL_GASTOS_ENERO)
+        assert "EXTRACT(YEAR FROM fecha) = 2024 AND EXTRACT(MONTH FROM fecha) = 12" in sql
+
+    def test_anio_explicito_sobre_rango_de_fechas(self):
+        sql = _resolver("¿y en 2024?", SQL_LOCALIDAD_ANIO)
+        assert "fecha >= '2024-01-01' AND fecha < '2025-01-01'" in sql
+
+    def test_mes_sobre_rango_anual_es_ambiguo(self):
+        assert _resolver("¿y el mes anterior?", SQL_LOCALIDAD_ANIO) is None
+        assert _resolver("¿y en marzo?", SQL_LOCALIDAD_ANIO) is None
+
+    def test_mes_anterior_sobre_periodo_relativo_de_un_mes(self):
+        sql = _resolver("¿y el mes anterior?", SQL_MES_PASADO)
+        assert sql.count("EXTRACT(MONTH FROM (CURRENT_DATE - INTERVAL '1 month') - INTERVAL '1 month')") == 1
+        assert sql.count("EXTRACT(YEAR FROM (CURRENT_DATE - INTERVAL '1 month') - INTERVAL '1 month')") == 1
+
+    def test_mes_anterior_sobre_anio_actual_no_aplica(self):
+        # Correr CURRENT_DATE un mes seguiría siendo el año entero (o el anterior en enero)
+        assert _resolver("¿y el mes anterior?", SQL_ANIO_ACTUAL) is None
+        sql = _resolver("¿y el año pasado?", SQL_ANIO_ACTUAL)
+        assert "EXTRACT(YEAR FROM (CURRENT_DATE - INTERVAL '1 year'))" in sql
+
+    def test_mes_anterior_sobre_ventana_de_dias_no_aplica(self):
+        # Daría una ventana abierta de 60 días
+        assert _resolver("¿y el mes anterior?", SQL_ULTIMOS_30_DIAS) is None
+        assert _resolver("¿y el año pasado?", SQL_ULTIMOS_30_DIAS) is None
+
+    def test_mes_explicito_sobre_mes_pasado_no_aplica(self):
+        assert _resolver("¿y en marzo?", SQL_MES_PASADO) is None
+
+    def test_limit_no_es_un_anio(self):
+        sql = _resolver("¿y el año pasado?", SQL_LOCALIDAD_ANIO + " LIMIT 2025")
+        assert sql.endswith("LIMIT 2025")
+
+
+class TestFiltrosYAgrupacion:
+    """Filtros agregados o cambiados y cambio de dimensión."""
+
+    def test_filtro_nuevo_se_agrega_al_where(self):
+        sql = _resolver("solo Montevideo", SQL_AREAS_MES)
+        assert "AND o.localidad = 'MONTEVIDEO' GROUP BY a.nombre" in sql
+
+    def test_filtro_existente_cambia_de_valor(self):
+        sql = _resolver("¿y los gastos?", SQL_AREAS_MES)
+        assert "o.tipo_operacion = 'GASTO'" in sql
+        assert "'INGRESO'" not in sql
+
+    def test_filtro_de_area_usa_el_join_existente(self):
+        sql = _resolver("solo notarial", SQL_AREAS_MES)
+        assert "a.nombre = 'Notarial'" in sql
+
+    def test_cambio_de_agrupacion_actualiza_select_y_group_by(self):
+        sql = _resolver("¿y por localidad?", SQL_AREAS_MES)
+        assert sql.startswith("SELECT o.localidad AS localidad, SUM(o.total_pesificado)")
+        assert "GROUP BY o.localidad ORDER BY total_pesos DESC" in sql
+
+    def test_total_se_agrupa_por_area_con_join(self):
+        sql = _resolver("¿y por área?", SQL_GASTOS_ENERO)
+        assert sql.startswith("SELECT ar.nombre AS area, SUM(total_pesificado) AS total FROM operaciones")
+        assert "LEFT JOIN areas ar ON ar.id = operaciones.area_id WHERE" in sql
+        assert sql.endswith("GROUP BY ar.nombre")
+
+    def test_agrupacion_por_orden_actualiza_el_order_by(self):
+        sql = _resolver("¿y por tipo?", SQL_LOCALIDAD_ANIO)
+        assert "GROUP BY o.tipo_operacion ORDER BY tipo_operacion" in sql
+
+
+class TestMoneda:
+    """Cambio de moneda de los montos."""
+
+    def test_pesos_a_dolares_renombra_columnas_y_alias(self):
+        sql = _resolver("¿y en dólares?", SQL_AREAS_MES)
+        assert "SUM(o.total_dolarizado) AS total_dolares" in sql
+        assert "ORDER BY total_dolares DESC" in sql
+
+    def test_misma_moneda_no_aplica(self):
+        assert _resolver("¿y en dólares?", SQL_LOCALIDAD_ANIO) is None
+
+    def test_turno_de_lote_con_varias_sentencias_no_aplica(self):
+        # cfo_lote guarda los SQL del turno unidos con ";\n\n"
+        anterior = SQL_GASTOS_ENERO + ";\n\n" + SQL_LOCALIDAD_ANIO
+        assert _resolver("¿y el año pasado?", anterior) is None
+
+    def test_sin_sql_previo_no_aplica(self):
+        assert resolver_seguimiento("¿y en dólares?", [{"role": "user", "content": "hola"}]) is None
+
+    def test_varias_tablas_de_operaciones_no_aplica(self):
+        sql = (
+            "SELECT (SELECT SUM(total_pesificado) FROM operaciones WHERE tipo_operacion = 'INGRESO') "
+            "- (SELECT SUM(total_pesificado) FROM operaciones WHERE tipo_operacion = 'GASTO') AS resultado"
+        )
+        assert _resolver("solo Montevideo", sql) is None
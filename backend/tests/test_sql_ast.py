@@ -0,0 +1,151 @@
+"""
+Tests para sql_ast - parseo único de SQL compartido por validadores y post-procesador.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_sql_ast.py -v
+"""
+
+from unittest.mock import MagicMock
+
+from app.services.cfo_ai_service import ejecutar_consulta_cfo
+from app.services.sql_ast import ConsultaSQL, parsear_sql
+from app.services.sql_post_processor import SQLPostProcessor
+from app.services.validador_sql import ValidadorSQL
+
+
+SQL_UNION = (
+    "WITH base AS (SELECT area, total FROM a UNION ALL SELECT area, total FROM b) "
+    "SELECT area, total FROM base ORDER BY total DESC LIMIT 5 "
+    "UNION ALL "
+    "SELECT 'TOTAL', SUM(total) FROM base"
+)
+
+
+class TestTokenizacion:
+    """Tokens sin pérdida; strings y comentarios no se confunden con SQL."""
+
+    def test_reemite_el_texto_original(self):
+        sql = "SELECT  a -- comentario\nFROM t /* bloque */ WHERE x = 'it''s';"
+        assert ConsultaSQL(sql).a_sql() == sql
+
+    def test_palabras_en_strings_y_comentarios_no_cuentan(self):
+        consulta = ConsultaSQL("SELECT 'DROP TABLE x; DELETE' AS txt -- UNION ALL\nFROM t")
+        assert 'DROP' not in consulta.palabras
+        assert consulta.contar('UNION', 'ALL') == 0
+        assert len(consulta.sentencias) == 1
+        assert consulta.literales == ['DROP TABLE x; DELETE']
+
+    def test_string_con_escape_no_esconde_sentencias(self):
+        consulta = ConsultaSQL("SELECT E'\\'' ; DELETE FROM operaciones; --'")
+        assert consulta.comandos == ["SELECT", "DELETE"]
+        assert len(consulta.sentencias) == 2
+        assert ConsultaSQL(r"SELECT 'C:\' AS ruta FROM t").literales == ["C:\\"]
+
+    def test_parentesis_en_strings_no_desbalancean(self):
+        consulta = ConsultaSQL("SELECT ':)' FROM t WHERE (a = 1)")
+        assert consulta.parentesis_abiertos == consulta.parentesis_cerrados == 1
+
+
+class TestEstructura:
+    """Sentencias, grupos UNION por nivel, ramas y cláusulas."""
+
+    def test_grupos_por_nivel(self):
+        consulta = ConsultaSQL(SQL_UNION)
+        assert [g.profundidad for g in consulta.grupos] == [1, 0]
+        assert len(consulta.ramas) == 2
+        assert consulta.sentencias[0].operadores == ['UNION ALL']
+
+    def test_clausulas_al_nivel_de_la_rama(self):
+        primera = ConsultaSQL(SQL_UNION).ramas[0]
+        inicio, fin = primera.clausula('ORDER BY')
+        assert primera.consulta.valores[inicio:fin] == ['ORDER', 'BY', 'TOTAL', 'DESC']
+        assert primera.tiene_clausula('LIMIT')
+        # El FROM del CTE está un nivel más adentro: la rama solo ve el suyo
+        assert len(primera.consulta.clausulas('FROM', primera.inicio, primera.fin, 0)) == 1
+
+    def test_tipo_sentencia_y_comandos(self):
+        assert ConsultaSQL(SQL_UNION).tipo_sentencia == 'SELECT'
+        assert ConsultaSQL("INSERT INTO t VALUES (1)").tipo_sentencia == 'INSERT'
+        cte_borra = ConsultaSQL("WITH x AS (DELETE FROM t RETURNING *) SELECT * FROM x")
+        assert 'DELETE' in cte_borra.comandos
+
+    def test_comandos_de_sentencia_principal_con_with_y_explain(self):
+        assert sorted(ConsultaSQL("WITH x AS (SELECT 1) DELETE FROM t").comandos) == ['DELETE', 'SELECT', 'WITH']
+        assert ConsultaSQL("WITH x(a) AS (SELECT 1), y AS (SELECT 2) SELECT * FROM x").comandos[-1] == 'SELECT'
+        assert 'DELETE' in ConsultaSQL("EXPLAIN ANALYZE DELETE FROM t").comandos
+        assert 'UPDATE' in ConsultaSQL("EXPLAIN (ANALYZE, FORMAT JSON) UPDATE t SET a = 1").comandos
+        assert 'DELETE' in ConsultaSQL("SELECT * FROM (WITH x AS (SELECT 1) DELETE FROM t) s").comandos
+
+
+class TestParseoCompartido:
+    """parsear_sql cachea por texto; las reescrituras trabajan sobre copias."""
+
+    def test_mismo_texto_mismo_parseo(self):
+        sql = "SELECT 1 AS uno FROM t WHERE x = 'compartido'"
+        assert parsear_sql(sql) is parsear_sql(sql)
+
+    def test_copia_no_altera_el_cacheado(self):
+        sql = "SELECT * FROM areas a WHERE a.nombre = 'Juridica'"
+        copia = parsear_sql(sql).copia()
+        copia.reemplazar_literales({"'Juridica'": "'Jurídica'"})
+        assert "'Jurídica'" in copia.a_sql()
+        assert parsear_sql(sql).a_sql() == sql
+
+    def test_sql_procesado_queda_parseado_para_la_ejecucion(self):
+        resultado = SQLPostProcessor.procesar_sql(
+            "pregunta", "SELECT * FROM areas a WHERE a.nombre = 'Recuperacion' AND a.id > 0"
+        )
+        assert parsear_sql(resultado['sql']).literales == ['Recuperación']
+
+    def test_editar_conserva_formato_alrededor(self):
+        sql = "SELECT x\nFROM t -- tabla\nWHERE y = 1"
+        copia = parsear_sql(sql).copia()
+        fin = len(copia.valores)
+        copia.editar([(fin - 1, fin, "2"), (fin, fin, " AND z = 3")])
+        assert copia.a_sql() == "SELECT x\nFROM t -- tabla\nWHERE y = 2 AND z = 3"
+        assert copia.valores[-3:] == ["Z", "=", "3"]
+        assert parsear_sql(sql).a_sql() == sql
+
+
+class TestPrecision:
+    """Casos que el escaneo por texto resolvía mal."""
+
+    def test_limit_10_no_es_limit_1(self):
+        validacion = ValidadorSQL.validar_sql_antes_ejecutar(
+            "¿Cuáles son las mejores áreas en 2025?", "SELECT area FROM t ORDER BY x DESC LIMIT 10"
+        )
+        assert not any('LIMIT 1' in p for p in validacion['problemas'])
+
+    def test_order_by_de_subquery_no_requiere_parentizar(self):
+        sql = (
+            "SELECT * FROM (SELECT nombre FROM a ORDER BY nombre LIMIT 3) x "
+            "UNION ALL SELECT nombre FROM b"
+        )
+        assert SQLPostProcessor.parentizar_union_all(sql) == sql
+
+    def test_join_con_subquery_tiene_on(self):
+        sql = "SELECT * FROM a LEFT JOIN (SELECT b.id FROM b INNER JOIN c ON c.id = b.id) s ON s.id = a.id"
+        assert ValidadorSQL.validar_sintaxis_basica(sql)['valido'] is True
+
+    def test_cte_que_borra_se_bloquea(self):
+        resultado = ejecutar_consulta_cfo(
+            MagicMock(), "WITH x AS (DELETE FROM operaciones RETURNING *) SELECT COUNT(*) FROM x"
+        )
+        assert resultado == {"success": False, "error": "Consulta no permitida por seguridad"}
+
+    def test_with_seguido_de_delete_se_bloquea(self):
+        resultado = ejecutar_consulta_cfo(MagicMock(), "WITH x AS (SELECT 1) DELETE FROM operaciones")
+        assert resultado == {"success": False, "error": "Consulta no permitida por seguridad"}
+
+    def test_explain_analyze_delete_se_bloquea(self):
+        resultado = ejecutar_consulta_cfo(MagicMock(), "EXPLAIN ANALYZE DELETE FROM operaciones")
+        assert resultado == {"success": False, "error": "Consulta no permitida por seguridad"}
+
+    def test_delete_tras_string_con_escape_se_bloquea(self):
+        resultado = ejecutar_consulta_cfo(MagicMock(), "SELECT E'\\'' ; DELETE FROM operaciones; --'")
+        assert resultado == {"success": False, "error": "Consulta no permitida por seguridad"}
+
+    def test_multiples_sentencias_se_bloquean(self):
+        resultado = ejecutar_consulta_cfo(MagicMock(), "SELECT 1; SELECT 2")
+        assert resultado["error"] == "Solo se permite una consulta a la vez"
@@ -0,0 +1,188 @@
+"""
+Tests para SQLCache - cache de SQL generado delante de SQLRouter.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_sql_cache.py -v
+"""
+
+from datetime import date
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.services.sql_cache import SQLCache, huella_contexto, normalizar_pregunta
+from app.services.sql_router import SQLRouter
+
+
+HOY = date(2025, 10, 15)
+
+
+# ══════════════════════════════════════════════════════════════
+# NORMALIZACIÓN DE PREGUNTAS
+# ══════════════════════════════════════════════════════════════
+
+class TestNormalizarPregunta:
+    """Tests de normalización de la clave de cache."""
+
+    def test_ignora_tildes_mayusculas_y_puntuacion(self):
+        a = normalizar_pregunta("¿Cuánto FACTURAMOS en 2024?", HOY)
+        b = normalizar_pregunta("cuanto facturamos en 2024", HOY)
+        assert a == b == "cuanto facturamos en 2024"
+
+    def test_colapsa_espacios(self):
+        assert normalizar_pregunta("  gastos   por\tárea  ", HOY) == "gastos por area"
+
+    def test_resuelve_este_mes(self):
+        assert normalizar_pregunta("¿Cuánto facturamos este mes?", HOY) == "cuanto facturamos mes 2025-10"
+
+    def test_resuelve_mes_pasado_en_enero(self):
+        resultado = normalizar_pregunta("gastos del mes pasado", date(2025, 1, 10))
+        assert resultado == "gastos del mes 2024-12"
+
+    def test_resuelve_anio_actual_y_anterior(self):
+        assert normalizar_pregunta("ingresos este año", HOY) == "ingresos ano 2025"
+        assert normalizar_pregunta("ingresos del año pasado", HOY) == "ingresos del ano 2024"
+
+    def test_mismo_mes_distinto_dia_misma_clave(self):
+        assert normalizar_pregunta("este mes", date(2025, 10, 1)) == normalizar_pregunta("este mes", date(2025, 10, 31))
+
+    def test_distinto_mes_distinta_clave(self):
+        assert normalizar_pregunta("este mes", date(2025, 10, 31)) != normalizar_pregunta("este mes", date(2025, 11, 1))
+
+
+class TestHuellaContexto:
+    """Tests de la huella de contexto conversacional."""
+
+    def test_sin_contexto_vacia(self):
+        assert huella_contexto(None) == ""
+        assert huella_contexto([]) == ""
+
+    def test_contextos_distintos_distinta_huella(self):
+        ctx_a = [{"role": "user", "content": "facturación 2024"}]
+        ctx_b = [{"role": "user", "content": "gastos 2024"}]
+        assert huella_contexto(ctx_a) != huella_contexto(ctx_b)
+
+    def test_huella_estable(self):
+        ctx = [{"role": "user", "content": "hola"}, {"role": "assistant", "content": "respuesta"}]
+        assert huella_contexto(ctx) == huella_contexto(list(ctx))
+
+
+# ══════════════════════════════════════════════════════════════
+# LRU / TTL / CONTADORES
+# ══════════════════════════════════════════════════════════════
+
+class TestSQLCache:
+    """Tests del cache LRU + TTL."""
+
+    def test_miss_y_hit(self):
+        cache = SQLCache()
+        assert cache.obtener("k") is None
+        cache.guardar("k", {"sql": "SELECT 1", "metodo": "claude_direct"})
+        assert cache.obtener("k")["sql"] == "SELECT 1"
+        stats = cache.estadisticas()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_retorna_copia(self):
+        cache = SQLCache()
+        cache.guardar("k", {"sql": "SELECT 1"})
+        cache.obtener("k")["sql"] = "mutado"
+        assert cache.obtener("k")["sql"] == "SELECT 1"
+
+    def test_eviction_lru(self):
+        cache = SQLCache(max_entradas=2)
+        cache.guardar("a", {"sql": "A"})
+        cache.guardar("b", {"sql": "B"})
+        cache.obtener("a")  # "a" pasa a ser la más reciente
+        cache.guardar("c", {"sql": "C"})
+
+        assert cache.obtener("b") is None
+        assert cache.obtener("a") is not None
+        assert cache.obtener("c") is not None
+        assert cache.estadisticas()["evictions"] == 1
+
+    def test_ttl_expira(self):
+        cache = SQLCache(ttl_segundos=10)
+        with patch("app.services.sql_cache.time.monotonic", return_value=100.0):
+            cache.guardar("k", {"sql": "SELECT 1"})
+        with patch("app.services.sql_cache.time.monotonic", return_value=111.0):
+            assert cache.obtener("k") is None
+        assert cache.estadisticas()["entradas"] == 0
+
+    def test_invalidar_y_limpiar(self):
+        cache = SQLCache()
+        cache.guardar("k", {"sql": "SELECT 1"})
+        cache.invalidar("k")
+        assert cache.obtener("k") is None
+        cache.limpiar()
+        assert cache.estadisticas()["misses"] == 0
+
+    def test_clave_incluye_fecha_solo_si_se_pide(self):
+        sin_fecha_a = SQLCache.construir_clave("gastos 2024", hoy=date(2025, 10, 1))
+        sin_fecha_b = SQLCache.construir_clave("gastos 2024", hoy=date(2025, 10, 2))
+        con_fecha_a = SQLCache.construir_clave("tendencia gastos", hoy=date(2025, 10, 1), incluir_fecha=True)
+        con_fecha_b = SQLCache.construir_clave("tendencia gastos", hoy=date(2025, 10, 2), incluir_fecha=True)
+        assert sin_fecha_a == sin_fecha_b
+        assert con_fecha_a != con_fecha_b
+
+
+# ══════════════════════════════════════════════════════════════
+# INTEGRACIÓN CON SQLRouter
+# ══════════════════════════════════════════════════════════════
+
+@pytest.fixture
+def router_con_cache():
+    """SQLRouter con ClaudeSQLGenerator mockeado."""
+    mock_gen = Mock()
+    mock_gen.generar_sql = Mock(return_value="SELECT SUM(total_pesificado) FROM operaciones")
+    with patch("app.services.sql_router.ClaudeSQLGenerator", return_value=mock_gen):
+        router = SQLRouter()
+    return router, mock_gen
+
+
+class TestSQLRouterCache:
+    """Tests del cache integrado en generar_sql_inteligente."""
+
+    def test_pregunta_repetida_no_llama_a_claude(self, router_con_cache):
+        router, mock_gen = router_con_cache
+
+        primero = router.generar_sql_inteligente("¿Cuánto facturamos en promedio en 2024?")
+        segundo = router.generar_sql_inteligente("cuanto facturamos en promedio en 2024")
+
+        assert mock_gen.generar_sql.call_count == 1
+        assert primero["metodo"] == "claude_direct"
+        assert segundo["metodo"] == "cache"
+        assert segundo["sql"] == primero["sql"]
+        assert segundo["debug"]["metodo_original"] == "claude_direct"
+
+    def test_contexto_distinto_no_comparte_cache(self, router_con_cache):
+        router, mock_gen = router_con_cache
+
+        router.generar_sql_inteligente("¿y en mercedes?")
+        router.generar_sql_inteligente(
+            "¿y en mercedes?",
+            contexto=[{"role": "user", "content": "facturación 2024"}],
+        )
+
+        assert mock_gen.generar_sql.call_count == 2
+
+    def test_errores_no_se_cachean(self, router_con_cache):
+        router, mock_gen = router_con_cache
+        mock_gen.generar_sql.return_value = "Texto sin SQL"
+
+        router.generar_sql_inteligente("pregunta rara")
+        router.generar_sql_inteligente("pregunta rara")
+
+        assert mock_gen.generar_sql.call_count == 2
+        assert router.cache.estadisticas()["entradas"] == 0
+
+    def test_invalidar_fuerza_regeneracion(self, router_con_cache):
+        router, mock_gen = router_con_cache
+
+        router.generar_sql_inteligente("promedio de gastos 2024 por área")
+        router.invalidar_cache("promedio de gastos 2024 por área")
+        router.generar_sql_inteligente("promedio de gastos 2024 por área")
+
+        assert mock_gen.generar_sql.call_count == 2
@@ -187,7 +187,6 @@ class TestValidarSQL:
         validacion = validar_sql(sql)
         
         # Assert
-        # sqlparse puede o no detectarlo, pero debe retornar dict válido
         assert 'valido' in validacion
         assert 'tipo' in validacion
 
@@ -256,6 +255,19 @@ class TestGenerarSQLConClaude:
         assert resultado['exito'] is False
         assert resultado['error'] is not None
     
+    def test_metadatos_precalculados_no_repiten_query(self, router_instance, mock_claude_generator):
+        """Con metadatos pre-obtenidos no se vuelve a consultar la BD y se inyectan al contexto"""
+        db = Mock()
+        with patch.object(router_instance, '_fetch_metadatos') as mock_fetch:
+            resultado = router_instance.generar_sql_con_claude(
+                "tendencia de ingresos", db=db, metadatos="<metadatos_temporales/>"
+            )
+
+        assert resultado['exito'] is True
+        mock_fetch.assert_not_called()
+        contexto = mock_claude_generator.generar_sql.call_args.kwargs['contexto']
+        assert contexto[-1] == {"role": "assistant", "content": "<metadatos_temporales/>"}
+
     def test_claude_sql_con_backticks(self, router_instance, mock_claude_generator):
         """Claude devuelve SQL con backticks - debe extraerse"""
         # Arrange
@@ -351,6 +363,156 @@ class TestGenerarSQLInteligente:
         assert resultado['error'] is not None
     
 
+class TestCaminoCanonico:
+    """Preguntas canónicas con alta confianza usan su SQL de control sin llamar a Claude"""
+
+    def test_pregunta_canonica_no_llama_a_claude(self, router_instance, mock_claude_generator):
+        """Una pregunta que es exactamente el patrón canónico se resuelve con metodo 'canonica'"""
+        resultado = router_instance.generar_sql_inteligente("¿Cuál fue la facturación 2024?")
+
+        assert resultado['exito'] is True
+        assert resultado['metodo'] == 'canonica'
+        assert resultado['debug']['query_canonica'] == 'facturacion_2024'
+        assert resultado['intentos']['claude'] == 0
+        assert "EXTRACT(YEAR FROM fecha) = 2024" in resultado['sql']
+        mock_claude_generator.generar_sql.assert_not_called()
+
+    def test_desglose_extra_va_a_claude(self, router_instance, mock_claude_generator):
+        """Palabras fuera del patrón ('por cliente') bajan la confianza y se genera SQL"""
+        mock_claude_generator.generar_sql.return_value = "SELECT * FROM ops"
+
+        resultado = router_instance.generar_sql_inteligente("facturación 2024 por cliente")
+
+        assert resultado['metodo'] == 'claude_direct'
+        mock_claude_generator.generar_sql.assert_called_once()
+
+    def test_recorte_temporal_extra_va_a_claude(self, router_instance, mock_claude_generator):
+        """'rentabilidad del mes de marzo' no es la canónica 'rentabilidad del mes'"""
+        mock_claude_generator.generar_sql.return_value = "SELECT * FROM ops"
+
+        resultado = router_instance.generar_sql_inteligente("rentabilidad del mes de marzo")
+
+        assert resultado['metodo'] == 'claude_direct'
+
+    def test_confianza_por_palabras_significativas(self):
+        """Interrogativos y artículos no cuentan; el resto debe estar en el patrón"""
+        from app.services.validador_canonico import ValidadorCanonico
+
+        assert ValidadorCanonico.identificar_con_confianza("¿Cuánto es el capital de trabajo?") == (
+            'capital_trabajo', 1.0
+        )
+        assert ValidadorCanonico.identificar_con_confianza("facturación 2024 en dólares")[1] < 1.0
+        assert ValidadorCanonico.identificar_con_confianza("¿Cuántos clientes tenemos?") is None
+
+
+class TestSeguimiento:
+    """Preguntas de seguimiento reescriben el SQL del turno anterior sin llamar a Claude"""
+
+    SQL_PREVIO = (
+        "SELECT SUM(total_pesificado) AS total FROM operaciones "
+        "WHERE tipo_operacion = 'INGRESO' AND EXTRACT(YEAR FROM fecha) = 2025"
+    )
+
+    def _contexto(self, sql):
+        return [
+            {"role": "user", "content": "¿Cuánto facturamos en 2025?"},
+            {"role": "assistant", "content": "Facturamos $1.000.000.", "sql": sql},
+        ]
+
+    def test_refinamiento_reescribe_sql_previo(self, router_instance, mock_claude_generator):
+        resultado = router_instance.generar_sql_inteligente(
+            "¿y el año pasado?", contexto=self._contexto(self.SQL_PREVIO)
+        )
+
+        assert resultado['exito'] is True
+        assert resultado['metodo'] == 'seguimiento'
+        assert "EXTRACT(YEAR FROM fecha) = 2024" in resultado['sql']
+        assert resultado['debug']['refinamientos'] == [{'tipo': 'desplazar_anios', 'valor': -1}]
+        mock_claude_generator.generar_sql.assert_not_called()
+
+    def test_pregunta_nueva_va_a_claude(self, router_instance, mock_claude_generator):
+        mock_claude_generator.generar_sql.return_value = "SELECT * FROM ops"
+
+        resultado = router_instance.generar_sql_inteligente(
+            "¿cuál es el cliente con más deuda?", contexto=self._contexto(self.SQL_PREVIO)
+        )
+
+        assert resultado['metodo'] == 'claude_direct'
+        mock_claude_generator.generar_sql.assert_called_once()
+
+    def test_sin_sql_previo_va_a_claude(self, router_instance, mock_claude_generator):
+        mock_claude_generator.generar_sql.return_value = "SELECT * FROM ops"
+
+        resultado = router_instance.generar_sql_inteligente("¿y el año pasado?", contexto=self._contexto(None))
+
+        assert resultado['metodo'] == 'claude_direct'
+
+
+class TestPlantillas:
+    """Intenciones recurrentes se resuelven con plantillas SQL sin llamar a Claude"""
+
+    def test_intencion_recurrente_usa_plantilla(self, router_instance, mock_claude_generator):
+        resultado = router_instance.generar_sql_inteligente("Top 5 clientes de 2025")
+
+        assert resultado['exito'] is True
+        assert resultado['metodo'] == 'plantilla'
+        assert resultado['debug']['plantilla'] == 'ranking_clientes'
+        assert "LIMIT 5" in resultado['sql']
+        mock_claude_generator.generar_sql.assert_not_called()
+
+    def test_plantillas_desactivadas_van_a_claude(self, router_instance, mock_claude_generator, monkeypatch):
+        monkeypatch.setattr('app.services.sql_router.settings.cfo_sql_plantillas', False)
+        mock_claude_generator.generar_sql.return_value = "SELECT * FROM ops"
+
+        resultado = router_instance.generar_sql_inteligente("Top 5 clientes de 2025")
+
+        assert resultado['metodo'] == 'claude_direct'
+
+
+class TestGenerarSQLLote:
+    """Lote de preguntas: atajos sin modelo y una sola llamada a Claude para el resto"""
+
+    def test_una_llamada_para_las_pendientes(self, router_instance, mock_claude_generator):
+        """Canónica y plantilla no llegan al modelo; las demás comparten una llamada"""
+        mock_claude_generator.generar_sql_lote = Mock(
+            return_value=["SELECT area FROM areas", "SELECT COUNT(*) FROM operaciones"]
+        )
+
+        resultados = router_instance.generar_sql_lote([
+            "¿Cuál fue la facturación 2024?",
+            "gastos por área en marzo",
+            "promedio de gastos por área",
+            "cantidad de operaciones por localidad",
+        ])
+
+        assert [r['metodo'] for r in resultados] == ['canonica', 'plantilla', 'claude_lote', 'claude_lote']
+        mock_claude_generator.generar_sql_lote.assert_called_once()
+        assert mock_claude_generator.generar_sql_lote.call_args.args[0] == [
+            "promedio de gastos por área", "cantidad de operaciones por localidad"
+        ]
+        mock_claude_generator.generar_sql.assert_not_called()
+
+    def test_guarda_en_cache_de_sql(self, router_instance, mock_claude_generator):
+        """Un SQL del lote se sirve desde cache en la próxima consulta individual"""
+        mock_claude_generator.generar_sql_lote = Mock(return_value=["SELECT 1 FROM operaciones"])
+
+        router_instance.generar_sql_lote(["promedio de gastos por área"])
+        resultado = router_instance.generar_sql_inteligente("promedio de gastos por área")
+
+        assert resultado['metodo'] == 'cache'
+
+    def test_pregunta_sin_sql_cae_a_generacion_individual(self, router_instance, mock_claude_generator):
+        """Una pregunta que no volvió en el lote se genera sola"""
+        mock_claude_generator.generar_sql_lote = Mock(return_value=["SELECT 1 FROM operaciones", None])
+        mock_claude_generator.generar_sql.return_value = "SELECT 2 FROM operaciones"
+
+        resultados = router_instance.generar_sql_lote(["promedio de gastos por área", "retiros por socio"])
+
+        assert resultados[1]['metodo'] == 'claude_direct'
+        assert resultados[1]['sql'] == "SELECT 2 FROM operaciones"
+        mock_claude_generator.generar_sql.assert_called_once()
+
+
 # ══════════════════════════════════════════════════════════════
 # GRUPO 5: TESTS DE FUNCIONES GLOBALES
 # ══════════════════════════════════════════════════════════════
@@ -391,7 +553,9 @@ class TestFuncionesGlobales:
         
         # Assert
         mock_get_router.assert_called_once()
-        mock_router.generar_sql_inteligente.assert_called_once_with(pregunta, contexto=None, db=None)
+        mock_router.generar_sql_inteligente.assert_called_once_with(
+            pregunta, contexto=None, db=None, metadatos=None
+        )
         assert resultado['exito'] is True
 
 
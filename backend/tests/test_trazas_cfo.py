@@ -0,0 +1,162 @@
+"""
+Tests para trazas_cfo - duraciones por etapa, tokens y exportación Prometheus.
+
+Ejecutar:
+    cd backend
+    pytest tests/test_trazas_cfo.py -v
+"""
+
+import asyncio
+import contextvars
+from types import SimpleNamespace
+
+import pytest
+from fastapi.concurrency import run_in_threadpool
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.services.ai.prompt_cache import registrar_uso_cache, reiniciar_estadisticas_uso
+from app.services.trazas_cfo import (
+    HISTOGRAMA_ETAPAS,
+    HISTOGRAMA_TOKENS,
+    HISTOGRAMA_TURNOS,
+    Histograma,
+    anotar_traza,
+    etapa,
+    exportar_prometheus,
+    finalizar_traza,
+    iniciar_traza,
+    reiniciar_metricas,
+)
+
+
+@pytest.fixture(autouse=True)
+def metricas_limpias():
+    reiniciar_metricas()
+    reiniciar_estadisticas_uso()
+    yield
+    reiniciar_metricas()
+    reiniciar_estadisticas_uso()
+
+
+def _en_contexto_nuevo(func):
+    """Corre func en un contexto aislado (la traza no se filtra a otros tests)."""
+    return contextvars.copy_context().run(func)
+
+
+class TestHistograma:
+    """Buckets acumulativos y formato de exposición."""
+
+    def test_buckets_acumulativos(self):
+        histograma = Histograma("prueba_segundos", "Ayuda", (0.1, 1), ("etapa",))
+        for valor in (0.05, 0.5, 0.5, 3):
+            histograma.observar(valor, etapa="sql")
+
+        lineas = histograma.exportar()
+
+        assert "# TYPE prueba_segundos histogram" in lineas
+        assert 'prueba_segundos_bucket{etapa="sql",le="0.1"} 1' in lineas
+        assert 'prueba_segundos_bucket{etapa="sql",le="1"} 3' in lineas
+        assert 'prueba_segundos_bucket{etapa="sql",le="+Inf"} 4' in lineas
+        assert 'prueba_segundos_sum{etapa="sql"} 4.05' in lineas
+        assert 'prueba_segundos_count{etapa="sql"} 4' in lineas
+
+    def test_valor_en_el_limite_cae_en_ese_bucket(self):
+        histograma = Histograma("prueba", "Ayuda", (1, 2))
+        histograma.observar(1)
+        assert "prueba_bucket{le=\"1\"} 1" in histograma.exportar()
+
+    def test_etiquetas_escapadas(self):
+        histograma = Histograma("prueba", "Ayuda", (1,), ("etapa",))
+        histograma.observar(0.5, etapa='a"b')
+        assert 'prueba_count{etapa="a\\"b"} 1' in histograma.exportar()
+
+
+class TestTrazaTurno:
+    """Registro de etapas, tokens y cierre del turno."""
+
+    def test_etapas_y_tiempos_del_planificador(self):
+        def turno():
+            traza = iniciar_traza()
+            with etapa("generacion_sql"):
+                pass
+            with etapa("generacion_sql"):
+                pass
+            anotar_traza(metodo="claude_direct", filas=3)
+            return finalizar_traza(traza, {"metadatos": 0.02, "plan_sql_1": 0.01, "plan_sql_2": 0.01})
+
+        resumen = _en_contexto_nuevo(turno)
+
+        assert set(resumen["etapas"]) == {"generacion_sql", "metadatos", "plan_sql"}
+        assert resumen["etapas"]["plan_sql"] == pytest.approx(0.02)
+        assert resumen["metodo"] == "claude_direct"
+        assert ("generacion_sql",) in HISTOGRAMA_ETAPAS.series()
+        assert HISTOGRAMA_TURNOS.series()[("claude_direct", "ok")]["total"] == 1
+
+    def test_finalizar_dos_veces_observa_una(self):
+        def turno():
+            traza = iniciar_traza()
+            finalizar_traza(traza)
+            finalizar_traza(traza)
+
+        _en_contexto_nuevo(turno)
+        assert HISTOGRAMA_TURNOS.series()[("ninguno", "ok")]["total"] == 1
+
+    def test_etapa_sin_traza_no_falla(self):
+        def fuera_de_turno():
+            with etapa("x"):
+                pass
+
+        _en_contexto_nuevo(fuera_de_turno)
+        assert HISTOGRAMA_ETAPAS.series() == {}
+
+    def test_tokens_desde_el_threadpool_llegan_a_la_traza(self):
+        usage = SimpleNamespace(
+            input_tokens=100, output_tokens=20, cache_read_input_tokens=5000, cache_creation_input_tokens=0
+        )
+
+        async def turno():
+            traza = iniciar_traza()
+            await run_in_threadpool(registrar_uso_cache, usage, "sql")
+            registrar_uso_cache(usage, "narrativa")
+            return finalizar_traza(traza)
+
+        resumen = _en_contexto_nuevo(lambda: asyncio.run(turno()))
+
+        assert resumen["tokens"]["input_tokens"] == 200
+        assert resumen["tokens"]["cache_read_input_tokens"] == 10000
+        assert HISTOGRAMA_TOKENS.series()[("output",)]["suma"] == 40
+
+
+class TestEndpointMetrics:
+    """GET /metrics"""
+
+    def test_exporta_histogramas_y_caches(self, monkeypatch):
+        monkeypatch.setattr(settings, "metrics_token", "secreto")
+        _en_contexto_nuevo(lambda: finalizar_traza(iniciar_traza(), {"metadatos": 0.01}))
+
+        response = TestClient(app).get("/metrics", headers={"Authorization": "Bearer secreto"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'cfo_etapa_duracion_segundos_count{etapa="metadatos"} 1' in response.text
+        assert 'cfo_cache_hits_total{cache="sql"}' in response.text
+        assert 'cfo_cache_hits_total{cache="resultados"}' in response.text
+        assert 'cfo_claude_tokens_total{tipo="input"} 0' in response.text
+
+    def test_sin_token_configurado_no_se_expone(self, monkeypatch):
+        monkeypatch.setattr(settings, "metrics_token", "")
+        assert TestClient(app).get("/metrics").status_code == 404
+
+    def test_token_configurado_exige_bearer(self, monkeypatch):
+        monkeypatch.setattr(settings, "metrics_token", "secreto")
+        client = TestClient(app)
+
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer secreto"}).status_code == 200
+
+    def test_exportacion_vacia_es_valida(self):
+        texto = exportar_prometheus()
+        assert texto.endswith("\n")
+        assert "# TYPE cfo_turno_filas histogram" in texto
@@ -0,0 +1,64 @@
+"""
+Tests para versiones_datos - contadores de versión mantenidos por triggers.
+
+Necesita la BD de test: los triggers se instalan con el SQL de las migraciones
+(fixture db_con_triggers de conftest: create_all crea la tabla data_versions
+pero no los triggers).
+
+Ejecutar:
+    cd backend
+    pytest tests/test_versiones_datos.py -v
+"""
+
+from unittest.mock import MagicMock
+
+from sqlalchemy import text
+
+from app.models.cliente import Cliente
+from app.services.versiones_datos import (
+    TABLAS_VERSIONADAS,
+    obtener_versiones_datos,
+    versiones_vigentes,
+)
+
+
+class TestVersionesDatos:
+    """Una sentencia que modifica una tabla sube su versión en 1."""
+
+    def test_misma_lista_de_tablas_que_las_migraciones(self, migraciones_versiones):
+        tablas = [t for m in migraciones_versiones for t in m.TABLAS_VERSIONADAS]
+        assert tuple(tablas) == TABLAS_VERSIONADAS
+
+    def test_sin_tablas_no_consulta_y_esta_vigente(self):
+        db = MagicMock()
+        assert obtener_versiones_datos(db, []) == {}
+        assert versiones_vigentes(db, {})
+        db.execute.assert_not_called()
+
+    def test_tabla_sin_cambios_vale_cero(self, db_con_triggers):
+        assert obtener_versiones_datos(db_con_triggers) == dict.fromkeys(TABLAS_VERSIONADAS, 0)
+
+    def test_insert_sube_solo_su_tabla(self, db_con_triggers):
+        db_con_triggers.add(Cliente(nombre="CLIENTE VERSIONADO"))
+        db_con_triggers.flush()
+
+        versiones = obtener_versiones_datos(db_con_triggers)
+        assert versiones["clientes"] == 1
+        assert versiones["operaciones"] == 0
+
+    def test_una_sentencia_sobre_muchas_filas_suma_uno(self, db_con_triggers):
+        db_con_triggers.add_all([Cliente(nombre=f"CLIENTE {i}") for i in range(3)])
+        db_con_triggers.flush()
+        antes = obtener_versiones_datos(db_con_triggers, ["clientes"])["clientes"]
+
+        db_con_triggers.execute(text("UPDATE clientes SET activo = false WHERE nombre LIKE 'CLIENTE %'"))
+
+        assert obtener_versiones_datos(db_con_triggers, ["clientes"]) == {"clientes": antes + 1}
+
+    def test_versiones_vigentes(self, db_con_triggers):
+        versiones = obtener_versiones_datos(db_con_triggers, ["clientes", "proveedores"])
+        assert versiones_vigentes(db_con_triggers, versiones)
+
+        db_con_triggers.execute(text("DELETE FROM clientes WHERE false"))
+
+        assert not versiones_vigentes(db_con_triggers, versiones)
@@ -8,6 +8,49 @@ import remarkGfm from 'remark-gfm';
 import { useStreamingChat } from '../../hooks/useStreamingChat';
 import axiosClient from '../../services/api/axiosClient';
 
+// filas trae como máximo MAX_FILAS_TABLA (useStreamingChat); el total llega
+// con el evento data o, mientras tanto, es la cuenta de filas recibidas.
+function TablaResultado({ filas, filasRecibidas, totalFilas, truncado }) {
+  const columnas = Object.keys(filas[0]);
+  const total = totalFilas ?? filasRecibidas ?? filas.length;
+
+  return (
+    <div className="mb-2">
+      <div className="max-h-64 overflow-auto rounded-lg border border-border">
+        <table className="min-w-full text-xs">
+          <thead className="bg-surface sticky top-0">
+            <tr>
+              {columnas.map(col => (
+                <th key={col} className="px-2 py-1 text-left font-medium text-text-secondary whitespace-nowrap">{col}</th>
+              ))}
+            </tr>
+          </thead>
+          <tbody>
+            {filas.map((fila, idx) => (
+              <tr key={idx} className="border-t border-border">
+                {columnas.map(col => (
+                  <td key={col} className="px-2 py-1 whitespace-nowrap">{String(fila[col] ?? '')}</td>
+                ))}
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      </div>
+      <p className="mt-1 text-xs text-text-secondary">
+        {filas.length < total ? `mostrando ${filas.length} de ${total} filas` : `${total} filas`}
+        {truncado && ' (resultado truncado)'}
+      </p>
+    </div>
+  );
+}
+
+TablaResultado.propTypes = {
+  filas: PropTypes.arrayOf(PropTypes.object).isRequired,
+  filasRecibidas: PropTypes.number,
+  totalFilas: PropTypes.number,
+  truncado: PropTypes.bool,
+};
+
 export function ChatPanel({ isOpen, onClose }) {
   const [exportando, setExportando] = useState(null);
   
@@ -238,6 +281,14 @@ export function ChatPanel({ isOpen, onClose }) {
                         : 'bg-surface-alt text-text-primary rounded-tl-sm max-w-full'
                     )}
                   >
+                    {msg.role === 'assistant' && msg.filas?.length > 1 && (
+                      <TablaResultado
+                        filas={msg.filas}
+                        filasRecibidas={msg.filasRecibidas}
+                        totalFilas={msg.totalFilas}
+                        truncado={msg.truncado}
+                      />
+                    )}
                     {msg.role === 'assistant' ? (
                       <div className="prose prose-sm max-w-none dark:prose-invert prose-p:my-1 prose-headings:my-2">
                         <ReactMarkdown remarkPlugins={[remarkGfm]}>{msg.content}</ReactMarkdown>
@@ -1,6 +1,7 @@
 import { useState, useRef, useCallback } from 'react';
 import toast from 'react-hot-toast';
 import { readSSEStream } from '../utils/sseHelper';
+import { MAX_FILAS_TABLA } from '../utils/constants';
 
 /**
  * Hook para chat con streaming SSE
@@ -48,6 +49,8 @@ export function useStreamingChat() {
       id: assistantMsgId,
       role: 'assistant',
       content: '',
+      filas: [],
+      filasRecibidas: 0,
       timestamp: new Date(),
       streaming: true
     };
@@ -90,6 +93,26 @@ export function useStreamingChat() {
             setConversationId(parsed.id);
           } else if (event === 'status' || event === 'sql') {
             JSON.parse(data);
+          } else if (event === 'data_chunk') {
+            // Filas del resultado a medida que llegan del cursor (antes de la narrativa).
+            // Solo se guardan las que muestra la tabla; del resto se lleva la cuenta.
+            const parsed = JSON.parse(data);
+
+            setMessages(prev => prev.map(msg => {
+              if (msg.id !== assistantMsgId) return msg;
+              const filasRecibidas = msg.filasRecibidas + parsed.rows.length;
+              const faltan = MAX_FILAS_TABLA - msg.filas.length;
+              if (faltan <= 0) return { ...msg, filasRecibidas };
+              return { ...msg, filas: msg.filas.concat(parsed.rows.slice(0, faltan)), filasRecibidas };
+            }));
+          } else if (event === 'data') {
+            const parsed = JSON.parse(data);
+
+            setMessages(prev => prev.map(msg =>
+              msg.id === assistantMsgId
+                ? { ...msg, totalFilas: parsed.rows, truncado: parsed.truncado }
+                : msg
+            ));
           } else if (event === 'token') {
             streamingContent += data;
 
@@ -119,7 +142,7 @@ export function useStreamingChat() {
             toast.error(errorMsg);
             setMessages(prev => prev.map(msg =>
               msg.id === assistantMsgId
-                ? { ...msg, content: `Error: ${errorMsg}`, streaming: false }
+                ? { ...msg, content: `Error: ${errorMsg}`, filas: [], filasRecibidas: 0, streaming: false }
                 : msg
             ));
           }
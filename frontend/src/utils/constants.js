@@ -1,6 +1,9 @@
 export const LOCALIDADES = ['Montevideo', 'Mercedes'];
 export const OPERACION_TIPOS = ['INGRESO', 'GASTO', 'RETIRO', 'DISTRIBUCION'];
 
+// Filas del resultado que el chat guarda y muestra en la tabla (el resto solo se cuenta)
+export const MAX_FILAS_TABLA = 100;
+
 export const TIPO_CONFIG = {
   INGRESO: 'bg-emerald-50 text-emerald-700 border-emerald-200',
   GASTO: 'bg-coral-50 text-coral-700 border-coral-200',